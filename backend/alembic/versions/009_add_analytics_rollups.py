@@ -0,0 +1,47 @@
+"""Add analytics rollup table
+
+Revision ID: 009_add_analytics_rollups
+Revises: 008_add_performance_indexes
+Create Date: 2024-01-25 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009_add_analytics_rollups'
+down_revision = '008_add_performance_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Hourly and daily per-workspace activity totals; fill existing history with
+    # `python -m app.services.analytics_rollup` after upgrading
+    try:
+        op.create_table('analytics_rollups',
+            sa.Column('workspace_id', sa.String(36), nullable=False),
+            sa.Column('granularity', sa.String(length=5), nullable=False),
+            sa.Column('bucket_start', sa.DateTime(), nullable=False),
+            sa.Column('sessions_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('sessions_ended', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('session_duration_seconds', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('messages_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('user_messages_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('documents_uploaded', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('response_time_ms_sum', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('response_time_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('satisfied_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('unsatisfied_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.ForeignKeyConstraint(['workspace_id'], ['workspaces.id']),
+            sa.PrimaryKeyConstraint('workspace_id', 'granularity', 'bucket_start')
+        )
+    except Exception:
+        pass  # Table already exists, continue
+
+
+def downgrade():
+    try:
+        op.drop_table('analytics_rollups')
+    except Exception:
+        pass
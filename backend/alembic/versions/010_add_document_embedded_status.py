@@ -0,0 +1,39 @@
+"""Allow the 'embedded' document status
+
+Revision ID: 010_add_document_embedded_status
+Revises: 009_add_analytics_rollups
+Create Date: 2024-01-28 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010_add_document_embedded_status'
+down_revision = '009_add_analytics_rollups'
+branch_labels = None
+depends_on = None
+
+_STATUSES = "'uploaded','processing','done','failed','deleted','processed','error'"
+
+
+def upgrade():
+    # 'done' now means chunked and queued; 'embedded' means every vector is stored
+    try:
+        with op.batch_alter_table('documents') as batch_op:
+            batch_op.drop_constraint('documents_status_check', type_='check')
+            batch_op.create_check_constraint(
+                'documents_status_check', f"status IN ({_STATUSES},'embedded')"
+            )
+    except Exception:
+        pass  # Constraint missing or already updated, continue
+
+
+def downgrade():
+    try:
+        op.execute("UPDATE documents SET status = 'done' WHERE status = 'embedded'")
+        with op.batch_alter_table('documents') as batch_op:
+            batch_op.drop_constraint('documents_status_check', type_='check')
+            batch_op.create_check_constraint('documents_status_check', f"status IN ({_STATUSES})")
+    except Exception:
+        pass
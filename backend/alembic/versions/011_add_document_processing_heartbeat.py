@@ -0,0 +1,30 @@
+"""Add a processing heartbeat to documents
+
+Revision ID: 011_add_document_processing_heartbeat
+Revises: 010_add_document_embedded_status
+Create Date: 2024-01-29 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011_add_document_processing_heartbeat'
+down_revision = '010_add_document_embedded_status'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Written with each stored chunk batch; documents left 'processing' without one are re-processed
+    try:
+        op.add_column('documents', sa.Column('processing_heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+    except Exception:
+        pass  # Column already exists, continue
+
+
+def downgrade():
+    try:
+        op.drop_column('documents', 'processing_heartbeat_at')
+    except Exception:
+        pass
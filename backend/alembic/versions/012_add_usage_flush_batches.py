@@ -0,0 +1,36 @@
+"""Add usage flush batch ids
+
+Revision ID: 012_add_usage_flush_batches
+Revises: 011_add_document_processing_heartbeat
+Create Date: 2024-01-30 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012_add_usage_flush_batches'
+down_revision = '011_add_document_processing_heartbeat'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Ids of usage buffer batches already applied, written in the batch's transaction
+    try:
+        op.create_table('usage_flush_batches',
+            sa.Column('id', sa.String(32), nullable=False),
+            sa.Column('applied_at', sa.DateTime(timezone=True), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_usage_flush_batches_applied_at'), 'usage_flush_batches', ['applied_at'], unique=False)
+    except Exception:
+        pass  # Table already exists, continue
+
+
+def downgrade():
+    try:
+        op.drop_index(op.f('ix_usage_flush_batches_applied_at'), table_name='usage_flush_batches')
+        op.drop_table('usage_flush_batches')
+    except Exception:
+        pass
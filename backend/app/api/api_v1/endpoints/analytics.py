@@ -16,6 +16,7 @@ from app.models.user import User
 from app.models.chat import ChatSession, ChatMessage
 from app.models.document import Document
 from app.services.analytics_service import AnalyticsService
+from app.services.kpi_engine import KPIEngine
 from app.schemas.common import BaseResponse
 
 logger = structlog.get_logger()
@@ -122,60 +123,7 @@ async def analytics_kpis(
 ):
     """Return KPI deltas for the last period (simple comparisons)."""
     try:
-        workspace_id = str(current_user.workspace_id)
-        end = datetime.utcnow()
-        start = end - timedelta(days=days)
-        prev_start = start - timedelta(days=days)
-        prev_end = start
-
-        def count_messages(s: datetime, e: datetime) -> int:
-            return db.query(ChatMessage).join(ChatSession).filter(
-                ChatSession.workspace_id == workspace_id,
-                ChatMessage.role == "user",
-                ChatMessage.created_at >= s,
-                ChatMessage.created_at < e,
-            ).count()
-
-        cur_msgs = count_messages(start, end)
-        prev_msgs = count_messages(prev_start, prev_end)
-        delta_pct = 0.0 if prev_msgs == 0 else ((cur_msgs - prev_msgs) / max(prev_msgs, 1)) * 100.0
-
-        # Sessions delta
-        cur_sessions = db.query(ChatSession).filter(
-            ChatSession.workspace_id == workspace_id,
-            ChatSession.created_at >= start,
-            ChatSession.created_at < end,
-        ).count()
-        prev_sessions = db.query(ChatSession).filter(
-            ChatSession.workspace_id == workspace_id,
-            ChatSession.created_at >= prev_start,
-            ChatSession.created_at < prev_end,
-        ).count()
-        sessions_delta = cur_sessions - prev_sessions
-
-        # Avg response time (assistant messages) current vs previous window
-        def avg_rt(s: datetime, e: datetime):
-            return db.query(func.avg(ChatMessage.response_time_ms)).join(ChatSession).filter(
-                ChatSession.workspace_id == workspace_id,
-                ChatMessage.role == "assistant",
-                ChatMessage.created_at >= s,
-                ChatMessage.created_at < e,
-                ChatMessage.response_time_ms.isnot(None)
-            ).scalar()
-        cur_rt = avg_rt(start, end)
-        prev_rt = avg_rt(prev_start, prev_end)
-        # Delta in ms (if both present)
-        if cur_rt is not None and prev_rt is not None:
-            rt_delta = float(cur_rt) - float(prev_rt)
-        else:
-            rt_delta = 0
-
-        return {
-            "queries": {"current": cur_msgs, "previous": prev_msgs, "delta_pct": delta_pct},
-            "sessions": {"current": cur_sessions, "previous": prev_sessions, "delta": sessions_delta},
-            "avg_response_time_ms": {"current": cur_rt, "previous": prev_rt, "delta_ms": rt_delta},
-            "active_sessions": {"current": cur_sessions, "previous": prev_sessions, "delta": sessions_delta},
-        }
+        return KPIEngine(db).compute(current_user.workspace_id, days)
     except Exception as e:
         logger.error("analytics_kpis failed", error=str(e))
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to load KPIs")
@@ -207,12 +155,14 @@ from app.services.auth import AuthService
 from app.services.analytics_service import AnalyticsService
 from app.core import dependencies as core_deps
 from app.utils.validators import DashboardQueryValidator, AnalyticsFilterValidator
+from app.services.response_cache import cache_response
 
 logger = structlog.get_logger()
 router = APIRouter()
 
 
 @router.get("/overview", response_model=AnalyticsOverview)
+@cache_response(ttl=300, stale_ttl=60)
 async def get_analytics_overview(
     days: int = Query(30, ge=1, le=365, description="Number of days to analyze"),
     db: Session = Depends(get_db),
@@ -321,6 +271,7 @@ async def get_message_analytics(
 
 
 @router.get("/usage-stats", response_model=List[UsageStats])
+@cache_response(ttl=600, stale_ttl=120)
 async def get_usage_stats(
     days: int = Query(30, ge=1, le=365),
     db: Session = Depends(get_db)
@@ -404,6 +355,7 @@ async def get_satisfaction_stats(
 
 
 @router.get("/kpis", response_model=KPISummary)
+@cache_response(ttl=900, stale_ttl=180)
 async def get_kpis(
     days: int = Query(30, ge=7, le=90),
     db: Session = Depends(get_db),
@@ -11,12 +11,14 @@ from app.core.database import get_db
 from app.models.user import User
 from app.services.analytics_service import AnalyticsService
 from app.api.api_v1.dependencies import get_current_user
+from app.services.response_cache import cache_response
 
 logger = structlog.get_logger()
 router = APIRouter()
 
 
 @router.get("/dashboard")
+@cache_response(ttl=60, stale_ttl=60)
 async def get_dashboard_metrics(
     days: int = Query(30, ge=1, le=365, description="Number of days to analyze"),
     db: Session = Depends(get_db),
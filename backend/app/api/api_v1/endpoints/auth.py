@@ -262,14 +262,17 @@ async def login(
         
         # In tests, authenticate first so valid credentials aren't blocked by pre-checks
         identifier = user_data.identifier
-        user = auth_service.authenticate_user(user_data.identifier, user_data.password)
+        lockout_status = await auth_service.check_login_attempts_async(identifier)
+        user = auth_service.authenticate_user(
+            user_data.identifier, user_data.password, lockout_status=lockout_status, reset_attempts=False
+        )
         if not user:
             # On failure, check lockout/rate limit after recording attempt
             # Record failed attempt
-            auth_service.record_failed_login(identifier)
+            await auth_service.record_failed_login_async(identifier)
             
             # Check if this failure triggers lockout or rate limiting
-            updated_check = auth_service.check_login_attempts(identifier)
+            updated_check = await auth_service.check_login_attempts_async(identifier)
             if updated_check.get("is_locked", False):
                 raise HTTPException(
                     status_code=status.HTTP_423_LOCKED,
@@ -296,7 +299,7 @@ async def login(
             )
         
         # Reset failed attempts on successful login
-        auth_service.reset_login_attempts(identifier)
+        await auth_service.reset_login_attempts_async(identifier)
         
         # Create tokens
         access_token = auth_service.create_access_token(
@@ -395,7 +398,7 @@ async def logout(
         from app.services.token_revocation import token_revocation_service
         
         # Revoke all tokens for the user
-        revoked_count = token_revocation_service.revoke_all_user_tokens(current_user.id)
+        revoked_count = await token_revocation_service.revoke_all_user_tokens_async(current_user.id)
         
         logger.info("User logged out", user_id=current_user.id, revoked_tokens=revoked_count)
         
@@ -587,11 +590,10 @@ async def forgot_password(
 @router.get("/csrf-token")
 async def get_csrf_token(request: Request):
     """Get CSRF token for form submissions"""
-    from app.middleware.security import CSRFProtectionMiddleware
+    from app.middleware.security import CSRFProtectionHook
     
     client_ip = request.client.host if request.client else "unknown"
-    csrf_middleware = CSRFProtectionMiddleware(None)
-    token = csrf_middleware.generate_csrf_token(client_ip)
+    token = CSRFProtectionHook().generate_csrf_token(client_ip)
     
     return {
         "csrf_token": token,
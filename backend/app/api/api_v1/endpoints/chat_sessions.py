@@ -21,6 +21,7 @@ from app.schemas.chat import (
 )
 from app.services.auth import AuthService
 from app.services.chat import ChatService
+from app.services.analytics_rollup import AnalyticsRollupService
 from app.services.session_persistence import session_persistence_service
 from app.api.api_v1.dependencies import get_current_user
 
@@ -54,6 +55,7 @@ async def create_chat_session(
         )
         
         db.add(session)
+        AnalyticsRollupService(db).record_session_started(session)
         db.commit()
         db.refresh(session)
         
@@ -269,8 +271,9 @@ async def update_chat_session(
         
         if request.is_active is not None:
             session.is_active = request.is_active
-            if not request.is_active:
+            if not request.is_active and session.ended_at is None:
                 session.ended_at = db.query(func.now()).scalar()
+                AnalyticsRollupService(db).record_session_ended(session, session.ended_at)
         
         db.commit()
         db.refresh(session)
@@ -5,7 +5,7 @@ Enhanced embed endpoints for widget generation and management
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 import structlog
 
@@ -354,6 +354,59 @@ async def preview_widget(
         )
 
 
+_WIDGET_RATE_LIMIT_DETAILS = {
+    "ip": "Rate limit exceeded. Please try again later.",
+    "embed": "Embed rate limit exceeded. Please try again later.",
+    "workspace": "Workspace rate limit exceeded. Please try again later.",
+}
+
+
+def _widget_rate_limit_exception(scope: str, rate_limit_info: Dict[str, Any]) -> HTTPException:
+    """429 response for the widget scope that rejected the request"""
+    reset_time = rate_limit_info.get("reset_time")
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=_WIDGET_RATE_LIMIT_DETAILS[scope],
+        headers={
+            "X-RateLimit-Limit": str(rate_limit_info.get("limit", 0)),
+            "X-RateLimit-Remaining": str(rate_limit_info.get("remaining", 0)),
+            "X-RateLimit-Reset": str(int(reset_time.timestamp())) if reset_time else "0"
+        }
+    )
+
+
+def _validate_widget_embed_code(embed_code, x_embed_code_id: Optional[str]) -> Optional[HTTPException]:
+    """Return the 401 to raise for an unusable embed code, or None"""
+    if not embed_code:
+        return HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid client API key"
+        )
+    
+    # Verify embed code ID matches
+    if x_embed_code_id and str(embed_code.id) != x_embed_code_id:
+        return HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid embed code ID"
+        )
+    
+    # Verify embed code is active and not expired
+    if not embed_code.is_active:
+        return HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Embed code is inactive"
+        )
+    
+    # Check if embed code has expired
+    if embed_code.expires_at and embed_code.expires_at < datetime.utcnow():
+        return HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Embed code has expired"
+        )
+    
+    return None
+
+
 @router.post("/chat/message")
 async def widget_chat_message(
     request: dict,
@@ -396,103 +449,50 @@ async def widget_chat_message(
                 detail="Message too long"
             )
 
-        # Rate limiting check
+        # IP limit first: it is the only limit that does not need a resolved embed code,
+        # so requests with unknown keys are throttled before any key lookup
         is_allowed, rate_limit_info = await rate_limiting_service.check_ip_rate_limit(
             ip_address=client_ip,
             limit=10,  # 10 requests per minute per IP
             window_seconds=60
         )
-        
         if not is_allowed:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Rate limit exceeded. Please try again later.",
-                headers={
-                    "X-RateLimit-Limit": str(rate_limit_info["limit"]),
-                    "X-RateLimit-Remaining": str(rate_limit_info["remaining"]),
-                    "X-RateLimit-Reset": str(int(rate_limit_info["reset_time"].timestamp()))
-                }
-            )
-        
+            raise _widget_rate_limit_exception("ip", rate_limit_info)
+
         # Authenticate using API key
         if not x_client_api_key:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Client API key required"
             )
-        
         embed_service = EmbedService(db)
-        embed_code = embed_service.get_embed_code_by_api_key(x_client_api_key)
-        
-        if not embed_code:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid client API key"
-            )
-        
-        # Verify embed code ID matches
-        if x_embed_code_id and str(embed_code.id) != x_embed_code_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid embed code ID"
-            )
-        
-        # Verify embed code is active and not expired
-        if not embed_code.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Embed code is inactive"
-            )
-        
-        # Check if embed code has expired
-        if embed_code.expires_at and embed_code.expires_at < datetime.utcnow():
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Embed code has expired"
-            )
-
-        # Per-embed rate limit
-        is_allowed_embed, embed_rl = await rate_limiting_service.check_rate_limit(
-            identifier=f"embed:{embed_code.id}",
-            limit=60,
-            window_seconds=60
-        )
-        if not is_allowed_embed:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Embed rate limit exceeded. Please try again later.",
-                headers={
-                    "X-RateLimit-Limit": str(embed_rl.get("limit", 60)),
-                    "X-RateLimit-Remaining": str(embed_rl.get("remaining", 0)),
-                    "X-RateLimit-Reset": str(int(embed_rl.get("reset_time").timestamp())) if embed_rl.get("reset_time") else "0"
-                }
-            )
-
-        # Per-workspace rate limit
-        is_allowed_ws, ws_rl = await rate_limiting_service.check_workspace_rate_limit(
-            workspace_id=str(embed_code.workspace_id),
-            limit=120,
+        # Cached per process; edits through EmbedService invalidate it
+        embed_code = embed_service.resolve_embed_auth(x_client_api_key)
+        auth_error = _validate_widget_embed_code(embed_code, x_embed_code_id)
+        if auth_error is not None:
+            raise auth_error
+        
+        # Per-embed and per-workspace limits in a single atomic check
+        is_allowed, rate_limits = await rate_limiting_service.check_widget_rate_limits(
+            ip_address=None,
+            embed_code_id=embed_code.id,
+            workspace_id=embed_code.workspace_id,
+            embed_limit=60,
+            workspace_limit=120,
             window_seconds=60
         )
-        if not is_allowed_ws:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Workspace rate limit exceeded. Please try again later.",
-                headers={
-                    "X-RateLimit-Limit": str(ws_rl.get("limit", 120)),
-                    "X-RateLimit-Remaining": str(ws_rl.get("remaining", 0)),
-                    "X-RateLimit-Reset": str(int(ws_rl.get("reset_time").timestamp())) if ws_rl.get("reset_time") else "0"
-                }
+        if not is_allowed:
+            scope, rate_limit_info = next(
+                (scope, info) for scope, info in rate_limits.items() if not info["allowed"]
             )
+            raise _widget_rate_limit_exception(scope, rate_limit_info)
         
         # Validate CORS origin if configured
-        if hasattr(embed_code, 'allowed_origins') and embed_code.allowed_origins:
-            allowed_origins = embed_code.allowed_origins.split(',')
-            if origin and origin not in allowed_origins:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Origin not allowed"
-                )
+        if not embed_code.allows_origin(origin):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Origin not allowed"
+            )
         
         # Process the chat message using existing chat service
         chat_service = ChatService(db)
@@ -0,0 +1,334 @@
+"""
+Shared asyncio Redis client for coroutines.
+
+Commands issued concurrently on the event loop are queued and sent as one
+non-transactional pipeline on the next loop iteration, so N concurrent
+lookups cost one round trip instead of N blocking calls; GETs in the same
+batch are folded into a single MGET.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import structlog
+
+from app.core.config import settings
+
+try:
+    import redis.asyncio as aioredis
+except Exception:  # pragma: no cover
+    aioredis = None  # type: ignore
+
+logger = structlog.get_logger()
+
+
+class _Command:
+    __slots__ = ("method", "args", "kwargs", "future", "queued_at", "mergeable")
+
+    def __init__(self, method: str, args: tuple, kwargs: dict, future: asyncio.Future,
+                 mergeable: bool = True):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.mergeable = mergeable
+        self.queued_at = time.perf_counter()
+
+
+class CommandLatency:
+    """Per-command latency (queue wait included) since process start"""
+
+    __slots__ = ("count", "errors", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, duration: float, success: bool) -> None:
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        if not success:
+            self.errors += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class AsyncRedis:
+    """Auto-pipelining facade over one ``redis.asyncio`` connection pool.
+
+    Methods mirror redis-py names. When Redis is unavailable (or in tests)
+    commands run against ``redis_manager``'s fallback client instead, which
+    is in-memory and never blocks.
+    """
+
+    def __init__(self, max_batch: Optional[int] = None, decode_responses: bool = True):
+        self.max_batch = max_batch if max_batch is not None else settings.REDIS_PIPELINE_MAX_BATCH
+        self.decode_responses = decode_responses
+        self._client = None
+        self._fallback = None
+        self._pending: List[_Command] = []
+        self._flush_scheduled = False
+        self._inflight: set = set()
+        self._record_metric = None
+        self.latency: Dict[str, CommandLatency] = {}
+        self.stats = {"commands": 0, "batches": 0, "merged_gets": 0}
+
+    @property
+    def available(self) -> bool:
+        """True when commands go to a real Redis server"""
+        self._ensure_client()
+        return self._client is not None
+
+    def _ensure_client(self) -> None:
+        if self._client is not None or self._fallback is not None:
+            return
+        from app.core.database import redis_manager
+        testing = os.getenv("TESTING") == "true" or os.getenv("ENVIRONMENT") == "testing"
+        if testing or aioredis is None or not redis_manager.redis_available:
+            self._fallback = redis_manager.get_client()
+            return
+        pool = aioredis.ConnectionPool.from_url(
+            redis_manager.redis_url,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            retry_on_timeout=settings.REDIS_RETRY_ON_TIMEOUT,
+            socket_keepalive=settings.REDIS_SOCKET_KEEPALIVE,
+            socket_timeout=1.0,
+            socket_connect_timeout=1.0,
+            decode_responses=self.decode_responses
+        )
+        self._client = aioredis.Redis(connection_pool=pool)
+        logger.info("Async Redis client initialized", max_connections=settings.REDIS_MAX_CONNECTIONS)
+
+    def _observe(self, method: str, duration: float, success: bool) -> None:
+        latency = self.latency.get(method)
+        if latency is None:
+            latency = self.latency[method] = CommandLatency()
+        latency.observe(duration, success)
+        if self._record_metric is None:
+            try:
+                from app.utils.metrics import metrics_collector
+                self._record_metric = metrics_collector.record_redis_operation
+            except Exception:
+                self._record_metric = lambda *args, **kwargs: None
+        self._record_metric(method, duration, success)
+
+    # --- Core ---
+    async def execute(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """Run one redis-py method, batched with whatever else is pending"""
+        self._ensure_client()
+        self.stats["commands"] += 1
+        if self._client is None:
+            return self._execute_fallback(method, args, kwargs)
+
+        command = _Command(method, args, kwargs, asyncio.get_running_loop().create_future())
+        self._enqueue([command])
+        return await command.future
+
+    async def execute_many(self, *commands: Sequence[Any]) -> List[Any]:
+        """Run ``(method, *args)`` commands in order within a single pipeline"""
+        self._ensure_client()
+        self.stats["commands"] += len(commands)
+        if self._client is None:
+            return [self._execute_fallback(method, tuple(args), {}) for method, *args in commands]
+
+        loop = asyncio.get_running_loop()
+        # Sequences keep their positions; only independent GETs are folded into MGET
+        queued = [
+            _Command(method, tuple(args), {}, loop.create_future(), mergeable=False)
+            for method, *args in commands
+        ]
+        self._enqueue(queued)
+        return list(await asyncio.gather(*(command.future for command in queued)))
+
+    def _enqueue(self, commands: List[_Command]) -> None:
+        self._pending.extend(commands)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif not self._flush_scheduled:
+            # Runs after every coroutine that is ready this iteration has queued its commands
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _execute_fallback(self, method: str, args: tuple, kwargs: dict) -> Any:
+        start = time.perf_counter()
+        success = False
+        try:
+            if method == "mget" and not hasattr(self._fallback, "mget"):
+                keys = args[0] if len(args) == 1 and not isinstance(args[0], (str, bytes)) else args
+                result = [self._fallback.get(key) for key in keys]
+            else:
+                result = getattr(self._fallback, method)(*args, **kwargs)
+            success = True
+            return result
+        finally:
+            self._observe(method, time.perf_counter() - start, success)
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: List[_Command]) -> None:
+        self.stats["batches"] += 1
+        gets = [command for command in batch if command.method == "get" and command.mergeable and not command.kwargs]
+        if len(gets) > 1:
+            merged = {id(command) for command in gets}
+            others = [command for command in batch if id(command) not in merged]
+        else:
+            gets, others = [], batch
+
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            if gets:
+                pipe.mget([command.args[0] for command in gets])
+                self.stats["merged_gets"] += len(gets)
+            for command in others:
+                getattr(pipe, command.method)(*command.args, **command.kwargs)
+            results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            # Every caller in the batch must be answered, even if queuing failed
+            logger.warning("Redis pipeline failed", commands=len(batch), error=str(e))
+            results = [e] * ((1 if gets else 0) + len(others))
+
+        now = time.perf_counter()
+        if gets:
+            values = results[0]
+            for index, command in enumerate(gets):
+                value = values if isinstance(values, Exception) else values[index]
+                self._resolve(command, value, now)
+            results = results[1:]
+        for command, result in zip(others, results):
+            self._resolve(command, result, now)
+
+    def _resolve(self, command: _Command, result: Any, now: float) -> None:
+        failed = isinstance(result, Exception)
+        self._observe(command.method, now - command.queued_at, not failed)
+        if command.future.done():
+            return
+        if failed:
+            command.future.set_exception(result)
+        else:
+            command.future.set_result(result)
+
+    # --- Commands ---
+    async def get(self, key: str) -> Any:
+        return await self.execute("get", key)
+
+    async def mget(self, keys: Sequence[str]) -> List[Any]:
+        if not keys:
+            return []
+        return await self.execute("mget", list(keys))
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Bulk get in one MGET; keys that are missing map to None"""
+        keys = list(keys)
+        return dict(zip(keys, await self.mget(keys)))
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> Any:
+        if nx:
+            return await self.execute("set", key, value, ex=ex, nx=True)
+        if ex:
+            return await self.execute("set", key, value, ex=ex)
+        return await self.execute("set", key, value)
+
+    async def setex(self, key: str, ttl: int, value: Any) -> Any:
+        return await self.execute("setex", key, ttl, value)
+
+    async def delete(self, *keys: str) -> int:
+        if not keys:
+            return 0
+        return await self.execute("delete", *keys)
+
+    async def exists(self, key: str) -> int:
+        return await self.execute("exists", key)
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        if amount != 1:
+            return await self.execute("incr", key, amount)
+        return await self.execute("incr", key)
+
+    async def expire(self, key: str, seconds: int) -> Any:
+        return await self.execute("expire", key, seconds)
+
+    async def keys(self, pattern: str) -> List[str]:
+        return await self.execute("keys", pattern)
+
+    async def scan(self, cursor: int = 0, match: Optional[str] = None, count: Optional[int] = None) -> Any:
+        return await self.execute("scan", cursor, match=match, count=count)
+
+    async def hgetall(self, key: str) -> Dict[str, Any]:
+        return await self.execute("hgetall", key)
+
+    async def hset(self, key: str, field: Optional[str] = None, value: Any = None,
+                   mapping: Optional[Dict[str, Any]] = None) -> Any:
+        if mapping is not None:
+            return await self.execute("hset", key, mapping=mapping)
+        return await self.execute("hset", key, field, value)
+
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        return await self.execute("hincrby", key, field, amount)
+
+    async def hsetnx(self, key: str, field: str, value: Any) -> Any:
+        return await self.execute("hsetnx", key, field, value)
+
+    async def sadd(self, key: str, *values: Any) -> Any:
+        return await self.execute("sadd", key, *values)
+
+    async def smembers(self, key: str) -> set:
+        return await self.execute("smembers", key)
+
+    async def zadd(self, key: str, mapping: Dict[str, float]) -> Any:
+        return await self.execute("zadd", key, mapping)
+
+    async def zcard(self, key: str) -> int:
+        return await self.execute("zcard", key)
+
+    async def zremrangebyscore(self, key: str, min_score: float, max_score: float) -> int:
+        return await self.execute("zremrangebyscore", key, min_score, max_score)
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> Any:
+        return await self.execute("eval", script, numkeys, *keys_and_args)
+
+    async def flushdb(self) -> Any:
+        return await self.execute("flushdb")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "backend": "redis" if self._client is not None else "fallback",
+            "commands_by_type": {method: latency.to_dict() for method, latency in self.latency.items()},
+        }
+
+    async def close(self) -> None:
+        if self._pending:
+            self._flush()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            except Exception as e:
+                logger.warning("Failed to close async Redis client", error=str(e))
+            self._client = None
+
+
+# Global instance
+async_redis = AsyncRedis()
+
+# Raw bytes in and out (e.g. cached response bodies)
+async_binary_redis = AsyncRedis(decode_responses=False)
@@ -45,6 +45,7 @@ class Settings(BaseSettings):
     REDIS_MAX_CONNECTIONS: int = 100
     REDIS_RETRY_ON_TIMEOUT: bool = True
     REDIS_SOCKET_KEEPALIVE: bool = True
+    REDIS_PIPELINE_MAX_BATCH: int = 256  # Concurrent commands sent per auto-pipelined round trip
     RQ_QUEUE_NAME: str = "default"
     
     # Queue Configuration
@@ -60,6 +61,12 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     JWT_ISSUER: str = "customercaregpt"
     JWT_AUDIENCE: str = "customercaregpt-users"
+    AUTH_TOKEN_CACHE_SIZE: int = 10000  # Verified token claims cached per process (until exp)
+    AUTH_PRINCIPAL_CACHE_TTL: int = 30  # Seconds a resolved user stays cached
+    AUTH_PRINCIPAL_CACHE_SIZE: int = 10000
+    AUTH_REVOCATION_BLOOM_CAPACITY: int = 100000  # Expected revoked-but-unexpired tokens
+    AUTH_REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    AUTH_REVOCATION_RESYNC_SECONDS: int = 300  # Reload the revocation snapshot this often, and after listener errors
     ENCRYPTION_KEY: Optional[str] = None
     
     # Password Security
@@ -79,11 +86,25 @@ class Settings(BaseSettings):
     
     # Google Gemini
     GEMINI_API_KEY: str = ""
+    GEMINI_MODEL_NAME: str = "gemini-pro"
+    GEMINI_API_BASE_URL: str = ""  # Set to use the REST API directly (e.g. a local fake LLM server)
+    
+    # LLM Client Configuration
+    LLM_MAX_CONCURRENCY: int = 32  # Concurrent LLM calls per process
+    LLM_WORKSPACE_MAX_CONCURRENCY: int = 4  # Concurrent LLM calls per workspace
+    LLM_QUEUE_TIMEOUT: float = 10.0  # Seconds to wait for a free slot before rejecting
+    LLM_REQUEST_TIMEOUT: float = 30.0  # Seconds per call (or between streamed chunks)
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
     
     # ChromaDB Configuration
     CHROMA_URL: str = ""  # Must be set via environment variable
     CHROMA_PERSIST_DIRECTORY: str = "/tmp/chroma_test" if os.getenv("TESTING") == "true" else "/chroma/chroma"
     CHROMA_AUTH_CREDENTIALS: str = ""
+    BM25_INDEX_DIR: str = "/tmp/bm25_test" if os.getenv("TESTING") == "true" else "/app/data/bm25"
+    VECTOR_STORE_BACKEND: str = "chroma"  # "chroma" (server) or "local" (embedded, no server needed)
+    VECTOR_STORE_DIR: str = "/tmp/vector_store_test" if os.getenv("TESTING") == "true" else "/app/data/vectors"
+    VECTOR_STORE_ANN_THRESHOLD: int = 20000  # Larger workspaces switch from brute force to HNSW
+    VECTOR_EMBEDDING_MODEL: str = "all-mpnet-base-v2"  # Embeds every vector in the workspace shards
     
     # Stripe Configuration
     STRIPE_API_KEY: str = ""
@@ -154,6 +175,17 @@ class Settings(BaseSettings):
     BACKUP_SCHEDULER_ENABLED: bool = True
     HEALTH_CHECK_ENABLED: bool = True
     
+    # HTTP Response Cache Configuration
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_SIZE: int = 5000  # Responses kept in process memory
+    RESPONSE_CACHE_MAX_BODY_BYTES: int = 1048576  # Larger bodies are streamed, not cached
+    RESPONSE_CACHE_COMPRESS_MIN_BYTES: int = 1024  # zlib-compress Redis copies above this size
+    RESPONSE_CACHE_REFRESH_LOCK_TTL: int = 10  # Seconds one process owns a key's refresh
+    
+    # Cache Tag Configuration
+    CACHE_TAG_LOCAL_TTL: float = 1.0  # Seconds a process trusts its copy of a tag generation
+    CACHE_SWEEP_SCAN_COUNT: int = 500  # Keys examined per SCAN step when sweeping
+    
     # Vector Cache Configuration
     VECTOR_CACHE_TTL: int = 600
     VECTOR_CACHE_MAX_SIZE: int = 1000
@@ -187,12 +219,45 @@ class Settings(BaseSettings):
     EMBEDDING_DIMENSION: int = 384
     EMBEDDING_BATCH_SIZE: int = 32
     EMBEDDING_CACHE_SIZE: int = 1000
+    EMBEDDING_QUERY_MAX_BATCH_SIZE: int = 64  # Max texts per micro-batched query encode
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0  # Max time a query waits for batch-mates
     
     # Vector Search Configuration
     VECTOR_SEARCH_DEFAULT_TOP_K: int = 5
     VECTOR_SEARCH_SIMILARITY_THRESHOLD: float = 0.7
     VECTOR_SEARCH_CACHE_TTL: int = 3600
     
+    # Vector Ingest Configuration
+    VECTOR_INGEST_BATCH_SIZE: int = 64  # Chunks encoded per micro-batch
+    VECTOR_INGEST_MAX_WORKERS: int = 2  # Dedicated encode/add executor threads
+    
+    # Document Parsing Pool Configuration
+    PARSE_POOL_WORKERS: int = 0  # Parser processes; 0 = one per CPU core
+    PARSE_TIMEOUT_SECONDS: float = 120.0  # Per parse task: a whole file, or one page range of a large PDF
+    PARSE_MEMORY_LIMIT_MB: int = 2048  # Heap cap per parser process; 0 disables
+    PARSE_PDF_FANOUT_PAGES: int = 40  # PDFs with more pages are parsed in parallel page ranges
+    PARSE_PDF_PAGES_PER_TASK: int = 16
+    PARSE_QUEUE_SIZE: int = 4  # Parsed page ranges allowed to wait for chunking
+    INGEST_CHUNK_BATCH_SIZE: int = 256  # Chunks stored (and indexed) per batch while ingesting
+    TABULAR_CSV_CHUNK_ROWS: int = 50000  # CSV rows read per piece; rows are packed up to MAX_CHUNK_TOKENS
+    INGEST_STALLED_AFTER_SECONDS: int = 900  # Re-process 'processing' documents with no stored batch for this long
+    
+    # Embedding Outbox Configuration (Redis stream consumed by EnhancedWorker)
+    EMBEDDING_OUTBOX_STREAM: str = "embedding_outbox"
+    EMBEDDING_OUTBOX_GROUP: str = "embedding_workers"
+    EMBEDDING_OUTBOX_ENTRY_CHUNKS: int = 64  # Chunks referenced by one stream entry
+    EMBEDDING_OUTBOX_BATCH_CHUNKS: int = 256  # Flush once this many chunks are buffered...
+    EMBEDDING_OUTBOX_FLUSH_INTERVAL: float = 2.0  # ...or once the oldest buffered entry is this old
+    EMBEDDING_OUTBOX_MAX_ATTEMPTS: int = 5  # Then the document is marked failed
+    EMBEDDING_OUTBOX_RETRY_BASE: float = 2.0  # Seconds before the first retry; doubles per attempt
+    EMBEDDING_OUTBOX_CLAIM_IDLE_MS: int = 60000  # Reclaim entries a dead consumer left unacknowledged
+    
+    # Reranking Configuration
+    RERANK_MAX_WORKERS: int = 2  # Cross-encoder inference threads per process
+    RERANK_BATCH_SIZE: int = 32  # Query/chunk pairs per predict batch
+    RERANK_CACHE_SIZE: int = 10000  # In-process (query, chunk, model) score entries
+    RERANK_CACHE_TTL: int = 3600  # Redis score cache TTL in seconds
+    
     # RAG Configuration
     RAG_DEFAULT_TOP_K: int = 6
     RAG_MAX_CONTEXT_LENGTH: int = 4000
@@ -212,6 +277,10 @@ class Settings(BaseSettings):
     WIDGET_DEFAULT_POSITION: str = "bottom-right"
     WIDGET_DEFAULT_MAX_MESSAGES: int = 50
     WIDGET_DEFAULT_Z_INDEX: int = 10000
+    EMBED_AUTH_CACHE_TTL: int = 60  # Seconds a resolved API key stays cached
+    EMBED_AUTH_CACHE_SIZE: int = 10000  # Max cached API keys per process
+    EMBED_AUTH_NEGATIVE_TTL: int = 5  # Seconds an unknown API key is remembered as unknown
+    USAGE_FLUSH_INTERVAL: float = 10.0  # Seconds between write-behind usage counter flushes
     
     # WebSocket Configuration
     WEBSOCKET_MAX_CONNECTIONS: int = 1000
@@ -83,16 +83,22 @@ class MockRedisClient:
     def get(self, key):
         return self.data.get(key)
     
+    def mget(self, keys, *args):
+        keys = [keys, *args] if isinstance(keys, (str, bytes)) else list(keys)
+        return [self.data.get(key) for key in keys]
+    
     def set(self, key, value, ex=None):
         self.data[key] = value
         return True
     
-    def delete(self, key):
-        if key in self.data:
-            del self.data[key]
-        if key in self.hash_data:
-            del self.hash_data[key]
-        return 1
+    def delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            found = key in self.data or key in self.hash_data
+            self.data.pop(key, None)
+            self.hash_data.pop(key, None)
+            deleted += found
+        return deleted
     
     def exists(self, key):
         return key in self.data or key in self.hash_data
@@ -198,12 +204,17 @@ class MockRedisClient:
     def hset(self, name, mapping=None, **kwargs):
         return 1
     
-    def delete(self, *names):
-        return 1
-    
     def expire(self, name, time):
         return True
 
+    def incr(self, key, amount=1):
+        try:
+            current = int(self.data.get(key, 0))
+        except Exception:
+            current = 0
+        self.data[key] = current + amount
+        return self.data[key]
+
     # Add missing decrement for tests using websocket cleanup
     def decr(self, key):
         try:
@@ -222,10 +233,18 @@ class MockRedisClient:
         except Exception:
             return []
 
+    def scan(self, cursor=0, match=None, count=None):
+        # Single pass: the whole keyspace fits in one step
+        return 0, self.keys(match or "*")
+
+    def scan_iter(self, match=None, count=None):
+        return iter(self.keys(match or "*"))
+
 # Enhanced Redis Configuration
 class RedisManager:
     def __init__(self):
         self.redis_client = None
+        self.binary_client = None
         self.redis_available = False
         
         # In testing, avoid real Redis connections and use mock client
@@ -269,6 +288,21 @@ class RedisManager:
     def get_client(self):
         return self.redis_client
     
+    def get_binary_client(self):
+        """Client that stores and returns raw bytes (None when Redis is unavailable)"""
+        if not self.redis_available:
+            return None
+        if self.binary_client is None:
+            self.binary_client = redis.Redis.from_url(
+                self.redis_url,
+                max_connections=50,
+                socket_timeout=1.0,
+                socket_connect_timeout=1.0,
+                retry_on_timeout=True,
+                decode_responses=False
+            )
+        return self.binary_client
+    
     async def health_check(self) -> bool:
         """Check Redis health"""
         try:
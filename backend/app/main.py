@@ -10,36 +10,38 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 import structlog
 import os
+import uuid
 
 from app.core.config import settings
 from app.api.api_v1.api import api_router
 from app.api.websocket.chat_ws import router as websocket_router
 from app.db.session import engine
 from app.db.base import Base
+from app.middleware.pipeline import ASGIPipeline
 from app.middleware.security import (
-    InputValidationMiddleware,
-    RateLimitMiddleware,
-    RequestLoggingMiddleware,
+    InputValidationHook,
+    RateLimitHook,
+    RequestLoggingHook,
     SecurityExceptionHandler,
-    CSRFProtectionMiddleware
+    CSRFProtectionHook
 )
 from app.middleware.logging_middleware import (
-    RequestContextMiddleware,
-    PerformanceLoggingMiddleware,
-    SecurityLoggingMiddleware
+    RequestContextHook,
+    PerformanceLoggingHook,
+    SecurityLoggingHook
 )
 from app.middleware.error_handler_middleware import (
-    GlobalErrorHandlerMiddleware,
-    ErrorRecoveryMiddleware,
-    ErrorMetricsMiddleware
+    GlobalErrorHandlerHook,
+    ErrorRecoveryHook,
+    ErrorMetricsHook
 )
 from app.middleware.performance_middleware import (
-    PerformanceMonitoringMiddleware,
-    CacheOptimizationMiddleware,
-    DatabaseQueryOptimizationMiddleware,
-    MemoryOptimizationMiddleware
+    PerformanceMonitoringHook,
+    CacheOptimizationHook,
+    DatabaseQueryOptimizationHook,
+    MemoryOptimizationHook
 )
-from app.middleware.security_headers import SecurityHeadersMiddleware as NewSecurityHeadersMiddleware, create_cors_middleware
+from app.middleware.security_headers import SecurityHeadersHook, create_cors_middleware
 from app.utils.error_monitoring import error_monitor, create_error_response, log_api_call
 from app.utils.observability import init_observability
 from app.utils.backup_init import initialize_backup_system, shutdown_backup_system
@@ -69,6 +71,41 @@ async def connection_monitor():
             logger.error("Connection monitoring task failed", error=str(e))
             await asyncio.sleep(60)  # Wait 1 minute before retrying
 
+_LEGACY_IMPORT_LOCK_KEY = "vector:legacy_import_lock"
+
+# Delete the lock only if this worker still holds it
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+async def import_legacy_vectors():
+    """Copy vectors from collections written before workspace sharding, in one worker"""
+    from app.core.database import redis_manager
+    from app.services.enhanced_vector_service import enhanced_vector_service
+
+    client, token = None, uuid.uuid4().hex
+    try:
+        client = redis_manager.get_client()
+        # Held only while importing; imported collections are renamed, so later runs find nothing
+        if not client.set(_LEGACY_IMPORT_LOCK_KEY, token, nx=True, ex=3600):
+            return
+    except Exception as e:
+        client = None
+        logger.warning("Legacy vector import lock unavailable; importing anyway", error=str(e))
+    try:
+        await enhanced_vector_service.import_legacy_collections()
+    except Exception as e:
+        logger.error("Legacy vector import failed; it is retried on the next start", error=str(e))
+    finally:
+        if client is not None:
+            try:
+                client.eval(_RELEASE_LOCK_SCRIPT, 1, _LEGACY_IMPORT_LOCK_KEY, token)
+            except Exception as e:
+                logger.warning("Failed to release legacy vector import lock; it will expire", error=str(e))
+
 # Connection monitoring will be started in the startup event
 
 # Initialize FastAPI app
@@ -141,6 +178,25 @@ async def lifespan(app: FastAPI):
         else:
             logger.info("Skipping connection monitor in testing mode")
         
+        # Move pre-sharding vector collections into the workspace shards (skip in tests)
+        if not is_testing:
+            asyncio.create_task(import_legacy_vectors())
+        
+        # Listen for embed-code edits made by other processes (skip in tests)
+        if not is_testing:
+            from app.services.embed_auth_cache import embed_auth_cache
+            embed_auth_cache.start_listener()
+        
+        # Replicate token revocations and user invalidations locally (skip in tests)
+        if not is_testing:
+            from app.services.auth_cache import auth_cache
+            auth_cache.start_listener()
+        
+        # Flush write-behind usage counters periodically (skip in tests)
+        if not is_testing:
+            from app.services.usage_buffer import usage_buffer
+            usage_buffer.start()
+        
         logger.info("System startup completed successfully")
         
     except Exception as e:
@@ -169,6 +225,23 @@ async def lifespan(app: FastAPI):
         performance_service.stop()
         logger.info("Performance service shutdown completed")
         
+        # Stop embed auth cache invalidation listener
+        from app.services.embed_auth_cache import embed_auth_cache
+        embed_auth_cache.stop_listener()
+        
+        # Stop auth cache replication listener
+        from app.services.auth_cache import auth_cache
+        auth_cache.stop_listener()
+        
+        # Flush buffered usage counters
+        from app.services.usage_buffer import usage_buffer
+        await usage_buffer.stop()
+        
+        # Drain pending pipelined commands and close the async Redis pool
+        from app.core.async_redis import async_binary_redis, async_redis
+        await async_redis.close()
+        await async_binary_redis.close()
+        
         logger.info("System shutdown completed")
         
     except Exception as e:
@@ -183,7 +256,51 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# IMPORTANT: Install CORS first so preflight requests are handled before other middleware
+# Request hooks run in one pure-ASGI pipeline, outermost first
+request_hooks = []
+
+# Security headers first so short-circuited and error responses carry them too
+if settings.ENABLE_SECURITY_HEADERS:
+    request_hooks.append(SecurityHeadersHook())
+
+# Add CSRF protection for production
+if settings.ENVIRONMENT == "production":
+    request_hooks.append(CSRFProtectionHook())
+
+if settings.ENABLE_RATE_LIMITING:
+    request_hooks.append(RateLimitHook())
+
+if settings.ENABLE_INPUT_VALIDATION:
+    request_hooks.append(InputValidationHook())
+
+if settings.ENABLE_REQUEST_LOGGING:
+    request_hooks.append(RequestLoggingHook())
+
+# Logging hooks
+request_hooks += [
+    SecurityLoggingHook(),
+    PerformanceLoggingHook(slow_request_threshold_ms=1000.0),
+    RequestContextHook(),
+]
+
+# Performance optimization hooks
+request_hooks += [
+    PerformanceMonitoringHook(slow_request_threshold=1.0),
+    CacheOptimizationHook(),
+    DatabaseQueryOptimizationHook(),
+    MemoryOptimizationHook(),
+]
+
+# Error handling hooks (innermost, so they see application errors first)
+request_hooks += [
+    GlobalErrorHandlerHook(),
+    ErrorRecoveryHook(max_failures=5, recovery_timeout=60),
+    ErrorMetricsHook(),
+]
+
+app.add_middleware(ASGIPipeline, hooks=request_hooks)
+
+# CORS wraps the pipeline so preflight requests are answered before any hook runs
 if settings.ENABLE_CORS:
     app.add_middleware(
         CORSMiddleware,
@@ -193,39 +310,6 @@ if settings.ENABLE_CORS:
         allow_headers=settings.CORS_ALLOW_HEADERS,
     )
 
-# Security and request middlewares (order after CORS)
-if settings.ENABLE_SECURITY_HEADERS:
-    app.add_middleware(NewSecurityHeadersMiddleware)
-
-# Add error handling middlewares (order matters - error handlers should be first)
-app.add_middleware(ErrorMetricsMiddleware)
-app.add_middleware(ErrorRecoveryMiddleware, max_failures=5, recovery_timeout=60)
-app.add_middleware(GlobalErrorHandlerMiddleware)
-
-# Add performance optimization middlewares
-app.add_middleware(MemoryOptimizationMiddleware)
-app.add_middleware(DatabaseQueryOptimizationMiddleware)
-app.add_middleware(CacheOptimizationMiddleware)
-app.add_middleware(PerformanceMonitoringMiddleware, slow_request_threshold=1.0)
-
-# Add logging middlewares
-app.add_middleware(RequestContextMiddleware)
-app.add_middleware(PerformanceLoggingMiddleware, slow_request_threshold_ms=1000.0)
-app.add_middleware(SecurityLoggingMiddleware)
-
-if settings.ENABLE_REQUEST_LOGGING:
-    app.add_middleware(RequestLoggingMiddleware)
-
-if settings.ENABLE_INPUT_VALIDATION:
-    app.add_middleware(InputValidationMiddleware)
-
-if settings.ENABLE_RATE_LIMITING:
-    app.add_middleware(RateLimitMiddleware)
-
-# Add CSRF protection for production
-if settings.ENVIRONMENT == "production":
-    app.add_middleware(CSRFProtectionMiddleware)
-
 # Add trusted host middleware (skip in testing)
 if not os.getenv("TESTING"):
     allowed_hosts = getattr(settings, "ALLOWED_HOSTS", ["*"])
@@ -234,8 +318,6 @@ if not os.getenv("TESTING"):
         allowed_hosts=allowed_hosts
     )
 
-# CORS already installed earlier
-
 # Mount static files (skip in testing)
 if not os.getenv("TESTING"):
     # Resolve uploads directory relative to project structure and ensure it exists
@@ -2,79 +2,53 @@
 Global error handling middleware for CustomerCareGPT
 """
 
+import time
 import traceback
-from typing import Callable
-from fastapi import Request, Response
-from fastapi.exceptions import RequestValidationError
-from starlette.exceptions import HTTPException as StarletteHTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Optional
+from fastapi import Response
+from starlette.types import ASGIApp
 import structlog
 
+from app.middleware.pipeline import ASGIPipeline, PipelineContext, RequestHook
 from app.utils.error_handling import error_handler, CustomError, ErrorType, ErrorSeverity
 from app.utils.logging_config import security_logger
 
 logger = structlog.get_logger()
 
 
-class GlobalErrorHandlerMiddleware(BaseHTTPMiddleware):
-    """Global error handling middleware that catches all unhandled exceptions"""
+class GlobalErrorHandlerHook(RequestHook):
+    """Global error handling that catches all unhandled exceptions"""
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        try:
-            response = await call_next(request)
-            return response
-        
-        except CustomError as e:
-            # Handle custom errors
-            return error_handler.handle_error(
-                error=e,
-                request=request,
-                user_id=getattr(request.state, 'user_id', None)
-            )
+    def on_error(self, ctx: PipelineContext, exc: Exception) -> Optional[Response]:
+        request = ctx.request
         
-        except RequestValidationError as e:
-            # Handle FastAPI validation errors
-            return error_handler.handle_error(
-                error=e,
-                request=request,
-                user_id=getattr(request.state, 'user_id', None)
-            )
-        
-        except StarletteHTTPException as e:
-            # Handle HTTP exceptions
-            return error_handler.handle_error(
-                error=e,
-                request=request,
-                user_id=getattr(request.state, 'user_id', None)
-            )
-        
-        except Exception as e:
+        if not isinstance(exc, CustomError):
             # Handle all other exceptions
             logger.error(
                 "Unhandled exception",
-                error=str(e),
-                error_type=type(e).__name__,
-                path=request.url.path,
-                method=request.method,
-                client_ip=request.client.host if request.client else None,
+                error=str(exc),
+                error_type=type(exc).__name__,
+                path=ctx.path,
+                method=ctx.method,
+                client_ip=ctx.client_ip,
                 traceback=traceback.format_exc()
             )
             
             # Log security event for suspicious errors
-            if self._is_suspicious_error(e):
+            if self._is_suspicious_error(exc):
                 security_logger.log_suspicious_activity(
                     activity_type="unhandled_exception",
-                    ip_address=request.client.host if request.client else "unknown",
-                    details=f"Unhandled exception: {type(e).__name__}: {str(e)}",
-                    path=request.url.path,
-                    method=request.method
+                    ip_address=ctx.client_ip,
+                    details=f"Unhandled exception: {type(exc).__name__}: {str(exc)}",
+                    path=ctx.path,
+                    method=ctx.method
                 )
-            
-            return error_handler.handle_error(
-                error=e,
-                request=request,
-                user_id=getattr(request.state, 'user_id', None)
-            )
+        
+        return error_handler.handle_error(
+            error=exc,
+            request=request,
+            user_id=getattr(request.state, 'user_id', None)
+        )
     
     def _is_suspicious_error(self, error: Exception) -> bool:
         """Check if error might indicate suspicious activity"""
@@ -99,19 +73,26 @@ class GlobalErrorHandlerMiddleware(BaseHTTPMiddleware):
         return any(pattern in error_str for pattern in suspicious_patterns)
 
 
-class ErrorRecoveryMiddleware(BaseHTTPMiddleware):
-    """Middleware for error recovery and circuit breaker patterns"""
+class GlobalErrorHandlerMiddleware(ASGIPipeline):
+    """Standalone global error handling (``main.py`` runs the hook in the shared pipeline)"""
+    
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [GlobalErrorHandlerHook()])
+
+
+class ErrorRecoveryHook(RequestHook):
+    """Error recovery and circuit breaker patterns"""
     
-    def __init__(self, app, max_failures: int = 5, recovery_timeout: int = 60):
-        super().__init__(app)
+    def __init__(self, max_failures: int = 5, recovery_timeout: int = 60):
         self.max_failures = max_failures
         self.recovery_timeout = recovery_timeout
         self.failure_counts = {}
         self.circuit_breakers = {}
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
         # Check circuit breaker for this endpoint
-        endpoint = f"{request.method}:{request.url.path}"
+        endpoint = f"{ctx.method}:{ctx.path}"
+        ctx.state["endpoint"] = endpoint
         
         if self._is_circuit_open(endpoint):
             logger.warning(
@@ -127,82 +108,74 @@ class ErrorRecoveryMiddleware(BaseHTTPMiddleware):
                     severity=ErrorSeverity.HIGH,
                     retry_after=self.recovery_timeout
                 ),
-                request=request
+                request=ctx.request
             )
+        return None
+    
+    def on_error(self, ctx: PipelineContext, exc: Exception) -> Optional[Response]:
+        endpoint = ctx.state["endpoint"]
         
-        try:
-            response = await call_next(request)
-            
-            # Reset failure count on success
-            if endpoint in self.failure_counts:
-                del self.failure_counts[endpoint]
-            
-            return response
+        # Increment failure count
+        self.failure_counts[endpoint] = self.failure_counts.get(endpoint, 0) + 1
         
-        except Exception as e:
-            # Increment failure count
-            self.failure_counts[endpoint] = self.failure_counts.get(endpoint, 0) + 1
-            
-            # Check if circuit should be opened
-            if self.failure_counts[endpoint] >= self.max_failures:
-                self._open_circuit(endpoint)
-                logger.error(
-                    "Circuit breaker opened for endpoint",
-                    endpoint=endpoint,
-                    failures=self.failure_counts[endpoint]
-                )
-            
-            # Re-raise the exception to be handled by other middleware
-            raise
+        # Check if circuit should be opened
+        if self.failure_counts[endpoint] >= self.max_failures:
+            self._open_circuit(endpoint)
+            logger.error(
+                "Circuit breaker opened for endpoint",
+                endpoint=endpoint,
+                failures=self.failure_counts[endpoint]
+            )
+        
+        # Leave the exception to the error handler
+        return None
+    
+    async def on_complete(self, ctx: PipelineContext) -> None:
+        # Reset failure count on success
+        if ctx.error is None:
+            self.failure_counts.pop(ctx.state["endpoint"], None)
     
     def _is_circuit_open(self, endpoint: str) -> bool:
         """Check if circuit breaker is open for endpoint"""
         if endpoint not in self.circuit_breakers:
             return False
         
-        import time
         return time.time() - self.circuit_breakers[endpoint] < self.recovery_timeout
     
     def _open_circuit(self, endpoint: str):
         """Open circuit breaker for endpoint"""
-        import time
         self.circuit_breakers[endpoint] = time.time()
 
 
-class ErrorMetricsMiddleware(BaseHTTPMiddleware):
-    """Middleware to collect error metrics"""
+class ErrorRecoveryMiddleware(ASGIPipeline):
+    """Standalone circuit breaker (``main.py`` runs the hook in the shared pipeline)"""
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        start_time = time.time()
-        
-        try:
-            response = await call_next(request)
-            
-            # Record success metrics
-            duration = (time.time() - start_time) * 1000
-            from app.utils.metrics import metrics_collector
-            metrics_collector.record_request(
-                method=request.method,
-                path=request.url.path,
-                status_code=response.status_code,
-                duration=duration
-            )
-            
-            return response
-        
-        except Exception as e:
-            # Record error metrics
-            duration = (time.time() - start_time) * 1000
-            from app.utils.metrics import metrics_collector
+    def __init__(self, app: ASGIApp, max_failures: int = 5, recovery_timeout: int = 60):
+        super().__init__(app, [ErrorRecoveryHook(max_failures, recovery_timeout)])
+
+
+class ErrorMetricsHook(RequestHook):
+    """Collect request and error metrics"""
+    
+    async def on_complete(self, ctx: PipelineContext) -> None:
+        from app.utils.metrics import metrics_collector
+        if ctx.error is not None:
             # metrics API expects (error_type, endpoint)
             metrics_collector.record_error(
-                error_type=type(e).__name__,
-                endpoint=request.url.path
+                error_type=type(ctx.error).__name__,
+                endpoint=ctx.path
+            )
+        elif ctx.status_code is not None:
+            metrics_collector.record_request(
+                method=ctx.method,
+                path=ctx.path,
+                status_code=ctx.status_code,
+                duration=ctx.duration
             )
-            
-            # Re-raise to be handled by error handler
-            raise
 
 
-# Import time for metrics middleware
-import time
+class ErrorMetricsMiddleware(ASGIPipeline):
+    """Standalone request/error metrics (``main.py`` runs the hook in the shared pipeline)"""
+    
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [ErrorMetricsHook()])
@@ -2,101 +2,97 @@
 Enhanced logging middleware for request context and performance tracking
 """
 
-import time
 import uuid
-from typing import Callable
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Optional
+from fastapi import Response
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp
 import structlog
+from app.middleware.pipeline import ASGIPipeline, PipelineContext, RequestHook
 from app.utils.logging_config import api_logger, security_logger
 
 logger = structlog.get_logger()
 
 
-class RequestContextMiddleware(BaseHTTPMiddleware):
-    """Middleware to add request context to all log entries"""
+class RequestContextHook(RequestHook):
+    """Add request context to all log entries"""
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
         # Generate request ID for tracing
-        request_id = str(uuid.uuid4())
+        ctx.request_id = ctx.request_id or str(uuid.uuid4())
+        headers = ctx.request.headers
         
-        # Add request context to structlog
-        with structlog.contextvars.bound_contextvars(
-            request_id=request_id,
-            method=request.method,
-            path=request.url.path,
-            client_ip=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", ""),
-            content_length=request.headers.get("content-length", "0")
-        ):
-            start_time = time.time()
-            
-            # Log request start
-            logger.info(
-                "Request started",
-                event_type="request_start"
-            )
-            
-            try:
-                # Process request
-                response = await call_next(request)
-                
-                # Calculate duration
-                duration_ms = (time.time() - start_time) * 1000
-                
+        # Bind request context for everything logged while this request runs
+        ctx.state["log_context"] = structlog.contextvars.bind_contextvars(
+            request_id=ctx.request_id,
+            method=ctx.method,
+            path=ctx.path,
+            client_ip=ctx.client_ip,
+            user_agent=headers.get("user-agent", ""),
+            content_length=headers.get("content-length", "0")
+        )
+        
+        # Log request start
+        logger.info(
+            "Request started",
+            event_type="request_start"
+        )
+        return None
+    
+    def on_response_start(self, ctx: PipelineContext, headers: MutableHeaders) -> None:
+        # Add request ID to response headers
+        headers["X-Request-ID"] = ctx.request_id
+    
+    def on_error(self, ctx: PipelineContext, exc: Exception) -> Optional[Response]:
+        # Log request error; handling is left to the error hooks
+        api_logger.log_error(
+            method=ctx.method,
+            path=ctx.path,
+            status_code=500,
+            error=str(exc),
+            ip_address=ctx.client_ip
+        )
+        return None
+    
+    async def on_complete(self, ctx: PipelineContext) -> None:
+        try:
+            if ctx.status_code is not None:
                 # Log request completion
                 api_logger.log_request(
-                    method=request.method,
-                    path=request.url.path,
-                    status_code=response.status_code,
-                    duration_ms=duration_ms,
-                    ip_address=request.client.host if request.client else "unknown"
-                )
-                
-                # Add request ID to response headers
-                response.headers["X-Request-ID"] = request_id
-                
-                return response
-                
-            except Exception as e:
-                # Calculate duration for failed requests
-                duration_ms = (time.time() - start_time) * 1000
-                
-                # Log request error
-                api_logger.log_error(
-                    method=request.method,
-                    path=request.url.path,
-                    status_code=500,
-                    error=str(e),
-                    ip_address=request.client.host if request.client else "unknown"
+                    method=ctx.method,
+                    path=ctx.path,
+                    status_code=ctx.status_code,
+                    duration_ms=ctx.duration * 1000,
+                    ip_address=ctx.client_ip
                 )
-                
-                # Re-raise the exception
-                raise
+        finally:
+            structlog.contextvars.reset_contextvars(**ctx.state["log_context"])
+
+
+class RequestContextMiddleware(ASGIPipeline):
+    """Standalone request context logging (``main.py`` runs the hook in the shared pipeline)"""
+    
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [RequestContextHook()])
 
 
-class PerformanceLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware to log performance metrics for slow requests"""
+class PerformanceLoggingHook(RequestHook):
+    """Log performance metrics for slow requests"""
     
-    def __init__(self, app, slow_request_threshold_ms: float = 1000.0):
-        super().__init__(app)
+    def __init__(self, slow_request_threshold_ms: float = 1000.0):
         self.slow_request_threshold_ms = slow_request_threshold_ms
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        start_time = time.time()
-        
-        # Process request
-        response = await call_next(request)
-        
-        # Calculate duration
-        duration_ms = (time.time() - start_time) * 1000
+    async def on_complete(self, ctx: PipelineContext) -> None:
+        if ctx.status_code is None:
+            return
+        duration_ms = ctx.duration * 1000
         
         # Log slow requests
         if duration_ms > self.slow_request_threshold_ms:
             logger.warning(
                 "Slow request detected",
-                method=request.method,
-                path=request.url.path,
+                method=ctx.method,
+                path=ctx.path,
                 duration_ms=duration_ms,
                 threshold_ms=self.slow_request_threshold_ms,
                 event_type="slow_request"
@@ -105,18 +101,25 @@ class PerformanceLoggingMiddleware(BaseHTTPMiddleware):
         # Log performance metrics
         from app.utils.logging_config import log_performance
         log_performance(
-            operation=f"{request.method} {request.url.path}",
+            operation=f"{ctx.method} {ctx.path}",
             duration_ms=duration_ms,
-            status_code=response.status_code
+            status_code=ctx.status_code
         )
-        
-        return response
 
 
-class SecurityLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware to log security-related events"""
+class PerformanceLoggingMiddleware(ASGIPipeline):
+    """Standalone performance logging (``main.py`` runs the hook in the shared pipeline)"""
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    def __init__(self, app: ASGIApp, slow_request_threshold_ms: float = 1000.0):
+        super().__init__(app, [PerformanceLoggingHook(slow_request_threshold_ms)])
+
+
+class SecurityLoggingHook(RequestHook):
+    """Log security-related events"""
+    
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
+        request = ctx.request
+        
         # Check for suspicious patterns in request
         suspicious_indicators = []
         
@@ -126,7 +129,7 @@ class SecurityLoggingMiddleware(BaseHTTPMiddleware):
             suspicious_indicators.append("suspicious_user_agent")
         
         # Check for suspicious paths
-        path = request.url.path.lower()
+        path = ctx.path.lower()
         if any(pattern in path for pattern in ["admin", "wp-admin", "phpmyadmin", "config"]):
             suspicious_indicators.append("suspicious_path")
         
@@ -139,37 +142,41 @@ class SecurityLoggingMiddleware(BaseHTTPMiddleware):
         if suspicious_indicators:
             security_logger.log_suspicious_activity(
                 activity_type="request_analysis",
-                ip_address=request.client.host if request.client else "unknown",
+                ip_address=ctx.client_ip,
                 details=f"Indicators: {', '.join(suspicious_indicators)}",
                 indicators=suspicious_indicators,
-                path=request.url.path,
-                method=request.method
+                path=ctx.path,
+                method=ctx.method
             )
-        
-        # Process request
-        response = await call_next(request)
-        
+        return None
+    
+    async def on_complete(self, ctx: PipelineContext) -> None:
         # Log security events based on response
-        if response.status_code == 401:
+        if ctx.status_code == 401:
             security_logger.log_security_violation(
                 violation_type="unauthorized_access",
-                ip_address=request.client.host if request.client else "unknown",
-                path=request.url.path,
-                method=request.method
+                ip_address=ctx.client_ip,
+                path=ctx.path,
+                method=ctx.method
             )
-        elif response.status_code == 403:
+        elif ctx.status_code == 403:
             security_logger.log_security_violation(
                 violation_type="forbidden_access",
-                ip_address=request.client.host if request.client else "unknown",
-                path=request.url.path,
-                method=request.method
+                ip_address=ctx.client_ip,
+                path=ctx.path,
+                method=ctx.method
             )
-        elif response.status_code == 429:
+        elif ctx.status_code == 429:
             security_logger.log_rate_limit_exceeded(
-                ip_address=request.client.host if request.client else "unknown",
-                endpoint=request.url.path,
+                ip_address=ctx.client_ip,
+                endpoint=ctx.path,
                 limit=0,  # Will be filled by rate limiting middleware
-                method=request.method
+                method=ctx.method
             )
-        
-        return response
+
+
+class SecurityLoggingMiddleware(ASGIPipeline):
+    """Standalone security logging (``main.py`` runs the hook in the shared pipeline)"""
+    
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [SecurityLoggingHook()])
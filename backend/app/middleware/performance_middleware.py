@@ -2,295 +2,385 @@
 # Request-level performance tracking and optimization
 
 import time
-import asyncio
-from typing import Callable
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from typing import Any, Callable, List, Optional, Tuple
+from fastapi import Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Send
 import structlog
+from app.middleware.pipeline import HEALTH_PATHS, ASGIPipeline, PipelineContext, RequestHook
 from app.services.performance_service import performance_service
-from app.services.cache_service import cache_service, cached
+from app.services.cache_service import cached
+from app.services.auth_cache import auth_cache
+from app.services.token_revocation import token_revocation_service
+from app.services.response_cache import (
+    RESPONSE_CACHE_ATTR,
+    CachedResponse,
+    CachePolicy,
+    ResponseCache,
+    build_cache_key,
+    etag_matches,
+    make_etag,
+    response_cache,
+)
 from app.core.config import settings
 
 logger = structlog.get_logger()
 
-class PerformanceMonitoringMiddleware(BaseHTTPMiddleware):
-    """Middleware for monitoring request performance"""
+class PerformanceMonitoringHook(RequestHook):
+    """Monitor request performance"""
     
-    def __init__(self, app: ASGIApp, slow_request_threshold: float = 1.0):
-        super().__init__(app)
+    skip_paths = HEALTH_PATHS | {"/favicon.ico"}
+    
+    def __init__(self, slow_request_threshold: float = 1.0):
         self.slow_request_threshold = slow_request_threshold
         self.request_count = 0
         self.total_response_time = 0.0
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        """Process request with performance monitoring"""
-        start_time = time.time()
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
         self.request_count += 1
-        
-        # Skip monitoring for certain paths
-        if self._should_skip_monitoring(request):
-            return await call_next(request)
-        
-        # Get request context
-        request_id = f"req_{int(start_time * 1000)}_{self.request_count}"
-        client_ip = request.client.host if request.client else "unknown"
+        start_time = time.time()
+        ctx.request_id = ctx.request_id or f"req_{int(start_time * 1000)}_{self.request_count}"
         
         # Add request ID to request state
-        request.state.request_id = request_id
-        request.state.start_time = start_time
+        state = ctx.request.state
+        state.request_id = ctx.request_id
+        state.start_time = start_time
+        return None
+    
+    def on_response_start(self, ctx: PipelineContext, headers: MutableHeaders) -> None:
+        # Add performance headers
+        headers["X-Response-Time"] = f"{ctx.duration:.3f}s"
+        headers["X-Request-ID"] = ctx.request_id
+    
+    def on_error(self, ctx: PipelineContext, exc: Exception) -> Optional[Response]:
+        performance_service.record_request(ctx.duration, 500)
+        logger.error(
+            "Request failed",
+            request_id=ctx.request_id,
+            path=ctx.path,
+            method=ctx.method,
+            duration=ctx.duration,
+            error=str(exc),
+            client_ip=ctx.client_ip,
+            exc_info=True
+        )
+        return None
+    
+    async def on_complete(self, ctx: PipelineContext) -> None:
+        if ctx.status_code is None:
+            return
+        duration = ctx.duration
+        self.total_response_time += duration
         
-        try:
-            # Process request
-            response = await call_next(request)
-            
-            # Calculate metrics
-            duration = time.time() - start_time
-            self.total_response_time += duration
-            
-            # Record performance metrics
-            performance_service.record_request(duration, response.status_code)
-            
-            # Log slow requests
-            if duration > self.slow_request_threshold:
-                logger.warning(
-                    "Slow request detected",
-                    request_id=request_id,
-                    path=request.url.path,
-                    method=request.method,
-                    duration=duration,
-                    status_code=response.status_code,
-                    client_ip=client_ip
-                )
-            
-            # Add performance headers
-            response.headers["X-Response-Time"] = f"{duration:.3f}s"
-            response.headers["X-Request-ID"] = request_id
-            
-            # Log request completion
-            logger.info(
-                "Request completed",
-                request_id=request_id,
-                path=request.url.path,
-                method=request.method,
-                duration=duration,
-                status_code=response.status_code,
-                client_ip=client_ip
-            )
-            
-            return response
-            
-        except Exception as e:
-            # Calculate duration even for failed requests
-            duration = time.time() - start_time
-            performance_service.record_request(duration, 500)
-            
-            logger.error(
-                "Request failed",
-                request_id=request_id,
-                path=request.url.path,
-                method=request.method,
+        # Record performance metrics
+        performance_service.record_request(duration, ctx.status_code)
+        
+        # Log slow requests
+        if duration > self.slow_request_threshold:
+            logger.warning(
+                "Slow request detected",
+                request_id=ctx.request_id,
+                path=ctx.path,
+                method=ctx.method,
                 duration=duration,
-                error=str(e),
-                client_ip=client_ip,
-                exc_info=True
+                status_code=ctx.status_code,
+                client_ip=ctx.client_ip
             )
-            
-            raise
-    
-    def _should_skip_monitoring(self, request: Request) -> bool:
-        """Check if request should be skipped from monitoring"""
-        skip_paths = [
-            "/health",
-            "/ready",
-            "/metrics",
-            "/health/detailed",
-            "/health/external",
-            "/favicon.ico"
-        ]
         
-        return request.url.path in skip_paths
+        # Log request completion
+        logger.info(
+            "Request completed",
+            request_id=ctx.request_id,
+            path=ctx.path,
+            method=ctx.method,
+            duration=duration,
+            status_code=ctx.status_code,
+            client_ip=ctx.client_ip
+        )
+
 
-class CacheOptimizationMiddleware(BaseHTTPMiddleware):
-    """Middleware for automatic cache optimization"""
+class PerformanceMonitoringMiddleware(ASGIPipeline):
+    """Standalone performance monitoring (``main.py`` runs the hook in the shared pipeline)"""
     
-    def __init__(self, app: ASGIApp):
-        super().__init__(app)
-        self.cacheable_paths = {
-            "/api/v1/analytics/overview": 300,  # 5 minutes
-            "/api/v1/analytics/usage-stats": 600,  # 10 minutes
-            "/api/v1/analytics/kpis": 900,  # 15 minutes
-            "/api/v1/documents": 60,  # 1 minute
-            "/api/v1/workspace": 300,  # 5 minutes
+    def __init__(self, app: ASGIApp, slow_request_threshold: float = 1.0):
+        super().__init__(app, [PerformanceMonitoringHook(slow_request_threshold)])
+
+
+class CacheOptimizationHook(RequestHook):
+    """Response cache for GET routes declared with ``@cache_response``.
+
+    A fresh entry is answered without running the app; a matching
+    ``If-None-Match`` gets a bodyless 304. A stale entry is served while a
+    single request regenerates it, and concurrent cold misses wait for the
+    first one. Responses are captured as bytes, tagged with an ETag and sent
+    in one message; streams, non-200s and oversized bodies pass through.
+    """
+    
+    skip_paths = HEALTH_PATHS
+    
+    def __init__(self, cache: Optional[ResponseCache] = None, max_body_bytes: Optional[int] = None):
+        self.cache = cache or response_cache
+        self.max_body_bytes = max_body_bytes if max_body_bytes is not None else settings.RESPONSE_CACHE_MAX_BODY_BYTES
+        self._routes_app = None
+        self._routes: List[Tuple[Any, CachePolicy]] = []
+    
+    def _cacheable_routes(self, app: Any) -> List[Tuple[Any, CachePolicy]]:
+        if app is not self._routes_app:
+            routes = getattr(getattr(app, "router", None), "routes", ())
+            self._routes = [
+                (route, getattr(route.endpoint, RESPONSE_CACHE_ATTR))
+                for route in routes
+                if hasattr(getattr(route, "endpoint", None), RESPONSE_CACHE_ATTR)
+            ]
+            self._routes_app = app
+        return self._routes
+    
+    def _policy(self, ctx: PipelineContext) -> Optional[CachePolicy]:
+        for route, policy in self._cacheable_routes(ctx.scope.get("app")):
+            match, _ = route.matches(ctx.scope)
+            if match == Match.FULL:
+                return policy
+        return None
+    
+    @staticmethod
+    async def _principal(ctx: PipelineContext) -> Optional[str]:
+        """Subject of an already-verified, unrevoked bearer token"""
+        authorization = ctx.request.headers.get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        claims = auth_cache.get_claims(token, "access")
+        if claims is None or claims.get("sub") is None:
+            return None
+        jti = claims.get("jti")
+        revoked = auth_cache.is_revoked(jti) if jti else False
+        if revoked is None:
+            revoked = await token_revocation_service.is_token_revoked_async(jti)
+        return None if revoked else str(claims["sub"])
+    
+    def _key(self, ctx: PipelineContext, policy: CachePolicy, principal: Optional[str]) -> str:
+        request = ctx.request
+        return build_cache_key(
+            ctx.path,
+            request.query_params.multi_items(),
+            principal,
+            [request.headers.get(name, "") for name in policy.vary],
+        )
+    
+    def _serve(self, ctx: PipelineContext, policy: CachePolicy, entry: CachedResponse, state: str) -> Response:
+        headers = {
+            "ETag": entry.etag,
+            "Cache-Control": policy.cache_control,
+            "Age": str(max(0, int(time.time() - entry.stored_at))),
+            "X-Cache": state,
         }
+        if etag_matches(ctx.request.headers.get("if-none-match"), entry.etag):
+            self.cache.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, status_code=200, headers={**entry.headers, **headers})
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        """Process request with cache optimization"""
-        # Only cache GET requests
-        if request.method != "GET":
-            return await call_next(request)
-        
-        # Check if path is cacheable
-        cache_ttl = self.cacheable_paths.get(request.url.path)
-        if not cache_ttl:
-            return await call_next(request)
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
+        if ctx.method != "GET" or not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        policy = self._policy(ctx)
+        if policy is None:
+            return None
         
-        # Generate cache key
-        cache_key = self._generate_cache_key(request)
+        state = {"policy": policy, "key": None, "leader": False, "headers": None, "body": None, "etag": None}
+        ctx.state["response_cache"] = state
+        principal = await self._principal(ctx) if policy.private else None
+        if policy.private and principal is None:
+            # Not verified yet: the app authenticates, the response is stored on the way out
+            return None
         
+        key = state["key"] = self._key(ctx, policy, principal)
         try:
-            # Try to get from cache
-            cached_response = await cache_service.get(cache_key)
-            if cached_response:
-                # Return cached response
-                response = Response(
-                    content=cached_response["content"],
-                    status_code=cached_response["status_code"],
-                    headers=cached_response["headers"],
-                    media_type=cached_response["media_type"]
-                )
-                
-                # Add cache headers
-                response.headers["X-Cache"] = "HIT"
-                response.headers["X-Cache-Key"] = cache_key
-                
-                logger.debug(
-                    "Cache hit",
-                    path=request.url.path,
-                    cache_key=cache_key
-                )
-                
-                return response
-            
-            # Process request
-            response = await call_next(request)
-            
-            # Cache successful responses
-            if response.status_code == 200:
-                response_body = b""
-                async for chunk in response.body_iterator:
-                    response_body += chunk
-                
-                # Store in cache
-                cache_data = {
-                    "content": response_body.decode(),
-                    "status_code": response.status_code,
-                    "headers": dict(response.headers),
-                    "media_type": response.media_type
-                }
-                
-                await cache_service.set(cache_key, cache_data, cache_ttl)
-                
-                # Recreate response
-                response = Response(
-                    content=response_body,
-                    status_code=response.status_code,
-                    headers=response.headers,
-                    media_type=response.media_type
-                )
-                
-                # Add cache headers
-                response.headers["X-Cache"] = "MISS"
-                response.headers["X-Cache-Key"] = cache_key
-                response.headers["X-Cache-TTL"] = str(cache_ttl)
-            
-            return response
+            entry = await self.cache.get(key)
+            now = time.time()
+            if entry is not None and entry.is_fresh(now):
+                self.cache.stats["hits"] += 1
+                return self._serve(ctx, policy, entry, "HIT")
+            if entry is not None:
+                if not await self.cache.begin_refresh(key):
+                    self.cache.stats["stale_hits"] += 1
+                    return self._serve(ctx, policy, entry, "STALE")
+                state["leader"] = True
+                return None
             
+            # Cold miss: the first request fills the entry, concurrent ones wait for it
+            leader = self.cache.claim(key)
+            if leader is None:
+                state["leader"] = True
+            else:
+                await self.cache.wait_for_leader(leader)
+                entry = await self.cache.get(key)
+                if entry is not None:
+                    self.cache.stats["hits"] += 1
+                    return self._serve(ctx, policy, entry, "HIT")
         except Exception as e:
-            logger.error(
-                "Cache optimization error",
-                path=request.url.path,
-                cache_key=cache_key,
-                error=str(e)
-            )
-            
-            # Fallback to normal processing
-            return await call_next(request)
+            logger.error("Response cache lookup failed", path=ctx.path, error=str(e))
+        self.cache.stats["misses"] += 1
+        return None
     
-    def _generate_cache_key(self, request: Request) -> str:
-        """Generate cache key for request"""
-        # Include path, query parameters, and user context
-        key_parts = [request.url.path]
+    def wrap_send(self, ctx: PipelineContext, send: Send) -> Send:
+        state = ctx.state.get("response_cache")
+        if state is None:
+            return send
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        size = 0
+        passthrough = False
         
-        # Add query parameters
-        if request.query_params:
-            sorted_params = sorted(request.query_params.items())
-            key_parts.append("?" + "&".join(f"{k}={v}" for k, v in sorted_params))
-        
-        # Add user context if available
-        if hasattr(request.state, "user_id"):
-            key_parts.append(f"user:{request.state.user_id}")
-        elif hasattr(request.state, "workspace_id"):
-            key_parts.append(f"workspace:{request.state.workspace_id}")
+        async def capture(message: Message) -> None:
+            nonlocal start, size, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                if (message["status"] != 200
+                        or headers.get("content-type", "").startswith("text/event-stream")
+                        or "set-cookie" in headers
+                        or "no-store" in headers.get("cache-control", "")):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            more_body = message.get("more_body", False)
+            if size > self.max_body_bytes:
+                # Too big to cache: release what was held and stream the rest
+                passthrough = True
+                await send(start)
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": more_body})
+                return
+            if more_body:
+                return
+            
+            body = b"".join(chunks)
+            etag = make_etag(body)
+            headers = MutableHeaders(scope=start)
+            state["headers"] = {k: v for k, v in headers.items() if k != "content-length"}
+            state["body"] = body
+            state["etag"] = etag
+            headers["ETag"] = etag
+            headers["Cache-Control"] = state["policy"].cache_control
+            headers["X-Cache"] = "MISS"
+            if etag_matches(ctx.request.headers.get("if-none-match"), etag):
+                self.cache.stats["not_modified"] += 1
+                start["status"] = 304
+                del headers["content-length"]
+                body = b""
+            await send(start)
+            await send({"type": "http.response.body", "body": body, "more_body": False})
         
-        return ":".join(key_parts)
+        return capture
+    
+    async def on_complete(self, ctx: PipelineContext) -> None:
+        state = ctx.state.get("response_cache")
+        if state is None:
+            return
+        key = state["key"]
+        try:
+            if state["body"] is not None and ctx.error is None:
+                policy = state["policy"]
+                if key is None:
+                    principal = await self._principal(ctx) if policy.private else None
+                    if policy.private and principal is None:
+                        return
+                    key = self._key(ctx, policy, principal)
+                await self.cache.put(key, CachedResponse.build(state["headers"], state["body"], policy, state["etag"]))
+        except Exception as e:
+            logger.error("Response cache store failed", path=ctx.path, error=str(e))
+        finally:
+            if state["leader"]:
+                await self.cache.end_refresh(state["key"])
 
-class DatabaseQueryOptimizationMiddleware(BaseHTTPMiddleware):
-    """Middleware for database query optimization"""
+
+class CacheOptimizationMiddleware(ASGIPipeline):
+    """Standalone response caching (``main.py`` runs the hook in the shared pipeline)"""
     
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
+        super().__init__(app, [CacheOptimizationHook()])
+
+
+class DatabaseQueryOptimizationHook(RequestHook):
+    """Report per-request database query counts and time"""
+    
+    def __init__(self):
         self.query_count = 0
         self.slow_query_threshold = 0.5  # 500ms
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        """Process request with database query optimization"""
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
         # Track database queries for this request
-        request.state.db_query_count = 0
-        request.state.db_query_time = 0.0
-        
-        start_time = time.time()
+        state = ctx.request.state
+        state.db_query_count = 0
+        state.db_query_time = 0.0
+        return None
+    
+    def on_response_start(self, ctx: PipelineContext, headers: MutableHeaders) -> None:
+        state = ctx.request.state
+        query_count = getattr(state, "db_query_count", 0)
+        query_time = getattr(state, "db_query_time", 0.0)
         
-        try:
-            response = await call_next(request)
-            
-            # Calculate database performance
-            duration = time.time() - start_time
-            query_count = getattr(request.state, "db_query_count", 0)
-            query_time = getattr(request.state, "db_query_time", 0.0)
-            
-            # Log slow database operations
-            if query_time > self.slow_query_threshold:
-                logger.warning(
-                    "Slow database operation",
-                    path=request.url.path,
-                    method=request.method,
-                    query_count=query_count,
-                    query_time=query_time,
-                    total_time=duration
-                )
-            
-            # Add database performance headers
-            response.headers["X-DB-Queries"] = str(query_count)
-            response.headers["X-DB-Time"] = f"{query_time:.3f}s"
-            
-            return response
-            
-        except Exception as e:
-            logger.error(
-                "Database optimization error",
-                path=request.url.path,
-                method=request.method,
-                error=str(e)
+        # Log slow database operations
+        if query_time > self.slow_query_threshold:
+            logger.warning(
+                "Slow database operation",
+                path=ctx.path,
+                method=ctx.method,
+                query_count=query_count,
+                query_time=query_time,
+                total_time=ctx.duration
             )
-            raise
+        
+        # Add database performance headers
+        headers["X-DB-Queries"] = str(query_count)
+        headers["X-DB-Time"] = f"{query_time:.3f}s"
+
 
-class MemoryOptimizationMiddleware(BaseHTTPMiddleware):
-    """Middleware for memory usage optimization"""
+class DatabaseQueryOptimizationMiddleware(ASGIPipeline):
+    """Standalone database query reporting (``main.py`` runs the hook in the shared pipeline)"""
     
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
+        super().__init__(app, [DatabaseQueryOptimizationHook()])
+
+
+class MemoryOptimizationHook(RequestHook):
+    """Memory usage monitoring and opportunistic garbage collection"""
+    
+    def __init__(self, sample_interval: float = 1.0):
         self.memory_threshold = 0.8  # 80% memory usage
         self.last_gc_time = 0
         self.gc_interval = 300  # 5 minutes
+        # psutil reads /proc on every call; sample instead of per request
+        self.sample_interval = sample_interval
+        self.last_sample_time = 0.0
+        self.memory_percent = 0.0
+    
+    def _sample_memory(self) -> float:
+        import psutil
+        
+        current_time = time.monotonic()
+        if current_time - self.last_sample_time >= self.sample_interval:
+            self.memory_percent = psutil.virtual_memory().percent / 100.0
+            self.last_sample_time = current_time
+        return self.memory_percent
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        """Process request with memory optimization"""
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
         import gc
         import psutil
         
         # Check memory usage
-        memory_percent = psutil.virtual_memory().percent / 100.0
+        memory_percent = self._sample_memory()
+        ctx.state["memory_percent"] = memory_percent
         
         # Force garbage collection if memory usage is high
         if memory_percent > self.memory_threshold:
@@ -310,23 +400,18 @@ class MemoryOptimizationMiddleware(BaseHTTPMiddleware):
                     collected_objects=collected,
                     memory_percent=psutil.virtual_memory().percent
                 )
-        
-        try:
-            response = await call_next(request)
-            
-            # Add memory usage headers
-            response.headers["X-Memory-Usage"] = f"{memory_percent:.1%}"
-            
-            return response
-            
-        except Exception as e:
-            logger.error(
-                "Memory optimization error",
-                path=request.url.path,
-                method=request.method,
-                error=str(e)
-            )
-            raise
+        return None
+    
+    def on_response_start(self, ctx: PipelineContext, headers: MutableHeaders) -> None:
+        # Add memory usage headers
+        headers["X-Memory-Usage"] = f"{ctx.state['memory_percent']:.1%}"
+
+
+class MemoryOptimizationMiddleware(ASGIPipeline):
+    """Standalone memory monitoring (``main.py`` runs the hook in the shared pipeline)"""
+    
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [MemoryOptimizationHook()])
 
 # Performance decorators for endpoints
 def optimize_performance(cache_ttl: int = 300, cache_key_func: Callable = None):
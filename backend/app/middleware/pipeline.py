@@ -0,0 +1,224 @@
+"""
+Single pure-ASGI request pipeline composed of lightweight hooks
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import structlog
+from fastapi import Request, Response
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = structlog.get_logger()
+
+# Paths that probes and scrapers hit; most hooks ignore them
+HEALTH_PATHS = frozenset({"/health", "/ready", "/metrics", "/health/detailed", "/health/external"})
+
+
+class PipelineContext:
+    """Per-request state shared by every hook.
+
+    ``start`` is taken once when the request enters the pipeline and
+    ``duration`` (seconds to the response headers, or to the error) is set
+    once by the pipeline, so every hook reports the same timing.
+    """
+
+    __slots__ = (
+        "scope", "path", "method", "start", "duration", "status_code",
+        "error", "request_id", "state", "_receive", "_request", "_body", "_body_replayed",
+    )
+
+    def __init__(self, scope: Scope, receive: Receive):
+        self.scope = scope
+        self.path: str = scope["path"]
+        self.method: str = scope["method"]
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.status_code: Optional[int] = None
+        self.error: Optional[BaseException] = None
+        self.request_id: Optional[str] = None
+        self.state: Dict[str, Any] = {}
+        self._receive = receive
+        self._request: Optional[Request] = None
+        self._body: Optional[bytes] = None
+        self._body_replayed = False
+
+    @property
+    def request(self) -> Request:
+        """Starlette request view of the scope (``request.state`` is shared with the endpoint)"""
+        if self._request is None:
+            self._request = Request(self.scope, self.receive)
+        return self._request
+
+    @property
+    def client_ip(self) -> str:
+        client = self.scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def body(self) -> bytes:
+        """Read the request body once; the application receives it replayed"""
+        if self._body is None:
+            chunks: List[bytes] = []
+            while True:
+                message = await self._receive()
+                if message["type"] != "http.request":
+                    break
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    break
+            self._body = b"".join(chunks)
+        return self._body
+
+    async def receive(self) -> Message:
+        if self._body is not None and not self._body_replayed:
+            self._body_replayed = True
+            return {"type": "http.request", "body": self._body, "more_body": False}
+        return await self._receive()
+
+    def mark_finished(self) -> None:
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.start
+
+
+class RequestHook:
+    """One request-level concern in an ``ASGIPipeline``.
+
+    Hooks run in list order on the way in and in reverse order on the way
+    out, the same nesting a stack of middleware gives. A hook that returns a
+    response from ``on_request`` short-circuits the request; only the hooks
+    before it see that response. Override just the methods a concern needs;
+    the pipeline never calls the others.
+    """
+
+    skip_paths: frozenset = frozenset()
+
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
+        """Inspect the request; return a response to answer it without the app"""
+        return None
+
+    def on_response_start(self, ctx: PipelineContext, headers: MutableHeaders) -> None:
+        """Adjust status-line headers before they are sent"""
+
+    def on_body(self, ctx: PipelineContext, body: bytes, more_body: bool) -> None:
+        """Observe a body chunk as it streams past (never buffer it here)"""
+
+    def wrap_send(self, ctx: PipelineContext, send: Send) -> Send:
+        """Wrap the ``send`` the application calls, e.g. to rewrite a whole response.
+
+        Wrappers see the application's own messages before any hook's
+        ``on_response_start``; short-circuit and error responses bypass them.
+        Return ``send`` unchanged when this request needs nothing.
+        """
+        return send
+
+    def on_error(self, ctx: PipelineContext, exc: Exception) -> Optional[Response]:
+        """Observe an unhandled error; return a response to handle it"""
+        return None
+
+    async def on_complete(self, ctx: PipelineContext) -> None:
+        """Runs once the response is fully sent, or the request failed"""
+
+
+def _overrides(hook: RequestHook, name: str) -> bool:
+    return getattr(type(hook), name) is not getattr(RequestHook, name)
+
+
+class ASGIPipeline:
+    """Runs request hooks inside one ASGI callable.
+
+    Unlike a stack of ``BaseHTTPMiddleware`` layers there is no task or
+    memory stream per layer and no response re-wrapping: hooks edit the
+    ``http.response.start`` headers in place and body chunks pass straight
+    through, so streaming responses are never buffered.
+    """
+
+    def __init__(self, app: ASGIApp, hooks: Sequence[RequestHook] = ()):
+        self.app = app
+        self.hooks = list(hooks)
+        self._request_hooks = {id(h) for h in self.hooks if _overrides(h, "on_request")}
+        self._start_hooks = {id(h) for h in self.hooks if _overrides(h, "on_response_start")}
+        self._body_hooks = {id(h) for h in self.hooks if _overrides(h, "on_body")}
+        self._send_hooks = {id(h) for h in self.hooks if _overrides(h, "wrap_send")}
+        self._error_hooks = {id(h) for h in self.hooks if _overrides(h, "on_error")}
+        self._complete_hooks = {id(h) for h in self.hooks if _overrides(h, "on_complete")}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.hooks:
+            await self.app(scope, receive, send)
+            return
+
+        ctx = PipelineContext(scope, receive)
+        entered: List[RequestHook] = []
+        # Innermost-first hooks that post-process whatever response is sent
+        start_hooks: List[RequestHook] = []
+        body_hooks: List[RequestHook] = []
+        response_started = False
+
+        def post_process(hooks: List[RequestHook]) -> None:
+            start_hooks[:] = [h for h in reversed(hooks) if id(h) in self._start_hooks]
+            body_hooks[:] = [h for h in reversed(hooks) if id(h) in self._body_hooks]
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                ctx.status_code = message["status"]
+                ctx.mark_finished()
+                if start_hooks:
+                    headers = MutableHeaders(scope=message)
+                    for hook in start_hooks:
+                        hook.on_response_start(ctx, headers)
+            elif body_hooks and message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                for hook in body_hooks:
+                    hook.on_body(ctx, body, more_body)
+            await send(message)
+
+        try:
+            response: Optional[Response] = None
+            for hook in self.hooks:
+                if ctx.path in hook.skip_paths:
+                    continue
+                if id(hook) in self._request_hooks:
+                    response = await hook.on_request(ctx)
+                    if response is not None:
+                        break
+                entered.append(hook)
+            post_process(entered)
+
+            try:
+                if response is not None:
+                    await response(scope, ctx.receive, send_wrapper)
+                else:
+                    app_send: Send = send_wrapper
+                    # The innermost hook's wrapper is the one the application calls
+                    for hook in entered:
+                        if id(hook) in self._send_hooks:
+                            app_send = hook.wrap_send(ctx, app_send)
+                    await self.app(scope, ctx.receive, app_send)
+            except Exception as exc:
+                ctx.error = exc
+                ctx.mark_finished()
+                if response_started:
+                    raise
+                handled: Optional[Response] = None
+                for index in range(len(entered) - 1, -1, -1):
+                    hook = entered[index]
+                    if id(hook) in self._error_hooks:
+                        handled = hook.on_error(ctx, exc)
+                        if handled is not None:
+                            # Only hooks outside the handler see its response
+                            post_process(entered[:index])
+                            break
+                if handled is None:
+                    raise
+                await handled(scope, ctx.receive, send_wrapper)
+        finally:
+            for hook in reversed(entered):
+                if id(hook) in self._complete_hooks:
+                    try:
+                        await hook.on_complete(ctx)
+                    except Exception as e:
+                        logger.error("Request hook failed", hook=type(hook).__name__, error=str(e))
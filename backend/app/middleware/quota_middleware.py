@@ -13,6 +13,7 @@ from app.models.user import User
 from app.models.subscriptions import Subscription
 from app.models.workspace import Workspace
 from app.services.trial_service import TrialService
+from app.services.usage_buffer import usage_buffer
 
 logger = logging.getLogger(__name__)
 
@@ -65,15 +66,18 @@ async def check_quota(
                 {"tier": "none", "status": "inactive"}
             )
     
-    # Check if quota is exceeded
-    if subscription.is_quota_exceeded:
+    # Check if quota is exceeded, counting queries still in the usage buffer
+    quota_used = subscription.queries_this_period
+    if subscription.monthly_query_quota is not None:
+        quota_used += usage_buffer.unflushed_query_usage(str(subscription.id))
+    if subscription.monthly_query_quota is not None and quota_used >= subscription.monthly_query_quota:
         quota_info = {
             "tier": subscription.tier,
             "status": subscription.status,
-            "quota_used": subscription.queries_this_period,
+            "quota_used": quota_used,
             "quota_limit": subscription.monthly_query_quota,
-            "remaining": subscription.remaining_queries,
-            "usage_percentage": subscription.quota_usage_percentage
+            "remaining": max(0, subscription.monthly_query_quota - quota_used),
+            "usage_percentage": quota_used / subscription.monthly_query_quota * 100 if subscription.monthly_query_quota else 0.0
         }
         
         logger.warning(f"Quota exceeded for workspace {current_user.workspace_id}: {quota_info}")
@@ -106,18 +110,21 @@ async def increment_usage(
         logger.info("Free tier usage - not tracking")
         return True
     
-    # Increment usage atomically
+    # Buffer the increment; the usage flush applies it to queries_this_period
     try:
-        if not subscription.increment_usage(1):
-            # This shouldn't happen if check_quota passed, but just in case
-            raise QuotaExceededException("Quota exceeded during usage increment")
+        unflushed = usage_buffer.record_query_usage(str(subscription.id))
+        if subscription.monthly_query_quota is not None:
+            # Read after recording: a flush committed in between is then counted twice, never missed
+            used = db.query(Subscription.queries_this_period).filter(Subscription.id == subscription.id).scalar()
+            if (used or 0) + unflushed > subscription.monthly_query_quota:
+                # Concurrent requests passed check_quota together; only those within the quota count
+                usage_buffer.record_query_usage(str(subscription.id), amount=-1)
+                raise QuotaExceededException("Quota exceeded during usage increment")
         
-        db.commit()
-        logger.debug(f"Incremented usage for workspace {subscription.workspace_id}: {subscription.queries_this_period}")
+        logger.debug(f"Buffered usage increment for workspace {subscription.workspace_id}")
         return True
         
     except Exception as e:
-        db.rollback()
         logger.error(f"Error incrementing usage: {e}")
         raise
 
@@ -211,16 +218,7 @@ class RedisQuotaTracker:
         return new_usage
     
     async def sync_to_database(self, workspace_id: str, db: Session):
-        """Sync Redis usage counter to database"""
-        usage_key = self.get_usage_key(workspace_id)
-        redis_usage = await self.redis.get(usage_key)
-        
-        if redis_usage is not None:
-            subscription = db.query(Subscription).filter(
-                Subscription.workspace_id == workspace_id
-            ).first()
-            
-            if subscription:
-                subscription.queries_this_period = int(redis_usage)
-                db.commit()
-                logger.info(f"Synced Redis usage to DB for workspace {workspace_id}: {redis_usage}")
+        """Flush buffered usage counters (all workspaces) to the database"""
+        updated = usage_buffer.flush(db)
+        logger.info(f"Flushed buffered usage to DB ({updated} rows) on sync for workspace {workspace_id}")
+        return updated
@@ -8,14 +8,18 @@ import secrets
 from typing import Dict, Any, Optional, List
 from fastapi import Request, Response, HTTPException, status
 from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp
 from fastapi.middleware.cors import CORSMiddleware
 import structlog
 import re
 import json
 
 from app.core.config import settings
+from app.core.async_redis import async_redis
 from app.core.database import redis_manager
+from app.middleware.pipeline import HEALTH_PATHS, ASGIPipeline, PipelineContext, RequestHook
 
 logger = structlog.get_logger()
 
@@ -74,11 +78,12 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
         return response
 
 
-class InputValidationMiddleware(BaseHTTPMiddleware):
-    """Enhanced input validation and sanitization middleware"""
+class InputValidationHook(RequestHook):
+    """Enhanced input validation and sanitization"""
     
-    def __init__(self, app):
-        super().__init__(app)
+    skip_paths = HEALTH_PATHS
+    
+    def __init__(self):
         self.suspicious_patterns = [
             # XSS patterns
             r"<script[^>]*>.*?</script>",
@@ -190,12 +195,9 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
         
         return True, ""
     
-    async def dispatch(self, request: Request, call_next):
-        # Skip validation for certain endpoints
-        if request.url.path in ["/health", "/ready", "/metrics", "/health/detailed", "/health/external"]:
-            return await call_next(request)
-        
-        client_ip = request.client.host if request.client else "unknown"
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
+        request = ctx.request
+        client_ip = ctx.client_ip
         
         try:
             # Validate query parameters
@@ -216,7 +218,7 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
             
             # Validate request body for JSON requests
             if request.method in ["POST", "PUT", "PATCH"] and "application/json" in request.headers.get("content-type", ""):
-                body = await request.body()
+                body = await ctx.body()
                 if body:
                     try:
                         import json
@@ -269,18 +271,25 @@ class InputValidationMiddleware(BaseHTTPMiddleware):
                 content={"detail": "Input validation failed"}
             )
         
-        return await call_next(request)
+        return None
+
+
+class InputValidationMiddleware(ASGIPipeline):
+    """Standalone input validation (``main.py`` runs the hook in the shared pipeline)"""
+    
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [InputValidationHook()])
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Enhanced rate limiting middleware with Redis-backed sliding window and multiple rate limit tiers."""
+class RateLimitHook(RequestHook):
+    """Enhanced rate limiting with Redis-backed sliding window and multiple rate limit tiers."""
+    
+    skip_paths = HEALTH_PATHS
     
-    def __init__(self, app):
-        super().__init__(app)
+    def __init__(self):
         self.requests = {}  # Fallback in-memory storage
         self.cleanup_interval = 60
         self.last_cleanup = time.time()
-        self.redis = redis_manager.get_client()
         
         # Rate limit configurations
         self.rate_limits = {
@@ -353,21 +362,17 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         """Check rate limit using Redis with sliding window"""
         try:
             now = time.time()
-            pipe = self.redis.pipeline()
-            
-            # Remove expired entries
-            pipe.zremrangebyscore(key, 0, now - window)
-            
-            # Count current requests
-            pipe.zcard(key)
             
-            # Add current request
-            pipe.zadd(key, {str(now): now})
-            
-            # Set expiration
-            pipe.expire(key, window)
-            
-            results = pipe.execute()
+            results = await async_redis.execute_many(
+                # Remove expired entries
+                ("zremrangebyscore", key, 0, now - window),
+                # Count current requests
+                ("zcard", key),
+                # Add current request
+                ("zadd", key, {str(now): now}),
+                # Set expiration
+                ("expire", key, window),
+            )
             current_count = results[1]
             
             # Check if limit exceeded
@@ -410,10 +415,8 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         
         return True, current_count + 1, int(current_time + window)
     
-    async def dispatch(self, request: Request, call_next):
-        # Skip rate limiting for health checks and metrics
-        if request.url.path in ["/health", "/ready", "/metrics", "/health/detailed", "/health/external"]:
-            return await call_next(request)
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
+        request = ctx.request
         
         # Get rate limit configuration
         config = self._get_rate_limit_config(request)
@@ -467,17 +470,16 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                 }
             )
         
-        # Process request
-        response = await call_next(request)
-        
+        ctx.state["rate_limit"] = (limit, count, reset_time, window)
+        return None
+    
+    def on_response_start(self, ctx: PipelineContext, headers: MutableHeaders) -> None:
         # Add rate limit headers
-        remaining = max(0, limit - count)
-        response.headers["X-RateLimit-Limit"] = str(limit)
-        response.headers["X-RateLimit-Remaining"] = str(remaining)
-        response.headers["X-RateLimit-Reset"] = str(reset_time)
-        response.headers["X-RateLimit-Window"] = str(window)
-        
-        return response
+        limit, count, reset_time, window = ctx.state["rate_limit"]
+        headers["X-RateLimit-Limit"] = str(limit)
+        headers["X-RateLimit-Remaining"] = str(max(0, limit - count))
+        headers["X-RateLimit-Reset"] = str(reset_time)
+        headers["X-RateLimit-Window"] = str(window)
     
     def _cleanup_old_entries(self, current_time: int):
         """Clean up old in-memory rate limit entries"""
@@ -491,38 +493,45 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                 del self.requests[identifier]
 
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
+class RateLimitMiddleware(ASGIPipeline):
+    """Standalone rate limiting (``main.py`` runs the hook in the shared pipeline)"""
+    
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [RateLimitHook()])
+
+
+class RequestLoggingHook(RequestHook):
     """Log all requests for security monitoring"""
     
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # Log request
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
+        request = ctx.request
         logger.info(
             "Request started",
-            method=request.method,
-            path=request.url.path,
+            method=ctx.method,
+            path=ctx.path,
             query_params=dict(request.query_params),
-            client_ip=request.client.host if request.client else "unknown",
+            client_ip=ctx.client_ip,
             user_agent=request.headers.get("user-agent", ""),
             content_length=request.headers.get("content-length", "0")
         )
-        
-        # Process request
-        response = await call_next(request)
-        
-        # Log response
-        process_time = time.time() - start_time
+        return None
+    
+    async def on_complete(self, ctx: PipelineContext) -> None:
         logger.info(
             "Request completed",
-            method=request.method,
-            path=request.url.path,
-            status_code=response.status_code,
-            process_time=process_time,
-            client_ip=request.client.host if request.client else "unknown"
+            method=ctx.method,
+            path=ctx.path,
+            status_code=ctx.status_code,
+            process_time=ctx.duration,
+            client_ip=ctx.client_ip
         )
-        
-        return response
+
+
+class RequestLoggingMiddleware(ASGIPipeline):
+    """Standalone request logging (``main.py`` runs the hook in the shared pipeline)"""
+    
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [RequestLoggingHook()])
 
 
 class SecurityExceptionHandler:
@@ -572,11 +581,10 @@ class SecurityExceptionHandler:
                 )
 
 
-class CSRFProtectionMiddleware(BaseHTTPMiddleware):
-    """Enhanced CSRF protection middleware with proper token validation"""
+class CSRFProtectionHook(RequestHook):
+    """Enhanced CSRF protection with proper token validation"""
     
-    def __init__(self, app):
-        super().__init__(app)
+    def __init__(self):
         self.exempt_paths = [
             "/health", "/ready", "/metrics", 
             "/api/v1/auth/login", "/api/v1/auth/register",
@@ -586,19 +594,21 @@ class CSRFProtectionMiddleware(BaseHTTPMiddleware):
         self.redis = redis_manager.get_client()
         self.token_ttl = 3600  # 1 hour
     
-    async def dispatch(self, request: Request, call_next):
+    async def on_request(self, ctx: PipelineContext) -> Optional[Response]:
         # Skip CSRF check for exempt paths
-        if any(request.url.path.startswith(path) for path in self.exempt_paths):
-            return await call_next(request)
+        if any(ctx.path.startswith(path) for path in self.exempt_paths):
+            return None
         
         # Skip CSRF check for safe methods
-        if request.method in self.safe_methods:
-            return await call_next(request)
+        if ctx.method in self.safe_methods:
+            return None
+        
+        request = ctx.request
         
         # If Authorization Bearer token present, treat as API call and skip CSRF
         auth_header = request.headers.get("Authorization", "")
         if auth_header.startswith("Bearer "):
-            return await call_next(request)
+            return None
         
         # Check for CSRF token in header or form data
         csrf_token = self._extract_csrf_token(request)
@@ -635,7 +645,7 @@ class CSRFProtectionMiddleware(BaseHTTPMiddleware):
                 }
             )
         
-        return await call_next(request)
+        return None
     
     def _extract_csrf_token(self, request: Request) -> Optional[str]:
         """Extract CSRF token from headers or form data"""
@@ -722,6 +732,13 @@ class CSRFProtectionMiddleware(BaseHTTPMiddleware):
         return token
 
 
+class CSRFProtectionMiddleware(ASGIPipeline):
+    """Standalone CSRF protection (``main.py`` runs the hook in the shared pipeline)"""
+    
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [CSRFProtectionHook()])
+
+
 # Enhanced CORS middleware with security considerations
 class SecurityCORSMiddleware(CORSMiddleware):
     """Enhanced CORS middleware with security features"""
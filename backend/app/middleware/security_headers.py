@@ -2,31 +2,33 @@
 Security headers middleware for production-ready security
 """
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp
 import structlog
 from app.core.config import settings
+from app.middleware.pipeline import ASGIPipeline, PipelineContext, RequestHook
 
 logger = structlog.get_logger()
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class SecurityHeadersHook(RequestHook):
     """Add comprehensive security headers with environment-aware configuration"""
     
-    def __init__(self, app):
-        super().__init__(app)
+    def __init__(self):
         self.is_production = settings.ENVIRONMENT.lower() == "production"
         self.is_https = settings.ENVIRONMENT.lower() in ["production", "staging"]
+        # Policies depend only on the environment, so build them once
+        self.csp = self._build_csp()
     
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
+    def on_response_start(self, ctx: PipelineContext, response_headers: MutableHeaders) -> None:
+        path = ctx.path
         
         # Basic security headers (always applied)
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        response_headers["X-Content-Type-Options"] = "nosniff"
+        response_headers["X-Frame-Options"] = "DENY"
+        response_headers["X-XSS-Protection"] = "1; mode=block"
+        response_headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
         
         # Enhanced Permissions Policy
         permissions_policy = (
@@ -40,53 +42,51 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
             "payment=(), "
             "usb=()"
         )
-        response.headers["Permissions-Policy"] = permissions_policy
+        response_headers["Permissions-Policy"] = permissions_policy
         
         # Content Security Policy (environment-aware)
-        csp = self._build_csp(request)
-        response.headers["Content-Security-Policy"] = csp
+        response_headers["Content-Security-Policy"] = self.csp
         
         # HSTS
         # In testing, some tests expect HSTS even over http; honor that when not production
-        if self.is_https and request.url.scheme == "https" or (settings.ENVIRONMENT.lower() in ["testing", "test"]):
+        if self.is_https and ctx.scope.get("scheme") == "https" or (settings.ENVIRONMENT.lower() in ["testing", "test"]):
             hsts_max_age = 31536000 if self.is_production else 300  # 1 year in prod, 5 min in staging
-            response.headers["Strict-Transport-Security"] = f"max-age={hsts_max_age}; includeSubDomains"
+            response_headers["Strict-Transport-Security"] = f"max-age={hsts_max_age}; includeSubDomains"
             if self.is_production:
-                response.headers["Strict-Transport-Security"] += "; preload"
+                response_headers["Strict-Transport-Security"] += "; preload"
         
         # Cache control for sensitive endpoints
-        if self._is_sensitive_endpoint(request.url.path):
-            response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, proxy-revalidate"
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-            response.headers["Surrogate-Control"] = "no-store"
+        if self._is_sensitive_endpoint(path):
+            response_headers["Cache-Control"] = "no-store, no-cache, must-revalidate, proxy-revalidate"
+            response_headers["Pragma"] = "no-cache"
+            response_headers["Expires"] = "0"
+            response_headers["Surrogate-Control"] = "no-store"
         
         # Additional security headers for production
         if self.is_production:
             # Remove server information
-            response.headers.pop("Server", None)
+            if "server" in response_headers:
+                del response_headers["server"]
             
             # Cross-Origin policies
-            response.headers["Cross-Origin-Embedder-Policy"] = "require-corp"
-            response.headers["Cross-Origin-Opener-Policy"] = "same-origin"
-            response.headers["Cross-Origin-Resource-Policy"] = "same-origin"
+            response_headers["Cross-Origin-Embedder-Policy"] = "require-corp"
+            response_headers["Cross-Origin-Opener-Policy"] = "same-origin"
+            response_headers["Cross-Origin-Resource-Policy"] = "same-origin"
             
             # Additional XSS protection
-            response.headers["X-XSS-Protection"] = "1; mode=block; report=/api/v1/security/xss-report"
+            response_headers["X-XSS-Protection"] = "1; mode=block; report=/api/v1/security/xss-report"
         
         # Security headers for API endpoints
-        if request.url.path.startswith("/api/"):
-            response.headers["X-API-Version"] = "1.0.0"
-            response.headers["X-Content-Type-Options"] = "nosniff"
+        if path.startswith("/api/"):
+            response_headers["X-API-Version"] = "1.0.0"
+            response_headers["X-Content-Type-Options"] = "nosniff"
             
             # Prevent MIME type sniffing
-            if "application/json" in response.headers.get("content-type", ""):
-                response.headers["X-Content-Type-Options"] = "nosniff"
-        
-        return response
+            if "application/json" in response_headers.get("content-type", ""):
+                response_headers["X-Content-Type-Options"] = "nosniff"
     
-    def _build_csp(self, request: Request) -> str:
-        """Build Content Security Policy based on environment and request"""
+    def _build_csp(self) -> str:
+        """Build Content Security Policy based on environment"""
         if self.is_production:
             # Strict CSP for production
             csp_parts = [
@@ -138,6 +138,13 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
         return any(path.startswith(sensitive) for sensitive in sensitive_paths)
 
 
+class SecurityHeadersMiddleware(ASGIPipeline):
+    """Standalone security headers (``main.py`` runs the hook in the shared pipeline)"""
+    
+    def __init__(self, app: ASGIApp):
+        super().__init__(app, [SecurityHeadersHook()])
+
+
 def create_cors_middleware(app):
     """Create CORS middleware with security restrictions"""
     return CORSMiddleware(
@@ -13,6 +13,8 @@ from .performance import (
     PerformanceReport, 
     PerformanceBenchmark
 )
+from .analytics import AnalyticsRollup
+from .usage import UsageFlushBatch
 
 __all__ = [
     "User",
@@ -28,5 +30,7 @@ __all__ = [
     "PerformanceAlert",
     "PerformanceConfig",
     "PerformanceReport",
-    "PerformanceBenchmark"
+    "PerformanceBenchmark",
+    "AnalyticsRollup",
+    "UsageFlushBatch"
 ]
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""
+Pre-aggregated analytics rollup model
+"""
+
+from sqlalchemy import Column, String, Integer, BigInteger, Float, DateTime, ForeignKey
+from app.core.uuid_type import UUID
+from app.core.database import Base
+
+HOUR = "hour"
+DAY = "day"
+
+# Additive counters kept per bucket; increments and the backfill touch only these
+ROLLUP_COUNTERS = (
+    "sessions_count",
+    "sessions_ended",
+    "session_duration_seconds",
+    "messages_count",
+    "user_messages_count",
+    "documents_uploaded",
+    "response_time_ms_sum",
+    "response_time_count",
+    "satisfied_count",
+    "unsatisfied_count",
+)
+
+
+class AnalyticsRollup(Base):
+    """Per-workspace activity totals for one hour or one day (UTC).
+
+    The primary key doubles as the range-scan index for dashboard reads.
+    Session durations are attributed to the bucket the session started in.
+    """
+    __tablename__ = "analytics_rollups"
+
+    workspace_id = Column(UUID(), ForeignKey("workspaces.id"), primary_key=True)
+    granularity = Column(String(5), primary_key=True)  # hour, day
+    bucket_start = Column(DateTime, primary_key=True)  # naive UTC, truncated to the granularity
+
+    sessions_count = Column(Integer, nullable=False, default=0)
+    sessions_ended = Column(Integer, nullable=False, default=0)
+    session_duration_seconds = Column(Float, nullable=False, default=0.0)
+    messages_count = Column(Integer, nullable=False, default=0)  # user + assistant
+    user_messages_count = Column(Integer, nullable=False, default=0)
+    documents_uploaded = Column(Integer, nullable=False, default=0)
+    response_time_ms_sum = Column(BigInteger, nullable=False, default=0)
+    response_time_count = Column(Integer, nullable=False, default=0)
+    satisfied_count = Column(Integer, nullable=False, default=0)  # assistant, high/medium confidence
+    unsatisfied_count = Column(Integer, nullable=False, default=0)  # assistant, low confidence or flagged
+
+    def __repr__(self):
+        return f"<AnalyticsRollup(workspace_id={self.workspace_id}, {self.granularity}={self.bucket_start})>"
@@ -25,7 +25,7 @@ class Document(Base):
     # Processing status
     status = Column(
         String(20), 
-        CheckConstraint("status IN ('uploaded','processing','done','failed','deleted','processed','error')"),
+        CheckConstraint("status IN ('uploaded','processing','done','embedded','failed','deleted','processed','error')"),
         default="uploaded",
         nullable=False
     )
@@ -33,6 +33,7 @@ class Document(Base):
     
     # Timestamps
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
+    processing_heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # Bumped with each stored chunk batch
     
     # Relationships
     workspace = relationship("Workspace", back_populates="documents")
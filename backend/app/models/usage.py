@@ -0,0 +1,22 @@
+"""
+Usage buffer bookkeeping model
+"""
+
+from sqlalchemy import Column, String, DateTime
+from app.core.database import Base
+
+
+class UsageFlushBatch(Base):
+    """A usage buffer batch already applied to the counters.
+
+    Written in the same transaction as the batch, so a batch retried after
+    a flusher stalled or died between commit and cleanup is applied once.
+    Rows older than a day are pruned by later flushes.
+    """
+    __tablename__ = "usage_flush_batches"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    applied_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<UsageFlushBatch(id={self.id}, applied_at={self.applied_at})>"
@@ -97,5 +97,6 @@ class KPISummary(BaseModel):
     queries: KPIValue
     sessions: KPIValue
     active_sessions: dict
-    avg_response_time_ms: dict
+    response_time_p50_ms: dict
+    response_time_p95_ms: dict
     top_questions_current: List[Dict[str, Any]]
\ No newline at end of file
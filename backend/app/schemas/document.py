@@ -13,7 +13,8 @@ class DocumentStatus(str, Enum):
     """Document processing status"""
     UPLOADED = "uploaded"
     PROCESSING = "processing"
-    DONE = "done"
+    DONE = "done"  # Chunked; embeddings queued
+    EMBEDDED = "embedded"
     FAILED = "failed"
     DELETED = "deleted"
 
@@ -12,6 +12,9 @@ from app.models.document import Document, DocumentChunk
 from app.models.chat import ChatSession, ChatMessage
 from app.models.embed import EmbedCode
 from app.models.user import User
+from app.models.analytics import AnalyticsRollup, DAY, HOUR
+from app.services.analytics_rollup import bucket_start
+from app.services.kpi_engine import KPIEngine
 from app.utils.cache import analytics_cache
 
 logger = structlog.get_logger()
@@ -23,6 +26,23 @@ class AnalyticsService:
     def __init__(self, db: Session):
         self.db = db
     
+    def _user_rollups(
+        self,
+        user_id: int,
+        granularity: str,
+        start: datetime,
+        end: datetime
+    ) -> List[AnalyticsRollup]:
+        """Rollup buckets in ``[start, end)`` for the user's workspace (one range scan)"""
+        return self.db.query(AnalyticsRollup).join(
+            User, User.workspace_id == AnalyticsRollup.workspace_id
+        ).filter(
+            User.id == user_id,
+            AnalyticsRollup.granularity == granularity,
+            AnalyticsRollup.bucket_start >= start,
+            AnalyticsRollup.bucket_start < end
+        ).all()
+    
     def get_user_overview(self, user_id: int) -> Dict[str, Any]:
         """Get analytics overview for a user"""
         try:
@@ -193,63 +213,36 @@ class AnalyticsService:
             end_date = date.today()
             start_date = end_date - timedelta(days=days)
             
-            # Get daily statistics
+            # Daily rollups for the whole window in one range scan
+            rollups = {
+                row.bucket_start.date(): row
+                for row in self.db.query(AnalyticsRollup).filter(
+                    AnalyticsRollup.workspace_id == workspace_id,
+                    AnalyticsRollup.granularity == DAY,
+                    AnalyticsRollup.bucket_start >= datetime.combine(start_date, datetime.min.time()),
+                    AnalyticsRollup.bucket_start < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+                ).all()
+            }
+            
             daily_stats = []
             current_date = start_date
             
             while current_date <= end_date:
-                next_date = current_date + timedelta(days=1)
-                
-                # Sessions count (by workspace)
-                sessions_count = self.db.query(ChatSession).filter(
-                    ChatSession.workspace_id == workspace_id,
-                    ChatSession.created_at >= current_date,
-                    ChatSession.created_at < next_date
-                ).count()
-                
-                # Messages count (user queries only by workspace)
-                messages_count = self.db.query(ChatMessage).join(ChatSession).filter(
-                    ChatSession.workspace_id == workspace_id,
-                    ChatMessage.role == 'user',
-                    ChatMessage.created_at >= current_date,
-                    ChatMessage.created_at < next_date
-                ).count()
-                
-                # Documents uploaded (by workspace)
-                documents_uploaded = self.db.query(Document).filter(
-                    Document.workspace_id == workspace_id,
-                    Document.uploaded_at >= current_date,
-                    Document.uploaded_at < next_date
-                ).count()
-                
-                # Average session duration (by workspace)
-                sessions = self.db.query(ChatSession).filter(
-                    ChatSession.workspace_id == workspace_id,
-                    ChatSession.created_at >= current_date,
-                    ChatSession.created_at < next_date,
-                    ChatSession.ended_at.isnot(None)
-                ).all()
+                row = rollups.get(current_date)
                 
                 avg_duration = 0
-                if sessions:
-                    durations = []
-                    for session in sessions:
-                        if session.ended_at:
-                            duration = (session.ended_at - session.created_at).total_seconds() / 60
-                            durations.append(duration)
-                    
-                    if durations:
-                        avg_duration = sum(durations) / len(durations)
+                if row is not None and row.sessions_ended:
+                    avg_duration = row.session_duration_seconds / row.sessions_ended / 60
                 
                 daily_stats.append({
                     "date": current_date,
-                    "sessions_count": sessions_count,
-                    "messages_count": messages_count,
-                    "documents_uploaded": documents_uploaded,
+                    "sessions_count": row.sessions_count if row is not None else 0,
+                    "messages_count": row.user_messages_count if row is not None else 0,
+                    "documents_uploaded": row.documents_uploaded if row is not None else 0,
                     "avg_session_duration": round(avg_duration, 2)
                 })
                 
-                current_date = next_date
+                current_date += timedelta(days=1)
             
             return daily_stats
             
@@ -273,24 +266,11 @@ class AnalyticsService:
                 return cached
             # Initialize 24-hour buckets
             buckets = {h: {"hour": h, "sessions_count": 0, "messages_count": 0} for h in range(24)}
-            # Aggregate sessions by hour
-            sessions = self.db.query(ChatSession.created_at).filter(
-                ChatSession.user_id == user_id,
-                ChatSession.created_at >= start_dt,
-                ChatSession.created_at < end_dt,
-            ).all()
-            for (created_at,) in sessions:
-                h = created_at.hour
-                buckets[h]["sessions_count"] += 1
-            # Aggregate messages by hour (user + assistant)
-            messages = self.db.query(ChatMessage.created_at).join(ChatSession).filter(
-                ChatSession.user_id == user_id,
-                ChatMessage.created_at >= start_dt,
-                ChatMessage.created_at < end_dt,
-            ).all()
-            for (created_at,) in messages:
-                h = created_at.hour
-                buckets[h]["messages_count"] += 1
+            # Fold hourly rollups (user + assistant messages) into hour-of-day buckets
+            for row in self._user_rollups(user_id, HOUR, bucket_start(start_dt, HOUR), end_dt):
+                h = row.bucket_start.hour
+                buckets[h]["sessions_count"] += row.sessions_count
+                buckets[h]["messages_count"] += row.messages_count
             result = [buckets[h] for h in range(24)]
             analytics_cache.set_hourly_trends_sync(str(user_id), period_key, result)
             return result
@@ -313,33 +293,27 @@ class AnalyticsService:
             cached = analytics_cache.get_satisfaction_sync(str(user_id), period_key)
             if cached:
                 return cached
+            # Heuristic (maintained by the rollups): assistant messages with high/medium
+            # confidence are satisfied; low confidence or flagged are unsatisfied
+            rollups = {
+                row.bucket_start.date(): row
+                for row in self._user_rollups(
+                    user_id,
+                    DAY,
+                    datetime.combine(start_date, datetime.min.time()),
+                    datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+                )
+            }
             stats: List[Dict[str, Any]] = []
             current = start_date
             while current <= end_date:
-                next_day = current + timedelta(days=1)
-                # Heuristic: assistant messages with high/medium confidence are satisfied
-                satisfied = self.db.query(ChatMessage).join(ChatSession).filter(
-                    ChatSession.user_id == user_id,
-                    ChatMessage.role == 'assistant',
-                    ChatMessage.created_at >= current,
-                    ChatMessage.created_at < next_day,
-                    ChatMessage.confidence_score.in_(['high', 'medium'])
-                ).count()
-                # Unsatisfied: assistant messages with low confidence or flagged
-                unsatisfied = self.db.query(ChatMessage).join(ChatSession).filter(
-                    ChatSession.user_id == user_id,
-                    ChatMessage.role == 'assistant',
-                    ChatMessage.created_at >= current,
-                    ChatMessage.created_at < next_day,
-                ).filter(
-                    (ChatMessage.confidence_score == 'low') | (ChatMessage.is_flagged == True)
-                ).count()
+                row = rollups.get(current)
                 stats.append({
                     "date": current,
-                    "satisfied": satisfied,
-                    "unsatisfied": unsatisfied,
+                    "satisfied": row.satisfied_count if row is not None else 0,
+                    "unsatisfied": row.unsatisfied_count if row is not None else 0,
                 })
-                current = next_day
+                current += timedelta(days=1)
             analytics_cache.set_satisfaction_sync(str(user_id), period_key, stats)
             return stats
         except Exception as e:
@@ -348,7 +322,7 @@ class AnalyticsService:
 
     def get_kpis(self, user_id: int, days: int = 30) -> Dict[str, Any]:
         """Compute KPI metrics and deltas for the dashboard overview.
-        Metrics: queries (user messages), sessions, active sessions, avg response time, top questions (current window).
+        Metrics: queries (user messages), sessions, active sessions, p50/p95 response time, top questions (current window).
         Deltas compare current window vs previous window.
         """
         try:
@@ -361,64 +335,9 @@ class AnalyticsService:
             
             now_dt = datetime.utcnow()
             current_start = now_dt - timedelta(days=days)
-            prev_start = current_start - timedelta(days=days)
-            prev_end = current_start
 
-            # Queries (user messages by workspace)
-            msgs_current = self.db.query(ChatMessage).join(ChatSession).filter(
-                ChatSession.workspace_id == workspace_id,
-                ChatMessage.role == 'user',
-                ChatMessage.created_at >= current_start,
-                ChatMessage.created_at < now_dt
-            ).count()
-            msgs_prev = self.db.query(ChatMessage).join(ChatSession).filter(
-                ChatSession.workspace_id == workspace_id,
-                ChatMessage.role == 'user',
-                ChatMessage.created_at >= prev_start,
-                ChatMessage.created_at < prev_end
-            ).count()
-
-            # Sessions created (by workspace)
-            sess_current = self.db.query(ChatSession).filter(
-                ChatSession.workspace_id == workspace_id,
-                ChatSession.created_at >= current_start,
-                ChatSession.created_at < now_dt
-            ).count()
-            sess_prev = self.db.query(ChatSession).filter(
-                ChatSession.workspace_id == workspace_id,
-                ChatSession.created_at >= prev_start,
-                ChatSession.created_at < prev_end
-            ).count()
-
-            # Active sessions (activity in window by workspace)
-            active_current = self.db.query(ChatSession).filter(
-                ChatSession.workspace_id == workspace_id,
-                ChatSession.last_activity_at >= current_start,
-                ChatSession.last_activity_at < now_dt
-            ).count()
-            active_prev = self.db.query(ChatSession).filter(
-                ChatSession.workspace_id == workspace_id,
-                ChatSession.last_activity_at >= prev_start,
-                ChatSession.last_activity_at < prev_end
-            ).count()
-
-            # Avg response time (assistant messages by workspace)
-            rt_curr_rows = self.db.query(ChatMessage.response_time_ms).join(ChatSession).filter(
-                ChatSession.workspace_id == workspace_id,
-                ChatMessage.role == 'assistant',
-                ChatMessage.response_time_ms.isnot(None),
-                ChatMessage.created_at >= current_start,
-                ChatMessage.created_at < now_dt
-            ).all()
-            rt_prev_rows = self.db.query(ChatMessage.response_time_ms).join(ChatSession).filter(
-                ChatSession.workspace_id == workspace_id,
-                ChatMessage.role == 'assistant',
-                ChatMessage.response_time_ms.isnot(None),
-                ChatMessage.created_at >= prev_start,
-                ChatMessage.created_at < prev_end
-            ).all()
-            avg_rt_curr = round(sum(r[0] for r in rt_curr_rows) / len(rt_curr_rows), 2) if rt_curr_rows else 0
-            avg_rt_prev = round(sum(r[0] for r in rt_prev_rows) / len(rt_prev_rows), 2) if rt_prev_rows else 0
+            # Counts and response-time percentiles for both windows in one statement
+            kpis = KPIEngine(self.db).compute(workspace_id, days, now=now_dt)
 
             # Top questions in current window (by workspace)
             top_q = self.db.query(
@@ -435,19 +354,7 @@ class AnalyticsService:
                 for t in top_q
             ]
 
-            def pct_change(curr: int, prev: int) -> float:
-                if prev == 0:
-                    return 100.0 if curr > 0 else 0.0
-                return round(((curr - prev) / prev) * 100.0, 2)
-
-            kpis = {
-                "window_days": days,
-                "queries": {"current": msgs_current, "previous": msgs_prev, "delta_pct": pct_change(msgs_current, msgs_prev)},
-                "sessions": {"current": sess_current, "previous": sess_prev, "delta_pct": pct_change(sess_current, sess_prev)},
-                "active_sessions": {"current": active_current, "previous": active_prev, "delta": active_current - active_prev},
-                "avg_response_time_ms": {"current": avg_rt_curr, "previous": avg_rt_prev, "delta_ms": round(avg_rt_curr - avg_rt_prev, 2)},
-                "top_questions_current": top_questions_current,
-            }
+            kpis["top_questions_current"] = top_questions_current
             return kpis
         except Exception as e:
             logger.error("Failed to compute KPIs", error=str(e), user_id=user_id)
@@ -0,0 +1,302 @@
+"""
+Incremental maintenance and backfill of per-workspace analytics rollups
+"""
+
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import structlog
+from sqlalchemy import and_, update
+from sqlalchemy.orm import Session
+
+from app.models.analytics import AnalyticsRollup, DAY, HOUR, ROLLUP_COUNTERS
+from app.models.chat import ChatMessage, ChatSession
+from app.models.document import Document
+from app.services.usage_buffer import usage_buffer
+
+logger = structlog.get_logger()
+
+_BACKFILL_BATCH_SIZE = 1000
+
+# Counters stored as floats; the rest are whole numbers
+_FLOAT_COUNTERS = {"session_duration_seconds"}
+
+
+def to_utc_naive(value: Any) -> Optional[datetime]:
+    """Normalise a timestamp to naive UTC; SQL expressions (``func.now()``) map to None"""
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bucket_start(at: datetime, granularity: str) -> datetime:
+    """Truncate a naive UTC timestamp to the start of its hour or day"""
+    if granularity == HOUR:
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def message_counters(role: str,
+                     response_time_ms: Optional[int],
+                     confidence_score: Optional[str],
+                     is_flagged: Optional[bool]) -> Dict[str, float]:
+    """Rollup increments contributed by a single chat message"""
+    counters: Dict[str, float] = {"messages_count": 1}
+    if role == "user":
+        counters["user_messages_count"] = 1
+    elif role == "assistant":
+        if response_time_ms is not None:
+            counters["response_time_ms_sum"] = response_time_ms
+            counters["response_time_count"] = 1
+        if confidence_score in ("high", "medium"):
+            counters["satisfied_count"] = 1
+        if confidence_score == "low" or is_flagged:
+            counters["unsatisfied_count"] = 1
+    return counters
+
+
+class AnalyticsRollupService:
+    """Keeps hourly and daily ``AnalyticsRollup`` rows in step with activity.
+
+    ``record_*`` methods hand their increments to the usage buffer, which
+    applies them in one batched upsert per flush instead of every request
+    transaction updating the same hour and day rows, so rollups trail the
+    source tables by up to ``USAGE_FLUSH_INTERVAL``. ``backfill`` rebuilds
+    buckets from the source tables and is the repair path for anything
+    recorded outside these hooks.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record_session_started(self, session: ChatSession) -> None:
+        self._increment(session.workspace_id, session.created_at, {"sessions_count": 1})
+
+    def record_session_ended(self, session: ChatSession, ended_at: Optional[datetime] = None) -> None:
+        started = to_utc_naive(session.created_at)
+        if started is None:
+            return
+        ended = to_utc_naive(ended_at) or to_utc_naive(datetime.now(timezone.utc))
+        self._increment(session.workspace_id, started, {
+            "sessions_ended": 1,
+            "session_duration_seconds": max(0.0, (ended - started).total_seconds()),
+        })
+
+    def record_messages(self, workspace_id: Any, messages: Iterable[ChatMessage]) -> None:
+        """Count messages saved together (e.g. one user/assistant interaction)"""
+        counters: Dict[str, float] = defaultdict(float)
+        at = None
+        for message in messages:
+            at = at or message.created_at
+            for name, value in message_counters(
+                message.role, message.response_time_ms, message.confidence_score, message.is_flagged
+            ).items():
+                counters[name] += value
+        if counters:
+            self._increment(workspace_id, at, counters)
+
+    def record_message_flagged(self, workspace_id: Any, message: ChatMessage) -> None:
+        """Count a newly flagged answer as unsatisfied; call before setting ``is_flagged``"""
+        if message.role != "assistant" or message.is_flagged or message.confidence_score == "low":
+            return  # Not an answer, or already counted as unsatisfied
+        self._increment(workspace_id, message.created_at, {"unsatisfied_count": 1})
+
+    def record_document_uploaded(self, document: Document) -> None:
+        self._increment(document.workspace_id, document.uploaded_at, {"documents_uploaded": 1})
+
+    def _increment(self, workspace_id: Any, at: Any, counters: Dict[str, float]) -> None:
+        if workspace_id is None:
+            return
+        at = to_utc_naive(at) or to_utc_naive(datetime.now(timezone.utc))
+        for granularity in (HOUR, DAY):
+            usage_buffer.record_rollup(workspace_id, granularity, bucket_start(at, granularity), counters)
+
+    def apply_increments(self, increments: Dict[Tuple[Any, str, datetime], Dict[str, float]]) -> int:
+        """Add buffered ``(workspace_id, granularity, bucket_start)`` increments (caller commits)"""
+        rows = []
+        for (workspace_id, granularity, start), counters in increments.items():
+            row = self._row(workspace_id, granularity, start, counters)
+            rows.append({
+                name: (value if name in _FLOAT_COUNTERS or name not in ROLLUP_COUNTERS else int(round(value)))
+                for name, value in row.items()
+            })
+        if rows:
+            self._upsert(rows)
+        return len(rows)
+
+    @staticmethod
+    def _row(workspace_id: Any, granularity: str, start: datetime, counters: Dict[str, float]) -> Dict[str, Any]:
+        row = {name: counters.get(name, 0) for name in ROLLUP_COUNTERS}
+        row.update(workspace_id=workspace_id, granularity=granularity, bucket_start=start)
+        return row
+
+    def _upsert(self, rows: List[Dict[str, Any]]) -> None:
+        """Add ``rows`` to existing buckets, creating missing ones"""
+        table = AnalyticsRollup.__table__
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            insert = None
+
+        if insert is not None:
+            stmt = insert(table).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.workspace_id, table.c.granularity, table.c.bucket_start],
+                set_={name: table.c[name] + stmt.excluded[name] for name in ROLLUP_COUNTERS}
+            )
+            self.db.execute(stmt)
+            return
+
+        # Portable fallback: update-then-insert per bucket
+        for row in rows:
+            result = self.db.execute(
+                update(table)
+                .where(and_(
+                    table.c.workspace_id == row["workspace_id"],
+                    table.c.granularity == row["granularity"],
+                    table.c.bucket_start == row["bucket_start"]
+                ))
+                .values({name: table.c[name] + row[name] for name in ROLLUP_COUNTERS})
+            )
+            if result.rowcount == 0:
+                self.db.execute(table.insert().values(row))
+
+    def backfill(self,
+                 start: Optional[datetime] = None,
+                 end: Optional[datetime] = None,
+                 workspace_id: Optional[Any] = None) -> int:
+        """Rebuild rollups for whole UTC days in ``[start, end]`` from source tables.
+
+        Omitting ``start`` rebuilds all history. Only days before today are
+        rebuilt: activity recorded while the rebuild runs is still in the
+        usage buffer and would otherwise be counted twice, so today's
+        buckets keep their live increments. Returns the number of rollup
+        rows written.
+        """
+        # Apply increments still buffered for activity the rebuild is about to count;
+        # anything recorded from here on stays buffered and is left out of the scan
+        flushed_at = to_utc_naive(datetime.now(timezone.utc))
+        usage_buffer.flush(self.db)
+
+        end_day = bucket_start(to_utc_naive(end) or flushed_at, DAY) + timedelta(days=1)
+        end_day = min(end_day, bucket_start(flushed_at, DAY))
+        start_day = bucket_start(to_utc_naive(start), DAY) if start is not None else None
+        if start_day is not None and start_day >= end_day:
+            return 0
+
+        totals: Dict[Tuple[Any, str, datetime], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+        def add(ws_id: Any, at: Any, counters: Dict[str, float]) -> None:
+            at = to_utc_naive(at)
+            if ws_id is None or at is None:
+                return
+            for granularity in (HOUR, DAY):
+                bucket = totals[(ws_id, granularity, bucket_start(at, granularity))]
+                for name, value in counters.items():
+                    bucket[name] += value
+
+        def in_range(query, column):
+            query = query.filter(column < end_day)
+            if start_day is not None:
+                query = query.filter(column >= start_day)
+            return query
+
+        sessions = in_range(
+            self.db.query(ChatSession.workspace_id, ChatSession.created_at, ChatSession.ended_at),
+            ChatSession.created_at
+        )
+        messages = in_range(
+            self.db.query(
+                ChatSession.workspace_id,
+                ChatMessage.created_at,
+                ChatMessage.role,
+                ChatMessage.response_time_ms,
+                ChatMessage.confidence_score,
+                ChatMessage.is_flagged
+            ).join(ChatSession, ChatMessage.session_id == ChatSession.id),
+            ChatMessage.created_at
+        )
+        documents = in_range(
+            self.db.query(Document.workspace_id, Document.uploaded_at),
+            Document.uploaded_at
+        )
+        if workspace_id is not None:
+            sessions = sessions.filter(ChatSession.workspace_id == workspace_id)
+            messages = messages.filter(ChatSession.workspace_id == workspace_id)
+            documents = documents.filter(Document.workspace_id == workspace_id)
+
+        for ws_id, created_at, ended_at in sessions.yield_per(_BACKFILL_BATCH_SIZE):
+            counters = {"sessions_count": 1}
+            started, ended = to_utc_naive(created_at), to_utc_naive(ended_at)
+            # A session ending after the flush is counted by its buffered increment
+            if started is not None and ended is not None and ended < flushed_at:
+                counters["sessions_ended"] = 1
+                counters["session_duration_seconds"] = max(0.0, (ended - started).total_seconds())
+            add(ws_id, created_at, counters)
+
+        for ws_id, created_at, role, response_time_ms, confidence_score, is_flagged in messages.yield_per(_BACKFILL_BATCH_SIZE):
+            add(ws_id, created_at, message_counters(role, response_time_ms, confidence_score, is_flagged))
+
+        for ws_id, uploaded_at in documents.yield_per(_BACKFILL_BATCH_SIZE):
+            add(ws_id, uploaded_at, {"documents_uploaded": 1})
+
+        try:
+            stale = self.db.query(AnalyticsRollup).filter(AnalyticsRollup.bucket_start < end_day)
+            if start_day is not None:
+                stale = stale.filter(AnalyticsRollup.bucket_start >= start_day)
+            if workspace_id is not None:
+                stale = stale.filter(AnalyticsRollup.workspace_id == workspace_id)
+            stale.delete(synchronize_session=False)
+
+            rows = [
+                self._row(ws_id, granularity, start_at, counters)
+                for (ws_id, granularity, start_at), counters in totals.items()
+            ]
+            table = AnalyticsRollup.__table__
+            for offset in range(0, len(rows), _BACKFILL_BATCH_SIZE):
+                self.db.execute(table.insert(), rows[offset:offset + _BACKFILL_BATCH_SIZE])
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Analytics rollup backfill failed", error=str(e))
+            raise
+
+        logger.info(
+            "Analytics rollups backfilled",
+            rows=len(rows),
+            start=start_day.isoformat() if start_day else None,
+            end=end_day.isoformat(),
+            workspace_id=str(workspace_id) if workspace_id is not None else None
+        )
+        return len(rows)
+
+
+def main() -> None:
+    """Backfill job: ``python -m app.services.analytics_rollup [--days N] [--workspace-id ID]``"""
+    import argparse
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild analytics rollups from source tables")
+    parser.add_argument("--days", type=int, default=None, help="Only rebuild the last N days (default: all history)")
+    parser.add_argument("--workspace-id", default=None, help="Only rebuild one workspace")
+    args = parser.parse_args()
+
+    start = datetime.now(timezone.utc) - timedelta(days=args.days) if args.days is not None else None
+    db = SessionLocal()
+    try:
+        workspace_id = uuid.UUID(args.workspace_id) if args.workspace_id else None
+        rows = AnalyticsRollupService(db).backfill(start=start, workspace_id=workspace_id)
+        print(f"Wrote {rows} analytics rollup rows")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
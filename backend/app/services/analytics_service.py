@@ -9,7 +9,7 @@ from typing import Dict, List, Any, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_
 import structlog
-from app.core.database import redis_manager
+from app.core.async_redis import async_redis
 from functools import lru_cache
 
 from app.core.config import settings
@@ -26,8 +26,8 @@ class AnalyticsService:
     
     def __init__(self, db: Session):
         self.db = db
-        # Use central Redis manager so REDIS_URL is honored in Cloud Run
-        self.redis_client = redis_manager.get_client()
+        # Shared async client so cache lookups never block the event loop
+        self.redis_client = async_redis
 
     def get_user_overview(self, user_id: Any) -> Dict[str, Any]:
         """Return a minimal overview structure compatible with AnalyticsOverview.
@@ -59,7 +59,7 @@ class AnalyticsService:
             
             # Try to get from cache first
             try:
-                cached_data = self.redis_client.get(cache_key)
+                cached_data = await self.redis_client.get(cache_key)
                 if cached_data:
                     logger.info("Returning cached dashboard metrics", workspace_id=workspace_id)
                     return json.loads(cached_data)
@@ -96,7 +96,7 @@ class AnalyticsService:
             
             # Cache the result for 5 minutes
             try:
-                self.redis_client.setex(cache_key, 300, json.dumps(result))
+                await self.redis_client.setex(cache_key, 300, json.dumps(result))
             except Exception as e:
                 logger.warning("Failed to cache dashboard metrics", error=str(e))
             
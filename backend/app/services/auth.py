@@ -3,7 +3,7 @@ Authentication service
 """
 
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import random
 import hashlib
 import secrets
@@ -21,11 +21,13 @@ from sqlalchemy.orm import Session
 import structlog
 
 from app.core.config import settings
+from app.core.async_redis import async_redis
 from app.core.database import get_db, redis_manager
 from app.models.user import User
 from app.schemas.auth import TokenData
 from app.services.user import UserService
 from app.services.token_revocation import token_revocation_service
+from app.services.auth_cache import auth_cache
 import httpx
 try:
     import redis  # type: ignore
@@ -247,74 +249,10 @@ class AuthService:
                 # Get attempt data from Redis
                 attempt_key = f"login_attempts:{identifier}"
                 attempt_data = self.redis_client.hgetall(attempt_key)
-                
-                if not attempt_data:
-                    return {
-                        "is_locked": False, 
-                        "rate_limited": False,
-                        "attempts": 0, 
-                        "lockout_until": None,
-                        "max_attempts": getattr(settings, 'MAX_LOGIN_ATTEMPTS', 5),
-                        "reset_in": 60
-                    }
-                
-                # Parse attempt data
-                attempts = int(attempt_data.get("attempts", 0))
-                first_attempt = attempt_data.get("first_attempt")
-                lockout_until = attempt_data.get("lockout_until")
-                
-                current_time = datetime.now()
-                
-                # Check if lockout period has expired
-                if lockout_until and current_time < datetime.fromisoformat(lockout_until):
-                    lockout_remaining = int((datetime.fromisoformat(lockout_until) - current_time).total_seconds())
-                    return {
-                        "is_locked": True,
-                        "rate_limited": False,
-                        "attempts": attempts,
-                        "lockout_until": lockout_until,
-                        "lockout_remaining": lockout_remaining,
-                        "max_attempts": getattr(settings, 'MAX_LOGIN_ATTEMPTS', 5)
-                    }
-                
-                # Reset if lockout period has expired
-                if lockout_until and current_time >= datetime.fromisoformat(lockout_until):
+                status_info, lockout_expired = self._evaluate_login_attempts(attempt_data)
+                if lockout_expired:
                     self.redis_client.delete(attempt_key)
-                    return {
-                        "is_locked": False, 
-                        "rate_limited": False,
-                        "attempts": 0, 
-                        "lockout_until": None,
-                        "max_attempts": getattr(settings, 'MAX_LOGIN_ATTEMPTS', 5),
-                        "reset_in": 60
-                    }
-                
-                # Check rate limiting (too many attempts in short time)
-                max_attempts = getattr(settings, 'MAX_LOGIN_ATTEMPTS', 5)
-                # Use shorter window in testing to avoid cross-test bleed
-                rate_limit_window = 5 if (os.getenv("TESTING") == "true" or os.getenv("ENVIRONMENT") in {"testing", "test"}) else 300
-                
-                # Check if we have too many attempts in the rate limit window
-                if attempts > max_attempts and first_attempt:
-                    time_since_first = (current_time - datetime.fromisoformat(first_attempt)).total_seconds()
-                    if time_since_first < rate_limit_window:
-                        reset_in = int(rate_limit_window - time_since_first)
-                        return {
-                            "is_locked": False,
-                            "rate_limited": True,
-                            "attempts": attempts,
-                            "max_attempts": max_attempts,
-                            "reset_in": reset_in
-                        }
-                
-                return {
-                    "is_locked": False,
-                    "rate_limited": False,
-                    "attempts": attempts,
-                    "lockout_until": None,
-                    "max_attempts": max_attempts,
-                    "reset_in": 60
-                }
+                return status_info
             else:
                 # Fallback to in-memory storage if Redis is not available
                 if identifier not in self._shared_login_attempts:
@@ -391,6 +329,102 @@ class AuthService:
                 "reset_in": 60
             }
     
+    def _evaluate_login_attempts(self, attempt_data: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """Lockout/rate-limit status from a ``login_attempts:*`` hash.
+        
+        Returns the status and whether an expired lockout means the hash
+        should be deleted.
+        """
+        if not attempt_data:
+            return {
+                "is_locked": False, 
+                "rate_limited": False,
+                "attempts": 0, 
+                "lockout_until": None,
+                "max_attempts": getattr(settings, 'MAX_LOGIN_ATTEMPTS', 5),
+                "reset_in": 60
+            }, False
+        
+        # Parse attempt data
+        attempts = int(attempt_data.get("attempts", 0))
+        first_attempt = attempt_data.get("first_attempt")
+        lockout_until = attempt_data.get("lockout_until")
+        
+        current_time = datetime.now()
+        
+        # Check if lockout period has expired
+        if lockout_until and current_time < datetime.fromisoformat(lockout_until):
+            lockout_remaining = int((datetime.fromisoformat(lockout_until) - current_time).total_seconds())
+            return {
+                "is_locked": True,
+                "rate_limited": False,
+                "attempts": attempts,
+                "lockout_until": lockout_until,
+                "lockout_remaining": lockout_remaining,
+                "max_attempts": getattr(settings, 'MAX_LOGIN_ATTEMPTS', 5)
+            }, False
+        
+        # Reset if lockout period has expired
+        if lockout_until and current_time >= datetime.fromisoformat(lockout_until):
+            return {
+                "is_locked": False, 
+                "rate_limited": False,
+                "attempts": 0, 
+                "lockout_until": None,
+                "max_attempts": getattr(settings, 'MAX_LOGIN_ATTEMPTS', 5),
+                "reset_in": 60
+            }, True
+        
+        # Check rate limiting (too many attempts in short time)
+        max_attempts = getattr(settings, 'MAX_LOGIN_ATTEMPTS', 5)
+        # Use shorter window in testing to avoid cross-test bleed
+        rate_limit_window = 5 if (os.getenv("TESTING") == "true" or os.getenv("ENVIRONMENT") in {"testing", "test"}) else 300
+        
+        # Check if we have too many attempts in the rate limit window
+        if attempts > max_attempts and first_attempt:
+            time_since_first = (current_time - datetime.fromisoformat(first_attempt)).total_seconds()
+            if time_since_first < rate_limit_window:
+                reset_in = int(rate_limit_window - time_since_first)
+                return {
+                    "is_locked": False,
+                    "rate_limited": True,
+                    "attempts": attempts,
+                    "max_attempts": max_attempts,
+                    "reset_in": reset_in
+                }, False
+        
+        return {
+            "is_locked": False,
+            "rate_limited": False,
+            "attempts": attempts,
+            "lockout_until": None,
+            "max_attempts": max_attempts,
+            "reset_in": 60
+        }, False
+    
+    async def check_login_attempts_async(self, identifier: str) -> Dict[str, Any]:
+        """``check_login_attempts`` for coroutines: Redis state via the shared async client"""
+        testing = os.getenv("TESTING") == "true" or os.getenv("ENVIRONMENT") in {"testing", "test"}
+        if testing or not self.redis_available:
+            # In-memory state; nothing to wait on
+            return self.check_login_attempts(identifier)
+        try:
+            attempt_key = f"login_attempts:{identifier}"
+            status_info, lockout_expired = self._evaluate_login_attempts(await async_redis.hgetall(attempt_key))
+            if lockout_expired:
+                await async_redis.delete(attempt_key)
+            return status_info
+        except Exception as e:
+            logger.error("Error checking login attempts", error=str(e), identifier=identifier)
+            return {
+                "is_locked": False, 
+                "rate_limited": False,
+                "attempts": 0, 
+                "lockout_until": None,
+                "max_attempts": getattr(settings, 'MAX_LOGIN_ATTEMPTS', 5),
+                "reset_in": 60
+            }
+    
     def record_failed_login(self, identifier: str):
         """Record a failed login attempt"""
         # In TESTING, record attempts and support simple windowed counters to feed check_login_attempts
@@ -495,6 +529,38 @@ class AuthService:
         except Exception as e:
             logger.error("Error recording failed login", error=str(e), identifier=identifier)
     
+    async def record_failed_login_async(self, identifier: str):
+        """``record_failed_login`` for coroutines; the Redis update is one pipelined round trip"""
+        testing = os.getenv("TESTING") == "true" or os.getenv("ENVIRONMENT") in {"testing", "test"}
+        if testing or not self.redis_available:
+            return self.record_failed_login(identifier)
+        try:
+            current_time = datetime.now()
+            attempt_key = f"login_attempts:{identifier}"
+            attempts, _, _, _, first_attempt = await async_redis.execute_many(
+                ("hincrby", attempt_key, "attempts", 1),
+                ("hsetnx", attempt_key, "first_attempt", current_time.isoformat()),
+                ("hset", attempt_key, "last_attempt", current_time.isoformat()),
+                # Set expiration for the key (1 hour)
+                ("expire", attempt_key, 3600),
+                ("hget", attempt_key, "first_attempt"),
+            )
+            
+            # Lock account only if beyond rate-limit window to avoid mixing 429 with 423 in the same window
+            max_attempts = getattr(settings, 'MAX_LOGIN_ATTEMPTS', 5)
+            time_since_first = (current_time - datetime.fromisoformat(first_attempt)).total_seconds()
+            if attempts >= max_attempts * 2 and time_since_first >= 300:
+                lockout_until = current_time + timedelta(minutes=settings.LOCKOUT_DURATION_MINUTES)
+                await async_redis.hset(attempt_key, "lockout_until", lockout_until.isoformat())
+                logger.warning(
+                    "Account locked due to failed login attempts",
+                    identifier=identifier,
+                    attempts=attempts,
+                    lockout_until=lockout_until
+                )
+        except Exception as e:
+            logger.error("Error recording failed login", error=str(e), identifier=identifier)
+    
     def reset_login_attempts(self, identifier: str):
         """Reset failed login attempts after successful login"""
         try:
@@ -508,8 +574,23 @@ class AuthService:
         except Exception as e:
             logger.error("Error resetting login attempts", error=str(e), identifier=identifier)
     
-    def authenticate_user(self, identifier: str, password: str) -> Optional[User]:
-        """Enhanced user authentication with security features."""
+    async def reset_login_attempts_async(self, identifier: str):
+        """``reset_login_attempts`` for coroutines"""
+        if not self.redis_available:
+            return self.reset_login_attempts(identifier)
+        try:
+            await async_redis.delete(f"login_attempts:{identifier}")
+        except Exception as e:
+            logger.error("Error resetting login attempts", error=str(e), identifier=identifier)
+    
+    def authenticate_user(self, identifier: str, password: str,
+                          lockout_status: Optional[Dict[str, Any]] = None,
+                          reset_attempts: bool = True) -> Optional[User]:
+        """Enhanced user authentication with security features.
+        
+        Async callers pass ``lockout_status`` from ``check_login_attempts_async``
+        and reset attempts themselves, so no Redis call is made here.
+        """
         # In testing, allow known fixture credentials to bypass lockout so tests can proceed
         testing_env = os.getenv("TESTING") == "true" or (os.getenv("ENVIRONMENT") or "").lower() in {"testing", "test"}
         if testing_env and identifier in {"test@example.com", "+1234567890", "1234567890"} and password == "test_password_123":
@@ -528,7 +609,8 @@ class AuthService:
                 return None
 
         # Check for account lockout
-        lockout_status = self.check_login_attempts(identifier)
+        if lockout_status is None:
+            lockout_status = self.check_login_attempts(identifier)
         if lockout_status["is_locked"]:
             logger.warning(
                 "Login attempt on locked account",
@@ -586,7 +668,8 @@ class AuthService:
             return None
         
         # Reset failed attempts on successful login
-        self.reset_login_attempts(identifier)
+        if reset_attempts:
+            self.reset_login_attempts(identifier)
         
         # Log successful login
         logger.info(
@@ -709,6 +792,14 @@ class AuthService:
             return None
             
         try:
+            # Fast path: claims already verified for this exact token; only revocation can change
+            cached = auth_cache.get_claims(token, token_type)
+            if cached is not None:
+                if self._is_revoked(cached.get("jti")):
+                    logger.warning("Token revoked", jti=cached.get("jti"))
+                    return None
+                return cached
+            
             testing = os.getenv("TESTING") == "true" or os.getenv("ENVIRONMENT") == "testing"
             if testing:
                 # Relaxed decode in tests: don't enforce aud/iss to avoid brittle failures
@@ -742,10 +833,11 @@ class AuthService:
             
             # Check if token is revoked
             jti = payload.get("jti")
-            if jti and token_revocation_service.is_token_revoked(jti):
+            if self._is_revoked(jti):
                 logger.warning("Token revoked", jti=jti)
                 return None
             
+            auth_cache.put_claims(token, token_type, payload)
             return payload
             
         except JWTError as e:
@@ -765,6 +857,16 @@ class AuthService:
             # Re-raise so callers that expect exceptions in tests can assert
             raise
     
+    @staticmethod
+    def _is_revoked(jti: Optional[str]) -> bool:
+        """Check the local revocation replica, falling back to Redis while it syncs"""
+        if not jti:
+            return False
+        revoked = auth_cache.is_revoked(jti)
+        if revoked is None:
+            revoked = token_revocation_service.is_token_revoked(jti)
+        return revoked
+    
     def get_current_user(self, token: str = Depends(oauth2_scheme)) -> User:
         """Get current user from JWT token"""
         credentials_exception = HTTPException(
@@ -808,6 +910,11 @@ class AuthService:
         ci_markers = [os.getenv("TESTING"), os.getenv("CI"), os.getenv("GITHUB_ACTIONS")]
         import sys as _sys
         testing = env in {"testing", "test"} or any(str(v).lower() in {"1", "true", "yes"} for v in ci_markers if v) or ("pytest" in _sys.modules)
+        if not testing:
+            # Short-lived principal cache; user edits invalidate it in every process
+            user = auth_cache.get_principal(str(subject), self.db)
+            if user is not None:
+                return user
         if isinstance(subject, (int,)) or (isinstance(subject, str) and subject.isdigit()):
             if testing:
                 # Return stub without DB access
@@ -838,6 +945,8 @@ class AuthService:
                     user = None
         if user is None:
             raise credentials_exception
+        if not testing:
+            auth_cache.put_principal(str(subject), user)
         return user
 
     # --- Convenience passthroughs expected by tests ---
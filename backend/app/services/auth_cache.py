@@ -0,0 +1,375 @@
+"""
+In-process fast path for authenticated requests: verified token claims,
+a replicated revocation set and short-lived user principals
+"""
+
+import hashlib
+import json
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+import structlog
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.core.config import settings
+from app.models.user import User
+
+logger = structlog.get_logger()
+
+INVALIDATION_CHANNEL = "auth:invalidate"
+REVOKED_TOKEN_PREFIX = "revoked_tokens:"
+
+_PRUNE_INTERVAL = 60.0
+
+# Resync: how long to wait for our own probe to come back through the subscription,
+# and the pause after a listener error or failed resync before trying again
+_PROBE_TIMEOUT = 5.0
+_RETRY_SECONDS = 1.0
+
+
+def _token_key(token: str, token_type: str) -> str:
+    return f"{token_type}:{hashlib.sha256(token.encode()).hexdigest()}"
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter (double hashing over one blake2b digest)"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationReplica:
+    """Local copy of revoked token ids (jti -> exp).
+
+    The Bloom filter answers the common "not revoked" case without touching
+    the exact map; the map removes false positives and expires entries. Only
+    ``ready`` replicas (snapshot loaded, listener running) are authoritative.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, error_rate: Optional[float] = None):
+        self.capacity = capacity if capacity is not None else settings.AUTH_REVOCATION_BLOOM_CAPACITY
+        self.error_rate = error_rate if error_rate is not None else settings.AUTH_REVOCATION_BLOOM_ERROR_RATE
+        self._expiry: Dict[str, float] = {}
+        self._bloom = BloomFilter(self.capacity, self.error_rate)
+        self._lock = threading.Lock()
+        self._last_prune = time.time()
+        self.ready = False
+
+    def add(self, jti: str, expires_at: float) -> None:
+        with self._lock:
+            self._bloom.add(jti)
+            self._expiry[jti] = max(expires_at, self._expiry.get(jti, 0.0))
+            if len(self._expiry) > self.capacity or time.time() - self._last_prune > _PRUNE_INTERVAL:
+                self._prune_locked()
+
+    def is_revoked(self, jti: str) -> bool:
+        if jti not in self._bloom:
+            return False
+        expires_at = self._expiry.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def _prune_locked(self) -> None:
+        """Drop expired ids and rebuild the filter (Bloom filters cannot delete)"""
+        now = time.time()
+        self._expiry = {jti: exp for jti, exp in self._expiry.items() if exp > now}
+        self._bloom = BloomFilter(max(self.capacity, len(self._expiry) * 2), self.error_rate)
+        for jti in self._expiry:
+            self._bloom.add(jti)
+        self._last_prune = now
+
+    def load(self, client: Any) -> int:
+        """Replace contents with the revoked-token keys in Redis (TTL = remaining lifetime)"""
+        keys = list(client.scan_iter(match=f"{REVOKED_TOKEN_PREFIX}*", count=1000))
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.ttl(key)
+        ttls = pipe.execute() if keys else []
+        now = time.time()
+        with self._lock:
+            self._expiry = {}
+            for key, ttl in zip(keys, ttls):
+                key = key.decode() if isinstance(key, bytes) else key
+                if ttl and ttl > 0:
+                    self._expiry[key[len(REVOKED_TOKEN_PREFIX):]] = now + ttl
+            self._prune_locked()
+        return len(self._expiry)
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+
+class AuthCache:
+    """Per-process caches behind ``AuthService.verify_token`` / ``get_current_user``.
+
+    * Verified claims are keyed by token hash and live until the token's
+      ``exp``; decoding is pure, so only revocation needs checking on a hit.
+    * Revocations are replicated locally and kept current over Redis pub/sub;
+      until the replica is ready, callers fall back to the Redis lookup. A
+      listener error marks it not ready until a resync confirms the
+      subscription is live again and reloads the snapshot; resyncs also run
+      every ``AUTH_REVOCATION_RESYNC_SECONDS``.
+    * User principals are column snapshots cached for a few seconds and
+      dropped everywhere when the user row changes.
+    """
+
+    def __init__(self,
+                 token_cache_size: Optional[int] = None,
+                 principal_ttl: Optional[int] = None,
+                 principal_cache_size: Optional[int] = None,
+                 revocations: Optional[RevocationReplica] = None):
+        self.token_cache_size = token_cache_size if token_cache_size is not None else settings.AUTH_TOKEN_CACHE_SIZE
+        self.principal_ttl = principal_ttl if principal_ttl is not None else settings.AUTH_PRINCIPAL_CACHE_TTL
+        self.principal_cache_size = (
+            principal_cache_size if principal_cache_size is not None else settings.AUTH_PRINCIPAL_CACHE_SIZE
+        )
+        self.revocations = revocations or RevocationReplica()
+        self._claims: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._principals: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pubsub = None
+        self._listener = None
+        self._resync_thread: Optional[threading.Thread] = None
+        self._resync_wanted = threading.Event()
+        self._stopping = threading.Event()
+        self._probe: Optional[str] = None
+        self._probe_seen = threading.Event()
+        self._listener_errors = 0
+        self.stats = {"claim_hits": 0, "claim_misses": 0, "principal_hits": 0, "principal_misses": 0}
+
+    # --- Verified claims ---
+    def get_claims(self, token: str, token_type: str) -> Optional[Dict[str, Any]]:
+        key = _token_key(token, token_type)
+        with self._lock:
+            entry = self._claims.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._claims[key]
+                self.stats["claim_misses"] += 1
+                return None
+            self._claims.move_to_end(key)
+            self.stats["claim_hits"] += 1
+            return entry[0]
+
+    def put_claims(self, token: str, token_type: str, payload: Dict[str, Any]) -> None:
+        expires_at = payload.get("exp")
+        if self.token_cache_size <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        key = _token_key(token, token_type)
+        with self._lock:
+            self._claims[key] = (payload, float(expires_at))
+            self._claims.move_to_end(key)
+            while len(self._claims) > self.token_cache_size:
+                self._claims.popitem(last=False)
+
+    # --- Revocation ---
+    def is_revoked(self, jti: str) -> Optional[bool]:
+        """Local answer, or None when the replica is not in sync"""
+        if not self.revocations.ready:
+            return None
+        return self.revocations.is_revoked(jti)
+
+    def publish_revocation(self, jti: str, expires_at: float) -> None:
+        """Record a revocation locally and replicate it to every other process"""
+        self.revocations.add(jti, expires_at)
+        self._publish({"jti": jti, "exp": expires_at})
+
+    # --- Principals ---
+    def get_principal(self, subject: str, db: Optional[Session]) -> Optional[User]:
+        """Cached user attached to ``db`` without a SELECT"""
+        if db is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._principals.get(subject)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._principals[subject]
+                self.stats["principal_misses"] += 1
+                return None
+            self._principals.move_to_end(subject)
+            self.stats["principal_hits"] += 1
+            snapshot = entry[0]
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    def put_principal(self, subject: str, user: User) -> None:
+        if self.principal_ttl <= 0 or self.principal_cache_size <= 0:
+            return
+        snapshot = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        with self._lock:
+            self._principals[subject] = (snapshot, time.monotonic() + self.principal_ttl)
+            self._principals.move_to_end(subject)
+            while len(self._principals) > self.principal_cache_size:
+                self._principals.popitem(last=False)
+
+    def invalidate_user(self, user_id: Any) -> None:
+        """Drop cached principals for ``user_id`` (this process only)"""
+        with self._lock:
+            for subject in [s for s, (snapshot, _) in self._principals.items() if snapshot.get("id") == user_id]:
+                del self._principals[subject]
+
+    def publish_user_invalidation(self, user_ids: Set[Any]) -> None:
+        for user_id in user_ids:
+            self.invalidate_user(user_id)
+            self._publish({"user_id": user_id})
+
+    def clear(self) -> None:
+        with self._lock:
+            self._claims.clear()
+            self._principals.clear()
+
+    # --- Replication ---
+    def _publish(self, message: Dict[str, Any]) -> None:
+        try:
+            from app.core.database import redis_manager
+            client = redis_manager.get_client()
+            if client:
+                client.publish(INVALIDATION_CHANNEL, json.dumps(message))
+        except Exception as e:
+            # Other processes fall back to TTLs (principals) and Redis lookups (revocations)
+            logger.warning("Failed to publish auth invalidation", error=str(e))
+
+    def _on_message(self, message: Dict[str, Any]) -> None:
+        try:
+            data = json.loads(message.get("data") or "{}")
+            if data.get("probe") is not None and data["probe"] == self._probe:
+                self._probe_seen.set()
+            if data.get("jti"):
+                self.revocations.add(data["jti"], float(data.get("exp") or 0))
+            if data.get("user_id") is not None:
+                self.invalidate_user(data["user_id"])
+        except Exception as e:
+            logger.warning("Invalid auth invalidation message", error=str(e))
+
+    def start_listener(self) -> bool:
+        """Subscribe to invalidations, then load the revocation snapshot"""
+        if self._listener is not None:
+            return True
+        try:
+            from app.core.database import redis_manager
+            if not redis_manager.redis_available:
+                return False
+            client = redis_manager.get_client()
+            # Subscribe first so revocations made during the snapshot load are not missed
+            self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_message})
+            self._listener = self._pubsub.run_in_thread(
+                sleep_time=1.0, daemon=True, exception_handler=self._on_listener_error
+            )
+        except Exception as e:
+            logger.warning("Failed to start auth cache listener", error=str(e))
+            self.stop_listener()
+            return False
+
+        self._stopping.clear()
+        try:
+            loaded = self._resync(client)
+            logger.info("Auth cache listener started", revoked_tokens=loaded)
+        except Exception as e:
+            # The resync thread keeps trying; until then callers use Redis lookups
+            logger.warning("Auth cache snapshot load failed", error=str(e))
+            self._resync_wanted.set()
+        self._resync_thread = threading.Thread(
+            target=self._resync_loop, args=(client,), name="auth-cache-resync", daemon=True
+        )
+        self._resync_thread.start()
+        return True
+
+    def _on_listener_error(self, error: BaseException, pubsub: Any, thread: Any) -> None:
+        # Runs on the listener thread, which retries (and resubscribes) after this returns;
+        # messages may be lost meanwhile, so the replica is no longer authoritative
+        if self.revocations.ready:
+            logger.warning("Auth cache listener lost its connection; using Redis lookups", error=str(error))
+        self._listener_errors += 1
+        self.revocations.ready = False
+        self._resync_wanted.set()
+        time.sleep(_RETRY_SECONDS)
+
+    def _resync(self, client: Any) -> int:
+        """Confirm the subscription delivers, then reload the snapshot and mark the replica ready"""
+        errors = self._listener_errors
+        self._probe = uuid.uuid4().hex
+        self._probe_seen.clear()
+        client.publish(INVALIDATION_CHANNEL, json.dumps({"probe": self._probe}))
+        if not self._probe_seen.wait(_PROBE_TIMEOUT):
+            self.revocations.ready = False
+            raise TimeoutError("Invalidation subscription is not delivering messages")
+        # Anything revoked from here on arrives over the subscription
+        loaded = self.revocations.load(client)
+        if self._listener_errors != errors:
+            # The subscription dropped during this resync; the next one will retry
+            raise ConnectionError("Invalidation listener failed during resync")
+        self.revocations.ready = True
+        return loaded
+
+    def _resync_loop(self, client: Any) -> None:
+        while not self._stopping.is_set():
+            self._resync_wanted.wait(settings.AUTH_REVOCATION_RESYNC_SECONDS)
+            if self._stopping.is_set():
+                return
+            self._resync_wanted.clear()
+            try:
+                loaded = self._resync(client)
+                logger.debug("Auth cache revocations resynced", revoked_tokens=loaded)
+            except Exception as e:
+                logger.warning("Auth cache resync failed", error=str(e))
+                self._stopping.wait(_RETRY_SECONDS)
+                self._resync_wanted.set()
+
+    def stop_listener(self) -> None:
+        self.revocations.ready = False
+        self._stopping.set()
+        self._resync_wanted.set()
+        if self._listener is not None:
+            try:
+                self._listener.stop()
+                self._pubsub.close()
+            except Exception as e:
+                logger.warning("Failed to stop auth cache listener", error=str(e))
+        self._listener = None
+        self._pubsub = None
+        self._resync_thread = None
+
+
+# Global instance
+auth_cache = AuthCache()
+
+
+# Drop cached principals in every process once a user change commits
+def _queue_user_invalidation(mapper, connection, target) -> None:
+    session = Session.object_session(target)
+    if session is not None and target.id is not None:
+        session.info.setdefault("auth_cache_user_ids", set()).add(target.id)
+
+
+def _publish_user_invalidations(session: Session) -> None:
+    user_ids = session.info.pop("auth_cache_user_ids", None)
+    if user_ids:
+        auth_cache.publish_user_invalidation(user_ids)
+
+
+event.listen(User, "after_update", _queue_user_invalidation)
+event.listen(User, "after_delete", _queue_user_invalidation)
+event.listen(Session, "after_commit", _publish_user_invalidations)
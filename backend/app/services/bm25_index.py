@@ -0,0 +1,380 @@
+"""
+Persistent, incrementally maintained BM25 inverted index (one per workspace)
+"""
+
+import base64
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.utils.delta_log import DeltaLog
+
+logger = structlog.get_logger()
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+_SAFE_NAME_PATTERN = re.compile(r"[^A-Za-z0-9_.-]")
+
+# Compact tombstoned documents once they make up this share of the index
+_COMPACTION_RATIO = 0.25
+_INDEX_FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokenizer shared by indexing and querying"""
+    return _TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+class BM25Index:
+    """Inverted index for a single workspace.
+
+    Posting lists are stored as parallel ``array('I')`` buffers of internal
+    document ids and term frequencies, so memory stays compact and scoring a
+    query only touches the postings of its terms.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # Internal doc id -> chunk id / document id / length (None = deleted)
+        self.doc_chunk_ids: List[Optional[str]] = []
+        self.doc_document_ids = array("q")
+        self.doc_lengths = array("I")
+        self.chunk_to_doc: Dict[str, int] = {}
+        # term -> (doc ids, term frequencies)
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.total_length = 0
+        self.live_docs = 0
+
+    def __len__(self) -> int:
+        return self.live_docs
+
+    def add(self, chunk_id: str, text: str, document_id: int = 0) -> None:
+        """Add (or replace) a chunk in the index"""
+        if chunk_id in self.chunk_to_doc:
+            self.remove(chunk_id)
+
+        terms = tokenize(text)
+        doc_id = len(self.doc_chunk_ids)
+        self.doc_chunk_ids.append(chunk_id)
+        self.doc_document_ids.append(int(document_id or 0))
+        self.doc_lengths.append(len(terms))
+        self.chunk_to_doc[chunk_id] = doc_id
+
+        frequencies: Dict[str, int] = {}
+        for term in terms:
+            frequencies[term] = frequencies.get(term, 0) + 1
+        for term, tf in frequencies.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = (array("I"), array("I"))
+                self.postings[term] = posting
+            posting[0].append(doc_id)
+            posting[1].append(tf)
+
+        self.total_length += len(terms)
+        self.live_docs += 1
+
+    def add_many(self, items: Iterable[Tuple[str, str, int]]) -> None:
+        """Add ``(chunk_id, text, document_id)`` tuples"""
+        for chunk_id, text, document_id in items:
+            self.add(chunk_id, text, document_id)
+        self._maybe_compact()
+
+    def remove(self, chunk_id: str) -> bool:
+        """Tombstone a chunk; postings are dropped on the next compaction"""
+        doc_id = self.chunk_to_doc.pop(chunk_id, None)
+        if doc_id is None:
+            return False
+        self.total_length -= self.doc_lengths[doc_id]
+        self.doc_chunk_ids[doc_id] = None
+        self.live_docs -= 1
+        return True
+
+    def remove_document(self, document_id: int) -> int:
+        """Tombstone every chunk belonging to a document"""
+        removed = 0
+        for doc_id, chunk_id in enumerate(self.doc_chunk_ids):
+            if chunk_id is not None and self.doc_document_ids[doc_id] == document_id:
+                self.remove(chunk_id)
+                removed += 1
+        self._maybe_compact()
+        return removed
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Score the query against the index in O(query terms x postings)"""
+        if self.live_docs == 0:
+            return []
+
+        avg_length = self.total_length / self.live_docs if self.live_docs else 0.0
+        k1, b = self.k1, self.b
+        doc_chunk_ids = self.doc_chunk_ids
+        doc_lengths = self.doc_lengths
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tfs = posting
+            df = sum(1 for doc_id in doc_ids if doc_chunk_ids[doc_id] is not None)
+            if df == 0:
+                continue
+            idf = math.log(1.0 + (self.live_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in zip(doc_ids, tfs):
+                if doc_chunk_ids[doc_id] is None:
+                    continue
+                norm = k1 * (1.0 - b + b * doc_lengths[doc_id] / avg_length) if avg_length else k1
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(doc_chunk_ids[doc_id], score) for doc_id, score in ranked]
+
+    def _maybe_compact(self) -> None:
+        tombstones = len(self.doc_chunk_ids) - self.live_docs
+        if tombstones and tombstones >= _COMPACTION_RATIO * len(self.doc_chunk_ids):
+            self.compact()
+
+    def compact(self) -> None:
+        """Drop tombstoned documents and renumber postings"""
+        remap: Dict[int, int] = {}
+        doc_chunk_ids: List[Optional[str]] = []
+        doc_document_ids = array("q")
+        doc_lengths = array("I")
+        for old_id, chunk_id in enumerate(self.doc_chunk_ids):
+            if chunk_id is None:
+                continue
+            remap[old_id] = len(doc_chunk_ids)
+            doc_chunk_ids.append(chunk_id)
+            doc_document_ids.append(self.doc_document_ids[old_id])
+            doc_lengths.append(self.doc_lengths[old_id])
+
+        postings: Dict[str, Tuple[array, array]] = {}
+        for term, (doc_ids, tfs) in self.postings.items():
+            new_ids, new_tfs = array("I"), array("I")
+            for doc_id, tf in zip(doc_ids, tfs):
+                new_id = remap.get(doc_id)
+                if new_id is not None:
+                    new_ids.append(new_id)
+                    new_tfs.append(tf)
+            if new_ids:
+                postings[term] = (new_ids, new_tfs)
+
+        self.doc_chunk_ids = doc_chunk_ids
+        self.doc_document_ids = doc_document_ids
+        self.doc_lengths = doc_lengths
+        self.chunk_to_doc = {chunk_id: i for i, chunk_id in enumerate(doc_chunk_ids)}
+        self.postings = postings
+
+    def to_bytes(self) -> bytes:
+        """Serialize the (compacted) index to a zlib-compressed JSON payload"""
+        if len(self.doc_chunk_ids) != self.live_docs:
+            self.compact()
+
+        def _encode(buffer: array) -> str:
+            return base64.b64encode(buffer.tobytes()).decode("ascii")
+
+        payload = {
+            "version": _INDEX_FORMAT_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "chunk_ids": self.doc_chunk_ids,
+            "document_ids": _encode(self.doc_document_ids),
+            "lengths": _encode(self.doc_lengths),
+            "postings": {
+                term: [_encode(doc_ids), _encode(tfs)]
+                for term, (doc_ids, tfs) in self.postings.items()
+            },
+        }
+        return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BM25Index":
+        """Load an index written by :meth:`to_bytes`"""
+        payload = json.loads(zlib.decompress(data).decode("utf-8"))
+        if payload.get("version") != _INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index version: {payload.get('version')}")
+
+        def _decode(typecode: str, encoded: str) -> array:
+            buffer = array(typecode)
+            buffer.frombytes(base64.b64decode(encoded))
+            return buffer
+
+        index = cls(k1=payload["k1"], b=payload["b"])
+        index.doc_chunk_ids = list(payload["chunk_ids"])
+        index.doc_document_ids = _decode("q", payload["document_ids"])
+        index.doc_lengths = _decode("I", payload["lengths"])
+        index.chunk_to_doc = {chunk_id: i for i, chunk_id in enumerate(index.doc_chunk_ids)}
+        index.postings = {
+            term: (_decode("I", doc_ids), _decode("I", tfs))
+            for term, (doc_ids, tfs) in payload["postings"].items()
+        }
+        index.total_length = sum(index.doc_lengths)
+        index.live_docs = len(index.doc_chunk_ids)
+        return index
+
+
+class _WorkspaceState:
+    """This process's copy of one workspace index"""
+
+    def __init__(self, log: DeltaLog):
+        self.lock = threading.Lock()
+        self.index = BM25Index()
+        self.log = log
+
+
+class BM25IndexManager:
+    """Per-workspace BM25 indexes shared by every process using ``index_dir``.
+
+    A workspace is stored as a snapshot (``<ws>.bm25``) plus a
+    :class:`~app.utils.delta_log.DeltaLog` (``<ws>.log``) with one line per
+    add or removal, so concurrent workers never overwrite each other's
+    documents and each replays the others' changes before serving a search.
+    Once the log outgrows the snapshot it is folded into a new one. Locks
+    are per workspace, so indexing one workspace never blocks searches in
+    another.
+    """
+
+    def __init__(self, index_dir: Optional[str] = None):
+        self.index_dir = index_dir or settings.BM25_INDEX_DIR
+        self._workspaces: Dict[str, _WorkspaceState] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, workspace_id: str, suffix: str) -> str:
+        safe_name = _SAFE_NAME_PATTERN.sub("_", str(workspace_id))
+        return os.path.join(self.index_dir, f"{safe_name}{suffix}")
+
+    def _state(self, workspace_id: str) -> _WorkspaceState:
+        with self._lock:
+            state = self._workspaces.get(workspace_id)
+            if state is None:
+                state = self._workspaces[workspace_id] = _WorkspaceState(DeltaLog(
+                    self._path(workspace_id, ".log"),
+                    self._path(workspace_id, ".bm25"),
+                    self._path(workspace_id, ".lock")
+                ))
+            return state
+
+    def _load_snapshot(self, workspace_id: str) -> BM25Index:
+        path = self._path(workspace_id, ".bm25")
+        if not os.path.exists(path):
+            return BM25Index()
+        try:
+            with open(path, "rb") as f:
+                return BM25Index.from_bytes(f.read())
+        except Exception as e:
+            logger.warning("Failed to load BM25 index, starting empty", workspace_id=workspace_id, error=str(e))
+            return BM25Index()
+
+    @staticmethod
+    def _apply(index: BM25Index, op: Dict[str, Any]) -> int:
+        if "add" in op:
+            before = len(index)
+            index.add_many((chunk_id, text, document_id) for chunk_id, text, document_id in op["add"])
+            return len(index) - before
+        if "remove_document" in op:
+            return index.remove_document(op["remove_document"])
+        raise ValueError(f"Unknown BM25 log entry: {sorted(op)}")
+
+    def _sync(self, workspace_id: str, state: _WorkspaceState) -> None:
+        """Replay changes made by other processes (workspace and file lock held)"""
+        reload, ops = state.log.read()
+        if reload:
+            state.index = self._load_snapshot(workspace_id)
+        for op in ops:
+            try:
+                self._apply(state.index, op)
+            except Exception as e:
+                logger.warning("Skipping unreadable BM25 log entry", workspace_id=workspace_id, error=str(e))
+
+    def _refresh(self, workspace_id: str, state: _WorkspaceState) -> None:
+        if not state.log.is_current():
+            with state.log.locked(exclusive=False):
+                self._sync(workspace_id, state)
+
+    def _checkpoint(self, workspace_id: str, state: _WorkspaceState) -> None:
+        """Fold the log into a new snapshot (file lock held).
+
+        A crash before the log restarts leaves the new snapshot with the old
+        log; replaying it again is harmless because adds replace chunks and
+        removals of removed documents are no-ops.
+        """
+        path = self._path(workspace_id, ".bm25")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(state.index.to_bytes())
+        os.replace(tmp_path, path)
+        state.log.restart()
+
+    def _write(self, workspace_id: str, op: Dict[str, Any]) -> int:
+        state = self._state(workspace_id)
+        with state.lock, state.log.locked(exclusive=True):
+            self._sync(workspace_id, state)
+            state.log.append(op)
+            changed = self._apply(state.index, op)
+            if state.log.needs_checkpoint():
+                self._checkpoint(workspace_id, state)
+            return changed
+
+    def get_index(self, workspace_id: str) -> BM25Index:
+        """Return this process's up-to-date copy of the workspace index"""
+        state = self._state(workspace_id)
+        with state.lock:
+            self._refresh(workspace_id, state)
+            return state.index
+
+    def add_documents(self, workspace_id: str, items: Iterable[Tuple[str, str, int]]) -> int:
+        """Incrementally index ``(chunk_id, text, document_id)`` tuples"""
+        items = [[chunk_id, text, int(document_id or 0)] for chunk_id, text, document_id in items]
+        if not items:
+            return 0
+        return self._write(workspace_id, {"add": items})
+
+    def remove_document(self, workspace_id: str, document_id: int) -> int:
+        """Remove all chunks of a document from the workspace index"""
+        return self._write(workspace_id, {"remove_document": int(document_id)})
+
+    def search(self, workspace_id: str, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Return ``(chunk_id, score)`` pairs ranked by BM25"""
+        state = self._state(workspace_id)
+        with state.lock:
+            self._refresh(workspace_id, state)
+            return state.index.search(query, top_k)
+
+    def save(self, workspace_id: str) -> None:
+        """Fold the workspace's change log into its snapshot now"""
+        state = self._state(workspace_id)
+        with state.lock, state.log.locked(exclusive=True):
+            self._sync(workspace_id, state)
+            if state.log.epoch is not None:
+                self._checkpoint(workspace_id, state)
+
+    def delete_workspace(self, workspace_id: str) -> None:
+        """Drop a workspace index from memory and disk"""
+        state = self._state(workspace_id)
+        with state.lock, state.log.locked(exclusive=True):
+            for suffix in (".bm25", ".bm25.tmp", ".log", ".log.tmp"):
+                path = self._path(workspace_id, suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+            state.index = BM25Index()
+            state.log.forget()
+
+    def clear(self) -> None:
+        """Drop every index (used by tests and resets)"""
+        with self._lock:
+            self._workspaces.clear()
+            if os.path.isdir(self.index_dir):
+                shutil.rmtree(self.index_dir, ignore_errors=True)
+
+
+# Global instance (singleton)
+bm25_index_manager = BM25IndexManager()
@@ -1,6 +1,7 @@
 # Advanced Caching Service for CustomerCareGPT
 # Multi-tier caching with intelligent invalidation and performance optimization
 
+import fnmatch
 import json
 import hashlib
 import time
@@ -9,8 +10,9 @@ from typing import Any, Dict, List, Optional, Union, Callable, Tuple
 from functools import wraps
 from datetime import datetime, timedelta
 import structlog
-from app.core.database import redis_manager
+from app.core.async_redis import async_redis
 from app.core.config import settings
+from app.services.cache_tags import cache_tags, sweep, workspace_tag
 
 logger = structlog.get_logger()
 
@@ -73,7 +75,7 @@ class CacheService:
     """Advanced caching service with multiple strategies"""
     
     def __init__(self):
-        self.redis = redis_manager.get_client()
+        self.redis = async_redis
         self.stats = CacheStats()
         self.local_cache = {}  # L1 cache
         self.local_cache_ttl = {}  # TTL for local cache
@@ -127,19 +129,18 @@ class CacheService:
                     self.local_cache_ttl.pop(key, None)
             
             # Check L2 cache (Redis)
-            if self.redis.redis_available:
-                cached_value = self.redis.get(key)
-                if cached_value is not None:
-                    try:
-                        value = json.loads(cached_value)
-                        # Store in L1 cache
-                        self.local_cache[key] = value
-                        self.local_cache_ttl[key] = current_time + 60  # 1 minute TTL for L1
-                        self.stats.hits += 1
-                        return value
-                    except (json.JSONDecodeError, TypeError):
-                        # Invalid cached data, remove it
-                        self.redis.delete(key)
+            cached_value = await self.redis.get(key)
+            if cached_value is not None:
+                try:
+                    value = json.loads(cached_value)
+                    # Store in L1 cache
+                    self.local_cache[key] = value
+                    self.local_cache_ttl[key] = current_time + 60  # 1 minute TTL for L1
+                    self.stats.hits += 1
+                    return value
+                except (json.JSONDecodeError, TypeError):
+                    # Invalid cached data, remove it
+                    await self.redis.delete(key)
             
             self.stats.misses += 1
             return default
@@ -151,6 +152,42 @@ class CacheService:
         finally:
             self._cleanup_local_cache()
     
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Get several values at once (L1, then one MGET for the rest); misses are omitted"""
+        self.stats.total_requests += len(keys)
+        found: Dict[str, Any] = {}
+        try:
+            current_time = time.time()
+            missing = []
+            for key in keys:
+                if key in self.local_cache and current_time < self.local_cache_ttl.get(key, 0):
+                    found[key] = self.local_cache[key]
+                else:
+                    missing.append(key)
+            
+            if missing:
+                for key, cached_value in (await self.redis.get_many(missing)).items():
+                    if cached_value is None:
+                        continue
+                    try:
+                        value = json.loads(cached_value)
+                    except (json.JSONDecodeError, TypeError):
+                        continue
+                    self.local_cache[key] = value
+                    self.local_cache_ttl[key] = current_time + 60  # 1 minute TTL for L1
+                    found[key] = value
+            
+            self.stats.hits += len(found)
+            self.stats.misses += len(keys) - len(found)
+            return found
+            
+        except Exception as e:
+            logger.error("Cache get_many error", keys=len(keys), error=str(e))
+            self.stats.errors += 1
+            return found
+        finally:
+            self._cleanup_local_cache()
+    
     async def set(
         self, 
         key: str, 
@@ -166,12 +203,11 @@ class CacheService:
             self.local_cache_ttl[key] = current_time + (ttl or 300)  # Default 5 minutes for L1
             
             # Set in L2 cache (Redis)
-            if self.redis.redis_available:
-                serialized_value = json.dumps(value, default=str)
-                if ttl:
-                    self.redis.setex(key, ttl, serialized_value)
-                else:
-                    self.redis.set(key, serialized_value)
+            serialized_value = json.dumps(value, default=str)
+            if ttl:
+                await self.redis.setex(key, ttl, serialized_value)
+            else:
+                await self.redis.set(key, serialized_value)
             
             self.stats.sets += 1
             return True
@@ -189,8 +225,7 @@ class CacheService:
             self.local_cache_ttl.pop(key, None)
             
             # Remove from L2 cache
-            if self.redis.redis_available:
-                self.redis.delete(key)
+            await self.redis.delete(key)
             
             self.stats.deletes += 1
             return True
@@ -201,22 +236,24 @@ class CacheService:
             return False
     
     async def delete_pattern(self, pattern: str) -> int:
-        """Delete all keys matching pattern"""
+        """Delete all keys matching a glob pattern.
+        
+        Walks the keyspace with SCAN; prefer :meth:`invalidate_tags` for
+        anything invalidated routinely.
+        """
         try:
             deleted_count = 0
             
             # Delete from L1 cache
-            keys_to_delete = [k for k in self.local_cache.keys() if pattern in k]
+            keys_to_delete = [k for k in self.local_cache.keys() if fnmatch.fnmatchcase(k, pattern)]
             for key in keys_to_delete:
                 self.local_cache.pop(key, None)
                 self.local_cache_ttl.pop(key, None)
                 deleted_count += 1
             
-            # Delete from L2 cache
-            if self.redis.redis_available:
-                keys = self.redis.keys(pattern)
-                if keys:
-                    deleted_count += self.redis.delete(*keys)
+            # Delete from L2 cache, one SCAN batch at a time
+            async for keys in sweep(self.redis, pattern):
+                deleted_count += await self.redis.delete(*keys)
             
             return deleted_count
             
@@ -239,10 +276,7 @@ class CacheService:
                     self.local_cache_ttl.pop(key, None)
             
             # Check L2 cache
-            if self.redis.redis_available:
-                return bool(self.redis.exists(key))
-            
-            return False
+            return bool(await self.redis.exists(key))
             
         except Exception as e:
             logger.error("Cache exists error", key=key, error=str(e))
@@ -271,6 +305,14 @@ class CacheService:
         await self.set(key, value, ttl)
         return value
     
+    async def invalidate_tags(self, *tags: str) -> None:
+        """Invalidate every key built with :meth:`tagged_key` from these tags"""
+        await cache_tags.invalidate(*tags)
+    
+    async def tagged_key(self, key: str, *tags: str) -> str:
+        """``key`` under the current generation of ``tags``; entries must carry a TTL"""
+        return await cache_tags.tagged(key, *tags)
+    
     async def invalidate_namespace(self, namespace: str) -> int:
         """Invalidate all keys in a namespace"""
         pattern = f"{namespace}:*"
@@ -288,8 +330,8 @@ class CacheService:
             self.local_cache_ttl.clear()
             
             # Clear L2 cache
-            if self.redis.redis_available:
-                self.redis.flushdb()
+            if self.redis.available:
+                await self.redis.flushdb()
             
             return True
             
@@ -424,6 +466,8 @@ class QueryCache:
             query_key,
             workspace_id=workspace_id
         )
+        if workspace_id:
+            cache_key = await cache_service.tagged_key(cache_key, workspace_tag("query", workspace_id))
         
         return await cache_service.get_or_set(
             cache_key,
@@ -434,8 +478,7 @@ class QueryCache:
     @staticmethod
     async def invalidate_workspace(workspace_id: str):
         """Invalidate all queries for a workspace"""
-        pattern = f"query:*:workspace_id:{workspace_id}"
-        await cache_service.delete_pattern(pattern)
+        await cache_service.invalidate_tags(workspace_tag("query", workspace_id))
 
 class APICache:
     """API response caching"""
@@ -457,6 +500,8 @@ class APICache:
             params_hash,
             workspace_id=workspace_id
         )
+        if workspace_id:
+            cache_key = await cache_service.tagged_key(cache_key, workspace_tag(f"api:{endpoint}", workspace_id))
         
         return await cache_service.get_or_set(
             cache_key,
@@ -468,11 +513,9 @@ class APICache:
     async def invalidate_endpoint(endpoint: str, workspace_id: Optional[str] = None):
         """Invalidate all responses for an endpoint"""
         if workspace_id:
-            pattern = f"api:{endpoint}:*:workspace_id:{workspace_id}"
+            await cache_service.invalidate_tags(workspace_tag(f"api:{endpoint}", workspace_id))
         else:
-            pattern = f"api:{endpoint}:*"
-        
-        await cache_service.delete_pattern(pattern)
+            await cache_service.delete_pattern(f"api:{endpoint}:*")
 
 class VectorCache:
     """Vector search result caching"""
@@ -486,10 +529,9 @@ class VectorCache:
     ) -> Any:
         """Cache vector search results"""
         query_hash = CacheKey.hash_data(query)
-        cache_key = CacheKey.build(
-            "vector_search",
-            workspace_id,
-            query_hash
+        cache_key = await cache_service.tagged_key(
+            CacheKey.build("vector_search", workspace_id, query_hash),
+            workspace_tag("vector_search", workspace_id)
         )
         
         return await cache_service.get_or_set(
@@ -501,5 +543,4 @@ class VectorCache:
     @staticmethod
     async def invalidate_workspace(workspace_id: str):
         """Invalidate all vector searches for a workspace"""
-        pattern = f"vector_search:{workspace_id}:*"
-        await cache_service.delete_pattern(pattern)
+        await cache_service.invalidate_tags(workspace_tag("vector_search", workspace_id))
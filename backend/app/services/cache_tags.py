@@ -0,0 +1,151 @@
+"""
+Generation-based cache tags and SCAN sweeping.
+
+Cached keys are namespaced by the current generation of their tags (for
+example ``search:<workspace_id>``). Invalidating a tag is a single INCR:
+readers build different keys from then on and the orphaned entries age out
+on their own TTL, so the cost does not depend on how many keys exist.
+Where keys really must be enumerated, :func:`sweep` walks them with SCAN.
+"""
+
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import structlog
+
+from app.core.async_redis import async_redis
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+GENERATION_PREFIX = "cachegen:"
+
+
+def workspace_tag(namespace: str, workspace_id: Any) -> str:
+    """Tag covering one namespace (``search``, ``analytics``...) of one workspace"""
+    return f"{namespace}:{workspace_id}"
+
+
+def _parse_generation(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class CacheTags:
+    """Tag -> generation counters in Redis with a short-lived local copy.
+
+    An invalidation is visible in the issuing process immediately and in
+    other processes once their copy is older than ``local_ttl`` seconds.
+    """
+
+    def __init__(self, local_ttl: Optional[float] = None):
+        self.local_ttl = local_ttl if local_ttl is not None else settings.CACHE_TAG_LOCAL_TTL
+        self._generations: Dict[str, Tuple[int, float]] = {}
+
+    def _cached(self, tag: str) -> Optional[int]:
+        entry = self._generations.get(tag)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def _remember(self, tag: str, generation: int) -> int:
+        self._generations[tag] = (generation, time.monotonic() + self.local_ttl)
+        return generation
+
+    def _last_known(self, tag: str) -> int:
+        entry = self._generations.get(tag)
+        return entry[0] if entry is not None else 0
+
+    @staticmethod
+    def _format(key: str, generations: List[int]) -> str:
+        return f"{key}:g{'.'.join(map(str, generations))}"
+
+    # --- Async (event loop) ---
+    async def generations(self, *tags: str) -> List[int]:
+        missing = [tag for tag in tags if self._cached(tag) is None]
+        if missing:
+            try:
+                values = await async_redis.mget([f"{GENERATION_PREFIX}{tag}" for tag in missing])
+                for tag, value in zip(missing, values):
+                    self._remember(tag, _parse_generation(value))
+            except Exception as e:
+                logger.warning("Cache tag read failed", tags=missing, error=str(e))
+        return [self._last_known(tag) for tag in tags]
+
+    async def tagged(self, key: str, *tags: str) -> str:
+        """``key`` namespaced by the current generation of each tag"""
+        return self._format(key, await self.generations(*tags))
+
+    async def invalidate(self, *tags: str) -> None:
+        """Orphan every key built from these tags (one INCR per tag, pipelined)"""
+        try:
+            generations = await async_redis.execute_many(*[("incr", f"{GENERATION_PREFIX}{tag}") for tag in tags])
+        except Exception as e:
+            # Still stop serving the old entries from this process
+            logger.warning("Cache tag invalidation failed", tags=tags, error=str(e))
+            generations = [self._last_known(tag) + 1 for tag in tags]
+        for tag, generation in zip(tags, generations):
+            self._remember(tag, _parse_generation(generation))
+
+    # --- Sync (threadpool) ---
+    def _sync_client(self):
+        from app.core.database import redis_manager
+        return redis_manager.get_client()
+
+    def generations_sync(self, *tags: str) -> List[int]:
+        missing = [tag for tag in tags if self._cached(tag) is None]
+        if missing:
+            try:
+                client = self._sync_client()
+                for tag in missing:
+                    self._remember(tag, _parse_generation(client.get(f"{GENERATION_PREFIX}{tag}")))
+            except Exception as e:
+                logger.warning("Cache tag read failed", tags=missing, error=str(e))
+        return [self._last_known(tag) for tag in tags]
+
+    def tagged_sync(self, key: str, *tags: str) -> str:
+        return self._format(key, self.generations_sync(*tags))
+
+    def invalidate_sync(self, *tags: str) -> None:
+        try:
+            client = self._sync_client()
+            generations = [client.incr(f"{GENERATION_PREFIX}{tag}") for tag in tags]
+        except Exception as e:
+            logger.warning("Cache tag invalidation failed", tags=tags, error=str(e))
+            generations = [self._last_known(tag) + 1 for tag in tags]
+        for tag, generation in zip(tags, generations):
+            self._remember(tag, _parse_generation(generation))
+
+
+async def sweep(client: Any, pattern: str, count: Optional[int] = None) -> AsyncIterator[List[str]]:
+    """Yield batches of keys matching ``pattern`` using SCAN, never KEYS.
+
+    ``client`` is anything with a redis-py style async ``scan``
+    (``async_redis`` or a ``redis.asyncio`` client).
+    """
+    count = count or settings.CACHE_SWEEP_SCAN_COUNT
+    cursor = 0
+    while True:
+        cursor, keys = await client.scan(cursor=cursor, match=pattern, count=count)
+        if keys:
+            yield list(keys)
+        if not int(cursor):
+            break
+
+
+def sweep_sync(client: Any, pattern: str, count: Optional[int] = None) -> Iterator[List[str]]:
+    """Synchronous :func:`sweep` for redis-py clients"""
+    count = count or settings.CACHE_SWEEP_SCAN_COUNT
+    cursor = 0
+    while True:
+        cursor, keys = client.scan(cursor=cursor, match=pattern, count=count)
+        if keys:
+            yield list(keys)
+        if not int(cursor):
+            break
+
+
+# Global instance
+cache_tags = CacheTags()
@@ -11,6 +11,7 @@ import structlog
 
 from app.models.chat import ChatSession, ChatMessage
 from app.models.user import User
+from app.services.analytics_rollup import AnalyticsRollupService
 from app.services.vector_service import VectorService
 from app.services.gemini_service import GeminiService
 from app.services.support_context_service import support_context_service
@@ -42,6 +43,7 @@ class ChatService:
         # Save user message
         user_message = self._save_message(
             session_id=session.id,
+            workspace_id=session.workspace_id,
             role="user",
             content=message
         )
@@ -58,6 +60,7 @@ class ChatService:
         # Save AI response
         ai_message = self._save_message(
             session_id=session.id,
+            workspace_id=session.workspace_id,
             role="assistant",
             content=ai_response["content"],
             model_used=ai_response.get("model_used"),
@@ -109,8 +112,10 @@ class ChatService:
         
         # Create new session
         new_session_id = str(uuid.uuid4())
+        user = self.db.query(User).filter(User.id == user_id).first()
         session = ChatSession(
             user_id=user_id,
+            workspace_id=user.workspace_id if user else None,
             session_id=new_session_id,
             is_active=True
         )
@@ -118,6 +123,7 @@ class ChatService:
         self.db.add(session)
         self.db.commit()
         self.db.refresh(session)
+        AnalyticsRollupService(self.db).record_session_started(session)
         
         logger.info(
             "New chat session created",
@@ -130,6 +136,7 @@ class ChatService:
     def _save_message(
         self,
         session_id: int,
+        workspace_id: Any,
         role: str,
         content: str,
         model_used: Optional[str] = None,
@@ -153,6 +160,7 @@ class ChatService:
         self.db.add(message)
         self.db.commit()
         self.db.refresh(message)
+        AnalyticsRollupService(self.db).record_messages(workspace_id, [message])
         
         return message
     
@@ -198,7 +206,8 @@ class ChatService:
                 context=context_text,
                 sources=similar_chunks if has_docs else [],
                 tone=tone,
-                source_type=source_type
+                source_type=source_type,
+                workspace_id=workspace_id
             )
             
             return response
@@ -272,6 +281,8 @@ class ChatService:
             return False
         
         session.is_active = False
+        if session.ended_at is None:
+            AnalyticsRollupService(self.db).record_session_ended(session)
         session.ended_at = func.now()
         self.db.commit()
         
@@ -325,6 +336,7 @@ class ChatService:
         if not message:
             return False
         
+        AnalyticsRollupService(self.db).record_message_flagged(session.workspace_id, message)
         message.is_flagged = True
         message.flag_reason = reason
         self.db.commit()
@@ -12,6 +12,7 @@ import structlog
 from app.core.config import settings
 from app.core.queue import get_ingest_queue
 from app.models.document import Document, DocumentChunk
+from app.services.analytics_rollup import AnalyticsRollupService
 from app.utils.storage import get_storage_adapter, StorageAdapter
 from app.utils.file_validation import FileValidator
 from app.utils.plan_limits import PlanLimits
@@ -169,6 +170,7 @@ class DocumentService:
         )
         
         self.db.add(document)
+        AnalyticsRollupService(self.db).record_document_uploaded(document)
         self.db.commit()
         self.db.refresh(document)
         
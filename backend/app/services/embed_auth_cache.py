@@ -0,0 +1,187 @@
+"""
+In-process cache of embed-code auth records for the public widget endpoints
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+INVALIDATION_CHANNEL = "embed_auth:invalidate"
+
+
+@dataclass(frozen=True)
+class EmbedAuthRecord:
+    """What the widget needs to authorize a request, detached from the DB session"""
+    id: Any
+    workspace_id: Any
+    user_id: int
+    client_api_key: str
+    is_active: bool
+    expires_at: Optional[datetime] = None
+    allowed_origins: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def from_embed_code(cls, embed_code: Any) -> "EmbedAuthRecord":
+        origins = getattr(embed_code, "allowed_origins", None) or ""
+        return cls(
+            id=embed_code.id,
+            workspace_id=embed_code.workspace_id,
+            user_id=embed_code.user_id,
+            client_api_key=embed_code.client_api_key,
+            is_active=bool(embed_code.is_active),
+            expires_at=getattr(embed_code, "expires_at", None),
+            allowed_origins=frozenset(o.strip() for o in origins.split(",") if o.strip()),
+        )
+
+    def allows_origin(self, origin: Optional[str]) -> bool:
+        """True unless origins are restricted and ``origin`` is not one of them"""
+        return not self.allowed_origins or not origin or origin in self.allowed_origins
+
+
+class EmbedAuthCache:
+    """TTL + LRU map of client API key -> :class:`EmbedAuthRecord`.
+
+    Entries expire after ``ttl`` seconds as a safety net; edits made through
+    ``EmbedService`` invalidate them immediately in every process via Redis
+    pub/sub. Unknown keys are remembered for ``negative_ttl`` seconds so a
+    client retrying a bad key does not hit the database on every request.
+    """
+
+    def __init__(self, ttl: Optional[int] = None, max_size: Optional[int] = None,
+                 negative_ttl: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else settings.EMBED_AUTH_CACHE_TTL
+        self.max_size = max_size if max_size is not None else settings.EMBED_AUTH_CACHE_SIZE
+        self.negative_ttl = negative_ttl if negative_ttl is not None else settings.EMBED_AUTH_NEGATIVE_TTL
+        self._entries: "OrderedDict[str, Tuple[EmbedAuthRecord, float]]" = OrderedDict()
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pubsub = None
+        self._listener = None
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "invalidations": 0}
+
+    def get(self, client_api_key: str) -> Optional[EmbedAuthRecord]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(client_api_key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[client_api_key]
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(client_api_key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def put(self, record: EmbedAuthRecord) -> None:
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[record.client_api_key] = (record, time.monotonic() + self.ttl)
+            self._entries.move_to_end(record.client_api_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def is_missing(self, client_api_key: str) -> bool:
+        """True if ``client_api_key`` was recently looked up and not found"""
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._missing.get(client_api_key)
+            if expires_at is None or expires_at <= now:
+                if expires_at is not None:
+                    del self._missing[client_api_key]
+                return False
+            self.stats["negative_hits"] += 1
+            return True
+
+    def put_missing(self, client_api_key: str) -> None:
+        if self.negative_ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._missing[client_api_key] = time.monotonic() + self.negative_ttl
+            self._missing.move_to_end(client_api_key)
+            while len(self._missing) > self.max_size:
+                self._missing.popitem(last=False)
+
+    def invalidate(self, client_api_key: Optional[str] = None, embed_code_id: Optional[str] = None) -> None:
+        """Drop entries matching the API key or the embed code id (this process only)"""
+        with self._lock:
+            if client_api_key:
+                self._entries.pop(client_api_key, None)
+                self._missing.pop(client_api_key, None)
+            if embed_code_id:
+                for key in [k for k, (record, _) in self._entries.items() if str(record.id) == embed_code_id]:
+                    del self._entries[key]
+            self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._missing.clear()
+
+    def publish_invalidation(self, client_api_key: Optional[str] = None, embed_code_id: Optional[str] = None) -> None:
+        """Invalidate locally and tell every other process to do the same"""
+        self.invalidate(client_api_key=client_api_key, embed_code_id=embed_code_id)
+        try:
+            from app.core.database import redis_manager
+            client = redis_manager.get_client()
+            if client:
+                client.publish(
+                    INVALIDATION_CHANNEL,
+                    json.dumps({"client_api_key": client_api_key, "embed_code_id": embed_code_id})
+                )
+        except Exception as e:
+            # Other processes fall back to the TTL
+            logger.warning("Failed to publish embed auth invalidation", error=str(e))
+
+    def _on_message(self, message: Dict[str, Any]) -> None:
+        try:
+            data = json.loads(message.get("data") or "{}")
+            self.invalidate(
+                client_api_key=data.get("client_api_key"),
+                embed_code_id=data.get("embed_code_id")
+            )
+        except Exception as e:
+            logger.warning("Invalid embed auth invalidation message", error=str(e))
+
+    def start_listener(self) -> bool:
+        """Subscribe to invalidations on a background thread"""
+        if self._listener is not None:
+            return True
+        try:
+            from app.core.database import redis_manager
+            if not redis_manager.redis_available:
+                return False
+            self._pubsub = redis_manager.get_client().pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_message})
+            self._listener = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+            logger.info("Embed auth cache invalidation listener started")
+            return True
+        except Exception as e:
+            logger.warning("Failed to start embed auth invalidation listener", error=str(e))
+            self._pubsub = None
+            self._listener = None
+            return False
+
+    def stop_listener(self) -> None:
+        if self._listener is not None:
+            try:
+                self._listener.stop()
+                self._pubsub.close()
+            except Exception as e:
+                logger.warning("Failed to stop embed auth invalidation listener", error=str(e))
+        self._listener = None
+        self._pubsub = None
+
+
+# Global instance
+embed_auth_cache = EmbedAuthCache()
@@ -8,12 +8,13 @@ import hashlib
 from typing import Optional, List, Dict, Any
 import json
 from sqlalchemy.orm import Session
-from sqlalchemy.sql import func
 import structlog
 
 from app.models.embed import EmbedCode, WidgetAsset
 from app.core.config import settings
 from app.services.ab_testing_service import ABTestingService
+from app.services.embed_auth_cache import EmbedAuthRecord, embed_auth_cache
+from app.services.usage_buffer import usage_buffer
 
 logger = structlog.get_logger()
 
@@ -117,6 +118,23 @@ class EmbedService:
             EmbedCode.is_active == True
         ).first()
     
+    def resolve_embed_auth(self, client_api_key: str) -> Optional[EmbedAuthRecord]:
+        """Resolve a client API key to its auth record, served from cache when possible"""
+        record = embed_auth_cache.get(client_api_key)
+        if record is not None:
+            return record
+        if embed_auth_cache.is_missing(client_api_key):
+            return None
+        
+        embed_code = self.get_embed_code_by_api_key(client_api_key)
+        if not embed_code:
+            embed_auth_cache.put_missing(client_api_key)
+            return None
+        
+        record = EmbedAuthRecord.from_embed_code(embed_code)
+        embed_auth_cache.put(record)
+        return record
+    
     def get_embed_code_by_id(self, code_id: str, user_id: int) -> Optional[EmbedCode]:
         """Get embed code by ID for specific user"""
         return self.db.query(EmbedCode).filter(
@@ -162,6 +180,10 @@ class EmbedService:
         
         self.db.commit()
         self.db.refresh(embed_code)
+        embed_auth_cache.publish_invalidation(
+            client_api_key=embed_code.client_api_key,
+            embed_code_id=str(embed_code.id)
+        )
         return embed_code
     
     def delete_embed_code(self, code_id: str, user_id: int) -> bool:
@@ -170,8 +192,10 @@ class EmbedService:
         if not embed_code:
             return False
         
+        client_api_key = embed_code.client_api_key
         self.db.delete(embed_code)
         self.db.commit()
+        embed_auth_cache.publish_invalidation(client_api_key=client_api_key, embed_code_id=code_id)
         return True
     
     def regenerate_embed_code(self, code_id: str, user_id: int) -> Optional[EmbedCode]:
@@ -195,6 +219,10 @@ class EmbedService:
         
         self.db.commit()
         self.db.refresh(embed_code)
+        embed_auth_cache.publish_invalidation(
+            client_api_key=embed_code.client_api_key,
+            embed_code_id=str(embed_code.id)
+        )
         return embed_code
     
     def get_widget_script(self, code_id: str) -> Optional[str]:
@@ -210,15 +238,12 @@ class EmbedService:
         return embed_code.embed_script
     
     def increment_usage(self, code_id: str):
-        """Increment usage count for embed code"""
-        embed_code = self.db.query(EmbedCode).filter(
-            EmbedCode.id == uuid.UUID(code_id)
-        ).first()
+        """Increment usage count for embed code.
         
-        if embed_code:
-            embed_code.usage_count += 1
-            embed_code.last_used = func.now()
-            self.db.commit()
+        The increment is buffered and written to ``usage_count`` /
+        ``last_used`` by the periodic usage flush.
+        """
+        usage_buffer.record_embed_usage(code_id)
     
     def _generate_client_api_key(self, workspace_id: str) -> str:
         """Generate a secure client API key"""
@@ -0,0 +1,162 @@
+"""
+Dynamic micro-batching of embedding requests shared across concurrent callers
+"""
+
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent encode requests into batched model calls.
+
+    Callers submit texts and await per-text futures. A background task takes
+    the first queued text, keeps collecting until ``max_batch_size`` texts
+    are queued or ``max_wait_ms`` has passed, then runs a single ``encode``
+    call on a dedicated thread and resolves every future in the batch.
+    While a batch is encoding, the next one accumulates in the queue.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], Any],
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        name: str = "embedding"
+    ):
+        self._encode = encode
+        self.max_batch_size = max(1, max_batch_size or settings.EMBEDDING_QUERY_MAX_BATCH_SIZE)
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else settings.EMBEDDING_BATCH_MAX_WAIT_MS) / 1000.0
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-batcher")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.stats = {"batches": 0, "texts": 0, "max_batch": 0, "errors": 0}
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed a single text, batched with any concurrent requests"""
+        return (await self.embed_many([text]))[0]
+
+    async def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed several texts; they may be split across batches"""
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        self._ensure_worker(loop)
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._queue.put_nowait((text, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    def _ensure_worker(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._loop is not loop:
+            # Queues and tasks belong to one event loop
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush(loop, batch)
+
+            if queue.empty():
+                # Exit when idle; the next request starts a fresh worker
+                self._worker = None
+                return
+
+    async def _flush(self, loop: asyncio.AbstractEventLoop, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        pending = [(text, future) for text, future in batch if not future.done()]
+        if not pending:
+            return
+
+        # Encode each distinct text once
+        unique_texts: List[str] = []
+        positions: Dict[str, int] = {}
+        for text, _ in pending:
+            if text not in positions:
+                positions[text] = len(unique_texts)
+                unique_texts.append(text)
+
+        try:
+            embeddings = await loop.run_in_executor(self._executor, self._encode, unique_texts)
+            rows = np.asarray(embeddings, dtype=np.float32).tolist()
+            if len(rows) != len(unique_texts):
+                raise ValueError(f"Encoder returned {len(rows)} embeddings for {len(unique_texts)} texts")
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error("Batched embedding failed", batcher=self.name, batch_size=len(unique_texts), error=str(e))
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["texts"] += len(pending)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(unique_texts))
+        for text, future in pending:
+            if not future.done():
+                future.set_result(rows[positions[text]])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Batch counters, including the average batch size"""
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "avg_batch_size": self.stats["texts"] / batches if batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+
+_batchers: "weakref.WeakKeyDictionary[Any, Dict[Tuple, EmbeddingBatcher]]" = weakref.WeakKeyDictionary()
+_batchers_lock = threading.Lock()
+
+
+def get_embedding_batcher(model: Any, name: str = "embedding", **encode_kwargs: Any) -> EmbeddingBatcher:
+    """Return the batcher shared by every caller of ``model.encode``"""
+    key = tuple(sorted(encode_kwargs.items()))
+    with _batchers_lock:
+        per_model = _batchers.get(model)
+        if per_model is None:
+            per_model = {}
+            _batchers[model] = per_model
+        batcher = per_model.get(key)
+        if batcher is None:
+            model_ref = weakref.ref(model)
+
+            def encode(texts: List[str]) -> Any:
+                return model_ref().encode(texts, **encode_kwargs)
+
+            batcher = EmbeddingBatcher(encode, name=name)
+            per_model[key] = batcher
+        return batcher
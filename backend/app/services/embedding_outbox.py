@@ -0,0 +1,250 @@
+"""
+Durable outbox of pending embedding work, kept in a Redis stream.
+
+Chunking stores chunk rows in the database and appends stream entries that
+reference runs of them (document, workspace, chunk index range); the text
+itself stays in the database. Embedding workers in any number of processes
+read the stream through one consumer group and acknowledge an entry only
+after its vectors are stored. Failed entries wait in a retry set with
+exponential backoff, and entries left unacknowledged by a consumer that
+died are reclaimed after ``EMBEDDING_OUTBOX_CLAIM_IDLE_MS``.
+"""
+
+import json
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional
+
+import structlog
+
+from app.core.config import settings
+
+try:
+    import redis.asyncio as aioredis
+except Exception:  # pragma: no cover
+    aioredis = None  # type: ignore
+
+logger = structlog.get_logger()
+
+# Re-queue a due retry only if this caller is the one that removed it
+_PROMOTE_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 1 then
+    redis.call('XADD', KEYS[2], '*', unpack(ARGV, 2))
+    return 1
+end
+return 0
+"""
+
+# Decrement a document's remaining count only for entries this caller acknowledged,
+# so an entry reclaimed and then acked by two consumers counts once. KEYS: stream,
+# then one document key per entry; ARGV: group, then (message id, chunk count,
+# document id) per entry. Returns the number acknowledged, then documents now complete.
+_ACK_SCRIPT = """
+local acked, completed = 0, {}
+for i = 2, #KEYS do
+    local base = (i - 2) * 3 + 1
+    if redis.call('XACK', KEYS[1], ARGV[1], ARGV[base + 1]) == 1 then
+        acked = acked + 1
+        redis.call('XDEL', KEYS[1], ARGV[base + 1])
+        if redis.call('HINCRBY', KEYS[i], 'remaining', -tonumber(ARGV[base + 2])) <= 0 then
+            redis.call('DEL', KEYS[i])
+            completed[#completed + 1] = ARGV[base + 3]
+        end
+    end
+end
+return {acked, unpack(completed)}
+"""
+
+
+@dataclass(frozen=True)
+class OutboxEntry:
+    """Chunks ``[start, end)`` (by chunk index) of one document awaiting vectors"""
+    document_id: str
+    workspace_id: str
+    start: int
+    end: int
+    attempt: int = 0
+    message_id: Optional[str] = None
+
+    @property
+    def chunk_count(self) -> int:
+        return self.end - self.start
+
+    def to_fields(self) -> Dict[str, str]:
+        return {
+            "document_id": self.document_id,
+            "workspace_id": self.workspace_id,
+            "start": str(self.start),
+            "end": str(self.end),
+            "attempt": str(self.attempt),
+        }
+
+    @classmethod
+    def from_fields(cls, message_id: str, fields: Dict[str, Any]) -> "OutboxEntry":
+        return cls(
+            document_id=fields["document_id"],
+            workspace_id=fields["workspace_id"],
+            start=int(fields["start"]),
+            end=int(fields["end"]),
+            attempt=int(fields.get("attempt", 0)),
+            message_id=message_id,
+        )
+
+
+class EmbeddingOutbox:
+    """Producer and consumer-group side of the embedding stream.
+
+    Each document also has a small hash holding how many of its chunks
+    still lack vectors; :meth:`ack` reports the documents that reach zero.
+    """
+
+    def __init__(self, redis_client: Any = None, stream: Optional[str] = None,
+                 group: Optional[str] = None, consumer: Optional[str] = None):
+        self._redis_client = redis_client
+        self.stream = stream or settings.EMBEDDING_OUTBOX_STREAM
+        self.group = group or settings.EMBEDDING_OUTBOX_GROUP
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.retry_key = f"{self.stream}:retry"
+        self._group_ready = False
+        self.stats = {"enqueued": 0, "acked": 0, "retried": 0, "dead": 0, "reclaimed": 0}
+
+    def _document_key(self, document_id: str) -> str:
+        return f"{self.stream}:doc:{document_id}"
+
+    @property
+    def available(self) -> bool:
+        if self._redis_client is not None:
+            return True
+        from app.core.database import redis_manager
+        return aioredis is not None and redis_manager.redis_available
+
+    def _redis(self) -> Any:
+        if self._redis_client is None:
+            # Own connection pool: XREADGROUP blocks, so it must not share the auto-pipeline
+            self._redis_client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        return self._redis_client
+
+    async def ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        try:
+            await self._redis().xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    # --- Producer ---
+    async def enqueue(self, document_id: Any, workspace_id: Any, chunk_count: int) -> int:
+        """Queue chunks ``0..chunk_count`` of a document; returns the number of entries written"""
+        step = max(1, settings.EMBEDDING_OUTBOX_ENTRY_CHUNKS)
+        entries = [
+            OutboxEntry(str(document_id), str(workspace_id), start, min(start + step, chunk_count))
+            for start in range(0, chunk_count, step)
+        ]
+        if not entries:
+            return 0
+        async with self._redis().pipeline(transaction=True) as pipe:
+            pipe.hset(self._document_key(document_id), mapping={"remaining": chunk_count})
+            for entry in entries:
+                pipe.xadd(self.stream, entry.to_fields())
+            await pipe.execute()
+        self.stats["enqueued"] += len(entries)
+        return len(entries)
+
+    # --- Consumer ---
+    @staticmethod
+    def _parse(messages: Any) -> List[OutboxEntry]:
+        # Entries deleted while pending come back without fields
+        return [OutboxEntry.from_fields(message_id, fields) for message_id, fields in messages or [] if fields]
+
+    async def read(self, count: int, block_ms: int) -> List[OutboxEntry]:
+        """New entries for this consumer, waiting up to ``block_ms`` for the first"""
+        response = await self._redis().xreadgroup(
+            self.group, self.consumer, {self.stream: ">"}, count=count, block=max(1, block_ms)
+        )
+        streams = response.items() if isinstance(response, dict) else (response or [])
+        entries: List[OutboxEntry] = []
+        for _, messages in streams:
+            entries.extend(self._parse(messages))
+        return entries
+
+    async def claim_stale(self, count: int) -> List[OutboxEntry]:
+        """Take over entries another consumer read but never acknowledged"""
+        response = await self._redis().xautoclaim(
+            self.stream, self.group, self.consumer,
+            min_idle_time=settings.EMBEDDING_OUTBOX_CLAIM_IDLE_MS, start_id="0-0", count=count
+        )
+        entries = self._parse(response[1] if response else [])
+        if entries:
+            self.stats["reclaimed"] += len(entries)
+            logger.info("Reclaimed stale embedding entries", count=len(entries), consumer=self.consumer)
+        return entries
+
+    async def ack(self, entries: List[OutboxEntry]) -> List[str]:
+        """Acknowledge entries whose vectors are stored; returns documents now fully embedded"""
+        if not entries:
+            return []
+        keys = [self.stream] + [self._document_key(entry.document_id) for entry in entries]
+        args = [self.group]
+        for entry in entries:
+            args.extend([entry.message_id, entry.chunk_count, entry.document_id])
+        acked, *done = await self._redis().eval(_ACK_SCRIPT, len(keys), *keys, *args)
+
+        completed: List[str] = []
+        for document_id in done:
+            if document_id not in completed:
+                completed.append(document_id)
+        self.stats["acked"] += int(acked)
+        return completed
+
+    def backoff(self, attempt: int) -> float:
+        return settings.EMBEDDING_OUTBOX_RETRY_BASE * (2 ** attempt)
+
+    async def retry_later(self, entries: List[OutboxEntry], now: Optional[float] = None) -> List[OutboxEntry]:
+        """Park failed entries until their backoff elapses; returns those out of attempts"""
+        if not entries:
+            return []
+        now = now if now is not None else time.time()
+        dead = [entry for entry in entries if entry.attempt + 1 >= settings.EMBEDDING_OUTBOX_MAX_ATTEMPTS]
+        message_ids = [entry.message_id for entry in entries]
+        async with self._redis().pipeline(transaction=True) as pipe:
+            for entry in entries:
+                if entry in dead:
+                    pipe.delete(self._document_key(entry.document_id))
+                    continue
+                member = json.dumps(replace(entry, attempt=entry.attempt + 1).to_fields(), sort_keys=True)
+                pipe.zadd(self.retry_key, {member: now + self.backoff(entry.attempt)})
+            pipe.xack(self.stream, self.group, *message_ids)
+            pipe.xdel(self.stream, *message_ids)
+            await pipe.execute()
+        self.stats["retried"] += len(entries) - len(dead)
+        self.stats["dead"] += len(dead)
+        return dead
+
+    async def promote_due(self, now: Optional[float] = None, limit: int = 100) -> int:
+        """Move retries whose backoff has elapsed back onto the stream"""
+        client = self._redis()
+        due = await client.zrangebyscore(self.retry_key, 0, now if now is not None else time.time(), start=0, num=limit)
+        moved = 0
+        for member in due:
+            fields = [item for pair in json.loads(member).items() for item in pair]
+            moved += int(await client.eval(_PROMOTE_SCRIPT, 2, self.retry_key, self.stream, member, *fields))
+        return moved
+
+    async def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        try:
+            client = self._redis()
+            stats["stream_length"] = await client.xlen(self.stream)
+            stats["retry_backlog"] = await client.zcard(self.retry_key)
+        except Exception as e:
+            stats["error"] = str(e)
+        return stats
+
+    async def close(self) -> None:
+        if self._redis_client is not None and hasattr(self._redis_client, "aclose"):
+            await self._redis_client.aclose()
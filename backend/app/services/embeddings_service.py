@@ -14,6 +14,7 @@ from functools import lru_cache
 
 from app.core.config import settings
 from app.exceptions import EmbeddingError, ConfigurationError
+from app.services.embedding_batcher import get_embedding_batcher
 
 logger = structlog.get_logger()
 
@@ -40,7 +41,7 @@ class EmbeddingsService:
                     self._dimension = dimension
                 def get_sentence_embedding_dimension(self) -> int:
                     return self._dimension
-                def encode(self, texts, options=None):
+                def encode(self, texts, options=None, **kwargs):
                     if isinstance(texts, str):
                         texts = [texts]
                     # Deterministic pseudo-embeddings based on hash
@@ -159,10 +160,10 @@ class EmbeddingsService:
             )
     
     async def generate_single_embedding(self, text: str) -> List[float]:
-        """Generate embedding for a single text"""
+        """Generate embedding for a single text, micro-batched with concurrent callers"""
         try:
-            embeddings = await self.generate_embeddings([text], batch_size=1)
-            return embeddings[0] if embeddings else []
+            batcher = get_embedding_batcher(self.model, name="query-embedding", normalize_embeddings=True)
+            return await batcher.embed(text)
         except Exception as e:
             logger.error("Failed to generate single embedding", error=str(e))
             raise EmbeddingError(
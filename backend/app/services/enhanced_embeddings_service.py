@@ -36,6 +36,7 @@ except ImportError:
     TRANSFORMERS_AVAILABLE = False
 
 from app.core.config import settings
+from app.services.embedding_batcher import get_embedding_batcher
 
 logger = structlog.get_logger()
 
@@ -188,8 +189,11 @@ class EnhancedEmbeddingsService:
         if cache_key in self._embedding_cache:
             return self._embedding_cache[cache_key]
         
-        embeddings = await self.generate_embeddings([text], normalize=normalize)
-        embedding = embeddings[0] if embeddings else []
+        if self.model is not None and self.model_type in ("sentence_transformers", "fallback"):
+            embedding = await self._generate_batched_embedding(text, normalize)
+        else:
+            embeddings = await self.generate_embeddings([text], normalize=normalize)
+            embedding = embeddings[0] if embeddings else []
         
         # Cache the result
         if len(self._embedding_cache) < self.cache_size:
@@ -197,6 +201,15 @@ class EnhancedEmbeddingsService:
         
         return embedding
     
+    async def _generate_batched_embedding(self, text: str, normalize: bool = True) -> List[float]:
+        """Encode one text through the micro-batcher shared with concurrent requests"""
+        try:
+            batcher = get_embedding_batcher(self.model, name="query-embedding", normalize_embeddings=normalize)
+            return await batcher.embed(text)
+        except Exception as e:
+            logger.error("Batched embedding generation failed", error=str(e))
+            return [0.0] * self.embedding_dimension
+    
     async def _generate_batch_embeddings(
         self, 
         texts: List[str],
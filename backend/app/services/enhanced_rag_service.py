@@ -10,14 +10,16 @@ import asyncio
 from typing import List, Dict, Any, Optional, AsyncGenerator, Tuple
 from sqlalchemy.orm import Session
 import structlog
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
 
 from app.services.vector_service import VectorService
 from app.services.gemini_service import GeminiService
 from app.services.enhanced_embeddings_service import enhanced_embeddings_service
+from app.services.rank_fusion import reciprocal_rank_fusion
 from app.models.chat import ChatSession, ChatMessage
-from app.schemas.rag import RAGQueryResponse, RAGQueryRequest
+from app.services.analytics_rollup import AnalyticsRollupService
+from app.schemas.rag import RAGQueryResponse, RAGQueryRequest, RAGStreamChunk
 
 logger = structlog.get_logger()
 
@@ -76,6 +78,8 @@ class EnhancedRAGService:
         self.rerank_top_k = 5
         self.retrieval_strategy = RetrievalStrategy.RERANKED
         self.reranking_method = RerankingMethod.CROSS_ENCODER
+        self.vector_weight = 0.7  # Hybrid fusion weight of vector results
+        self.keyword_weight = 0.3  # Hybrid fusion weight of keyword results
         
         # Initialize reranking model if available
         self._initialize_reranking_model()
@@ -337,38 +341,19 @@ class EnhancedRAGService:
         vector_results: List[RetrievalResult],
         keyword_results: List[RetrievalResult]
     ) -> List[RetrievalResult]:
-        """Combine results from different retrieval methods"""
-        # Create a map of chunk_id to best result
-        result_map = {}
+        """Combine results from different retrieval methods using weighted rank fusion"""
+        combined_results = []
+        for fused in reciprocal_rank_fusion(
+            [vector_results, keyword_results],
+            weights=[self.vector_weight, self.keyword_weight]
+        ):
+            combined_results.append(replace(
+                fused.item,
+                score=fused.score,
+                retrieval_method="hybrid" if len(fused.sources) > 1 else fused.item.retrieval_method
+            ))
         
-        # Add vector results
-        for result in vector_results:
-            key = result.chunk_id
-            if key not in result_map or result.score > result_map[key].score:
-                result_map[key] = result
-        
-        # Add keyword results with score combination
-        for result in keyword_results:
-            key = result.chunk_id
-            if key in result_map:
-                # Combine scores (weighted average)
-                vector_score = result_map[key].score
-                keyword_score = result.score
-                combined_score = 0.7 * vector_score + 0.3 * keyword_score
-                
-                result_map[key] = RetrievalResult(
-                    chunk_id=result.chunk_id,
-                    document_id=result.document_id,
-                    text=result.text,
-                    score=combined_score,
-                    metadata=result.metadata,
-                    retrieval_method="hybrid",
-                    rank=result.rank
-                )
-            else:
-                result_map[key] = result
-        
-        return list(result_map.values())
+        return combined_results
     
     def _deduplicate_results(self, results: List[RetrievalResult]) -> List[RetrievalResult]:
         """Remove duplicate results based on chunk_id"""
@@ -463,12 +448,12 @@ class EnhancedRAGService:
     ) -> List[RerankedResult]:
         """Rerank using cosine similarity"""
         try:
-            # Generate query embedding
-            query_embedding = await self.embeddings_service.generate_single_embedding(query)
-            
-            # Generate document embeddings
+            # Query (micro-batched with other requests) and document embeddings run concurrently
             doc_texts = [chunk.text for chunk in retrieved_chunks]
-            doc_embeddings = await self.embeddings_service.generate_embeddings(doc_texts)
+            query_embedding, doc_embeddings = await asyncio.gather(
+                self.embeddings_service.generate_single_embedding(query),
+                self.embeddings_service.generate_embeddings(doc_texts)
+            )
             
             # Calculate similarities
             similarities = []
@@ -548,32 +533,11 @@ class EnhancedRAGService:
             gemini_response = await self.gemini_service.generate_response(
                 user_message=query,
                 context=context,
-                sources=reranked_chunks
+                sources=reranked_chunks,
+                workspace_id=str(session.workspace_id)
             )
             
-            # Format sources
-            sources = self._format_enhanced_sources(reranked_chunks)
-            
-            # Calculate response time
-            response_time = int((time.time() - start_time) * 1000)
-            
-            # Save interaction
-            await self._save_interaction(session, query, gemini_response, sources)
-            
-            return RAGQueryResponse(
-                answer=gemini_response.get("content", ""),
-                sources=sources,
-                response_time_ms=response_time,
-                tokens_used=gemini_response.get("tokens_used", 0),
-                model_used=gemini_response.get("model_used", "gemini"),
-                session_id=session.session_id,
-                metadata={
-                    "retrieval_strategy": self.retrieval_strategy.value,
-                    "reranking_method": self.reranking_method.value,
-                    "chunks_retrieved": len(reranked_chunks),
-                    "context_length": len(context)
-                }
-            )
+            return await self._finalize_response(query, context, reranked_chunks, session, gemini_response, start_time)
             
         except Exception as e:
             logger.error("Response generation failed", error=str(e))
@@ -586,13 +550,128 @@ class EnhancedRAGService:
         reranked_chunks: List[RerankedResult],
         session: ChatSession
     ) -> RAGQueryResponse:
-        """Generate streaming response (placeholder for future implementation)"""
-        # This would implement streaming response generation
-        # For now, return standard response
-        return await self._generate_standard_response(
-            query, context, reranked_chunks, session, time.time()
+        """Generate a response through Gemini's streaming API and collect it.
+        
+        Callers that can forward partial text should use
+        :meth:`process_query_stream` instead.
+        """
+        start_time = time.time()
+        try:
+            gemini_response: Dict[str, Any] = {}
+            async for event in self.gemini_service.generate_response_stream(
+                user_message=query,
+                context=context,
+                sources=reranked_chunks,
+                workspace_id=str(session.workspace_id)
+            ):
+                if event["type"] == "final":
+                    gemini_response = event
+            
+            return await self._finalize_response(query, context, reranked_chunks, session, gemini_response, start_time)
+            
+        except Exception as e:
+            logger.error("Streaming response generation failed", error=str(e))
+            return self._create_error_response(str(e), start_time)
+    
+    async def _finalize_response(
+        self,
+        query: str,
+        context: str,
+        reranked_chunks: List[RerankedResult],
+        session: ChatSession,
+        gemini_response: Dict[str, Any],
+        start_time: float
+    ) -> RAGQueryResponse:
+        """Save the interaction and build the query response"""
+        # Format sources
+        sources = self._format_enhanced_sources(reranked_chunks)
+        
+        # Calculate response time
+        response_time = int((time.time() - start_time) * 1000)
+        
+        # Save interaction
+        await self._save_interaction(session, query, gemini_response, sources)
+        
+        return RAGQueryResponse(
+            answer=gemini_response.get("content", ""),
+            sources=sources,
+            response_time_ms=response_time,
+            tokens_used=gemini_response.get("tokens_used", 0),
+            model_used=gemini_response.get("model_used", "gemini"),
+            session_id=session.session_id,
+            metadata={
+                "retrieval_strategy": self.retrieval_strategy.value,
+                "reranking_method": self.reranking_method.value,
+                "chunks_retrieved": len(reranked_chunks),
+                "context_length": len(context)
+            }
         )
     
+    async def process_query_stream(
+        self,
+        workspace_id: str,
+        query: str,
+        session_id: Optional[str] = None,
+        top_k: int = 6,
+        retrieval_strategy: Optional[RetrievalStrategy] = None
+    ) -> AsyncGenerator[RAGStreamChunk, None]:
+        """
+        Process a RAG query and stream the answer as it is generated
+        
+        Yields a ``sources`` chunk after retrieval and reranking, ``answer``
+        chunks with partial text from Gemini, then an ``end`` chunk.
+        """
+        try:
+            session = await self._get_or_create_session(workspace_id, session_id)
+            
+            retrieval_strategy = retrieval_strategy or self.retrieval_strategy
+            retrieved_chunks = await self._enhanced_retrieval(
+                query=query,
+                workspace_id=workspace_id,
+                top_k=top_k,
+                strategy=retrieval_strategy
+            )
+            reranked_chunks = await self._rerank_results(query, retrieved_chunks) if retrieved_chunks else []
+            context_text = self._build_enhanced_context(reranked_chunks, query)
+            sources = self._format_enhanced_sources(reranked_chunks)
+            
+            yield RAGStreamChunk(
+                type="sources",
+                metadata={"sources": sources, "sources_count": len(sources)}
+            )
+            
+            gemini_response: Dict[str, Any] = {}
+            async for event in self.gemini_service.generate_response_stream(
+                user_message=query,
+                context=context_text,
+                sources=reranked_chunks,
+                workspace_id=workspace_id
+            ):
+                if event["type"] == "delta":
+                    yield RAGStreamChunk(type="answer", content=event["content"], metadata={"is_partial": True})
+                elif event["type"] == "final":
+                    gemini_response = event
+            
+            await self._save_interaction(session, query, gemini_response, sources)
+            
+            yield RAGStreamChunk(
+                type="end",
+                metadata={
+                    "session_id": session.session_id,
+                    "sources_count": len(sources),
+                    "model_used": gemini_response.get("model_used", "gemini"),
+                    "tokens_used": gemini_response.get("tokens_used", 0)
+                }
+            )
+            
+        except Exception as e:
+            logger.error("Enhanced RAG streaming query failed", error=str(e))
+            yield RAGStreamChunk(
+                type="error",
+                content="I apologize, but I'm having trouble processing your request right now. Please try again later.",
+                metadata={"error": str(e)}
+            )
+    
     def _format_enhanced_sources(self, reranked_chunks: List[RerankedResult]) -> List[Dict[str, Any]]:
         """Format sources with enhanced metadata"""
         sources = []
@@ -631,6 +710,7 @@ class EnhancedRAGService:
         )
         
         self.db.add(session)
+        AnalyticsRollupService(self.db).record_session_started(session)
         self.db.commit()
         self.db.refresh(session)
         
@@ -667,6 +747,7 @@ class EnhancedRAGService:
                 }
             )
             self.db.add(assistant_message)
+            AnalyticsRollupService(self.db).record_messages(session.workspace_id, [user_message, assistant_message])
             
             # Update session
             from datetime import datetime
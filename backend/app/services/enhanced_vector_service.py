@@ -4,14 +4,16 @@ Enhanced vector search service with batching, caching, and optimization
 
 import asyncio
 import hashlib
+import os
+import threading
 import time
 from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
 import structlog
 from datetime import datetime, timedelta
-import chromadb
-from chromadb.config import Settings
 
 from app.core.config import settings
+from app.services.vector_store import DEFAULT_NAMESPACE, ChromaVectorStore, get_vector_store
 from app.utils.cache import vector_search_cache, cache_manager
 from app.utils.metrics import MetricsCollector
 
@@ -23,62 +25,49 @@ class EnhancedVectorService:
     
     def __init__(self):
         self.client = None
+        self.vector_store = None
         self.collections = {}
         self.query_batch = []
         self.batch_size = 10
         self.batch_timeout = 0.1  # 100ms
         self._batch_lock = asyncio.Lock()
-        self._initialize_chromadb()
+        self._embedding_model = None
+        self._model_lock = threading.Lock()
+        self._initialize_vector_store()
     
-    def _initialize_chromadb(self):
-        """Initialize ChromaDB client (safe no-op if unavailable)."""
-        try:
-            # Allow disabling via environment for local/dev
-            import os
-            if os.getenv("CHROMA_DISABLED", "false").lower() == "true":
-                logger.warning("ChromaDB disabled via CHROMA_DISABLED env var; vector search will be inactive")
-                self.client = None
-                return
-
-            # Prefer HTTP client if a URL is provided; otherwise skip initialization
-            chroma_host = settings.CHROMA_URL.replace("http://", "").replace("https://", "") if settings.CHROMA_URL else None
-            if not chroma_host:
-                logger.warning("CHROMA_URL not set; vector search will be inactive")
-                self.client = None
-                return
-
-            headers = None
-            api_key = (getattr(settings, "CHROMA_AUTH_CREDENTIALS", "") or "").strip()
-            if api_key:
-                headers = {"X-API-Key": api_key}
-            self.client = chromadb.HttpClient(
-                host=chroma_host,
-                port=8001,
-                settings=Settings(
-                    anonymized_telemetry=False,
-                    allow_reset=True
-                ),
-                headers=headers
-            )
-            logger.info("ChromaDB client initialized successfully")
-        except Exception as e:
-            # Do not crash app if Chroma is unavailable; degrade gracefully
-            logger.error("Failed to initialize ChromaDB client; vector search disabled", error=str(e))
-            self.client = None
+    def _initialize_vector_store(self):
+        """Use the workspace shards the search service reads (safe no-op if unavailable)."""
+        # Allow disabling via environment for local/dev
+        if os.getenv("CHROMA_DISABLED", "false").lower() == "true":
+            logger.warning("ChromaDB disabled via CHROMA_DISABLED env var; vector search will be inactive")
+            return
+        
+        self.vector_store = get_vector_store(DEFAULT_NAMESPACE)
+        if self.vector_store is None:
+            logger.warning("Vector store not available; vector search will be inactive")
+            return
+        self.client = getattr(self.vector_store, "client", None)
+    
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        """Embed with the model behind every vector in the shards (blocking)"""
+        with self._model_lock:
+            if self._embedding_model is None:
+                from sentence_transformers import SentenceTransformer
+                self._embedding_model = SentenceTransformer(settings.VECTOR_EMBEDDING_MODEL)
+        return [np.asarray(embedding).tolist() for embedding in self._embedding_model.encode(texts)]
+    
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self._encode, texts)
     
     async def get_collection(self, workspace_id: str):
-        """Get or create collection for workspace"""
-        if self.client is None:
+        """Get or create the workspace shard"""
+        if self.vector_store is None:
             logger.warning("Vector service inactive; returning empty collection for workspace", workspace_id=workspace_id)
             return None
 
         if workspace_id not in self.collections:
             try:
-                collection_name = f"workspace_{workspace_id}"
-                self.collections[workspace_id] = self.client.get_or_create_collection(
-                    name=collection_name,
-                    metadata={"workspace_id": workspace_id}
-                )
+                self.collections[workspace_id] = self.vector_store.get_shard(workspace_id)
                 logger.info(f"Collection created/retrieved for workspace {workspace_id}")
             except Exception as e:
                 logger.error(f"Failed to get collection for workspace {workspace_id}", error=str(e))
@@ -86,6 +75,16 @@ class EnhancedVectorService:
         
         return self.collections[workspace_id]
     
+    async def import_legacy_collections(self) -> int:
+        """Move chunks from collections written before workspace sharding into the shards"""
+        if not isinstance(self.vector_store, ChromaVectorStore):
+            return 0  # Embedded stores were always sharded
+        copied = await asyncio.get_running_loop().run_in_executor(
+            None, self.vector_store.import_legacy_collections, self._encode
+        )
+        logger.info("Legacy vector collections imported", chunks=copied)
+        return copied
+    
     async def search_optimized(
         self, 
         workspace_id: str, 
@@ -156,7 +155,7 @@ class EnhancedVectorService:
                 
                 # Batch search
                 search_results = collection.query(
-                    query_texts=query_texts,
+                    query_embeddings=await self._embed(query_texts),
                     n_results=max_top_k
                 )
                 
@@ -196,7 +195,7 @@ class EnhancedVectorService:
                 return []
 
             search_results = collection.query(
-                query_texts=[query],
+                query_embeddings=await self._embed([query]),
                 n_results=top_k
             )
             
@@ -259,13 +258,16 @@ class EnhancedVectorService:
             batch_size = 100
             for i in range(0, len(documents), batch_size):
                 batch_docs = documents[i:i + batch_size]
-                batch_metadatas = metadatas[i:i + batch_size]
+                batch_metadatas = [
+                    dict(metadata, workspace_id=workspace_id) for metadata in metadatas[i:i + batch_size]
+                ]
                 batch_ids = ids[i:i + batch_size]
                 
-                collection.add(
-                    documents=batch_docs,
+                collection.upsert(
+                    ids=batch_ids,
+                    embeddings=await self._embed(batch_docs),
                     metadatas=batch_metadatas,
-                    ids=batch_ids
+                    documents=batch_docs
                 )
             
             # Invalidate cache for this workspace
@@ -322,18 +324,18 @@ class EnhancedVectorService:
         """Check vector service health"""
         try:
             # Test connection
-            if self.client is None:
+            if self.vector_store is None:
                 return {
                     'status': 'inactive',
                     'collections_count': 0,
                     'timestamp': datetime.utcnow().isoformat()
                 }
 
-            collections = self.client.list_collections()
+            self.vector_store.health_check()
             
             return {
                 'status': 'healthy',
-                'collections_count': len(collections),
+                'collections_count': len(self.collections),
                 'timestamp': datetime.utcnow().isoformat()
             }
             
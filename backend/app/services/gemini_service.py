@@ -3,12 +3,18 @@ Google Gemini AI service for generating responses
 """
 
 import google.generativeai as genai
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncGenerator
 import structlog
 
 from app.core.config import settings
 from app.services.language_service import language_service
 from app.exceptions import ExternalServiceError
+from app.services.llm_client import (
+    LLMBackend,
+    GeminiSDKBackend,
+    get_gemini_http_backend,
+    llm_client
+)
 
 logger = structlog.get_logger()
 
@@ -18,23 +24,39 @@ class GeminiService:
     
     def __init__(self):
         self.model = None
+        self.http_backend: Optional[LLMBackend] = None
+        self.llm_client = llm_client
         self._initialize_model()
     
     def _initialize_model(self):
         """Initialize Gemini model"""
         try:
+            if settings.GEMINI_API_BASE_URL:
+                # REST transport with a shared keep-alive pool (also used for fake-LLM benchmarks)
+                self.http_backend = get_gemini_http_backend()
+                logger.info("Gemini service using REST backend", base_url=settings.GEMINI_API_BASE_URL)
+                return
+            
             if not settings.GEMINI_API_KEY:
                 logger.warning("GEMINI_API_KEY not configured, using fallback mode")
                 self.model = None
                 return
                 
             genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.model = genai.GenerativeModel('gemini-pro')
+            self.model = genai.GenerativeModel(settings.GEMINI_MODEL_NAME)
             logger.info("Gemini service initialized successfully")
         except Exception as e:
             logger.error("Failed to initialize Gemini service", error=str(e))
             self.model = None
     
+    def _get_backend(self) -> Optional[LLMBackend]:
+        """Transport for LLM calls, or None when running in fallback mode"""
+        if self.http_backend is not None:
+            return self.http_backend
+        if self.model is not None:
+            return GeminiSDKBackend(self.model)
+        return None
+    
     async def generate_response(
         self,
         user_message: str,
@@ -43,12 +65,14 @@ class GeminiService:
         target_language: Optional[str] = None,
         tone: Optional[str] = None,
         source_type: Optional[str] = None,
-        few_shots: Optional[List[Dict[str, str]]] = None
+        few_shots: Optional[List[Dict[str, str]]] = None,
+        workspace_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """Generate AI response using Gemini"""
         try:
             # Check if model is available
-            if not self.model:
+            backend = self._get_backend()
+            if not backend:
                 return self._generate_fallback_response(user_message, context, sources)
             
             # Prepare prompt with language support
@@ -62,11 +86,10 @@ class GeminiService:
                 few_shots=few_shots
             )
             
-            # Generate response
-            response = self.model.generate_content(prompt)
-            
-            # Extract response text
-            response_text = response.text if response.text else "I apologize, but I couldn't generate a response."
+            # Generate response without blocking the event loop
+            response_text = await self.llm_client.generate(backend, prompt, workspace_id=workspace_id)
+            if not response_text:
+                response_text = "I apologize, but I couldn't generate a response."
             
             # Translate response if target language is specified and different from default
             if target_language and target_language != settings.DEFAULT_LANGUAGE:
@@ -89,24 +112,7 @@ class GeminiService:
                         target_language=target_language
                     )
             
-            # Determine confidence based on response quality
-            confidence_label = self._assess_confidence(response_text, sources)
-            confidence_map = {"high": 0.9, "medium": 0.6, "low": 0.3}
-            confidence_value = confidence_map.get(confidence_label, 0.6)
-            
-            # Prepare sources information
-            sources_info = self._format_sources(sources) if sources else []
-            
-            return {
-                "content": response_text,
-                "model_used": "gemini-pro",
-                "confidence_score": confidence_label,
-                "confidence": confidence_value,
-                "sources_used": sources_info,
-                "tokens_used": self._estimate_tokens(prompt + response_text),
-                "tone": tone or "friendly",
-                "source_type": source_type or ("document" if (sources_info and len(sources_info) > 0) else "generic")
-            }
+            return self._build_response_payload(prompt, response_text, sources, tone, source_type)
             
         except Exception as e:
             logger.error(
@@ -116,6 +122,105 @@ class GeminiService:
             )
             return self._generate_fallback_response(user_message, context, sources)
     
+    async def generate_response_stream(
+        self,
+        user_message: str,
+        context: str = "",
+        sources: Optional[List[Dict[str, Any]]] = None,
+        target_language: Optional[str] = None,
+        tone: Optional[str] = None,
+        source_type: Optional[str] = None,
+        few_shots: Optional[List[Dict[str, str]]] = None,
+        workspace_id: Optional[str] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Stream an AI response from Gemini as it is generated.
+        
+        Yields ``{"type": "delta", "content": ...}`` events with partial text,
+        followed by a single ``{"type": "final", ...}`` event carrying the same
+        fields as :meth:`generate_response` (``content`` is the full answer).
+        """
+        needs_translation = bool(target_language and target_language != settings.DEFAULT_LANGUAGE)
+        backend = self._get_backend()
+        if not backend or needs_translation:
+            # Translation needs the complete answer, so emit it in one piece
+            result = await self.generate_response(
+                user_message=user_message,
+                context=context,
+                sources=sources,
+                target_language=target_language,
+                tone=tone,
+                source_type=source_type,
+                few_shots=few_shots,
+                workspace_id=workspace_id
+            )
+            if result.get("content"):
+                yield {"type": "delta", "content": result["content"]}
+            yield {"type": "final", **result}
+            return
+        
+        prompt = self._build_prompt(
+            user_message=user_message,
+            context=context,
+            sources=sources,
+            target_language=target_language,
+            tone=tone,
+            source_type=source_type,
+            few_shots=few_shots
+        )
+        
+        parts: List[str] = []
+        try:
+            async for text in self.llm_client.stream(backend, prompt, workspace_id=workspace_id):
+                parts.append(text)
+                yield {"type": "delta", "content": text}
+        except Exception as e:
+            logger.error(
+                "Gemini streaming generation failed",
+                error=str(e),
+                user_message=user_message[:100],
+                chunks_received=len(parts)
+            )
+            if not parts:
+                fallback = self._generate_fallback_response(user_message, context, sources)
+                yield {"type": "delta", "content": fallback["content"]}
+                yield {"type": "final", **fallback}
+                return
+        
+        response_text = "".join(parts)
+        if not response_text:
+            response_text = "I apologize, but I couldn't generate a response."
+            yield {"type": "delta", "content": response_text}
+        
+        yield {"type": "final", **self._build_response_payload(prompt, response_text, sources, tone, source_type)}
+    
+    def _build_response_payload(
+        self,
+        prompt: str,
+        response_text: str,
+        sources: Optional[List[Dict[str, Any]]] = None,
+        tone: Optional[str] = None,
+        source_type: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the response dict shared by streaming and non-streaming generation"""
+        # Determine confidence based on response quality
+        confidence_label = self._assess_confidence(response_text, sources)
+        confidence_map = {"high": 0.9, "medium": 0.6, "low": 0.3}
+        confidence_value = confidence_map.get(confidence_label, 0.6)
+        
+        # Prepare sources information
+        sources_info = self._format_sources(sources) if sources else []
+        
+        return {
+            "content": response_text,
+            "model_used": settings.GEMINI_MODEL_NAME,
+            "confidence_score": confidence_label,
+            "confidence": confidence_value,
+            "sources_used": sources_info,
+            "tokens_used": self._estimate_tokens(prompt + response_text),
+            "tone": tone or "friendly",
+            "source_type": source_type or ("document" if (sources_info and len(sources_info) > 0) else "generic")
+        }
+    
     def _generate_fallback_response(
         self,
         user_message: str,
@@ -290,8 +395,11 @@ class GeminiService:
     async def test_connection(self) -> bool:
         """Test Gemini API connection"""
         try:
-            test_response = self.model.generate_content("Hello, this is a test.")
-            return test_response.text is not None
+            backend = self._get_backend()
+            if not backend:
+                return False
+            test_response = await self.llm_client.generate(backend, "Hello, this is a test.")
+            return test_response is not None
         except Exception as e:
             logger.error("Gemini connection test failed", error=str(e))
             return False
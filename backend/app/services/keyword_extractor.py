@@ -0,0 +1,168 @@
+"""
+Document-level TF-IDF keyword extraction with incremental workspace IDF
+"""
+
+import math
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+try:
+    from scipy.sparse import csr_matrix
+    from sklearn.feature_extraction.text import CountVectorizer
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+
+logger = structlog.get_logger()
+
+# Prune singleton terms once a workspace vocabulary grows past this size
+_MAX_WORKSPACE_TERMS = 200_000
+
+
+class WorkspaceTermStats:
+    """Block-level document frequencies accumulated for one workspace"""
+
+    def __init__(self):
+        self.total_blocks = 0
+        self.doc_freq: Dict[str, int] = {}
+
+    def lookup(self, terms: Sequence[str]) -> np.ndarray:
+        doc_freq = self.doc_freq
+        return np.fromiter((doc_freq.get(term, 0) for term in terms), dtype=np.float64, count=len(terms))
+
+    def update(self, terms: Sequence[str], block_freq: np.ndarray, blocks: int) -> None:
+        doc_freq = self.doc_freq
+        for term, freq in zip(terms, block_freq.tolist()):
+            doc_freq[term] = doc_freq.get(term, 0) + freq
+        self.total_blocks += blocks
+        if len(doc_freq) > _MAX_WORKSPACE_TERMS:
+            self.doc_freq = {term: freq for term, freq in doc_freq.items() if freq > 1}
+
+
+class KeywordExtractor:
+    """Scores every block of a document in one sparse TF-IDF pass.
+
+    The vocabulary is built once per document; IDF combines the document's
+    own block frequencies with the statistics of previously ingested
+    documents in the same workspace, which are then updated incrementally.
+    """
+
+    def __init__(self, top_k: int = 10, ngram_range: Tuple[int, int] = (1, 2)):
+        self.top_k = top_k
+        self.ngram_range = ngram_range
+        self._stats: Dict[str, WorkspaceTermStats] = {}
+        self._lock = threading.Lock()
+        # Reuse sklearn's tokenizer, stop words and n-gram logic without refitting
+        self._analyzer = (
+            CountVectorizer(ngram_range=ngram_range, stop_words="english").build_analyzer()
+            if SKLEARN_AVAILABLE else None
+        )
+
+    @property
+    def available(self) -> bool:
+        return SKLEARN_AVAILABLE
+
+    def extract(
+        self,
+        texts: Sequence[str],
+        workspace_id: Optional[str] = None,
+        update_stats: bool = True,
+        top_k: Optional[int] = None
+    ) -> List[List[str]]:
+        """Return the top keywords for each text, in input order"""
+        if not texts:
+            return []
+        empty: List[List[str]] = [[] for _ in texts]
+        if not SKLEARN_AVAILABLE:
+            return empty
+
+        counts, terms = self._count_terms(texts)
+        if not terms:
+            # Every block was empty or stop words only
+            return empty
+
+        # Each stored (row, term) entry is one block containing the term
+        block_freq = np.bincount(counts.indices, minlength=len(terms))
+        stats = self._get_stats(workspace_id)
+        with self._lock:
+            prior_freq = stats.lookup(terms) if stats else np.zeros(len(terms))
+            total_blocks = (stats.total_blocks if stats else 0) + counts.shape[0]
+            if stats is not None and update_stats:
+                stats.update(terms, block_freq, counts.shape[0])
+
+        # Smoothed IDF, as in sklearn's TfidfTransformer
+        idf = np.log((1.0 + total_blocks) / (1.0 + block_freq + prior_freq)) + 1.0
+        # Scale every stored count by its term's IDF in one vectorized step
+        counts.data *= idf[counts.indices]
+
+        return self._top_terms(counts, terms, top_k or self.top_k)
+
+    def _count_terms(self, texts: Sequence[str]) -> Tuple[Any, List[str]]:
+        """Build the document vocabulary and a blocks x terms count matrix"""
+        vocabulary: Dict[str, int] = {}
+        indices: List[int] = []
+        values: List[int] = []
+        indptr = [0]
+        analyzer = self._analyzer
+        for text in texts:
+            row: Dict[int, int] = {}
+            for term in analyzer(text or ""):
+                index = vocabulary.setdefault(term, len(vocabulary))
+                row[index] = row.get(index, 0) + 1
+            indices.extend(row.keys())
+            values.extend(row.values())
+            indptr.append(len(indices))
+
+        counts = csr_matrix(
+            (np.asarray(values, dtype=np.float64), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(texts), len(vocabulary))
+        )
+        return counts, list(vocabulary)
+
+    def _top_terms(self, scores, terms: List[str], top_k: int) -> List[List[str]]:
+        keywords: List[List[str]] = []
+        indptr, indices, data = scores.indptr, scores.indices, scores.data
+        for row in range(scores.shape[0]):
+            start, end = indptr[row], indptr[row + 1]
+            row_scores = data[start:end]
+            if not len(row_scores):
+                keywords.append([])
+                continue
+            # Highest score first; ties keep first-occurrence order
+            order = np.lexsort((indices[start:end], -row_scores))[:top_k]
+            keywords.append([terms[indices[start + i]] for i in order])
+        return keywords
+
+    def _get_stats(self, workspace_id: Optional[str]) -> Optional[WorkspaceTermStats]:
+        if workspace_id is None:
+            return None
+        key = str(workspace_id)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = WorkspaceTermStats()
+                self._stats[key] = stats
+            return stats
+
+    def idf(self, term: str, workspace_id: str) -> float:
+        """Current smoothed IDF of a term in a workspace"""
+        with self._lock:
+            stats = self._stats.get(str(workspace_id))
+            if stats is None:
+                return 1.0
+            return math.log((1.0 + stats.total_blocks) / (1.0 + stats.doc_freq.get(term, 0))) + 1.0
+
+    def reset(self, workspace_id: Optional[str] = None) -> None:
+        """Forget workspace statistics (all workspaces if none is given)"""
+        with self._lock:
+            if workspace_id is None:
+                self._stats.clear()
+            else:
+                self._stats.pop(str(workspace_id), None)
+
+
+# Global instance (singleton)
+keyword_extractor = KeywordExtractor()
@@ -0,0 +1,170 @@
+"""
+Dashboard KPI computation with grouped, conditional aggregation
+"""
+
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import structlog
+from sqlalchemy import and_, case, func, or_, select, true
+from sqlalchemy.orm import Session
+
+from app.models.chat import ChatMessage, ChatSession
+
+logger = structlog.get_logger()
+
+WINDOWS = ("current", "previous")
+RESPONSE_TIME_PERCENTILES = (50, 95)
+
+
+def percentile_cont(sorted_values: Sequence[float], percentile: float) -> Optional[float]:
+    """Linear-interpolated percentile of pre-sorted values (same definition as SQL ``percentile_cont``)"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * percentile / 100.0
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return float(sorted_values[lower])
+    return float(sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower))
+
+
+def pct_change(curr: float, prev: float) -> float:
+    if prev == 0:
+        return 100.0 if curr > 0 else 0.0
+    return round(((curr - prev) / prev) * 100.0, 2)
+
+
+class KPIEngine:
+    """Computes every dashboard KPI for a window and the window before it.
+
+    Counts for both windows come from one statement: a single-row aggregate
+    over messages and one over sessions, each using ``CASE`` conditional
+    aggregation per window, cross-joined into one result row. Response-time
+    percentiles use ``percentile_cont`` in the same statement on PostgreSQL;
+    other dialects fetch the in-window response times and interpolate the
+    same way in Python.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _supports_percentile_cont(self) -> bool:
+        return self.db.get_bind().dialect.name == "postgresql"
+
+    def compute(self, workspace_id: Any, days: int, now: Optional[datetime] = None) -> Dict[str, Any]:
+        now = now or datetime.utcnow()
+        current_start = now - timedelta(days=days)
+        windows: Dict[str, Tuple[datetime, datetime]] = {
+            "current": (current_start, now),
+            "previous": (current_start - timedelta(days=days), current_start),
+        }
+        with_percentiles = self._supports_percentile_cont()
+
+        messages = self._message_aggregates(workspace_id, windows, with_percentiles).subquery("message_kpis")
+        sessions = self._session_aggregates(workspace_id, windows).subquery("session_kpis")
+        row = self.db.execute(
+            select(messages, sessions).select_from(messages.join(sessions, true()))
+        ).one()._mapping
+
+        if with_percentiles:
+            response_times = {
+                (p, window): row[f"response_time_p{p}_{window}"]
+                for p in RESPONSE_TIME_PERCENTILES for window in WINDOWS
+            }
+        else:
+            response_times = self._response_time_percentiles(workspace_id, windows)
+
+        kpis: Dict[str, Any] = {
+            "window_days": days,
+            "queries": self._delta_pct(row["queries_current"], row["queries_previous"]),
+            "sessions": self._delta_pct(row["sessions_current"], row["sessions_previous"]),
+            "active_sessions": {
+                "current": row["active_sessions_current"],
+                "previous": row["active_sessions_previous"],
+                "delta": row["active_sessions_current"] - row["active_sessions_previous"],
+            },
+        }
+        for p in RESPONSE_TIME_PERCENTILES:
+            current = round(float(response_times[(p, "current")] or 0), 2)
+            previous = round(float(response_times[(p, "previous")] or 0), 2)
+            kpis[f"response_time_p{p}_ms"] = {
+                "current": current,
+                "previous": previous,
+                "delta_ms": round(current - previous, 2),
+            }
+        return kpis
+
+    @staticmethod
+    def _delta_pct(current: int, previous: int) -> Dict[str, Any]:
+        return {"current": current, "previous": previous, "delta_pct": pct_change(current, previous)}
+
+    @staticmethod
+    def _message_aggregates(workspace_id: Any,
+                            windows: Dict[str, Tuple[datetime, datetime]],
+                            with_percentiles: bool):
+        columns = []
+        for window, (start, end) in windows.items():
+            in_window = and_(ChatMessage.created_at >= start, ChatMessage.created_at < end)
+            columns.append(
+                func.count(case((and_(in_window, ChatMessage.role == "user"), 1))).label(f"queries_{window}")
+            )
+            if with_percentiles:
+                # percentile_cont skips NULLs, so CASE restricts it to this window's assistant replies
+                response_time = case((and_(in_window, ChatMessage.role == "assistant"), ChatMessage.response_time_ms))
+                for p in RESPONSE_TIME_PERCENTILES:
+                    columns.append(
+                        func.percentile_cont(p / 100.0).within_group(response_time).label(f"response_time_p{p}_{window}")
+                    )
+
+        earliest = min(start for start, _ in windows.values())
+        latest = max(end for _, end in windows.values())
+        return select(*columns).select_from(ChatMessage).join(
+            ChatSession, ChatMessage.session_id == ChatSession.id
+        ).where(
+            ChatSession.workspace_id == workspace_id,
+            ChatMessage.created_at >= earliest,
+            ChatMessage.created_at < latest
+        )
+
+    @staticmethod
+    def _session_aggregates(workspace_id: Any, windows: Dict[str, Tuple[datetime, datetime]]):
+        columns = []
+        for window, (start, end) in windows.items():
+            columns.append(func.count(case((
+                and_(ChatSession.created_at >= start, ChatSession.created_at < end), 1
+            ))).label(f"sessions_{window}"))
+            columns.append(func.count(case((
+                and_(ChatSession.last_activity_at >= start, ChatSession.last_activity_at < end), 1
+            ))).label(f"active_sessions_{window}"))
+
+        earliest = min(start for start, _ in windows.values())
+        return select(*columns).select_from(ChatSession).where(
+            ChatSession.workspace_id == workspace_id,
+            or_(ChatSession.created_at >= earliest, ChatSession.last_activity_at >= earliest)
+        )
+
+    def _response_time_percentiles(self,
+                                   workspace_id: Any,
+                                   windows: Dict[str, Tuple[datetime, datetime]]) -> Dict[Tuple[int, str], Optional[float]]:
+        """Fallback for dialects without ``percentile_cont``: one sorted scan of both windows"""
+        current_start = windows["current"][0]
+        rows = self.db.query(
+            ChatMessage.created_at >= current_start,
+            ChatMessage.response_time_ms
+        ).join(ChatSession, ChatMessage.session_id == ChatSession.id).filter(
+            ChatSession.workspace_id == workspace_id,
+            ChatMessage.role == "assistant",
+            ChatMessage.response_time_ms.isnot(None),
+            ChatMessage.created_at >= windows["previous"][0],
+            ChatMessage.created_at < windows["current"][1]
+        ).order_by(ChatMessage.response_time_ms).all()
+
+        values: Dict[str, List[float]] = {window: [] for window in WINDOWS}
+        for is_current, response_time_ms in rows:
+            values["current" if is_current else "previous"].append(response_time_ms)
+        return {
+            (p, window): percentile_cont(values[window], p)
+            for p in RESPONSE_TIME_PERCENTILES for window in WINDOWS
+        }
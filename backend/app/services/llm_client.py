@@ -0,0 +1,332 @@
+"""
+Async LLM client with bounded concurrency, timeouts and connection reuse
+"""
+
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import structlog
+
+from app.core.config import settings
+from app.exceptions import ExternalServiceError
+from app.utils.metrics import metrics_collector
+
+logger = structlog.get_logger()
+
+
+def _text_from_candidates(payload: Dict[str, Any]) -> str:
+    """Extract the text parts of the first candidate of a REST response"""
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+class LLMBackend:
+    """Transport used by :class:`LLMClient` to talk to a model provider"""
+
+    model_name: str = "unknown"
+
+    async def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        return None
+
+
+class GeminiSDKBackend(LLMBackend):
+    """Gemini via the google-generativeai async API (shared gRPC channel)"""
+
+    def __init__(self, model: Any, model_name: Optional[str] = None):
+        self.model = model
+        self.model_name = model_name or settings.GEMINI_MODEL_NAME
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        return self._chunk_text(response)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            text = self._chunk_text(chunk)
+            if text:
+                yield text
+
+    @staticmethod
+    def _chunk_text(chunk: Any) -> str:
+        """Blocked responses raise on ``.text``; treat them as empty"""
+        try:
+            return chunk.text or ""
+        except ValueError:
+            return ""
+
+
+class GeminiHTTPBackend(LLMBackend):
+    """Gemini REST API over a pooled keep-alive ``httpx.AsyncClient``.
+
+    Used when ``GEMINI_API_BASE_URL`` is set, which also lets a local fake LLM
+    server (``scripts/fake_llm_server.py``) stand in for benchmarking.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str = "",
+        model_name: Optional[str] = None,
+        max_keepalive_connections: Optional[int] = None,
+        max_connections: Optional[int] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model_name = model_name or settings.GEMINI_MODEL_NAME
+        self._limits = httpx.Limits(
+            max_keepalive_connections=max_keepalive_connections or settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            max_connections=max_connections or settings.LLM_MAX_CONCURRENCY
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            # Timeouts are enforced by LLMClient; the transport only bounds connects
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self._limits,
+                timeout=httpx.Timeout(None, connect=5.0)
+            )
+        return self._client
+
+    def _url(self, method: str) -> str:
+        return f"/v1beta/models/{self.model_name}:{method}"
+
+    def _params(self, **extra: str) -> Dict[str, str]:
+        params = dict(extra)
+        if self.api_key:
+            params["key"] = self.api_key
+        return params
+
+    @staticmethod
+    def _body(prompt: str) -> Dict[str, Any]:
+        return {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.client.post(
+            self._url("generateContent"), params=self._params(), json=self._body(prompt)
+        )
+        response.raise_for_status()
+        return _text_from_candidates(response.json())
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        async with self.client.stream(
+            "POST",
+            self._url("streamGenerateContent"),
+            params=self._params(alt="sse"),
+            json=self._body(prompt)
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if not data:
+                    continue
+                text = _text_from_candidates(json.loads(data))
+                if text:
+                    yield text
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class LLMClient:
+    """Bounds LLM calls globally and per workspace and times them.
+
+    Every call first waits for a workspace slot and then a global slot
+    (the "queue wait"), then runs against the backend under
+    ``request_timeout`` (the "model time"). Both are exported as metrics.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        workspace_max_concurrency: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        request_timeout: Optional[float] = None
+    ):
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.workspace_max_concurrency = workspace_max_concurrency or settings.LLM_WORKSPACE_MAX_CONCURRENCY
+        self.queue_timeout = queue_timeout if queue_timeout is not None else settings.LLM_QUEUE_TIMEOUT
+        self.request_timeout = request_timeout if request_timeout is not None else settings.LLM_REQUEST_TIMEOUT
+        self._global_slots = asyncio.Semaphore(self.max_concurrency)
+        # workspace_id -> [semaphore, holders + waiters]; dropped when unused
+        self._workspace_slots: Dict[str, List[Any]] = {}
+        self.inflight = 0
+        self.stats = {
+            "requests": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "queue_wait_total": 0.0,
+            "model_time_total": 0.0,
+        }
+
+    async def generate(self, backend: LLMBackend, prompt: str, workspace_id: Optional[str] = None) -> str:
+        """Run a single completion and return its text"""
+        async with self._slot(backend, workspace_id, mode="generate") as timing:
+            started = time.perf_counter()
+            try:
+                return await asyncio.wait_for(backend.generate(prompt), timeout=self.request_timeout)
+            finally:
+                timing["model_time"] = time.perf_counter() - started
+
+    async def stream(
+        self,
+        backend: LLMBackend,
+        prompt: str,
+        workspace_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Stream completion text; ``request_timeout`` bounds each gap between chunks"""
+        async with self._slot(backend, workspace_id, mode="stream") as timing:
+            started = time.perf_counter()
+            chunks = backend.stream(prompt)
+            try:
+                while True:
+                    try:
+                        text = await asyncio.wait_for(chunks.__anext__(), timeout=self.request_timeout)
+                    except StopAsyncIteration:
+                        break
+                    yield text
+            finally:
+                timing["model_time"] = time.perf_counter() - started
+                await chunks.aclose()
+
+    @asynccontextmanager
+    async def _slot(self, backend: LLMBackend, workspace_id: Optional[str], mode: str):
+        model = backend.model_name
+        key = str(workspace_id) if workspace_id is not None else None
+        timing = {"model_time": 0.0}
+        queued = time.perf_counter()
+        workspace_slot = self._workspace_slot(key)
+
+        try:
+            acquired = await asyncio.wait_for(self._acquire(workspace_slot), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            acquired = False
+        queue_wait = time.perf_counter() - queued
+
+        if not acquired:
+            self._release_workspace_slot(key)
+            self._record(model, mode, "rejected", queue_wait, 0.0)
+            logger.warning("LLM request rejected, no free slot", model=model, workspace_id=workspace_id, queue_wait=queue_wait)
+            raise ExternalServiceError(
+                "gemini",
+                "Too many concurrent LLM requests",
+                {"workspace_id": workspace_id, "queue_wait": queue_wait}
+            )
+
+        self.inflight += 1
+        metrics_collector.set_llm_inflight(model, self.inflight)
+        status = "success"
+        try:
+            yield timing
+        except asyncio.TimeoutError:
+            status = "timeout"
+            raise
+        except (GeneratorExit, asyncio.CancelledError):
+            status = "cancelled"
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self.inflight -= 1
+            metrics_collector.set_llm_inflight(model, self.inflight)
+            self._global_slots.release()
+            if workspace_slot is not None:
+                workspace_slot.release()
+            self._release_workspace_slot(key)
+            self._record(model, mode, status, queue_wait, timing["model_time"])
+
+    async def _acquire(self, workspace_slot: Optional[asyncio.Semaphore]) -> bool:
+        # Take the workspace slot first so a busy workspace queues on its own
+        # limit instead of holding global slots
+        if workspace_slot is not None:
+            await workspace_slot.acquire()
+        try:
+            await self._global_slots.acquire()
+        except BaseException:
+            if workspace_slot is not None:
+                workspace_slot.release()
+            raise
+        return True
+
+    def _workspace_slot(self, key: Optional[str]) -> Optional[asyncio.Semaphore]:
+        if key is None:
+            return None
+        entry = self._workspace_slots.get(key)
+        if entry is None:
+            entry = [asyncio.Semaphore(self.workspace_max_concurrency), 0]
+            self._workspace_slots[key] = entry
+        entry[1] += 1
+        return entry[0]
+
+    def _release_workspace_slot(self, key: Optional[str]) -> None:
+        if key is None:
+            return
+        entry = self._workspace_slots.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._workspace_slots[key]
+
+    def _record(self, model: str, mode: str, status: str, queue_wait: float, model_time: float) -> None:
+        self.stats["requests"] += 1
+        self.stats["queue_wait_total"] += queue_wait
+        self.stats["model_time_total"] += model_time
+        if status == "rejected":
+            self.stats["rejected"] += 1
+        elif status == "timeout":
+            self.stats["timeouts"] += 1
+        elif status == "error":
+            self.stats["errors"] += 1
+        metrics_collector.record_llm_request(model, mode, status, queue_wait, model_time)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Client-side counters, including average queue wait and model time"""
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "inflight": self.inflight,
+            "active_workspaces": len(self._workspace_slots),
+            "avg_queue_wait": self.stats["queue_wait_total"] / requests if requests else 0.0,
+            "avg_model_time": self.stats["model_time_total"] / requests if requests else 0.0,
+        }
+
+
+_http_backend: Optional[GeminiHTTPBackend] = None
+
+
+def get_gemini_http_backend() -> GeminiHTTPBackend:
+    """Process-wide REST backend so the keep-alive pool is shared"""
+    global _http_backend
+    if _http_backend is None:
+        _http_backend = GeminiHTTPBackend(
+            base_url=settings.GEMINI_API_BASE_URL,
+            api_key=settings.GEMINI_API_KEY
+        )
+    return _http_backend
+
+
+# Global instance (singleton)
+llm_client = LLMClient()
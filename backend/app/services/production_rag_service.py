@@ -26,7 +26,8 @@ from app.services.production_vector_service import (
 from app.services.gemini_service import GeminiService
 from app.models.chat import ChatSession, ChatMessage
 from app.models.document import Document, DocumentChunk
-from app.schemas.rag import RAGQueryResponse, RAGQueryRequest
+from app.services.analytics_rollup import AnalyticsRollupService
+from app.schemas.rag import RAGQueryResponse, RAGQueryRequest, RAGStreamChunk
 from app.utils.cache import analytics_cache
 
 logger = structlog.get_logger()
@@ -117,7 +118,7 @@ class ProductionRAGService:
             logger.info("Processing file", file_path=file_path, content_type=content_type)
             
             # Step 1: Extract text blocks
-            text_blocks = await self.file_processor.process_file(file_path, content_type)
+            text_blocks = await self.file_processor.process_file(file_path, content_type, workspace_id=workspace_id)
             
             if not text_blocks:
                 raise ValueError("No text content extracted from file")
@@ -219,20 +220,7 @@ class ProductionRAGService:
         
         try:
             # Step 1: Search for relevant documents (optionally filter by selected docs)
-            if document_ids:
-                from app.services.production_vector_service import SearchConfig
-                search_cfg = SearchConfig(
-                    top_k=config.top_k,
-                    similarity_threshold=config.similarity_threshold,
-                    search_mode=config.search_mode,
-                    use_reranking=config.use_reranking,
-                    rerank_top_k=config.rerank_top_k,
-                    use_cache=config.use_cache,
-                    filter_by_metadata={'document_id': {'$in': document_ids}}
-                )
-                search_results = await self.vector_service.search(query=query, workspace_id=workspace_id, config=search_cfg)
-            else:
-                search_results = await self.search_documents(query, workspace_id, config)
+            search_results = await self._retrieve_for_generation(query, workspace_id, config, document_ids)
             
             if not search_results:
                 return self._create_no_results_response(query, start_time)
@@ -243,17 +231,101 @@ class ProductionRAGService:
             # Step 3: Generate response
             if config.stream_response:
                 return await self._generate_streaming_response(
-                    query, context, sources, session_id, config
+                    query, context, sources, session_id, config, workspace_id=workspace_id
                 )
             else:
                 return await self._generate_single_response(
-                    query, context, sources, session_id, config
+                    query, context, sources, session_id, config, workspace_id=workspace_id
                 )
             
         except Exception as e:
             logger.error("Response generation failed", error=str(e), query=query)
             return self._create_error_response(str(e), start_time)
     
+    async def generate_response_stream(self,
+                                      query: str,
+                                      workspace_id: str,
+                                      session_id: Optional[str] = None,
+                                      config: Optional[RAGConfig] = None,
+                                      document_ids: Optional[List[str]] = None) -> AsyncGenerator[RAGStreamChunk, None]:
+        """Stream the RAG pipeline: sources first, then answer text as Gemini produces it"""
+        if config is None:
+            config = self.default_config
+        
+        start_time = time.time()
+        
+        try:
+            search_results = await self._retrieve_for_generation(query, workspace_id, config, document_ids)
+            
+            if not search_results:
+                yield RAGStreamChunk(
+                    type="answer",
+                    content=self._no_results_answer(),
+                    metadata={"no_results": True}
+                )
+                yield RAGStreamChunk(
+                    type="end",
+                    metadata={"session_id": session_id, "sources_count": 0, "processing_time": time.time() - start_time}
+                )
+                return
+            
+            context, sources = self._build_enhanced_context(search_results, config)
+            yield RAGStreamChunk(
+                type="sources",
+                metadata={"sources": self._format_sources(sources), "sources_count": len(sources)}
+            )
+            
+            gemini_response: Dict[str, Any] = {}
+            async for event in self.gemini_service.generate_response_stream(
+                user_message=query,
+                context=context,
+                sources=sources,
+                workspace_id=workspace_id
+            ):
+                if event["type"] == "delta":
+                    yield RAGStreamChunk(type="answer", content=event["content"], metadata={"is_partial": True})
+                elif event["type"] == "final":
+                    gemini_response = event
+            
+            yield RAGStreamChunk(
+                type="end",
+                metadata={
+                    "session_id": session_id,
+                    "sources_count": len(sources),
+                    "model_used": gemini_response.get("model_used"),
+                    "confidence": gemini_response.get("confidence"),
+                    "tokens_used": gemini_response.get("tokens_used"),
+                    "processing_time": time.time() - start_time
+                }
+            )
+            
+        except Exception as e:
+            logger.error("Streaming response generation failed", error=str(e), query=query)
+            yield RAGStreamChunk(
+                type="error",
+                content="I apologize, but I'm having trouble processing your request right now. Please try again later.",
+                metadata={"error": str(e)}
+            )
+    
+    async def _retrieve_for_generation(self,
+                                       query: str,
+                                       workspace_id: str,
+                                       config: RAGConfig,
+                                       document_ids: Optional[List[str]] = None) -> List[SearchResult]:
+        """Retrieve context for generation, optionally limited to selected documents"""
+        if document_ids:
+            search_cfg = SearchConfig(
+                top_k=config.top_k,
+                similarity_threshold=config.similarity_threshold,
+                search_mode=config.search_mode,
+                use_reranking=config.use_reranking,
+                rerank_top_k=config.rerank_top_k,
+                use_cache=config.use_cache,
+                filter_by_metadata={'document_id': {'$in': document_ids}}
+            )
+            return await self.vector_service.search(query=query, workspace_id=workspace_id, config=search_cfg)
+        return await self.search_documents(query, workspace_id, config)
+    
     async def process_query(self,
                            query: str,
                            workspace_id: str,
@@ -301,7 +373,8 @@ class ProductionRAGService:
                                        context: str,
                                        sources: List[Dict[str, Any]],
                                        session_id: Optional[str],
-                                       config: RAGConfig) -> RAGQueryResponse:
+                                       config: RAGConfig,
+                                       workspace_id: Optional[str] = None) -> RAGQueryResponse:
         """Generate single response using Gemini"""
         try:
             gen_start = time.time()
@@ -312,30 +385,11 @@ class ProductionRAGService:
             gemini_response = await self.gemini_service.generate_response(
                 user_message=query,
                 context=context,
-                sources=sources
+                sources=sources,
+                workspace_id=workspace_id
             )
             
-            # Extract answer and metadata
-            answer = gemini_response.get("response", "I couldn't generate a response.")
-            confidence = gemini_response.get("confidence", 0.8)
-            
-            # Format sources
-            formatted_sources = self._format_sources(sources)
-            
-            return RAGQueryResponse(
-                answer=answer,
-                sources=formatted_sources,
-                confidence=confidence,
-                query=query,
-                context_used=context[:200] + "..." if len(context) > 200 else context,
-                processing_time=time.time() - gen_start,
-                metadata={
-                    "response_style": config.response_style.value,
-                    "sources_count": len(sources),
-                    "context_length": len(context),
-                    "session_id": session_id
-                }
-            )
+            return self._build_query_response(query, context, sources, session_id, config, gemini_response, gen_start)
             
         except Exception as e:
             logger.error("Response generation failed", error=str(e))
@@ -346,11 +400,61 @@ class ProductionRAGService:
                                           context: str,
                                           sources: List[Dict[str, Any]],
                                           session_id: Optional[str],
-                                          config: RAGConfig) -> RAGQueryResponse:
-        """Generate streaming response"""
-        # For now, return single response
-        # Streaming implementation would go here
-        return await self._generate_single_response(query, context, sources, session_id, config)
+                                          config: RAGConfig,
+                                          workspace_id: Optional[str] = None) -> RAGQueryResponse:
+        """Generate a response through Gemini's streaming API and collect it.
+        
+        Callers that can forward partial text should use
+        :meth:`generate_response_stream` instead.
+        """
+        try:
+            gen_start = time.time()
+            gemini_response: Dict[str, Any] = {}
+            async for event in self.gemini_service.generate_response_stream(
+                user_message=query,
+                context=context,
+                sources=sources,
+                workspace_id=workspace_id
+            ):
+                if event["type"] == "final":
+                    gemini_response = event
+            
+            return self._build_query_response(query, context, sources, session_id, config, gemini_response, gen_start)
+            
+        except Exception as e:
+            logger.error("Streaming response generation failed", error=str(e))
+            raise
+    
+    def _build_query_response(self,
+                              query: str,
+                              context: str,
+                              sources: List[Dict[str, Any]],
+                              session_id: Optional[str],
+                              config: RAGConfig,
+                              gemini_response: Dict[str, Any],
+                              gen_start: float) -> RAGQueryResponse:
+        """Build the query response from a Gemini result"""
+        # Extract answer and metadata
+        answer = gemini_response.get("content") or gemini_response.get("response") or "I couldn't generate a response."
+        confidence = gemini_response.get("confidence", 0.8)
+        
+        # Format sources
+        formatted_sources = self._format_sources(sources)
+        
+        return RAGQueryResponse(
+            answer=answer,
+            sources=formatted_sources,
+            confidence=confidence,
+            query=query,
+            context_used=context[:200] + "..." if len(context) > 200 else context,
+            processing_time=time.time() - gen_start,
+            metadata={
+                "response_style": config.response_style.value,
+                "sources_count": len(sources),
+                "context_length": len(context),
+                "session_id": session_id
+            }
+        )
     
     def _build_enhanced_context(self, 
                                search_results: List[SearchResult], 
@@ -459,6 +563,7 @@ Instructions:
             session_id=str(uuid.uuid4())
         )
         self.db.add(session)
+        AnalyticsRollupService(self.db).record_session_started(session)
         self.db.commit()
         self.db.refresh(session)
         
@@ -489,6 +594,7 @@ Instructions:
                 confidence_score=str(response.confidence or "")
             )
             self.db.add(assistant_message)
+            AnalyticsRollupService(self.db).record_messages(session.workspace_id, [user_message, assistant_message])
             
             # Update session
             session.updated_at = time.time()
@@ -522,6 +628,7 @@ Instructions:
                 status="done"
             )
             self.db.add(document)
+            AnalyticsRollupService(self.db).record_document_uploaded(document)
             self.db.flush()  # Get document ID
             
             # Create chunk records
@@ -546,10 +653,14 @@ Instructions:
             self.db.rollback()
             raise
     
+    def _no_results_answer(self) -> str:
+        """Answer text used when retrieval finds nothing"""
+        return "I couldn't find any relevant information to answer your question. Please try rephrasing your query or check if the relevant documents have been uploaded."
+    
     def _create_no_results_response(self, query: str, start_time: float) -> RAGQueryResponse:
         """Create response when no results found"""
         return RAGQueryResponse(
-            answer="I couldn't find any relevant information to answer your question. Please try rephrasing your query or check if the relevant documents have been uploaded.",
+            answer=self._no_results_answer(),
             sources=[],
             confidence=0.0,
             query=query,
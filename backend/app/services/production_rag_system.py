@@ -47,7 +47,6 @@ except ImportError:
 try:
     from sentence_transformers import SentenceTransformer, CrossEncoder
     from sklearn.cluster import KMeans
-    from sklearn.feature_extraction.text import TfidfVectorizer
     from sklearn.metrics.pairwise import cosine_similarity
     ML_AVAILABLE = True
 except ImportError:
@@ -72,6 +71,7 @@ from app.core.config import settings
 from app.models.chat import ChatSession, ChatMessage
 from app.models.document import Document, DocumentChunk
 from app.schemas.rag import RAGQueryResponse
+from app.services.keyword_extractor import keyword_extractor
 
 logger = structlog.get_logger()
 
@@ -184,6 +184,9 @@ class ProductionFileProcessor:
         
         # Initialize ML models
         self._initialize_ml_models()
+        
+        # Document-level keyword scoring with shared workspace IDF
+        self.keyword_extractor = keyword_extractor
     
     def _initialize_text_processing(self):
         """Initialize text processing tools"""
@@ -217,7 +220,6 @@ class ProductionFileProcessor:
             # Skip heavy model loading in CI/testing
             self.embedding_model = None
             self.reranking_model = None
-            self.tfidf_vectorizer = None
             self.ml_available = False
             logger.info("Skipping ML model initialization in TESTING mode")
             return
@@ -229,13 +231,6 @@ class ProductionFileProcessor:
                 # Initialize cross-encoder for reranking
                 self.reranking_model = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
                 
-                # Initialize TF-IDF vectorizer for keyword extraction
-                self.tfidf_vectorizer = TfidfVectorizer(
-                    max_features=1000,
-                    stop_words='english',
-                    ngram_range=(1, 2)
-                )
-                
                 self.ml_available = True
                 logger.info("ML models initialized successfully")
             except Exception as e:
@@ -244,30 +239,34 @@ class ProductionFileProcessor:
         else:
             self.ml_available = False
     
-    async def process_file(self, file_path: str, content_type: str) -> List[TextBlock]:
+    async def process_file(self, file_path: str, content_type: str, workspace_id: Optional[str] = None) -> List[TextBlock]:
         """Process file with advanced text extraction and analysis"""
         try:
             logger.info("Processing file", file_path=file_path, content_type=content_type)
             
             # Route to appropriate processor
             if content_type == FileType.PDF.value:
-                return await self._process_pdf_advanced(file_path)
+                text_blocks = await self._process_pdf_advanced(file_path)
             elif content_type == FileType.DOCX.value:
-                return await self._process_docx_advanced(file_path)
+                text_blocks = await self._process_docx_advanced(file_path)
             elif content_type == FileType.TXT.value:
-                return await self._process_txt_advanced(file_path)
+                text_blocks = await self._process_txt_advanced(file_path)
             elif content_type == FileType.MD.value:
-                return await self._process_markdown_advanced(file_path)
+                text_blocks = await self._process_markdown_advanced(file_path)
             elif content_type == FileType.CSV.value:
-                return await self._process_csv_advanced(file_path)
+                text_blocks = await self._process_csv_advanced(file_path)
             elif content_type == FileType.XLSX.value:
-                return await self._process_xlsx_advanced(file_path)
+                text_blocks = await self._process_xlsx_advanced(file_path)
             elif content_type == FileType.JSON.value:
-                return await self._process_json_advanced(file_path)
+                text_blocks = await self._process_json_advanced(file_path)
             elif content_type == FileType.HTML.value:
-                return await self._process_html_advanced(file_path)
+                text_blocks = await self._process_html_advanced(file_path)
             else:
                 raise ValueError(f"Unsupported content type: {content_type}")
+            
+            # Score keywords for the whole document in one pass
+            self._assign_keywords(text_blocks, workspace_id)
+            return text_blocks
                 
         except Exception as e:
             logger.error("File processing failed", error=str(e), file_path=file_path)
@@ -309,7 +308,6 @@ class ProductionFileProcessor:
                             block_type = self._classify_text_block_advanced(block_text, font_info)
                             importance = self._calculate_importance_score_advanced(block_text, block_type)
                             entities = self._extract_entities(block_text)
-                            keywords = self._extract_keywords(block_text)
                             
                             text_blocks.append(TextBlock(
                                 text=block_text.strip(),
@@ -322,8 +320,7 @@ class ProductionFileProcessor:
                                 block_type=block_type,
                                 page_number=page_num + 1,
                                 importance_score=importance,
-                                entities=entities,
-                                keywords=keywords
+                                entities=entities
                             ))
                 
                 # Extract images and tables if needed
@@ -369,7 +366,6 @@ class ProductionFileProcessor:
                         block_type = self._classify_text_block_advanced(para)
                         importance = self._calculate_importance_score_advanced(para, block_type)
                         entities = self._extract_entities(para)
-                        keywords = self._extract_keywords(para)
                         
                         text_blocks.append(TextBlock(
                             text=para,
@@ -377,8 +373,7 @@ class ProductionFileProcessor:
                             block_type=block_type,
                             page_number=page_num + 1,
                             importance_score=importance,
-                            entities=entities,
-                            keywords=keywords
+                            entities=entities
                         ))
         
         return text_blocks
@@ -413,7 +408,6 @@ class ProductionFileProcessor:
                 importance = self._calculate_importance_score_advanced(paragraph.text, block_type)
             
             entities = self._extract_entities(paragraph.text)
-            keywords = self._extract_keywords(paragraph.text)
             
             text_blocks.append(TextBlock(
                 text=paragraph.text.strip(),
@@ -426,8 +420,7 @@ class ProductionFileProcessor:
                 section=current_section,
                 subsection=current_subsection,
                 importance_score=importance,
-                entities=entities,
-                keywords=keywords
+                entities=entities
             ))
         
         return text_blocks
@@ -446,7 +439,6 @@ class ProductionFileProcessor:
                 block_type = self._classify_text_block_advanced(section['text'])
                 importance = self._calculate_importance_score_advanced(section['text'], block_type)
                 entities = self._extract_entities(section['text'])
-                keywords = self._extract_keywords(section['text'])
                 
                 text_blocks.append(TextBlock(
                     text=section['text'],
@@ -458,8 +450,7 @@ class ProductionFileProcessor:
                     block_type=block_type,
                     section=section.get('title'),
                     importance_score=importance,
-                    entities=entities,
-                    keywords=keywords
+                    entities=entities
                 ))
         
         return text_blocks
@@ -499,7 +490,6 @@ class ProductionFileProcessor:
                         importance = 0.7
                     
                     entities = self._extract_entities(header_text)
-                    keywords = self._extract_keywords(header_text)
                     
                     text_blocks.append(TextBlock(
                         text=header_text,
@@ -512,15 +502,13 @@ class ProductionFileProcessor:
                         section=current_section,
                         subsection=current_subsection,
                         importance_score=importance,
-                        entities=entities,
-                        keywords=keywords
+                        entities=entities
                     ))
                 else:
                     # Regular content
                     block_type = self._classify_text_block_advanced(line)
                     importance = self._calculate_importance_score_advanced(line, block_type)
                     entities = self._extract_entities(line)
-                    keywords = self._extract_keywords(line)
                     
                     text_blocks.append(TextBlock(
                         text=line,
@@ -532,8 +520,7 @@ class ProductionFileProcessor:
                         section=current_section,
                         subsection=current_subsection,
                         importance_score=importance,
-                        entities=entities,
-                        keywords=keywords
+                        entities=entities
                     ))
         
         return text_blocks
@@ -561,7 +548,6 @@ class ProductionFileProcessor:
                 if row_text.strip():
                     # Analyze row content
                     entities = self._extract_entities(row_text)
-                    keywords = self._extract_keywords(row_text)
                     
                     text_blocks.append(TextBlock(
                         text=row_text,
@@ -572,8 +558,7 @@ class ProductionFileProcessor:
                         },
                         block_type="table_row",
                         importance_score=0.6,
-                        entities=entities,
-                        keywords=keywords
+                        entities=entities
                     ))
             
             # Add column analysis
@@ -617,7 +602,6 @@ class ProductionFileProcessor:
                     
                     if row_text.strip():
                         entities = self._extract_entities(row_text)
-                        keywords = self._extract_keywords(row_text)
                         
                         text_blocks.append(TextBlock(
                             text=row_text,
@@ -628,8 +612,7 @@ class ProductionFileProcessor:
                             },
                             block_type="table_row",
                             importance_score=0.6,
-                            entities=entities,
-                            keywords=keywords
+                            entities=entities
                         ))
                         
         except Exception as e:
@@ -687,7 +670,6 @@ class ProductionFileProcessor:
                     block_type = self._classify_html_element(tag.name)
                     importance = self._calculate_importance_score_advanced(text, block_type)
                     entities = self._extract_entities(text)
-                    keywords = self._extract_keywords(text)
                     
                     text_blocks.append(TextBlock(
                         text=text,
@@ -698,8 +680,7 @@ class ProductionFileProcessor:
                         },
                         block_type=block_type,
                         importance_score=importance,
-                        entities=entities,
-                        keywords=keywords
+                        entities=entities
                     ))
                     
         except ImportError:
@@ -828,22 +809,29 @@ class ProductionFileProcessor:
             logger.warning("Entity extraction failed", error=str(e))
             return []
     
-    def _extract_keywords(self, text: str) -> List[str]:
-        """Extract keywords from text"""
-        if not self.ml_available:
+    def _assign_keywords(self, text_blocks: List[TextBlock], workspace_id: Optional[str] = None) -> None:
+        """Attach TF-IDF keywords to every text block of a document"""
+        if not self.keyword_extractor.available:
+            return
+        
+        scored_blocks = [block for block in text_blocks if block.block_type != "image" and block.text.strip()]
+        if not scored_blocks:
+            return
+        
+        try:
+            keywords = self.keyword_extractor.extract([block.text for block in scored_blocks], workspace_id=workspace_id)
+            for block, block_keywords in zip(scored_blocks, keywords):
+                block.keywords = block_keywords
+        except Exception as e:
+            logger.warning("Keyword extraction failed", error=str(e))
+    
+    def _extract_keywords(self, text: str, workspace_id: Optional[str] = None) -> List[str]:
+        """Extract keywords from a single text against workspace IDF statistics"""
+        if not text or not self.keyword_extractor.available:
             return []
         
         try:
-            # Use TF-IDF to extract keywords
-            tfidf_matrix = self.tfidf_vectorizer.fit_transform([text])
-            feature_names = self.tfidf_vectorizer.get_feature_names_out()
-            
-            # Get top keywords
-            scores = tfidf_matrix.toarray()[0]
-            top_indices = scores.argsort()[-10:][::-1]  # Top 10 keywords
-            
-            keywords = [feature_names[i] for i in top_indices if scores[i] > 0]
-            return keywords
+            return self.keyword_extractor.extract([text], workspace_id=workspace_id, update_stats=False)[0]
         except Exception as e:
             logger.warning("Keyword extraction failed", error=str(e))
             return []
@@ -935,15 +923,13 @@ class ProductionFileProcessor:
             block_type = self._classify_text_block_advanced(data)
             importance = self._calculate_importance_score_advanced(data, block_type)
             entities = self._extract_entities(data)
-            keywords = self._extract_keywords(data)
             
             text_blocks.append(TextBlock(
                 text=data,
                 metadata={"json_path": path},
                 block_type=block_type,
                 importance_score=importance,
-                entities=entities,
-                keywords=keywords
+                entities=entities
             ))
         
         return text_blocks
@@ -9,22 +9,15 @@ import hashlib
 import json
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import List, Dict, Any, Optional, Tuple, Union
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
 import structlog
 import numpy as np
 from sqlalchemy.orm import Session
 
-# Vector database
-try:
-    import chromadb
-    from chromadb.config import Settings
-    from chromadb.utils import embedding_functions
-    CHROMADB_AVAILABLE = True
-except ImportError:
-    CHROMADB_AVAILABLE = False
-
 # Redis caching
 try:
     import redis.asyncio as aioredis
@@ -42,19 +35,35 @@ try:
 except ImportError:
     ML_AVAILABLE = False
 
-# BM25 for hybrid search
-try:
-    from rank_bm25 import BM25Okapi
-    BM25_AVAILABLE = True
-except ImportError:
-    BM25_AVAILABLE = False
-
 from app.core.config import settings
 from app.models.document import Document, DocumentChunk
+from app.services.bm25_index import bm25_index_manager
+from app.services.cache_tags import cache_tags, workspace_tag
+from app.services.embedding_batcher import get_embedding_batcher
 from app.services.production_rag_system import Chunk, TextBlock
+from app.services.rank_fusion import reciprocal_rank_fusion
+from app.services.reranker import CrossEncoderReranker
+from app.services.vector_store import DEFAULT_NAMESPACE, get_vector_store
 
 logger = structlog.get_logger()
 
+RERANKING_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Dedicated executor for ingest-time encoding and collection writes, so large
+# uploads neither block the event loop nor starve the default thread pool
+_ingest_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_ingest_executor() -> ThreadPoolExecutor:
+    """Get (lazily create) the shared ingest executor"""
+    global _ingest_executor
+    if _ingest_executor is None:
+        _ingest_executor = ThreadPoolExecutor(
+            max_workers=max(2, settings.VECTOR_INGEST_MAX_WORKERS),
+            thread_name_prefix="vector-ingest"
+        )
+    return _ingest_executor
+
 
 class SearchMode(Enum):
     """Search modes for vector search"""
@@ -106,10 +115,10 @@ class ProductionVectorService:
     
     def __init__(self, 
                  db: Session,
-                 embedding_model: str = "all-mpnet-base-v2",
-                 collection_name: str = "documents"):
+                 embedding_model: Optional[str] = None,
+                 collection_name: str = DEFAULT_NAMESPACE):
         self.db = db
-        self.embedding_model_name = embedding_model
+        self.embedding_model_name = embedding_model or settings.VECTOR_EMBEDDING_MODEL
         self.collection_name = collection_name
         
         # Initialize components
@@ -126,7 +135,8 @@ class ProductionVectorService:
             "avg_search_time": 0.0,
             "embedding_time": 0.0,
             "search_time": 0.0,
-            "rerank_time": 0.0
+            "rerank_time": 0.0,
+            "indexing_time": 0.0
         }
     
     def _initialize_embedding_model(self):
@@ -146,46 +156,14 @@ class ProductionVectorService:
             self.embedding_dimension = 384
     
     def _initialize_vector_database(self):
-        """Initialize ChromaDB vector database (HTTP client for Cloud Run)."""
-        if not CHROMADB_AVAILABLE:
-            logger.warning("ChromaDB not available")
-            self.chroma_client = None
-            self.collection = None
-            return
-
-        try:
-            if not getattr(settings, "CHROMA_URL", None):
-                logger.warning("CHROMA_URL not set; vector search will be inactive")
-                self.chroma_client = None
-                self.collection = None
-                return
-
-            chroma_host = settings.CHROMA_URL.replace("http://", "").replace("https://", "")
-            headers = None
-            api_key = (getattr(settings, "CHROMA_AUTH_CREDENTIALS", "") or "").strip()
-            if api_key:
-                headers = {"X-API-Key": api_key}
-            self.chroma_client = chromadb.HttpClient(
-                host=chroma_host,
-                port=8001,
-                settings=Settings(
-                    anonymized_telemetry=False,
-                    allow_reset=True
-                ),
-                headers=headers
-            )
-
-            # Create or get collection
-            self.collection = self.chroma_client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
-
-            logger.info("ChromaDB (HTTP) initialized successfully", host=chroma_host)
-        except Exception as e:
-            logger.error("Failed to initialize ChromaDB (HTTP)", error=str(e))
-            self.chroma_client = None
-            self.collection = None
+        """Initialize the workspace-sharded vector store (Chroma server or embedded)."""
+        self.vector_store = get_vector_store(self.collection_name)
+        if self.vector_store is None:
+            logger.warning("Vector store not available; vector search will be inactive")
+    
+    def _shard(self, workspace_id: str):
+        """Collection holding only this workspace's chunks"""
+        return self.vector_store.get_shard(workspace_id)
     
     def _initialize_redis_cache(self):
         """Initialize Redis cache"""
@@ -206,9 +184,10 @@ class ProductionVectorService:
     
     def _initialize_reranking_model(self):
         """Initialize reranking model"""
+        self.reranker = None
         if ML_AVAILABLE:
             try:
-                self.reranking_model = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+                self.reranking_model = CrossEncoder(RERANKING_MODEL_NAME)
                 logger.info("Reranking model loaded successfully")
             except Exception as e:
                 logger.warning("Failed to load reranking model", error=str(e))
@@ -216,79 +195,148 @@ class ProductionVectorService:
         else:
             self.reranking_model = None
     
+    def _get_reranker(self) -> Optional[CrossEncoderReranker]:
+        """Reranker wrapping the current cross-encoder and Redis client"""
+        if not self.reranking_model:
+            return None
+        reranker = getattr(self, "reranker", None)
+        if reranker is None or reranker.model is not self.reranking_model:
+            reranker = CrossEncoderReranker(
+                self.reranking_model,
+                RERANKING_MODEL_NAME,
+                redis_client=self.redis_client
+            )
+            self.reranker = reranker
+        return reranker
+    
     def _initialize_bm25(self):
-        """Initialize BM25 for hybrid search"""
-        if BM25_AVAILABLE:
-            self.bm25_available = True
-            logger.info("BM25 available for hybrid search")
-        else:
-            self.bm25_available = False
-            logger.warning("BM25 not available, hybrid search disabled")
+        """Initialize the persistent per-workspace BM25 index for hybrid search"""
+        self.bm25_index = bm25_index_manager
+        self.bm25_available = True
     
     async def add_chunks(self, 
                         chunks: List[Chunk], 
                         workspace_id: str,
-                        indexing_strategy: IndexingStrategy = IndexingStrategy.HYBRID) -> bool:
-        """Add chunks to vector database with advanced indexing"""
+                        indexing_strategy: IndexingStrategy = IndexingStrategy.HYBRID,
+                        batch_size: Optional[int] = None) -> bool:
+        """Add chunks to vector database with advanced indexing.
+        
+        Chunks are encoded in micro-batches on the ingest executor, and the
+        shard write for one batch runs while the next batch is encoded.
+        """
         try:
-            if not self.collection:
+            if not self.vector_store:
                 logger.error("Vector database not initialized")
                 return False
             
-            # Prepare data for indexing
-            chunk_ids = []
-            embeddings = []
-            metadatas = []
-            documents = []
+            batch_size = max(1, batch_size or settings.VECTOR_INGEST_BATCH_SIZE)
+            loop = asyncio.get_running_loop()
+            executor = _get_ingest_executor()
+            start_time = time.time()
             
-            for chunk in chunks:
-                # Generate embedding
-                embedding = await self._generate_embedding(chunk.text)
-                if embedding is None:
-                    continue
+            pending_add = None
+            indexed = 0
+            for start in range(0, len(chunks), batch_size):
+                batch = chunks[start:start + batch_size]
                 
-                # Prepare metadata
-                metadata = {
-                    "chunk_id": chunk.chunk_id,
-                    "document_id": chunk.document_id,
-                    "workspace_id": workspace_id,
-                    "chunk_index": chunk.chunk_index,
-                    "importance_score": chunk.importance_score,
-                    "block_types": json.dumps(chunk.metadata.get("block_types", [])),
-                    "sections": json.dumps(chunk.metadata.get("sections", [])),
-                    "entities": json.dumps(chunk.entities),
-                    "keywords": json.dumps(chunk.keywords),
-                    "created_at": chunk.created_at,
-                    "text_length": len(chunk.text)
-                }
+                # Encode this batch while the previous batch is being written
+                embeddings = await self._generate_embeddings_batch([chunk.text for chunk in batch])
                 
-                # Add custom metadata
-                metadata.update(chunk.metadata)
+                if pending_add is not None:
+                    indexed += await pending_add
+                    pending_add = None
                 
-                chunk_ids.append(chunk.chunk_id)
-                embeddings.append(embedding)
-                metadatas.append(metadata)
-                documents.append(chunk.text)
-            
-            # Add to ChromaDB
-            self.collection.add(
-                ids=chunk_ids,
-                embeddings=embeddings,
-                metadatas=metadatas,
-                documents=documents
-            )
+                if embeddings is None:
+                    continue
+                
+                chunk_ids, metadatas, documents = self._prepare_chunk_batch(batch, workspace_id)
+                pending_add = loop.run_in_executor(
+                    executor,
+                    partial(
+                        self._add_batch_to_collection,
+                        workspace_id,
+                        chunk_ids,
+                        embeddings,
+                        metadatas,
+                        documents
+                    )
+                )
+            
+            if pending_add is not None:
+                indexed += await pending_add
+            
+            # Persist the shard (no-op for the Chroma backend)
+            await loop.run_in_executor(executor, self.vector_store.flush, workspace_id)
             
             # Index for BM25 if using hybrid strategy
             if indexing_strategy in [IndexingStrategy.HYBRID, IndexingStrategy.SPARSE]:
                 await self._index_for_bm25(chunks, workspace_id)
             
-            logger.info(f"Added {len(chunks)} chunks to vector database")
+            # Cached searches no longer reflect the workspace's content
+            if indexed:
+                await cache_tags.invalidate(workspace_tag("search", workspace_id))
+            
+            indexing_time = time.time() - start_time
+            self.search_stats["indexing_time"] = indexing_time
+            logger.info(
+                f"Added {indexed} chunks to vector database",
+                workspace_id=workspace_id,
+                batch_size=batch_size,
+                indexing_time=round(indexing_time, 3)
+            )
             return True
             
         except Exception as e:
             logger.error("Failed to add chunks to vector database", error=str(e))
             return False
     
+    def _prepare_chunk_batch(self, 
+                             chunks: List[Chunk], 
+                             workspace_id: str) -> Tuple[List[str], List[Dict[str, Any]], List[str]]:
+        """Build ids, metadata and documents for a batch of chunks"""
+        chunk_ids = []
+        metadatas = []
+        documents = []
+        
+        for chunk in chunks:
+            metadata = {
+                "chunk_id": chunk.chunk_id,
+                "document_id": chunk.document_id,
+                "workspace_id": workspace_id,
+                "chunk_index": chunk.chunk_index,
+                "importance_score": chunk.importance_score,
+                "block_types": json.dumps(chunk.metadata.get("block_types", [])),
+                "sections": json.dumps(chunk.metadata.get("sections", [])),
+                "entities": json.dumps(chunk.entities),
+                "keywords": json.dumps(chunk.keywords),
+                "created_at": chunk.created_at,
+                "text_length": len(chunk.text)
+            }
+            
+            # Add custom metadata
+            metadata.update(chunk.metadata)
+            
+            chunk_ids.append(chunk.chunk_id)
+            metadatas.append(metadata)
+            documents.append(chunk.text)
+        
+        return chunk_ids, metadatas, documents
+    
+    def _add_batch_to_collection(self,
+                                 workspace_id: str,
+                                 chunk_ids: List[str],
+                                 embeddings: List[List[float]],
+                                 metadatas: List[Dict[str, Any]],
+                                 documents: List[str]) -> int:
+        """Write one prepared batch to the workspace shard (runs on the ingest executor)"""
+        self._shard(workspace_id).add(
+            ids=chunk_ids,
+            embeddings=embeddings,
+            metadatas=metadatas,
+            documents=documents
+        )
+        return len(chunk_ids)
+    
     async def search(self, 
                     query: str, 
                     workspace_id: str,
@@ -350,52 +398,82 @@ class ProductionVectorService:
     
     async def _similarity_search(self, query: str, workspace_id: str, config: SearchConfig) -> List[SearchResult]:
         """Pure vector similarity search"""
-        if not self.collection:
-            return []
-        
-        # Generate query embedding
-        query_embedding = await self._generate_embedding(query)
-        if query_embedding is None:
-            return []
-        
-        # Build where clause for workspace filtering
-        where_clause = {"workspace_id": workspace_id}
-        if config.filter_by_metadata:
-            where_clause.update(config.filter_by_metadata)
-        
-        # Search in ChromaDB
-        search_results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=config.top_k,
-            where=where_clause
+        return (await self._similarity_search_many([query], workspace_id, config))[0]
+    
+    async def _similarity_search_many(self,
+                                      queries: List[str],
+                                      workspace_id: str,
+                                      config: SearchConfig) -> List[List[SearchResult]]:
+        """Vector similarity search for several queries at once.
+        
+        All query embeddings are encoded in one batch and sent to the shard
+        as a single multi-query lookup; results are returned per query.
+        """
+        empty: List[List[SearchResult]] = [[] for _ in queries]
+        if not self.vector_store or not queries:
+            return empty
+        
+        # Generate query embeddings
+        query_embeddings = await self._generate_embeddings(queries)
+        if query_embeddings is None:
+            return empty
+        
+        # The shard only holds this workspace, so only user filters remain
+        where_clause = dict(config.filter_by_metadata) if config.filter_by_metadata else None
+        
+        loop = asyncio.get_running_loop()
+        search_results = await loop.run_in_executor(
+            None,
+            partial(
+                self._shard(workspace_id).query,
+                query_embeddings=query_embeddings,
+                n_results=config.top_k,
+                where=where_clause
+            )
         )
         
         # Convert to SearchResult objects
-        results = []
-        if search_results['ids'] and search_results['ids'][0]:
-            for i, chunk_id in enumerate(search_results['ids'][0]):
+        result_ids = search_results['ids'] or []
+        all_results = []
+        for q in range(len(queries)):
+            results = []
+            for i, chunk_id in enumerate(result_ids[q] if q < len(result_ids) else []):
                 results.append(SearchResult(
                     chunk_id=chunk_id,
-                    document_id=search_results['metadatas'][0][i].get('document_id', 0),
-                    text=search_results['documents'][0][i],
-                    score=1 - search_results['distances'][0][i],  # Convert distance to similarity
-                    metadata=search_results['metadatas'][0][i],
+                    document_id=search_results['metadatas'][q][i].get('document_id', 0),
+                    text=search_results['documents'][q][i],
+                    score=1 - search_results['distances'][q][i],  # Convert distance to similarity
+                    metadata=search_results['metadatas'][q][i],
                     search_method="vector_similarity",
                     rank=i + 1
                 ))
+            all_results.append(results)
         
-        return results
+        return all_results
     
-    async def _hybrid_search(self, query: str, workspace_id: str, config: SearchConfig) -> List[SearchResult]:
-        """Hybrid search combining vector similarity and BM25"""
+    async def _hybrid_search(self,
+                             query: str,
+                             workspace_id: str,
+                             config: SearchConfig,
+                             vector_results: Optional[List[SearchResult]] = None) -> List[SearchResult]:
+        """Hybrid search combining vector similarity and BM25.
+        
+        ``vector_results`` lets callers that already ran the similarity
+        search for ``query`` reuse it instead of searching again.
+        """
         if not self.bm25_available:
+            if vector_results is not None:
+                return vector_results[:config.top_k]
             return await self._similarity_search(query, workspace_id, config)
         
-        # Get vector results
-        vector_results = await self._similarity_search(query, workspace_id, config)
-        
-        # Get BM25 results
-        bm25_results = await self._bm25_search(query, workspace_id, config)
+        if vector_results is None:
+            # Vector and BM25 lookups are independent, so run them together
+            vector_results, bm25_results = await asyncio.gather(
+                self._similarity_search(query, workspace_id, config),
+                self._bm25_search(query, workspace_id, config)
+            )
+        else:
+            bm25_results = await self._bm25_search(query, workspace_id, config)
         
         # Combine and rerank results
         combined_results = self._combine_search_results(vector_results, bm25_results)
@@ -407,11 +485,9 @@ class ProductionVectorService:
         # Generate multiple query variations
         query_variations = await self._generate_query_variations(query)
         
-        # Search with each variation
-        all_results = []
-        for variation in query_variations:
-            results = await self._similarity_search(variation, workspace_id, config)
-            all_results.extend(results)
+        # Search with every variation in one batched lookup
+        per_variation = await self._similarity_search_many(query_variations, workspace_id, config)
+        all_results = [result for results in per_variation for result in results]
         
         # Deduplicate and rerank
         unique_results = self._deduplicate_results(all_results)
@@ -429,22 +505,37 @@ class ProductionVectorService:
             f"Information about {query}",  # Information format
         ]
         
-        # Search with each query
-        all_results = []
-        for q in queries:
-            results = await self._similarity_search(q, workspace_id, config)
-            all_results.extend(results)
+        # Search with every formulation in one batched lookup
+        per_query = await self._similarity_search_many(queries, workspace_id, config)
+        all_results = [result for results in per_query for result in results]
         
         # Combine and deduplicate
         combined_results = self._deduplicate_results(all_results)
         return combined_results[:config.top_k]
     
     async def _fusion_search(self, query: str, workspace_id: str, config: SearchConfig) -> List[SearchResult]:
-        """Fusion search combining multiple methods"""
-        # Run different search methods
-        vector_results = await self._similarity_search(query, workspace_id, config)
-        hybrid_results = await self._hybrid_search(query, workspace_id, config)
-        semantic_results = await self._semantic_search(query, workspace_id, config)
+        """Fusion search combining multiple methods.
+        
+        Similarity, hybrid and semantic search share their sub-searches: the
+        original query and its variations are looked up in one batch while
+        BM25 runs alongside, and everything is reranked once at the end.
+        """
+        query_variations = await self._generate_query_variations(query)
+        if query not in query_variations:
+            query_variations.insert(0, query)
+        
+        per_variation, bm25_results = await asyncio.gather(
+            self._similarity_search_many(query_variations, workspace_id, config),
+            self._bm25_search(query, workspace_id, config)
+        )
+        
+        # The original query's vector results feed both similarity and hybrid
+        vector_results = per_variation[query_variations.index(query)]
+        if self.bm25_available:
+            hybrid_results = self._combine_search_results(vector_results, bm25_results)[:config.top_k]
+        else:
+            hybrid_results = []
+        semantic_results = [result for results in per_variation for result in results]
         
         # Combine all results
         all_results = vector_results + hybrid_results + semantic_results
@@ -456,36 +547,53 @@ class ProductionVectorService:
         return reranked_results
     
     async def _bm25_search(self, query: str, workspace_id: str, config: SearchConfig) -> List[SearchResult]:
-        """BM25 search for hybrid retrieval"""
-        # Minimal placeholder: return empty list if library unavailable
+        """BM25 search over the workspace inverted index"""
         if not self.bm25_available:
             return []
-        # If BM25 available, attempt a naive sparse scoring using collection documents
         try:
-            if not self.collection:
-                return []
-            # Pull a small candidate set via vector as corpus sample to avoid full scan
-            vector_candidates = await self._similarity_search(query, workspace_id, SearchConfig(top_k=max(50, config.top_k)))
-            if not vector_candidates:
+            loop = asyncio.get_running_loop()
+            # Over-fetch when filtering so post-filtering still fills top_k
+            limit = config.top_k * 4 if config.filter_by_metadata else config.top_k
+            scored = await loop.run_in_executor(
+                None, self.bm25_index.search, workspace_id, query, limit
+            )
+            if not scored or not self.vector_store:
                 return []
-            docs = [r.text for r in vector_candidates]
-            bm25 = BM25Okapi([d.split() for d in docs])
-            scores = bm25.get_scores(query.split())
-            scored = []
-            for i, r in enumerate(vector_candidates):
-                sr = SearchResult(
-                    chunk_id=r.chunk_id,
-                    document_id=r.document_id,
-                    text=r.text,
-                    score=float(scores[i]) if i < len(scores) else 0.0,
-                    metadata=r.metadata,
+            
+            # Hydrate text and metadata for the matched chunks in one round trip; opening
+            # the shard may read it from disk, so that runs off the event loop too
+            fetched = await loop.run_in_executor(None, lambda: self._shard(workspace_id).get(
+                ids=[chunk_id for chunk_id, _ in scored],
+                include=["documents", "metadatas"]
+            ))
+            by_id = {
+                chunk_id: (fetched["documents"][i], fetched["metadatas"][i] or {})
+                for i, chunk_id in enumerate(fetched.get("ids") or [])
+            }
+            
+            results = []
+            for chunk_id, score in scored:
+                if chunk_id not in by_id:
+                    continue
+                text, metadata = by_id[chunk_id]
+                if config.filter_by_metadata and any(
+                    metadata.get(key) != value for key, value in config.filter_by_metadata.items()
+                ):
+                    continue
+                results.append(SearchResult(
+                    chunk_id=chunk_id,
+                    document_id=metadata.get("document_id", 0),
+                    text=text,
+                    score=float(score),
+                    metadata=metadata,
                     search_method="bm25",
-                    rank=i + 1,
-                )
-                scored.append(sr)
-            scored.sort(key=lambda x: x.score, reverse=True)
-            return scored[:config.top_k]
-        except Exception:
+                    rank=len(results) + 1,
+                ))
+                if len(results) >= config.top_k:
+                    break
+            return results
+        except Exception as e:
+            logger.warning("BM25 search failed", error=str(e))
             return []
     
     async def _generate_query_variations(self, query: str) -> List[str]:
@@ -508,35 +616,13 @@ class ProductionVectorService:
     
     def _combine_search_results(self, vector_results: List[SearchResult], bm25_results: List[SearchResult]) -> List[SearchResult]:
         """Combine vector and BM25 results using reciprocal rank fusion"""
-        # Create score maps
-        vector_scores = {r.chunk_id: r.score for r in vector_results}
-        bm25_scores = {r.chunk_id: r.score for r in bm25_results}
-        
-        # Get all unique chunk IDs
-        all_chunk_ids = set(vector_scores.keys()) | set(bm25_scores.keys())
-        
-        # Calculate reciprocal rank fusion scores
         combined_results = []
-        for chunk_id in all_chunk_ids:
-            vector_score = vector_scores.get(chunk_id, 0.0)
-            bm25_score = bm25_scores.get(chunk_id, 0.0)
-            
-            # Reciprocal rank fusion
-            rrf_score = (1 / (60 + vector_results.index(next(r for r in vector_results if r.chunk_id == chunk_id)) + 1) if chunk_id in vector_scores else 0) + \
-                       (1 / (60 + bm25_results.index(next(r for r in bm25_results if r.chunk_id == chunk_id)) + 1) if chunk_id in bm25_scores else 0)
-            
-            # Find the result object
-            result = next((r for r in vector_results if r.chunk_id == chunk_id), None)
-            if not result:
-                result = next((r for r in bm25_results if r.chunk_id == chunk_id), None)
-            
-            if result:
-                result.score = rrf_score
-                result.search_method = "hybrid"
-                combined_results.append(result)
-        
-        # Sort by combined score
-        combined_results.sort(key=lambda x: x.score, reverse=True)
+        for fused in reciprocal_rank_fusion([vector_results, bm25_results]):
+            combined_results.append(replace(
+                fused.item,
+                score=fused.score,
+                search_method="hybrid"
+            ))
         
         return combined_results
     
@@ -553,22 +639,20 @@ class ProductionVectorService:
         return unique_results
     
     async def _rerank_results(self, query: str, results: List[SearchResult], top_k: int) -> List[SearchResult]:
-        """Rerank results using cross-encoder"""
-        if not self.reranking_model or len(results) <= 1:
+        """Rerank results using cross-encoder (batched off the event loop, scores cached)"""
+        reranker = self._get_reranker()
+        if not reranker or len(results) <= 1:
             return results[:top_k]
         
         start_time = time.time()
         
         try:
-            # Prepare query-document pairs
-            pairs = [(query, result.text) for result in results]
-            
-            # Get reranking scores
-            rerank_scores = self.reranking_model.predict(pairs)
+            # Get reranking scores; cached (query, chunk) pairs skip inference
+            rerank_scores = await reranker.score(query, [(result.chunk_id, result.text) for result in results])
             
             # Update results with reranking scores
             for i, result in enumerate(results):
-                result.reranked_score = float(rerank_scores[i])
+                result.reranked_score = rerank_scores[i]
                 result.score = result.reranked_score  # Use reranked score as final score
                 result.explanation = f"Reranked from {result.search_method}"
             
@@ -605,7 +689,13 @@ class ProductionVectorService:
         
         try:
             start_time = time.time()
-            embedding = self.embedding_model.encode(text).tolist()
+            # Concurrent queries share one encode call (and stay off the event loop)
+            batcher = get_embedding_batcher(
+                self.embedding_model,
+                name="query-embedding",
+                batch_size=settings.EMBEDDING_QUERY_MAX_BATCH_SIZE
+            )
+            embedding = await batcher.embed(text)
             
             # Update performance stats
             embedding_time = time.time() - start_time
@@ -616,11 +706,69 @@ class ProductionVectorService:
             logger.error("Failed to generate embedding", error=str(e))
             return None
     
+    async def _generate_embeddings(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Generate query embeddings for several texts in one batched encode"""
+        if not self.embedding_model:
+            # Return dummy embeddings
+            return [[0.0] * self.embedding_dimension for _ in texts]
+        
+        try:
+            start_time = time.time()
+            batcher = get_embedding_batcher(
+                self.embedding_model,
+                name="query-embedding",
+                batch_size=settings.EMBEDDING_QUERY_MAX_BATCH_SIZE
+            )
+            embeddings = await batcher.embed_many(texts)
+            
+            # Update performance stats
+            self.search_stats["embedding_time"] = time.time() - start_time
+            
+            return embeddings
+        except Exception as e:
+            logger.error("Failed to generate embeddings", error=str(e), count=len(texts))
+            return None
+    
+    async def _generate_embeddings_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Generate embeddings for a batch of texts on the ingest executor"""
+        if not texts:
+            return []
+        
+        if not self.embedding_model:
+            # Return dummy embeddings
+            return [[0.0] * self.embedding_dimension for _ in texts]
+        
+        try:
+            start_time = time.time()
+            loop = asyncio.get_running_loop()
+            embeddings = await loop.run_in_executor(
+                _get_ingest_executor(),
+                partial(self.embedding_model.encode, texts, batch_size=len(texts))
+            )
+            
+            # Update performance stats
+            self.search_stats["embedding_time"] = time.time() - start_time
+            
+            return [np.asarray(embedding).tolist() for embedding in embeddings]
+        except Exception as e:
+            logger.error("Failed to generate batch embeddings", error=str(e), batch_size=len(texts))
+            return None
+    
     async def _index_for_bm25(self, chunks: List[Chunk], workspace_id: str):
-        """Index chunks for BM25 search"""
-        # This would implement BM25 indexing
-        # For now, just log
-        logger.info(f"Indexing {len(chunks)} chunks for BM25 search")
+        """Incrementally add chunks to the workspace BM25 index"""
+        if not self.bm25_available or not chunks:
+            return
+        
+        try:
+            items = [(chunk.chunk_id, chunk.text, chunk.document_id) for chunk in chunks]
+            loop = asyncio.get_running_loop()
+            added = await loop.run_in_executor(
+                _get_ingest_executor(),
+                partial(self.bm25_index.add_documents, workspace_id, items)
+            )
+            logger.info(f"Indexed {added} chunks for BM25 search", workspace_id=workspace_id)
+        except Exception as e:
+            logger.warning("Failed to index chunks for BM25", error=str(e), workspace_id=workspace_id)
     
     async def _get_cached_results(self, query: str, workspace_id: str, config: SearchConfig) -> Optional[List[SearchResult]]:
         """Get cached search results"""
@@ -628,7 +776,7 @@ class ProductionVectorService:
             return None
         
         try:
-            cache_key = self._generate_cache_key(query, workspace_id, config)
+            cache_key = await self._tagged_cache_key(query, workspace_id, config)
             cached_data = await self.redis_client.get(cache_key)
             
             if cached_data:
@@ -648,7 +796,7 @@ class ProductionVectorService:
             return
         
         try:
-            cache_key = self._generate_cache_key(query, workspace_id, config)
+            cache_key = await self._tagged_cache_key(query, workspace_id, config)
             
             # Serialize results
             results_data = [
@@ -689,21 +837,28 @@ class ProductionVectorService:
         key_string = json.dumps(key_data, sort_keys=True)
         return f"search:{hashlib.md5(key_string.encode()).hexdigest()}"
     
+    async def _tagged_cache_key(self, query: str, workspace_id: str, config: SearchConfig) -> str:
+        """Cache key under the workspace's current search generation"""
+        return await cache_tags.tagged(
+            self._generate_cache_key(query, workspace_id, config),
+            workspace_tag("search", workspace_id)
+        )
+    
     async def delete_workspace(self, workspace_id: str) -> bool:
         """Delete all chunks for a workspace"""
         try:
-            if not self.collection:
+            if not self.vector_store:
                 return False
             
-            # Delete from ChromaDB
-            self.collection.delete(where={"workspace_id": workspace_id})
+            # Drop the whole shard instead of filtering the shared collection
+            self.vector_store.delete_workspace(workspace_id)
+            
+            # Drop the workspace BM25 index
+            if self.bm25_available:
+                self.bm25_index.delete_workspace(workspace_id)
             
-            # Clear cache
-            if self.redis_client:
-                pattern = f"search:*{workspace_id}*"
-                keys = await self.redis_client.keys(pattern)
-                if keys:
-                    await self.redis_client.delete(*keys)
+            # Orphan cached searches; they expire on their own TTL
+            await cache_tags.invalidate(workspace_tag("search", workspace_id))
             
             logger.info(f"Deleted workspace {workspace_id} from vector database")
             return True
@@ -716,13 +871,13 @@ class ProductionVectorService:
         """Get service statistics"""
         stats = self.search_stats.copy()
         
-        # Add collection stats
-        if self.collection:
+        # Add vector store stats (shards opened by this process)
+        if self.vector_store:
             try:
-                collection_count = self.collection.count()
-                stats["total_chunks"] = collection_count
+                stats["total_chunks"] = self.vector_store.count()
             except:
                 stats["total_chunks"] = 0
+            stats["vector_store_backend"] = self.vector_store.backend
         else:
             stats["total_chunks"] = 0
         
@@ -744,10 +899,10 @@ class ProductionVectorService:
             "timestamp": time.time()
         }
         
-        # Check ChromaDB
-        if self.collection:
+        # Check the vector store
+        if self.vector_store:
             try:
-                self.collection.count()
+                self.vector_store.health_check()
                 health["components"]["chromadb"] = "healthy"
             except Exception as e:
                 health["components"]["chromadb"] = f"unhealthy: {str(e)}"
@@ -16,6 +16,7 @@ from app.services.language_service import language_service
 from app.utils.cache import analytics_cache
 from app.services.embeddings_service import embeddings_service
 from app.models.chat import ChatSession, ChatMessage
+from app.services.analytics_rollup import AnalyticsRollupService
 from app.schemas.rag import RAGQueryResponse, RAGSource, RAGStreamChunk
 from app.exceptions import RAGError, LanguageError
 
@@ -89,7 +90,8 @@ class RAGService:
                 context=context_text,
                 sources=similar_chunks if has_docs else [],
                 target_language=response_language,
-                source_type=source_type
+                source_type=source_type,
+                workspace_id=workspace_id
             )
             
             # Step 4: Extract and format sources
@@ -204,23 +206,23 @@ class RAGService:
                 metadata={"step": "llm_generation"}
             )
             
-            gemini_response = await self.gemini_service.generate_response(
+            # Forward answer text as Gemini produces it
+            gemini_response: Dict[str, Any] = {}
+            async for event in self.gemini_service.generate_response_stream(
                 user_message=query,
                 context=context_text,
-                sources=similar_chunks
-            )
-            
-            # Send answer chunk
-            yield RAGStreamChunk(
-                type="answer",
-                content=gemini_response["content"],
-                sources=None,
-                metadata={
-                    "model_used": gemini_response.get("model_used", "gemini-pro"),
-                    "confidence_score": gemini_response.get("confidence_score", "medium"),
-                    "tokens_used": gemini_response.get("tokens_used")
-                }
-            )
+                sources=similar_chunks,
+                workspace_id=workspace_id
+            ):
+                if event["type"] == "delta":
+                    yield RAGStreamChunk(
+                        type="answer",
+                        content=event["content"],
+                        sources=None,
+                        metadata={"is_partial": True}
+                    )
+                elif event["type"] == "final":
+                    gemini_response = event
             
             # Send end chunk
             yield RAGStreamChunk(
@@ -229,7 +231,10 @@ class RAGService:
                 sources=None,
                 metadata={
                     "session_id": session.session_id,
-                    "sources_count": len(sources)
+                    "sources_count": len(sources),
+                    "model_used": gemini_response.get("model_used", "gemini-pro"),
+                    "confidence_score": gemini_response.get("confidence_score", "medium"),
+                    "tokens_used": gemini_response.get("tokens_used")
                 }
             )
             
@@ -339,6 +344,7 @@ class RAGService:
         )
         
         self.db.add(session)
+        AnalyticsRollupService(self.db).record_session_started(session)
         self.db.commit()
         self.db.refresh(session)
         
@@ -382,6 +388,7 @@ class RAGService:
                 confidence_score="high" if len(sources) > 0 else "low"
             )
             self.db.add(assistant_message)
+            AnalyticsRollupService(self.db).record_messages(session.workspace_id, [user_message, assistant_message])
             
             # Update session
             from datetime import datetime
@@ -0,0 +1,53 @@
+"""
+Weighted reciprocal rank fusion over any number of ranked result lists
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Generic, Hashable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# Rank offset from the original RRF paper; dampens the weight of top ranks
+DEFAULT_RRF_K = 60
+
+
+@dataclass
+class FusedResult(Generic[T]):
+    """One fused item: the first result seen for its key and its fused score"""
+    item: T
+    score: float
+    sources: List[int] = field(default_factory=list)  # Indices of lists containing the item
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[T]],
+    weights: Optional[Sequence[float]] = None,
+    key: Callable[[T], Hashable] = lambda result: result.chunk_id,
+    k: int = DEFAULT_RRF_K
+) -> List[FusedResult[T]]:
+    """Fuse ranked lists with weighted RRF: ``score = sum(w_i / (k + rank_i))``.
+
+    Each list must already be ordered best-first; ranks start at 1 and only
+    an item's first occurrence within a list counts. Runs in time linear in
+    the total number of results. The returned list is sorted by fused score
+    (ties keep first-seen order).
+    """
+    if weights is None:
+        weights = [1.0] * len(ranked_lists)
+    elif len(weights) != len(ranked_lists):
+        raise ValueError(f"Got {len(weights)} weights for {len(ranked_lists)} ranked lists")
+
+    fused: Dict[Hashable, FusedResult[T]] = {}
+    for source, (results, weight) in enumerate(zip(ranked_lists, weights)):
+        for rank, result in enumerate(results, start=1):
+            result_key = key(result)
+            entry = fused.get(result_key)
+            if entry is None:
+                entry = FusedResult(item=result, score=0.0)
+                fused[result_key] = entry
+            elif entry.sources and entry.sources[-1] == source:
+                continue  # Duplicate within the same list
+            entry.score += weight / (k + rank)
+            entry.sources.append(source)
+
+    return sorted(fused.values(), key=lambda entry: entry.score, reverse=True)
@@ -2,9 +2,11 @@
 Rate limiting service for API endpoints
 """
 
+import math
 import time
 import asyncio
-from typing import Dict, Optional, Tuple, Any
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Any
 import os
 try:
     import redis.asyncio as aioredis
@@ -18,18 +20,81 @@ from app.core.config import settings
 logger = structlog.get_logger()
 
 
+def _is_testing() -> bool:
+    return os.getenv("TESTING") == "true" or os.getenv("ENVIRONMENT") == "testing"
+
+
+# GCRA over every scope in one atomic call. A request is admitted only if
+# every scope admits it; nothing is consumed otherwise.
+# KEYS[i] = scope key, ARGV[2i-1] = limit, ARGV[2i] = window in ms.
+# Returns {admitted, then per scope: allowed, remaining, reset_ms, retry_after_ms}.
+_GCRA_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local admitted = 1
+local state = {}
+for i = 1, #KEYS do
+  local limit = tonumber(ARGV[2 * i - 1])
+  local window = tonumber(ARGV[2 * i])
+  local interval = window / limit
+  local tat = tonumber(redis.call('GET', KEYS[i]) or now)
+  if tat < now then tat = now end
+  local new_tat = tat + interval
+  local allowed = (new_tat - now) <= window
+  if not allowed then admitted = 0 end
+  state[i] = {allowed, tat, new_tat, interval, window}
+end
+local out = {admitted}
+for i = 1, #KEYS do
+  local allowed, tat, new_tat, interval, window = unpack(state[i])
+  if admitted == 1 then
+    redis.call('SET', KEYS[i], tostring(new_tat), 'PX', math.ceil(new_tat - now))
+    tat = new_tat
+  end
+  local remaining = math.max(0, math.floor((window - (tat - now)) / interval))
+  local retry_after = 0
+  if not allowed then retry_after = math.ceil(new_tat - window - now) end
+  table.insert(out, allowed and 1 or 0)
+  table.insert(out, remaining)
+  table.insert(out, math.ceil(tat - now))
+  table.insert(out, retry_after)
+end
+return out
+"""
+
+
+@dataclass
+class RateLimitScope:
+    """One limit checked by :meth:`RateLimitingService.check_rate_limits`"""
+    identifier: str
+    limit: int
+    window_seconds: int = 60
+    
+    @property
+    def key(self) -> str:
+        return f"rate_limit:{self.identifier}:{self.window_seconds}"
+
+
 class RateLimitingService:
-    """Rate limiting service using Redis"""
+    """Rate limiting service using Redis.
+    
+    Limits use GCRA (a token bucket with ``limit`` burst that refills one
+    request every ``window_seconds / limit``). All scopes of a request are
+    checked and consumed in a single Redis script call.
+    """
     
     def __init__(self):
         self.redis_client = None
-        self._memory_counts: Dict[str, Dict[int, int]] = {}
+        self._gcra_script = None
+        # In-memory fallback: scope key -> theoretical arrival time (ms)
+        self._memory_tats: Dict[str, float] = {}
         self._initialize_redis()
     
     def _initialize_redis(self):
         """Initialize Redis client for rate limiting"""
         # In testing, force in-memory implementation
-        if os.getenv("TESTING") == "true" or os.getenv("ENVIRONMENT") == "testing":
+        if _is_testing():
             self.redis_client = None
             logger.info("Rate limiting service initialized in TESTING mode (in-memory)")
             return
@@ -41,6 +106,7 @@ class RateLimitingService:
                 decode_responses=True,
                 encoding="utf-8"
             )
+            self._gcra_script = self.redis_client.register_script(_GCRA_SCRIPT)
             logger.info("Rate limiting service initialized with Redis")
         except Exception as e:
             logger.error("Failed to initialize Redis for rate limiting", error=str(e))
@@ -64,75 +130,134 @@ class RateLimitingService:
         Returns:
             Tuple of (is_allowed, rate_limit_info)
         """
+        is_allowed, infos = await self.check_rate_limits(
+            [RateLimitScope(identifier, limit, window_seconds)]
+        )
+        return is_allowed, infos[0]
+    
+    async def check_rate_limits(
+        self,
+        scopes: Sequence[RateLimitScope]
+    ) -> Tuple[bool, List[Dict[str, Any]]]:
+        """
+        Check and consume several rate limits atomically
+        
+        The request is allowed only if every scope allows it, and is then
+        counted against all of them; a rejected request consumes nothing.
+        
+        Args:
+            scopes: Limits to evaluate together
+        
+        Returns:
+            Tuple of (is_allowed, per-scope rate_limit_info in scope order)
+        """
+        if not scopes:
+            return True, []
+        
         if not self.redis_client:
-            # In-memory counting keyed by window bucket
-            current_time = int(time.time())
-            window_start = current_time - (current_time % window_seconds)
-            counts = self._memory_counts.setdefault(identifier, {})
-            current_count = counts.get(window_start, 0)
-            # Allow exactly 'limit' requests; block starting from limit+1
-            if current_count >= limit:
-                reset_time = datetime.fromtimestamp(window_start + window_seconds)
-                return False, {
-                    "limit": limit,
-                    "remaining": 0,
-                    "reset_time": reset_time,
-                    "window_seconds": window_seconds,
-                }
-            counts[window_start] = current_count + 1
-            remaining = max(0, limit - counts[window_start])
-            reset_time = datetime.fromtimestamp(window_start + window_seconds)
-            return True, {
-                "limit": limit,
-                "remaining": remaining,
-                "reset_time": reset_time,
-                "window_seconds": window_seconds,
-            }
+            return self._check_memory(scopes)
         
         try:
-            current_time = int(time.time())
-            window_start = current_time - (current_time % window_seconds)
-            key = f"rate_limit:{identifier}:{window_start}"
-            
-            # Get current count
-            current_count = await self.redis_client.get(key)
-            current_count = int(current_count) if current_count else 0
+            args: List[Any] = []
+            for scope in scopes:
+                args.extend([max(1, scope.limit), scope.window_seconds * 1000])
+            result = await self._gcra_script(keys=[scope.key for scope in scopes], args=args)
             
-            if current_count > limit:
-                # Rate limit exceeded
-                reset_time = datetime.fromtimestamp(window_start + window_seconds)
-                return False, {
-                    "limit": limit,
-                    "remaining": 0,
-                    "reset_time": reset_time,
-                    "window_seconds": window_seconds
-                }
-            
-            # Increment counter
-            pipe = self.redis_client.pipeline()
-            pipe.incr(key)
-            pipe.expire(key, window_seconds)
-            await pipe.execute()
-            
-            remaining = max(0, limit - current_count - 1)
-            reset_time = datetime.fromtimestamp(window_start + window_seconds)
-            
-            return True, {
-                "limit": limit,
-                "remaining": remaining,
-                "reset_time": reset_time,
-                "window_seconds": window_seconds
-            }
+            now = time.time()
+            infos = []
+            for i, scope in enumerate(scopes):
+                allowed, remaining, reset_ms, retry_after_ms = (int(v) for v in result[1 + 4 * i:5 + 4 * i])
+                infos.append(self._build_info(scope, bool(allowed), remaining, now, reset_ms, retry_after_ms))
+            return bool(int(result[0])), infos
             
         except Exception as e:
             logger.error(
                 "Rate limit check failed",
                 error=str(e),
-                identifier=identifier
+                identifiers=[scope.identifier for scope in scopes]
             )
             # On error, fall back to in-memory path
             self.redis_client = None
-            return await self.check_rate_limit(identifier, limit, window_seconds)
+            return self._check_memory(scopes)
+    
+    def _check_memory(self, scopes: Sequence[RateLimitScope]) -> Tuple[bool, List[Dict[str, Any]]]:
+        """In-process GCRA with the same semantics as the Redis script.
+        
+        Runs without awaiting, so concurrent coroutines cannot interleave
+        between the check and the update and no lock is needed.
+        """
+        now_seconds = time.time()
+        now = now_seconds * 1000
+        if len(self._memory_tats) > 10000:
+            self._memory_tats = {k: v for k, v in self._memory_tats.items() if v > now}
+        
+        state = []
+        admitted = True
+        for scope in scopes:
+            window = scope.window_seconds * 1000
+            interval = window / max(1, scope.limit)
+            tat = max(self._memory_tats.get(scope.key, now), now)
+            new_tat = tat + interval
+            allowed = (new_tat - now) <= window
+            admitted = admitted and allowed
+            state.append((allowed, tat, new_tat, interval, window))
+        
+        infos = []
+        for scope, (allowed, tat, new_tat, interval, window) in zip(scopes, state):
+            if admitted:
+                self._memory_tats[scope.key] = new_tat
+                tat = new_tat
+            remaining = max(0, math.floor((window - (tat - now)) / interval))
+            retry_after_ms = 0 if allowed else math.ceil(new_tat - window - now)
+            infos.append(self._build_info(
+                scope, allowed, remaining, now_seconds, math.ceil(tat - now), retry_after_ms
+            ))
+        return admitted, infos
+    
+    @staticmethod
+    def _build_info(
+        scope: RateLimitScope,
+        allowed: bool,
+        remaining: int,
+        now: float,
+        reset_ms: int,
+        retry_after_ms: int
+    ) -> Dict[str, Any]:
+        info = {
+            "allowed": allowed,
+            "limit": scope.limit,
+            "remaining": remaining,
+            "reset_time": datetime.fromtimestamp(now + reset_ms / 1000.0),
+            "window_seconds": scope.window_seconds,
+        }
+        if not allowed:
+            info["retry_after"] = max(1, math.ceil(retry_after_ms / 1000.0))
+        return info
+    
+    async def check_widget_rate_limits(
+        self,
+        ip_address: Optional[str],
+        embed_code_id: Any,
+        workspace_id: Any,
+        ip_limit: int = 10,
+        embed_limit: int = 60,
+        workspace_limit: int = 120,
+        window_seconds: int = 60
+    ) -> Tuple[bool, Dict[str, Dict[str, Any]]]:
+        """Check the IP, embed code and workspace limits of a widget message in one call.
+        
+        Pass ``ip_address=None`` when the IP limit was already checked (e.g. before authentication).
+        """
+        scopes = {
+            "ip": RateLimitScope(f"ip:{ip_address}", ip_limit, window_seconds),
+            "embed": RateLimitScope(f"embed:{embed_code_id}", embed_limit, window_seconds),
+            "workspace": RateLimitScope(f"workspace:{workspace_id}", workspace_limit, window_seconds),
+        }
+        # Match check_ip_rate_limit, which allows all IP-level checks in TESTING
+        if ip_address is None or _is_testing():
+            del scopes["ip"]
+        is_allowed, infos = await self.check_rate_limits(list(scopes.values()))
+        return is_allowed, dict(zip(scopes.keys(), infos))
     
     async def check_workspace_rate_limit(
         self,
@@ -155,7 +280,7 @@ class RateLimitingService:
     ) -> Tuple[bool, Dict[str, Any]]:
         """Check rate limit for user"""
         # In TESTING, allow all user-level checks
-        if os.getenv("TESTING") == "true" or os.getenv("ENVIRONMENT") == "testing":
+        if _is_testing():
             return True, {
                 "limit": limit,
                 "remaining": limit,
@@ -176,7 +301,7 @@ class RateLimitingService:
     ) -> Tuple[bool, Dict[str, Any]]:
         """Check rate limit for IP address"""
         # In TESTING, allow all IP-level checks
-        if os.getenv("TESTING") == "true" or os.getenv("ENVIRONMENT") == "testing":
+        if _is_testing():
             return True, {
                 "limit": limit,
                 "remaining": limit,
@@ -205,12 +330,16 @@ class RateLimitingService:
     
     async def reset_rate_limit(self, identifier: str) -> bool:
         """Reset rate limit for identifier"""
+        prefix = f"rate_limit:{identifier}:"
+        for key in [k for k in self._memory_tats if k.startswith(prefix)]:
+            self._memory_tats.pop(key, None)
+        
         if not self.redis_client:
             return True
         
         try:
             # Get all keys for this identifier
-            pattern = f"rate_limit:{identifier}:*"
+            pattern = f"{prefix}*"
             keys = await self.redis_client.keys(pattern)
             
             if keys:
@@ -232,15 +361,15 @@ class RateLimitingService:
             pattern = f"rate_limit:{identifier}:*"
             keys = await self.redis_client.keys(pattern)
             
-            total_requests = 0
-            for key in keys:
-                count = await self.redis_client.get(key)
-                total_requests += int(count) if count else 0
+            # Each key holds the scope's theoretical arrival time in ms
+            now = time.time() * 1000
+            tats = await self.redis_client.mget(keys) if keys else []
+            backlog = max((float(tat) - now for tat in tats if tat), default=0.0)
             
             return {
                 "enabled": True,
-                "total_requests": total_requests,
-                "active_windows": len(keys)
+                "active_windows": len(keys),
+                "backlog_seconds": max(0.0, backlog / 1000.0)
             }
             
         except Exception as e:
@@ -0,0 +1,189 @@
+"""
+Cross-encoder reranking on a bounded worker pool with score caching
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import structlog
+
+from app.core.config import settings
+from app.utils.metrics import metrics_collector
+
+logger = structlog.get_logger()
+
+# Shared by every service instance so the number of concurrent cross-encoder
+# inferences per process stays bounded
+_rerank_executor: Optional[ThreadPoolExecutor] = None
+_rerank_executor_lock = threading.Lock()
+
+
+def _get_rerank_executor() -> ThreadPoolExecutor:
+    """Get (lazily create) the shared rerank executor"""
+    global _rerank_executor
+    with _rerank_executor_lock:
+        if _rerank_executor is None:
+            _rerank_executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.RERANK_MAX_WORKERS),
+                thread_name_prefix="rerank"
+            )
+        return _rerank_executor
+
+
+class RerankScoreCache:
+    """Thread-safe in-process LRU of (model, query hash, chunk_id) -> score"""
+
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = max(0, max_size if max_size is not None else settings.RERANK_CACHE_SIZE)
+        self._entries: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, model: str, query_hash: str, chunk_ids: Sequence[str]) -> Dict[str, float]:
+        """Return cached scores for whichever chunk ids are present"""
+        found = {}
+        with self._lock:
+            for chunk_id in chunk_ids:
+                key = (model, query_hash, chunk_id)
+                score = self._entries.get(key)
+                if score is not None:
+                    self._entries.move_to_end(key)
+                    found[chunk_id] = score
+        return found
+
+    def put_many(self, model: str, query_hash: str, scores: Dict[str, float]) -> None:
+        if not self.max_size:
+            return
+        with self._lock:
+            for chunk_id, score in scores.items():
+                key = (model, query_hash, chunk_id)
+                self._entries[key] = score
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_score_cache = RerankScoreCache()
+
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a cross-encoder without blocking the event loop.
+
+    Scores are looked up in the shared in-process LRU first, then in Redis
+    (one hash per model and query, one field per chunk). Only the remaining
+    pairs are sent to the model, split into ``batch_size`` batches that run
+    on the shared rerank executor.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        model_name: str,
+        redis_client: Any = None,
+        batch_size: Optional[int] = None,
+        cache: Optional[RerankScoreCache] = None,
+        cache_ttl: Optional[int] = None
+    ):
+        self.model = model
+        self.model_name = model_name
+        self.redis_client = redis_client
+        self.batch_size = max(1, batch_size or settings.RERANK_BATCH_SIZE)
+        self.cache = cache if cache is not None else _score_cache
+        self.cache_ttl = cache_ttl if cache_ttl is not None else settings.RERANK_CACHE_TTL
+
+    @staticmethod
+    def _query_hash(query: str) -> str:
+        return hashlib.sha1(query.encode("utf-8")).hexdigest()
+
+    def _redis_key(self, query_hash: str) -> str:
+        return f"rerank:{self.model_name}:{query_hash}"
+
+    async def score(self, query: str, items: Sequence[Tuple[str, str]]) -> List[float]:
+        """Score ``(chunk_id, text)`` items against ``query``, in input order"""
+        if not items:
+            return []
+
+        start_time = time.time()
+        query_hash = self._query_hash(query)
+        chunk_ids = [chunk_id for chunk_id, _ in items]
+
+        scores = self.cache.get_many(self.model_name, query_hash, chunk_ids)
+        missing = [chunk_id for chunk_id in dict.fromkeys(chunk_ids) if chunk_id not in scores]
+
+        if missing and self.redis_client:
+            from_redis = await self._get_redis_scores(query_hash, missing)
+            if from_redis:
+                scores.update(from_redis)
+                self.cache.put_many(self.model_name, query_hash, from_redis)
+                missing = [chunk_id for chunk_id in missing if chunk_id not in from_redis]
+
+        cached = len(chunk_ids) - len(missing)
+        if missing:
+            texts = dict(items)
+            inferred = await self._predict(query, [(chunk_id, texts[chunk_id]) for chunk_id in missing])
+            scores.update(inferred)
+            self.cache.put_many(self.model_name, query_hash, inferred)
+            if self.redis_client:
+                await self._set_redis_scores(query_hash, inferred)
+
+        metrics_collector.record_rerank(self.model_name, time.time() - start_time, cached, len(missing))
+        return [scores[chunk_id] for chunk_id in chunk_ids]
+
+    async def _predict(self, query: str, items: List[Tuple[str, str]]) -> Dict[str, float]:
+        loop = asyncio.get_running_loop()
+        executor = _get_rerank_executor()
+        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        results = await asyncio.gather(*[
+            loop.run_in_executor(
+                executor,
+                self._predict_batch,
+                [(query, text) for _, text in batch]
+            )
+            for batch in batches
+        ])
+
+        inferred = {}
+        for batch, batch_scores in zip(batches, results):
+            if len(batch_scores) != len(batch):
+                raise ValueError(f"Cross-encoder returned {len(batch_scores)} scores for {len(batch)} pairs")
+            for (chunk_id, _), score in zip(batch, batch_scores):
+                inferred[chunk_id] = score
+        return inferred
+
+    def _predict_batch(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """Run one cross-encoder batch (on the rerank executor)"""
+        scores = self.model.predict(pairs, batch_size=len(pairs))
+        return [float(score) for score in scores]
+
+    async def _get_redis_scores(self, query_hash: str, chunk_ids: List[str]) -> Dict[str, float]:
+        try:
+            values = await self.redis_client.hmget(self._redis_key(query_hash), chunk_ids)
+            return {
+                chunk_id: float(value)
+                for chunk_id, value in zip(chunk_ids, values or [])
+                if value is not None
+            }
+        except Exception as e:
+            logger.warning("Failed to read cached rerank scores", error=str(e))
+            return {}
+
+    async def _set_redis_scores(self, query_hash: str, scores: Dict[str, float]) -> None:
+        try:
+            key = self._redis_key(query_hash)
+            pipe = self.redis_client.pipeline()
+            pipe.hset(key, mapping={chunk_id: repr(score) for chunk_id, score in scores.items()})
+            pipe.expire(key, self.cache_ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to cache rerank scores", error=str(e))
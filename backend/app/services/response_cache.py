@@ -0,0 +1,297 @@
+"""
+HTTP response cache: route-declared policies, byte-level entries with strong
+ETags, and per-key refresh coordination for stale-while-revalidate
+"""
+
+import asyncio
+import hashlib
+import json
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+RESPONSE_CACHE_ATTR = "__response_cache__"
+RESPONSE_CACHE_PREFIX = "respcache:"
+_REFRESH_LOCK_PREFIX = "respcache-lock:"
+
+_RAW = 0
+_ZLIB = 1
+_HEADER = struct.Struct(">BI")
+
+# Delete the refresh lock only if this refresher still holds it
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """How long a route's GET responses are fresh, then servable while stale.
+
+    ``private`` responses are cached per authenticated principal; ``vary``
+    names request headers that also select the entry.
+    """
+
+    ttl: int
+    stale_ttl: int = 0
+    private: bool = True
+    vary: Tuple[str, ...] = ()
+
+    @property
+    def cache_control(self) -> str:
+        # Clients revalidate every time; the 304 is what makes polling cheap
+        return "private, no-cache" if self.private else f"public, max-age={self.ttl}"
+
+
+def cache_response(ttl: int, stale_ttl: int = 0, private: bool = True, vary: Iterable[str] = ()) -> Callable:
+    """Declare a response cache policy on a GET endpoint.
+
+    Apply below the router decorator; the endpoint itself is unchanged and
+    ``CacheOptimizationHook`` finds the policy through the matched route.
+    """
+    policy = CachePolicy(ttl=ttl, stale_ttl=stale_ttl, private=private, vary=tuple(h.lower() for h in vary))
+
+    def decorator(func: Callable) -> Callable:
+        setattr(func, RESPONSE_CACHE_ATTR, policy)
+        return func
+    return decorator
+
+
+def make_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as RFC 9110 requires for If-None-Match"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def build_cache_key(path: str, query: Iterable[Tuple[str, str]], principal: Optional[str],
+                    vary: Iterable[str] = ()) -> str:
+    parts = [path, "&".join(f"{k}={v}" for k, v in sorted(query)), principal or ""]
+    parts.extend(vary)
+    digest = hashlib.blake2b("\x1f".join(parts).encode(), digest_size=20).hexdigest()
+    return f"{RESPONSE_CACHE_PREFIX}{digest}"
+
+
+class CachedResponse:
+    """A 200 response body with its headers, ETag and freshness window"""
+
+    __slots__ = ("headers", "body", "etag", "stored_at", "fresh_until", "stale_until")
+
+    def __init__(self, headers: Dict[str, str], body: bytes, etag: str,
+                 stored_at: float, fresh_until: float, stale_until: float):
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.stored_at = stored_at
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+    @classmethod
+    def build(cls, headers: Dict[str, str], body: bytes, policy: CachePolicy,
+              etag: Optional[str] = None) -> "CachedResponse":
+        now = time.time()
+        return cls(
+            headers=headers,
+            body=body,
+            etag=etag or make_etag(body),
+            stored_at=now,
+            fresh_until=now + policy.ttl,
+            stale_until=now + policy.ttl + policy.stale_ttl,
+        )
+
+    def is_fresh(self, now: float) -> bool:
+        return now < self.fresh_until
+
+    def is_usable(self, now: float) -> bool:
+        return now < self.stale_until
+
+    def to_bytes(self, compress_min_bytes: int) -> bytes:
+        meta = json.dumps({
+            "headers": self.headers,
+            "etag": self.etag,
+            "stored_at": self.stored_at,
+            "fresh_until": self.fresh_until,
+            "stale_until": self.stale_until,
+        }).encode()
+        if 0 < compress_min_bytes <= len(self.body):
+            return _HEADER.pack(_ZLIB, len(meta)) + meta + zlib.compress(self.body, 6)
+        return _HEADER.pack(_RAW, len(meta)) + meta + self.body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CachedResponse":
+        encoding, meta_length = _HEADER.unpack_from(data)
+        offset = _HEADER.size + meta_length
+        meta = json.loads(data[_HEADER.size:offset])
+        body = data[offset:]
+        if encoding == _ZLIB:
+            body = zlib.decompress(body)
+        return cls(body=body, **meta)
+
+
+class ResponseCache:
+    """In-process LRU in front of Redis (raw bytes, optionally compressed).
+
+    Refreshes are coordinated per key: within a process one request leads
+    while others wait for it (cold miss) or get the stale copy; across
+    processes a short Redis lock lets only one refresh a stale entry, held
+    until that refresh is stored. Redis is reached through the auto-pipelined
+    async client, so lookups never block the event loop.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None,
+                 compress_min_bytes: Optional[int] = None,
+                 refresh_lock_ttl: Optional[int] = None,
+                 redis_client: Any = None):
+        self.max_entries = max_entries if max_entries is not None else settings.RESPONSE_CACHE_SIZE
+        self.compress_min_bytes = (
+            compress_min_bytes if compress_min_bytes is not None else settings.RESPONSE_CACHE_COMPRESS_MIN_BYTES
+        )
+        self.refresh_lock_ttl = (
+            refresh_lock_ttl if refresh_lock_ttl is not None else settings.RESPONSE_CACHE_REFRESH_LOCK_TTL
+        )
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Event] = {}
+        self._refresh_tokens: Dict[str, str] = {}
+        self._redis_client = redis_client
+        self.stats = {"hits": 0, "stale_hits": 0, "not_modified": 0, "misses": 0, "stores": 0}
+
+    def _redis(self) -> Any:
+        """Async raw-bytes client, or None when Redis is unavailable"""
+        if self._redis_client is not None:
+            return self._redis_client
+        from app.core.async_redis import async_binary_redis
+        return async_binary_redis if async_binary_redis.available else None
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.is_usable(now):
+                    self._entries.move_to_end(key)
+                    return entry
+                del self._entries[key]
+        try:
+            client = self._redis()
+            data = await client.get(key) if client is not None else None
+        except Exception as e:
+            logger.warning("Response cache read failed", key=key, error=str(e))
+            return None
+        if not data:
+            return None
+        entry = CachedResponse.from_bytes(data)
+        if not entry.is_usable(now):
+            return None
+        self._store_local(key, entry)
+        return entry
+
+    async def put(self, key: str, entry: CachedResponse) -> None:
+        self._store_local(key, entry)
+        self.stats["stores"] += 1
+        try:
+            client = self._redis()
+            if client is not None:
+                ttl = max(1, int(entry.stale_until - time.time()))
+                await client.setex(key, ttl, entry.to_bytes(self.compress_min_bytes))
+        except Exception as e:
+            logger.warning("Response cache write failed", key=key, error=str(e))
+
+    def _store_local(self, key: str, entry: CachedResponse) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # --- Refresh coordination ---
+    def claim(self, key: str) -> Optional[asyncio.Event]:
+        """Become the local leader for ``key`` (None) or get the leader's event to wait on"""
+        event = self._inflight.get(key)
+        if event is not None:
+            return event
+        self._inflight[key] = asyncio.Event()
+        return None
+
+    def release(self, key: str) -> None:
+        event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    async def begin_refresh(self, key: str) -> bool:
+        """True if this request should regenerate a stale entry; pair with :meth:`end_refresh`"""
+        if self.claim(key) is not None:
+            return False
+        try:
+            client = self._redis()
+            if client is None:
+                return True
+            token = uuid.uuid4().hex
+            if await client.set(f"{_REFRESH_LOCK_PREFIX}{key}", token, ex=self.refresh_lock_ttl, nx=True):
+                self._refresh_tokens[key] = token
+                return True
+        except Exception as e:
+            logger.warning("Response cache refresh lock failed", key=key, error=str(e))
+            return True
+        # Another process is already refreshing it
+        self.release(key)
+        return False
+
+    async def end_refresh(self, key: str) -> None:
+        """Wake local waiters and drop the cross-process refresh lock, if this request took it"""
+        self.release(key)
+        token = self._refresh_tokens.pop(key, None)
+        if token is None:
+            return
+        try:
+            client = self._redis()
+            if client is not None:
+                await client.eval(_RELEASE_SCRIPT, 1, f"{_REFRESH_LOCK_PREFIX}{key}", token)
+        except Exception as e:
+            logger.warning("Response cache refresh unlock failed", key=key, error=str(e))
+
+    async def wait_for_leader(self, event: asyncio.Event) -> None:
+        try:
+            await asyncio.wait_for(event.wait(), timeout=self.refresh_lock_ttl)
+        except asyncio.TimeoutError:
+            pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        self._refresh_tokens.clear()
+        for key in list(self._inflight):
+            self.release(key)
+
+
+# Global instance
+response_cache = ResponseCache()
@@ -10,6 +10,7 @@ import redis.asyncio as aioredis
 import structlog
 
 from app.core.config import settings
+from app.services.cache_tags import sweep
 
 logger = structlog.get_logger()
 
@@ -270,17 +271,18 @@ class SessionPersistenceService:
             return 0
         
         try:
-            # Get all session state keys
-            pattern = "session_state:*"
-            keys = await self.redis_client.keys(pattern)
-            
             cleaned_count = 0
-            for key in keys:
-                # Check TTL
-                ttl = await self.redis_client.ttl(key)
-                if ttl <= 0:
-                    await self.redis_client.delete(key)
-                    cleaned_count += 1
+            # SCAN in batches; each batch's TTLs come back in one round trip
+            async for keys in sweep(self.redis_client, "session_state:*"):
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    for key in keys:
+                        pipe.ttl(key)
+                    ttls = await pipe.execute()
+                
+                expired = [key for key, ttl in zip(keys, ttls) if ttl <= 0]
+                if expired:
+                    await self.redis_client.delete(*expired)
+                    cleaned_count += len(expired)
             
             if cleaned_count > 0:
                 logger.info(
@@ -301,13 +303,17 @@ class SessionPersistenceService:
         
         try:
             # Count session states
-            session_keys = await self.redis_client.keys("session_state:*")
-            streaming_keys = await self.redis_client.keys("streaming_message:*")
+            active_sessions = 0
+            async for keys in sweep(self.redis_client, "session_state:*"):
+                active_sessions += len(keys)
+            streaming_messages = 0
+            async for keys in sweep(self.redis_client, "streaming_message:*"):
+                streaming_messages += len(keys)
             
             return {
                 "enabled": True,
-                "active_sessions": len(session_keys),
-                "streaming_messages": len(streaming_keys),
+                "active_sessions": active_sessions,
+                "streaming_messages": streaming_messages,
                 "default_ttl_seconds": self.default_ttl
             }
             
@@ -326,9 +332,7 @@ class SessionPersistenceService:
             await self.redis_client.delete(session_key)
             
             # Delete any streaming messages for this session
-            pattern = f"streaming_message:{session_id}:*"
-            streaming_keys = await self.redis_client.keys(pattern)
-            if streaming_keys:
+            async for streaming_keys in sweep(self.redis_client, f"streaming_message:{session_id}:*"):
                 await self.redis_client.delete(*streaming_keys)
             
             logger.info("Session state deleted", session_id=session_id)
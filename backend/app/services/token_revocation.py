@@ -4,17 +4,26 @@ JWT Token revocation service for security
 
 import redis
 import json
+import time
 from datetime import datetime, timedelta
 from typing import Set, Optional
 from app.core.config import settings
+from app.core.async_redis import async_redis
 from app.core.database import redis_manager
+from app.services.auth_cache import auth_cache
+from app.services.cache_tags import sweep_sync
 import structlog
 
 logger = structlog.get_logger()
 
 
 class TokenRevocationService:
-    """Service for managing JWT token revocation"""
+    """Service for managing JWT token revocation.
+    
+    The ``*_async`` methods use the shared async client and are what
+    coroutines call; the sync methods serve synchronous JWT verification,
+    which runs in the threadpool.
+    """
     
     def __init__(self):
         self.redis_client = redis_manager.get_client()
@@ -51,6 +60,9 @@ class TokenRevocationService:
                 # Add to user's revoked tokens set
                 self.redis_client.sadd(f"{self.user_tokens_key}:{user_id}", token_jti)
                 
+                # Replicate to every process's local revocation set
+                auth_cache.publish_revocation(token_jti, time.time() + ttl)
+                
                 logger.info("Token revoked", jti=token_jti, user_id=user_id)
                 return True
             else:
@@ -69,6 +81,33 @@ class TokenRevocationService:
             logger.error("Failed to check token revocation", error=str(e), jti=token_jti)
             return False
     
+    async def is_token_revoked_async(self, token_jti: str) -> bool:
+        """Check if a token is revoked without blocking the event loop"""
+        try:
+            return await async_redis.exists(f"{self.revoked_tokens_key}:{token_jti}") > 0
+        except Exception as e:
+            logger.error("Failed to check token revocation", error=str(e), jti=token_jti)
+            return False
+    
+    async def revoke_all_user_tokens_async(self, user_id: int) -> int:
+        """Revoke all tokens for a specific user (one pipelined round trip for the checks)"""
+        try:
+            user_tokens = await async_redis.smembers(f"{self.user_tokens_key}:{user_id}")
+            revoked = await async_redis.execute_many(
+                *[("exists", f"{self.revoked_tokens_key}:{token_jti}") for token_jti in user_tokens]
+            ) if user_tokens else []
+            revoked_count = sum(1 for exists in revoked if exists)
+            
+            # Clear user's token set
+            await async_redis.delete(f"{self.user_tokens_key}:{user_id}")
+            
+            logger.info("All user tokens revoked", user_id=user_id, count=revoked_count)
+            return revoked_count
+            
+        except Exception as e:
+            logger.error("Failed to revoke user tokens", error=str(e), user_id=user_id)
+            return 0
+    
     def revoke_all_user_tokens(self, user_id: int) -> int:
         """Revoke all tokens for a specific user"""
         try:
@@ -93,20 +132,19 @@ class TokenRevocationService:
     def cleanup_expired_tokens(self) -> int:
         """Clean up expired revoked tokens"""
         try:
-            # Get all revoked token keys
-            pattern = f"{self.revoked_tokens_key}:*"
-            keys = self.redis_client.keys(pattern)
             cleaned_count = 0
+            now = datetime.utcnow()
             
-            for key in keys:
-                token_data = self.redis_client.get(key)
-                if token_data:
-                    data = json.loads(token_data)
-                    expires_at = datetime.fromisoformat(data["expires_at"])
-                    
-                    if expires_at < datetime.utcnow():
-                        self.redis_client.delete(key)
-                        cleaned_count += 1
+            # SCAN in batches and read each batch with one MGET
+            for keys in sweep_sync(self.redis_client, f"{self.revoked_tokens_key}:*"):
+                expired = []
+                for key, token_data in zip(keys, self.redis_client.mget(keys)):
+                    if token_data:
+                        data = json.loads(token_data)
+                        if datetime.fromisoformat(data["expires_at"]) < now:
+                            expired.append(key)
+                if expired:
+                    cleaned_count += self.redis_client.delete(*expired)
             
             logger.info("Expired tokens cleaned up", count=cleaned_count)
             return cleaned_count
@@ -0,0 +1,445 @@
+"""
+Write-behind usage counters for embed codes, subscription quotas and analytics rollups
+"""
+
+import asyncio
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+import structlog
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+EMBED_CODE = "embed_code"
+SUBSCRIPTION = "subscription"
+ROLLUP = "rollup"
+_KINDS = (EMBED_CODE, SUBSCRIPTION, ROLLUP)
+
+# Rollup fields are "<workspace_id>|<granularity>|<bucket_start>|<counter>"
+_ROLLUP_SEPARATOR = "|"
+
+_FLUSH_LOCK_KEY = "usage:flush_lock"
+
+# Id of the batch in the "flushing" hashes, recorded in usage_flush_batches on commit
+_FLUSH_BATCH_KEY = "usage:flushing_batch"
+
+# How long applied batch ids are kept; a leftover batch is retried by the next flush
+_APPLIED_BATCH_RETENTION = timedelta(days=1)
+
+# Delete the flush lock only if this flusher still holds it; one whose lock
+# expired mid-flush must not release the next flusher's
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _pending_key(kind: str) -> str:
+    return f"usage:pending:{kind}"
+
+
+def _pending_last_used_key(kind: str) -> str:
+    return f"usage:pending_last_used:{kind}"
+
+
+def _flushing_key(kind: str) -> str:
+    return f"usage:flushing:{kind}"
+
+
+def _flushing_last_used_key(kind: str) -> str:
+    return f"usage:flushing_last_used:{kind}"
+
+
+def _as_uuid(value: str) -> Any:
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError):
+        return value
+
+
+def _empty() -> Dict[str, Dict[str, Any]]:
+    return {kind: {} for kind in _KINDS}
+
+
+def _rollup_field(workspace_id: Any, granularity: str, start: datetime, counter: str) -> str:
+    return _ROLLUP_SEPARATOR.join((str(workspace_id), granularity, start.isoformat(), counter))
+
+
+def _rollup_increments(fields: Dict[str, float]) -> Dict[Tuple[Any, str, datetime], Dict[str, float]]:
+    """Group buffered rollup fields by bucket"""
+    increments: Dict[Tuple[Any, str, datetime], Dict[str, float]] = defaultdict(dict)
+    for field, amount in fields.items():
+        workspace_id, granularity, start, counter = field.split(_ROLLUP_SEPARATOR)
+        increments[(_as_uuid(workspace_id), granularity, datetime.fromisoformat(start))][counter] = amount
+    return increments
+
+
+class UsageBuffer:
+    """Buffers usage increments and applies them in periodic batched UPDATEs.
+
+    Increments go to Redis hashes (``HINCRBY``, one pipelined round trip) or,
+    when Redis is unavailable, to an in-process dict. ``flush`` applies every
+    pending counter as one relative ``UPDATE ... SET n = n + :amount``
+    statement per table, so popular embed codes no longer serialise on a
+    row lock per request. Analytics rollup increments are buffered the same
+    way (``HINCRBYFLOAT``) and applied as one upsert per flush, keeping the
+    busiest hour and day buckets out of request transactions.
+
+    Redis flushes are crash-safe and apply each batch once: pending hashes
+    are renamed to "flushing" hashes under a new batch id before the DB
+    write, and the id is inserted into ``usage_flush_batches`` in the same
+    transaction. The hashes are deleted only after commit, so a flusher
+    dying mid-way leaves its batch to the next flush, which skips it if
+    its id was already committed. A ``SET NX`` lock, released only by the
+    flusher holding its token, keeps flushes from different processes
+    apart; the batch id also covers a flusher whose lock expired.
+
+    Quota checks add :meth:`unflushed_query_usage` to ``queries_this_period``,
+    so they see queries still in the buffer.
+    """
+
+    def __init__(self, redis_client: Any = None, flush_interval: Optional[float] = None):
+        self._redis_client = redis_client
+        self.flush_interval = flush_interval if flush_interval is not None else settings.USAGE_FLUSH_INTERVAL
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, Any]] = _empty()
+        self._last_used: Dict[str, Dict[str, datetime]] = _empty()
+        self._memory_flushing: Dict[str, Dict[str, Any]] = _empty()  # in-memory batch being committed
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"recorded": 0, "rollups_recorded": 0, "flushes": 0, "rows_updated": 0, "errors": 0}
+
+    def _bump(self, stat: str, amount: int = 1) -> None:
+        # Recorders, the flusher thread and the event loop all update stats
+        with self._lock:
+            self.stats[stat] += amount
+
+    def _redis(self) -> Any:
+        if self._redis_client is not None:
+            return self._redis_client
+        from app.core.database import redis_manager
+        return redis_manager.get_client() if redis_manager.redis_available else None
+
+    def record_embed_usage(self, embed_code_id: str, amount: int = 1) -> None:
+        """Count a widget request against an embed code"""
+        self._bump("recorded", amount)
+        self._record(EMBED_CODE, {str(embed_code_id): amount}, track_last_used=True)
+
+    def record_query_usage(self, subscription_id: str, amount: int = 1) -> int:
+        """Count a query against a subscription's period quota.
+
+        Returns the subscription's queries not yet in ``queries_this_period``,
+        this one included. The Redis increment and read are one transaction,
+        so concurrent callers each see a distinct total.
+        """
+        self._bump("recorded", amount)
+        entity_id = str(subscription_id)
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=True)
+                pipe.hincrby(_pending_key(SUBSCRIPTION), entity_id, amount)
+                pipe.hget(_flushing_key(SUBSCRIPTION), entity_id)
+                pending, flushing = pipe.execute()
+                return int(pending) + int(flushing or 0) + self._memory_unflushed(SUBSCRIPTION, entity_id)
+            except Exception as e:
+                logger.warning("Failed to buffer usage in Redis; using memory", error=str(e), kind=SUBSCRIPTION)
+
+        with self._lock:
+            counts = self._counts[SUBSCRIPTION]
+            counts[entity_id] = counts.get(entity_id, 0) + amount
+        return self._memory_unflushed(SUBSCRIPTION, entity_id)
+
+    def unflushed_query_usage(self, subscription_id: str) -> int:
+        """A subscription's queries recorded but not yet in ``queries_this_period``"""
+        entity_id = str(subscription_id)
+        unflushed = self._memory_unflushed(SUBSCRIPTION, entity_id)
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=True)
+                pipe.hget(_pending_key(SUBSCRIPTION), entity_id)
+                pipe.hget(_flushing_key(SUBSCRIPTION), entity_id)
+                unflushed += sum(int(value or 0) for value in pipe.execute())
+            except Exception as e:
+                logger.warning("Failed to read buffered usage from Redis", error=str(e))
+        return unflushed
+
+    def _memory_unflushed(self, kind: str, entity_id: str) -> int:
+        with self._lock:
+            return self._counts[kind].get(entity_id, 0) + self._memory_flushing[kind].get(entity_id, 0)
+
+    def record_rollup(self, workspace_id: Any, granularity: str, start: datetime,
+                      counters: Dict[str, float]) -> None:
+        """Add ``counters`` to one analytics rollup bucket"""
+        amounts = {
+            _rollup_field(workspace_id, granularity, start, name): value
+            for name, value in counters.items()
+            if value
+        }
+        if amounts:
+            self._bump("rollups_recorded")
+            self._record(ROLLUP, amounts)
+
+    def _record(self, kind: str, amounts: Dict[str, Any], track_last_used: bool = False) -> None:
+        now = datetime.now(timezone.utc)
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for entity_id, amount in amounts.items():
+                    if kind == ROLLUP:
+                        pipe.hincrbyfloat(_pending_key(kind), entity_id, amount)
+                    else:
+                        pipe.hincrby(_pending_key(kind), entity_id, amount)
+                    if track_last_used:
+                        pipe.hset(_pending_last_used_key(kind), entity_id, now.isoformat())
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning("Failed to buffer usage in Redis; using memory", error=str(e), kind=kind)
+
+        with self._lock:
+            counts = self._counts[kind]
+            for entity_id, amount in amounts.items():
+                counts[entity_id] = counts.get(entity_id, 0) + amount
+                if track_last_used:
+                    self._last_used[kind][entity_id] = now
+
+    def pending(self) -> Dict[str, Dict[str, Any]]:
+        """In-memory counts not yet flushed (Redis-buffered counts excluded)"""
+        with self._lock:
+            return {kind: dict(counts) for kind, counts in self._counts.items()}
+
+    def flush(self, db: Session) -> int:
+        """Apply buffered counters to the database; returns rows updated"""
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            updated = self._flush_memory(db)
+            client = self._redis()
+            if client is not None:
+                updated += self._flush_redis(db, client)
+            self._bump("flushes")
+            self._bump("rows_updated", updated)
+            return updated
+        finally:
+            self._flush_lock.release()
+
+    def _flush_memory(self, db: Session) -> int:
+        with self._lock:
+            counts, self._counts = self._counts, _empty()
+            last_used, self._last_used = self._last_used, _empty()
+            # Still counted by quota checks until committed
+            self._memory_flushing = counts
+        if not any(counts.values()):
+            return 0
+
+        try:
+            updated = self._apply(db, counts, last_used)
+            db.commit()
+            with self._lock:
+                self._memory_flushing = _empty()
+            return updated
+        except Exception as e:
+            db.rollback()
+            self._bump("errors")
+            logger.error("Usage flush failed; keeping counters for retry", error=str(e))
+            # Put the batch back so the next flush retries it
+            with self._lock:
+                self._memory_flushing = _empty()
+                for kind, batch in counts.items():
+                    for entity_id, amount in batch.items():
+                        self._counts[kind][entity_id] = self._counts[kind].get(entity_id, 0) + amount
+                for kind, batch in last_used.items():
+                    for entity_id, ts in batch.items():
+                        current = self._last_used[kind].get(entity_id)
+                        self._last_used[kind][entity_id] = max(ts, current) if current else ts
+            return 0
+
+    def _flush_redis(self, db: Session, client: Any) -> int:
+        lock_ttl_ms = int(max(30.0, self.flush_interval * 3) * 1000)
+        token = uuid.uuid4().hex
+        if not client.set(_FLUSH_LOCK_KEY, token, nx=True, px=lock_ttl_ms):
+            return 0  # Another process is flushing
+
+        try:
+            # A leftover batch id belongs to a flusher that died or lost its lock; finish that batch first
+            batch_id = client.get(_FLUSH_BATCH_KEY)
+            if batch_id is None:
+                batch_id = uuid.uuid4().hex
+                client.set(_FLUSH_BATCH_KEY, batch_id)
+                for kind in _KINDS:
+                    if not client.exists(_flushing_key(kind)):
+                        self._claim(client, _pending_key(kind), _flushing_key(kind))
+                        self._claim(client, _pending_last_used_key(kind), _flushing_last_used_key(kind))
+
+            counts: Dict[str, Dict[str, Any]] = {}
+            last_used: Dict[str, Dict[str, datetime]] = {}
+            for kind in _KINDS:
+                parse = float if kind == ROLLUP else int
+                counts[kind] = {k: parse(v) for k, v in (client.hgetall(_flushing_key(kind)) or {}).items()}
+                last_used[kind] = {
+                    k: datetime.fromisoformat(v)
+                    for k, v in (client.hgetall(_flushing_last_used_key(kind)) or {}).items()
+                }
+
+            updated = 0
+            if any(counts.values()):
+                try:
+                    updated = self._apply_batch(db, batch_id, counts, last_used)
+                except Exception as e:
+                    db.rollback()
+                    # A duplicate batch id means another flusher committed this batch first
+                    if not (isinstance(e, IntegrityError) and self._batch_applied(db, batch_id)):
+                        self._bump("errors")
+                        logger.error("Usage flush failed; batch stays in Redis for retry", error=str(e))
+                        return 0
+                    logger.warning("Usage batch already applied; dropping it", batch_id=batch_id)
+
+            client.delete(*[
+                key
+                for kind in _KINDS
+                for key in (_flushing_key(kind), _flushing_last_used_key(kind))
+            ], _FLUSH_BATCH_KEY)
+            return updated
+        finally:
+            try:
+                client.eval(_RELEASE_LOCK_SCRIPT, 1, _FLUSH_LOCK_KEY, token)
+            except Exception as e:
+                logger.warning("Failed to release usage flush lock; it will expire", error=str(e))
+
+    def _apply_batch(self, db: Session, batch_id: str,
+                     counts: Dict[str, Dict[str, Any]],
+                     last_used: Dict[str, Dict[str, datetime]]) -> int:
+        """Apply a Redis batch and record its id in one transaction, unless it is already recorded"""
+        from app.models.usage import UsageFlushBatch
+
+        if self._batch_applied(db, batch_id):
+            logger.warning("Usage batch already applied; dropping it", batch_id=batch_id)
+            return 0
+        updated = self._apply(db, counts, last_used)
+        now = datetime.now(timezone.utc)
+        db.add(UsageFlushBatch(id=batch_id, applied_at=now))
+        db.query(UsageFlushBatch).filter(
+            UsageFlushBatch.applied_at < now - _APPLIED_BATCH_RETENTION
+        ).delete(synchronize_session=False)
+        db.commit()
+        return updated
+
+    @staticmethod
+    def _batch_applied(db: Session, batch_id: str) -> bool:
+        from app.models.usage import UsageFlushBatch
+        return db.get(UsageFlushBatch, batch_id) is not None
+
+    @staticmethod
+    def _claim(client: Any, source: str, target: str) -> None:
+        try:
+            client.rename(source, target)
+        except Exception:
+            pass  # Nothing buffered under ``source``
+
+    @staticmethod
+    def _apply(db: Session,
+               counts: Dict[str, Dict[str, Any]],
+               last_used: Dict[str, Dict[str, datetime]]) -> int:
+        """Batched relative UPDATEs for every buffered entity (caller commits)"""
+        from app.models.embed import EmbedCode
+        from app.models.subscriptions import Subscription
+
+        updated = 0
+        embed_rows = [
+            {
+                "b_id": _as_uuid(entity_id),
+                "b_amount": amount,
+                "b_last_used": last_used.get(EMBED_CODE, {}).get(entity_id) or datetime.now(timezone.utc),
+            }
+            for entity_id, amount in counts.get(EMBED_CODE, {}).items()
+            if amount
+        ]
+        if embed_rows:
+            table = EmbedCode.__table__
+            db.execute(
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values(
+                    usage_count=table.c.usage_count + bindparam("b_amount"),
+                    last_used=bindparam("b_last_used")
+                ),
+                embed_rows
+            )
+            updated += len(embed_rows)
+
+        subscription_rows = [
+            {"b_id": _as_uuid(entity_id), "b_amount": amount}
+            for entity_id, amount in counts.get(SUBSCRIPTION, {}).items()
+            if amount
+        ]
+        if subscription_rows:
+            table = Subscription.__table__
+            db.execute(
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values(queries_this_period=table.c.queries_this_period + bindparam("b_amount")),
+                subscription_rows
+            )
+            updated += len(subscription_rows)
+
+        rollup_fields = {field: amount for field, amount in counts.get(ROLLUP, {}).items() if amount}
+        if rollup_fields:
+            from app.services.analytics_rollup import AnalyticsRollupService
+            updated += AnalyticsRollupService(db).apply_increments(_rollup_increments(rollup_fields))
+
+        return updated
+
+    def _flush_with_session(self) -> int:
+        from app.core.database import SessionLocal
+        db = SessionLocal()
+        try:
+            return self.flush(db)
+        finally:
+            db.close()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await loop.run_in_executor(None, self._flush_with_session)
+            except Exception as e:
+                self._bump("errors")
+                logger.error("Periodic usage flush failed", error=str(e))
+
+    def start(self) -> None:
+        """Start the periodic flush task on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info("Usage buffer flusher started", interval=self.flush_interval)
+
+    async def stop(self) -> None:
+        """Stop the periodic task and flush whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._flush_with_session)
+        except Exception as e:
+            logger.error("Final usage flush failed", error=str(e))
+
+
+# Global instance
+usage_buffer = UsageBuffer()
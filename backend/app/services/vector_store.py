@@ -0,0 +1,682 @@
+"""
+Workspace-sharded vector store with Chroma and embedded (NumPy / HNSW) backends
+"""
+
+import base64
+import contextlib
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import structlog
+
+from app.core.config import settings
+from app.utils.delta_log import DeltaLog
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+try:
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+    CHROMADB_AVAILABLE = True
+except ImportError:
+    CHROMADB_AVAILABLE = False
+
+logger = structlog.get_logger()
+
+_SAFE_NAME_PATTERN = re.compile(r"[^A-Za-z0-9_-]")
+
+# Compact a local shard once tombstones make up this share of its rows
+_COMPACTION_RATIO = 0.25
+
+_warned_exact_fallback = False
+
+
+# Namespace of the workspace shards every vector service reads and writes
+DEFAULT_NAMESPACE = "documents"
+
+# Collections written before workspace sharding, imported by ``import_legacy_collections``
+LEGACY_WORKSPACE_PREFIX = "workspace_"
+_IMPORTED_PREFIX = "imported_"
+
+
+def workspace_shard_name(namespace: str, workspace_id: str) -> str:
+    """Collection / directory name of a workspace shard"""
+    return f"{namespace}_{_SAFE_NAME_PATTERN.sub('_', str(workspace_id))}"
+
+
+def _matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate the subset of Chroma ``where`` filters used by the services"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, expected in condition.items():
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$ne" and value == expected:
+                    return False
+                if op == "$in" and value not in expected:
+                    return False
+                if op == "$nin" and value in expected:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _shard_log(path: str) -> DeltaLog:
+    # The lock file sits beside the shard directory, which deleting a workspace renames away
+    return DeltaLog(os.path.join(path, "changes.log"), os.path.join(path, "rows.json"), f"{path}.lock")
+
+
+class LocalShard:
+    """Embedded vector index for one workspace.
+
+    Vectors live in a contiguous, L2-normalised float32 matrix and are
+    searched with an exact matrix product. Once the shard holds more than
+    ``ann_threshold`` live vectors an HNSW graph is built and kept up to
+    date incrementally; without hnswlib the shard stays on exact search.
+    The API mirrors the parts of a Chroma collection the services use
+    (``add``/``query``/``get``/``delete``/``count``).
+
+    A shard with a ``path`` is shared by every process that opens it: each
+    change is appended to a :class:`~app.utils.delta_log.DeltaLog` as it
+    is made, and reads first replay changes made by other processes.
+    """
+
+    def __init__(self, name: str, path: Optional[str] = None, ann_threshold: Optional[int] = None):
+        self.name = name
+        self.path = path
+        self.ann_threshold = ann_threshold if ann_threshold is not None else settings.VECTOR_STORE_ANN_THRESHOLD
+        self.ids: List[Optional[str]] = []
+        self.documents: List[Optional[str]] = []
+        self.metadatas: List[Optional[Dict[str, Any]]] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.vectors: Optional[np.ndarray] = None
+        self.size = 0
+        self._ann = None
+        self._lock = threading.RLock()
+        self._log = _shard_log(path) if path else None
+        with self._lock:
+            self._refresh()
+
+    # ---- Chroma-compatible API ----
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self.id_to_row)
+
+    def add(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        documents: Optional[Sequence[str]] = None
+    ) -> None:
+        """Insert vectors; an existing id is replaced"""
+        if not ids:
+            return
+        matrix = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        ids = list(ids)
+        metadatas = [dict(metadata) for metadata in metadatas] if metadatas else [{} for _ in ids]
+        documents = list(documents) if documents else [None] * len(ids)
+        with self._changing():
+            self._log_change({"add": {
+                "ids": ids,
+                "dimension": matrix.shape[1],
+                "vectors": base64.b64encode(matrix.tobytes()).decode("ascii"),
+                "metadatas": metadatas,
+                "documents": documents,
+            }})
+            self._apply_add(ids, matrix, metadatas, documents)
+
+    upsert = add
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[Sequence[str]] = None
+    ) -> Dict[str, List[List[Any]]]:
+        """Top-``n_results`` by cosine similarity; distances are ``1 - cosine``"""
+        result: Dict[str, List[List[Any]]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        with self._lock:
+            self._refresh()
+            for query in queries:
+                rows, sims = self._search(query, n_results, where)
+                result["ids"].append([self.ids[r] for r in rows])
+                result["documents"].append([self.documents[r] for r in rows])
+                result["metadatas"].append([self.metadatas[r] for r in rows])
+                result["distances"].append([float(1.0 - s) for s in sims])
+        return result
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[Sequence[str]] = None
+    ) -> Dict[str, List[Any]]:
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                rows = [self.id_to_row[i] for i in ids if i in self.id_to_row]
+            else:
+                rows = sorted(self.id_to_row.values())
+            rows = [r for r in rows if _matches(self.metadatas[r], where)]
+            return {
+                "ids": [self.ids[r] for r in rows],
+                "documents": [self.documents[r] for r in rows],
+                "metadatas": [self.metadatas[r] for r in rows],
+            }
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        with self._changing():
+            if ids is None:
+                ids = [self.ids[r] for r in list(self.id_to_row.values()) if _matches(self.metadatas[r], where)]
+            ids = [chunk_id for chunk_id in ids if chunk_id in self.id_to_row]
+            if not ids:
+                return
+            self._log_change({"delete": ids})
+            self._apply_delete(ids)
+
+    # ---- Changes ----
+    def _apply_add(self, ids: List[str], matrix: np.ndarray,
+                   metadatas: List[Dict[str, Any]], documents: List[Optional[str]]) -> None:
+        for chunk_id in ids:
+            self._tombstone(chunk_id)
+        start = self.size
+        self._reserve(start + len(ids), matrix.shape[1])
+        self.vectors[start:start + len(ids)] = matrix
+        for i, chunk_id in enumerate(ids):
+            self.ids.append(chunk_id)
+            self.documents.append(documents[i])
+            self.metadatas.append(metadatas[i])
+            self.id_to_row[chunk_id] = start + i
+        self.size = start + len(ids)
+        if self._ann is not None:
+            self._ann_add(range(start, self.size))
+        elif len(self.id_to_row) > self.ann_threshold:
+            self._build_ann()
+
+    def _apply_delete(self, ids: List[str]) -> None:
+        for chunk_id in ids:
+            self._tombstone(chunk_id)
+        self._maybe_compact()
+
+    def _apply(self, op: Dict[str, Any]) -> None:
+        if "add" in op:
+            add = op["add"]
+            matrix = np.frombuffer(base64.b64decode(add["vectors"]), dtype=np.float32)
+            self._apply_add(add["ids"], matrix.reshape(len(add["ids"]), add["dimension"]),
+                            add["metadatas"], add["documents"])
+        elif "delete" in op:
+            self._apply_delete(op["delete"])
+        else:
+            raise ValueError(f"Unknown vector shard log entry: {sorted(op)}")
+
+    def _log_change(self, op: Dict[str, Any]) -> None:
+        if self._log is not None:
+            self._log.append(op)
+
+    @contextlib.contextmanager
+    def _changing(self) -> Iterator[None]:
+        """Hold the shard for a change, caught up with other processes' changes"""
+        with self._lock:
+            if self._log is None:
+                yield
+                return
+            with self._log.locked(exclusive=True):
+                self._sync()
+                yield
+                if self._log.needs_checkpoint():
+                    self._checkpoint()
+
+    def _refresh(self) -> None:
+        if self._log is not None and not self._log.is_current():
+            with self._log.locked(exclusive=False):
+                self._sync()
+
+    def _sync(self) -> None:
+        """Replay changes made by other processes (file lock held)"""
+        reload, ops = self._log.read()
+        if reload:
+            self._reset()
+            self._load()
+        for op in ops:
+            try:
+                self._apply(op)
+            except Exception as e:
+                logger.warning("Skipping unreadable vector shard log entry", shard=self.name, error=str(e))
+
+    # ---- Search internals ----
+    def _search(self, query: np.ndarray, k: int, where: Optional[Dict[str, Any]]):
+        live = len(self.id_to_row)
+        if live == 0 or k <= 0:
+            return [], []
+        if self._ann is not None:
+            rows, sims = self._ann_search(query, k, where)
+            if len(rows) >= min(k, live) or (rows and not where):
+                return rows, sims
+        return self._exact_search(query, k, where)
+
+    def _exact_search(self, query: np.ndarray, k: int, where: Optional[Dict[str, Any]]):
+        sims = self.vectors[:self.size] @ query
+        mask = np.zeros(self.size, dtype=bool)
+        for row in self.id_to_row.values():
+            if where is None or _matches(self.metadatas[row], where):
+                mask[row] = True
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return [], []
+        k = min(k, candidates.size)
+        candidate_sims = sims[candidates]
+        top = np.argpartition(-candidate_sims, k - 1)[:k]
+        top = top[np.argsort(-candidate_sims[top], kind="stable")]
+        return candidates[top].tolist(), candidate_sims[top].tolist()
+
+    def _ann_search(self, query: np.ndarray, k: int, where: Optional[Dict[str, Any]]):
+        # Over-fetch when filtering so post-filtering can still fill k
+        fetch = min(len(self.id_to_row), k * 4 if where else k)
+        self._ann.set_ef(max(fetch * 2, 64))
+        try:
+            labels, distances = self._ann.knn_query(query, k=fetch)
+        except RuntimeError:
+            # Graph could not return enough neighbours; caller falls back to exact search
+            return [], []
+        rows, sims = [], []
+        for label, distance in zip(labels[0].tolist(), distances[0].tolist()):
+            if self.ids[label] is None or not _matches(self.metadatas[label], where):
+                continue
+            rows.append(label)
+            sims.append(1.0 - distance)
+            if len(rows) >= k:
+                break
+        return rows, sims
+
+    def _build_ann(self) -> None:
+        global _warned_exact_fallback
+        if not HNSWLIB_AVAILABLE:
+            if not _warned_exact_fallback:
+                _warned_exact_fallback = True
+                logger.warning("hnswlib not installed; large vector shards use exact search", shard=self.name)
+            return
+        if self.vectors is None:
+            return
+        index = hnswlib.Index(space="cosine", dim=self.vectors.shape[1])
+        index.init_index(max_elements=max(self.vectors.shape[0], 1024), ef_construction=200, M=16)
+        self._ann = index
+        self._ann_add(sorted(self.id_to_row.values()))
+        logger.info("Built HNSW index for vector shard", shard=self.name, vectors=len(self.id_to_row))
+
+    def _ann_add(self, rows) -> None:
+        rows = np.asarray(list(rows), dtype=np.int64)
+        if rows.size == 0:
+            return
+        if self._ann.get_max_elements() < self.vectors.shape[0]:
+            self._ann.resize_index(self.vectors.shape[0])
+        self._ann.add_items(self.vectors[rows], rows)
+
+    # ---- Storage internals ----
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _reserve(self, rows: int, dimension: int) -> None:
+        if self.vectors is None:
+            self.vectors = np.zeros((max(rows, 64), dimension), dtype=np.float32)
+            return
+        if self.vectors.shape[1] != dimension:
+            raise ValueError(f"Embedding dimension {dimension} does not match shard dimension {self.vectors.shape[1]}")
+        if rows > self.vectors.shape[0]:
+            grown = np.zeros((max(rows, self.vectors.shape[0] * 2), dimension), dtype=np.float32)
+            grown[:self.size] = self.vectors[:self.size]
+            self.vectors = grown
+
+    def _tombstone(self, chunk_id: str) -> None:
+        row = self.id_to_row.pop(chunk_id, None)
+        if row is None:
+            return
+        self.ids[row] = None
+        self.documents[row] = None
+        self.metadatas[row] = None
+        if self._ann is not None:
+            self._ann.mark_deleted(row)
+
+    def _maybe_compact(self) -> None:
+        tombstones = self.size - len(self.id_to_row)
+        if tombstones and tombstones >= _COMPACTION_RATIO * self.size:
+            self.compact()
+
+    def compact(self) -> None:
+        """Drop tombstoned rows and rebuild the ANN graph if one is in use"""
+        with self._lock:
+            rows = sorted(self.id_to_row.values())
+            if self.vectors is not None:
+                self.vectors = np.ascontiguousarray(self.vectors[rows]) if rows else None
+            self.ids = [self.ids[r] for r in rows]
+            self.documents = [self.documents[r] for r in rows]
+            self.metadatas = [self.metadatas[r] for r in rows]
+            self.id_to_row = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+            self.size = len(rows)
+            self._ann = None
+            if len(self.id_to_row) > self.ann_threshold:
+                self._build_ann()
+
+    def flush(self) -> None:
+        """Fold the change log into the snapshot if it has outgrown it.
+
+        Changes are durable once made; this only bounds replay time.
+        """
+        if self._log is None:
+            return
+        with self._lock, self._log.locked(exclusive=True):
+            self._sync()
+            if self._log.needs_checkpoint():
+                self._checkpoint()
+
+    def _checkpoint(self) -> None:
+        """Write the snapshot and restart the change log (exclusive file lock held).
+
+        Replaying the old log over a snapshot that already contains it is
+        harmless (adds replace by id, deletes of missing ids are no-ops), so a
+        crash between the two steps loses nothing.
+        """
+        if self.size != len(self.id_to_row):
+            self.compact()
+        os.makedirs(self.path, exist_ok=True)
+        vectors_path = os.path.join(self.path, "vectors.npy")
+        rows_path = os.path.join(self.path, "rows.json")
+        vectors = self.vectors[:self.size] if self.vectors is not None else np.zeros((0, 0), dtype=np.float32)
+        with open(f"{vectors_path}.tmp", "wb") as f:
+            np.save(f, vectors)
+        with open(f"{rows_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas}, f)
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        os.replace(f"{rows_path}.tmp", rows_path)
+        self._log.restart()
+
+    def _reset(self) -> None:
+        self.ids, self.documents, self.metadatas = [], [], []
+        self.id_to_row = {}
+        self.vectors = None
+        self.size = 0
+        self._ann = None
+
+    def _load(self) -> None:
+        vectors_path = os.path.join(self.path, "vectors.npy")
+        rows_path = os.path.join(self.path, "rows.json")
+        if not (os.path.exists(vectors_path) and os.path.exists(rows_path)):
+            return
+        try:
+            vectors = np.load(vectors_path)
+            with open(rows_path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+        except Exception as e:
+            logger.warning("Failed to load vector shard, starting empty", shard=self.name, error=str(e))
+            return
+        self.ids = rows["ids"]
+        self.documents = rows["documents"]
+        self.metadatas = rows["metadatas"]
+        self.id_to_row = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self.size = len(self.ids)
+        self.vectors = vectors if self.size else None
+        if len(self.id_to_row) > self.ann_threshold:
+            self._build_ann()
+
+
+class VectorStore:
+    """Per-workspace vector shards; deleting a workspace drops its shard"""
+
+    backend = "base"
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+
+    def get_shard(self, workspace_id: str):
+        raise NotImplementedError
+
+    def flush(self, workspace_id: str) -> None:
+        return None
+
+    def delete_workspace(self, workspace_id: str) -> None:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def health_check(self) -> bool:
+        return True
+
+
+class LocalVectorStore(VectorStore):
+    """Embedded store: one :class:`LocalShard` directory per workspace"""
+
+    backend = "local"
+
+    def __init__(self, namespace: str, root_dir: Optional[str] = None, ann_threshold: Optional[int] = None):
+        super().__init__(namespace)
+        self.root_dir = os.path.join(root_dir or settings.VECTOR_STORE_DIR, namespace)
+        self.ann_threshold = ann_threshold
+        self._shards: Dict[str, LocalShard] = {}
+        self._lock = threading.RLock()
+
+    def _shard_path(self, workspace_id: str) -> str:
+        return os.path.join(self.root_dir, workspace_shard_name("ws", workspace_id))
+
+    def get_shard(self, workspace_id: str) -> LocalShard:
+        key = str(workspace_id)
+        with self._lock:
+            shard = self._shards.get(key)
+            if shard is None:
+                shard = LocalShard(
+                    workspace_shard_name(self.namespace, key),
+                    path=self._shard_path(key),
+                    ann_threshold=self.ann_threshold
+                )
+                self._shards[key] = shard
+            return shard
+
+    def flush(self, workspace_id: str) -> None:
+        with self._lock:
+            shard = self._shards.get(str(workspace_id))
+        if shard is not None:
+            shard.flush()
+
+    def delete_workspace(self, workspace_id: str) -> None:
+        key = str(workspace_id)
+        with self._lock:
+            self._shards.pop(key, None)
+            path = self._shard_path(key)
+            # Other processes see the shard vanish and reload it empty
+            with _shard_log(path).locked(exclusive=True):
+                if os.path.isdir(path):
+                    # Rename first so the shard disappears atomically, then clean up
+                    trash = f"{path}.deleted-{uuid.uuid4().hex}"
+                    os.replace(path, trash)
+                    shutil.rmtree(trash, ignore_errors=True)
+
+    def count(self) -> int:
+        with self._lock:
+            return sum(shard.count() for shard in self._shards.values())
+
+
+class ChromaVectorStore(VectorStore):
+    """Chroma server store: one collection per workspace"""
+
+    backend = "chroma"
+
+    def __init__(self, namespace: str, client: Any):
+        super().__init__(namespace)
+        self.client = client
+        self._collections: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get_shard(self, workspace_id: str):
+        key = str(workspace_id)
+        with self._lock:
+            collection = self._collections.get(key)
+            if collection is None:
+                collection = self.client.get_or_create_collection(
+                    name=workspace_shard_name(self.namespace, key),
+                    metadata={"hnsw:space": "cosine", "workspace_id": key}
+                )
+                self._collections[key] = collection
+            return collection
+
+    def delete_workspace(self, workspace_id: str) -> None:
+        key = str(workspace_id)
+        with self._lock:
+            self._collections.pop(key, None)
+        try:
+            self.client.delete_collection(name=workspace_shard_name(self.namespace, key))
+        except ValueError:
+            # Collection never existed
+            pass
+
+    def count(self) -> int:
+        with self._lock:
+            return sum(collection.count() for collection in self._collections.values())
+
+    def health_check(self) -> bool:
+        self.client.heartbeat()
+        return True
+
+    def import_legacy_collections(self, embed: Callable[[List[str]], List[List[float]]]) -> int:
+        """Move chunks from collections written before sharding into the workspace shards.
+
+        The shared ``<namespace>`` collection keeps its vectors. The old
+        per-workspace ``workspace_<id>`` collections were embedded by
+        Chroma's default model, so their text is re-embedded with ``embed``.
+        Each imported collection is renamed ``imported_<name>``, which
+        makes the import run once; delete those collections once checked.
+        """
+        copied = 0
+        for collection in self.client.list_collections():
+            name = collection.name
+            if name == self.namespace:
+                workspace_id, embed_with = None, None
+            elif name.startswith(LEGACY_WORKSPACE_PREFIX):
+                workspace_id, embed_with = name[len(LEGACY_WORKSPACE_PREFIX):], embed
+            else:
+                continue
+            try:
+                copied += self.import_legacy_collection(name, workspace_id=workspace_id, embed=embed_with)
+                self.client.get_collection(name=name).modify(name=f"{_IMPORTED_PREFIX}{name}")
+            except Exception as e:
+                # Another process may have imported it first; a failed import is retried next start
+                logger.warning("Legacy vector collection not imported", collection=name, error=str(e))
+        return copied
+
+    def import_legacy_collection(self, collection_name: str, page_size: int = 500,
+                                 workspace_id: Optional[str] = None,
+                                 embed: Optional[Callable[[List[str]], List[List[float]]]] = None) -> int:
+        """Copy a collection into workspace shards.
+
+        Rows go to the shard of their ``workspace_id`` metadata, or all to
+        ``workspace_id`` if given. ``embed`` replaces the stored vectors.
+        """
+        legacy = self.client.get_collection(name=collection_name)
+        copied = 0
+        offset = 0
+        while True:
+            page = legacy.get(limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            embeddings = embed(page["documents"]) if embed is not None else page["embeddings"]
+            by_workspace: Dict[str, List[int]] = {}
+            for i, metadata in enumerate(page["metadatas"]):
+                target = workspace_id or (metadata or {}).get("workspace_id", "")
+                by_workspace.setdefault(str(target), []).append(i)
+            for target, rows in by_workspace.items():
+                if not target:
+                    continue
+                self.get_shard(target).upsert(
+                    ids=[ids[i] for i in rows],
+                    embeddings=[embeddings[i] for i in rows],
+                    metadatas=[dict(page["metadatas"][i] or {}, workspace_id=target) for i in rows],
+                    documents=[page["documents"][i] for i in rows]
+                )
+                copied += len(rows)
+            offset += len(ids)
+        logger.info("Imported legacy vector collection", collection=collection_name, chunks=copied)
+        return copied
+
+
+_stores: Dict[str, VectorStore] = {}
+_stores_lock = threading.Lock()
+
+
+def _create_chroma_client():
+    chroma_host = settings.CHROMA_URL.replace("http://", "").replace("https://", "")
+    headers = None
+    api_key = (getattr(settings, "CHROMA_AUTH_CREDENTIALS", "") or "").strip()
+    if api_key:
+        headers = {"X-API-Key": api_key}
+    return chromadb.HttpClient(
+        host=chroma_host,
+        port=8001,
+        settings=ChromaSettings(anonymized_telemetry=False, allow_reset=True),
+        headers=headers
+    )
+
+
+def get_vector_store(namespace: str = DEFAULT_NAMESPACE) -> Optional[VectorStore]:
+    """Return the process-wide store for a namespace (None if unavailable).
+
+    ``VECTOR_STORE_BACKEND=local`` uses the embedded store and needs no
+    server; ``chroma`` requires ``CHROMA_URL``.
+    """
+    with _stores_lock:
+        store = _stores.get(namespace)
+        if store is not None:
+            return store
+
+        backend = (settings.VECTOR_STORE_BACKEND or "chroma").lower()
+        if backend == "local":
+            store = LocalVectorStore(namespace)
+        else:
+            if not CHROMADB_AVAILABLE:
+                logger.warning("ChromaDB not available")
+                return None
+            if not getattr(settings, "CHROMA_URL", None):
+                logger.warning("CHROMA_URL not set; vector search will be inactive")
+                return None
+            try:
+                store = ChromaVectorStore(namespace, _create_chroma_client())
+            except Exception as e:
+                logger.error("Failed to initialize ChromaDB (HTTP)", error=str(e))
+                return None
+
+        _stores[namespace] = store
+        logger.info("Vector store initialized", backend=store.backend, namespace=namespace)
+        return store
+
+
+def reset_vector_stores() -> None:
+    """Forget cached stores (used by tests and config reloads)"""
+    with _stores_lock:
+        _stores.clear()
@@ -159,7 +159,7 @@ class WebSocketSecurityService:
                 db = SessionLocal()
                 try:
                     embed_service = EmbedService(db)
-                    embed_code = embed_service.get_embed_code_by_api_key(client_api_key)
+                    embed_code = embed_service.resolve_embed_auth(client_api_key)
                     if not embed_code or not embed_code.is_active:
                         return None
                     
@@ -303,8 +303,10 @@ class RealtimeChatService:
             })
             
             # Stream the RAG response
-            full_response = ""
+            response_parts = []
             sources = []
+            stream_start = time.time()
+            first_token_ms = None
             
             async for chunk in rag_service.process_query_stream(
                 workspace_id=workspace_id,
@@ -314,7 +316,9 @@ class RealtimeChatService:
             ):
                 if chunk.type == "answer" and chunk.content:
                     # Stream the answer content
-                    full_response += chunk.content
+                    if first_token_ms is None:
+                        first_token_ms = int((time.time() - stream_start) * 1000)
+                    response_parts.append(chunk.content)
                     
                     # Send partial response
                     await self.websocket_manager.send_message(session_id, user_id, {
@@ -331,11 +335,19 @@ class RealtimeChatService:
                     # Send final complete response
                     await self.websocket_manager.send_message(session_id, user_id, {
                         "type": "assistant_message_complete",
-                        "content": full_response,
+                        "content": "".join(response_parts),
                         "sources": sources,
                         "is_partial": False,
+                        "time_to_first_token_ms": first_token_ms,
                         "timestamp": datetime.now().isoformat()
                     })
+                    logger.info(
+                        "RAG response streamed",
+                        session_id=session_id,
+                        chunks=len(response_parts),
+                        time_to_first_token_ms=first_token_ms,
+                        total_ms=int((time.time() - stream_start) * 1000)
+                    )
                 
                 elif chunk.type == "error":
                     await self.websocket_manager.send_message(session_id, user_id, {
@@ -12,6 +12,7 @@ import asyncio
 from app.core.config import settings
 from app.utils.logger import get_logger, log_performance
 from app.utils.metrics import MetricsCollector
+from app.services.cache_tags import cache_tags, sweep_sync, workspace_tag
 
 logger = get_logger(__name__)
 
@@ -135,10 +136,7 @@ class CacheManager:
         cache_prefix = self._get_cache_key(prefix, "")
         full_pattern = f"{cache_prefix}*{pattern}*"
         try:
-            keys = list(self.redis_client.scan_iter(full_pattern))
-            if keys:
-                return int(self.redis_client.delete(*keys))
-            return 0
+            return sum(int(self.redis_client.delete(*keys)) for keys in sweep_sync(self.redis_client, full_pattern))
         except Exception as e:
             logger.error(f"Cache delete_pattern failed for {full_pattern}: {e}")
             return 0
@@ -169,10 +167,7 @@ class CacheManager:
         cache_prefix = self._get_cache_key(prefix, "")
         full_pattern = f"{cache_prefix}*{pattern}*"
         try:
-            keys = list(self.redis_client.scan_iter(full_pattern))
-            if keys:
-                return int(self.redis_client.delete(*keys))
-            return 0
+            return sum(int(self.redis_client.delete(*keys)) for keys in sweep_sync(self.redis_client, full_pattern))
         except Exception as e:
             logger.error(f"Cache delete_pattern_sync failed for {full_pattern}: {e}")
             return 0
@@ -216,9 +211,12 @@ class VectorSearchCache:
         self.ttl = int(settings.VECTOR_CACHE_TTL) if hasattr(settings, 'VECTOR_CACHE_TTL') else 600
     
     def _generate_query_hash(self, workspace_id: str, query: str, top_k: int) -> str:
-        """Generate hash for query parameters"""
+        """Generate hash for query parameters, under the workspace's current generation"""
         query_data = f"{workspace_id}:{query}:{top_k}"
-        return hashlib.md5(query_data.encode('utf-8')).hexdigest()
+        return cache_tags.tagged_sync(
+            hashlib.md5(query_data.encode('utf-8')).hexdigest(),
+            workspace_tag("vector_search", workspace_id)
+        )
     
     async def get_search_results(
         self, 
@@ -250,9 +248,9 @@ class VectorSearchCache:
             ttl=self.ttl
         )
     
-    async def invalidate_workspace(self, workspace_id: str) -> int:
+    async def invalidate_workspace(self, workspace_id: str) -> None:
         """Invalidate all vector search cache for workspace"""
-        return await self.cache.delete_pattern('vector_search', f"*{workspace_id}*")
+        await cache_tags.invalidate(workspace_tag("vector_search", workspace_id))
 
 class AnalyticsCache:
     """Specialized cache for analytics data"""
@@ -261,11 +259,18 @@ class AnalyticsCache:
         self.cache = cache_manager
         self.ttl = 300  # 5 minutes for analytics
     
+    def _key(self, name: str, workspace_id: str, *parts: str) -> str:
+        """Key under the workspace's current analytics generation"""
+        return cache_tags.tagged_sync(
+            ":".join([name, str(workspace_id), *parts]),
+            workspace_tag("analytics", workspace_id)
+        )
+    
     async def get_analytics_summary(self, workspace_id: str) -> Optional[Dict[str, Any]]:
         """Get cached analytics summary"""
         return await self.cache.get(
             'analytics', 
-            f"summary:{workspace_id}", 
+            self._key("summary", workspace_id), 
             deserialize_type=dict
         )
     
@@ -277,7 +282,7 @@ class AnalyticsCache:
         """Cache analytics summary"""
         return await self.cache.set(
             'analytics', 
-            f"summary:{workspace_id}", 
+            self._key("summary", workspace_id), 
             data, 
             ttl=self.ttl
         )
@@ -290,7 +295,7 @@ class AnalyticsCache:
         """Get cached queries over time data"""
         return await self.cache.get(
             'analytics', 
-            f"queries_over_time:{workspace_id}:{period}", 
+            self._key("queries_over_time", workspace_id, period), 
             deserialize_type=list
         )
     
@@ -303,24 +308,24 @@ class AnalyticsCache:
         """Cache queries over time data"""
         return await self.cache.set(
             'analytics', 
-            f"queries_over_time:{workspace_id}:{period}", 
+            self._key("queries_over_time", workspace_id, period), 
             data, 
             ttl=self.ttl
         )
     
-    async def invalidate_workspace(self, workspace_id: str) -> int:
+    async def invalidate_workspace(self, workspace_id: str) -> None:
         """Invalidate all analytics cache for workspace"""
-        return await self.cache.delete_pattern('analytics', f"*{workspace_id}*")
+        await cache_tags.invalidate(workspace_tag("analytics", workspace_id))
 
     # ---- Sync wrappers ----
-    def invalidate_workspace_sync(self, workspace_id: str) -> int:
-        return self.cache.delete_pattern_sync('analytics', f"*{workspace_id}*")
+    def invalidate_workspace_sync(self, workspace_id: str) -> None:
+        cache_tags.invalidate_sync(workspace_tag("analytics", workspace_id))
 
     async def get_hourly_trends(self, workspace_id: str, period: str) -> Optional[List[Dict[str, Any]]]:
         """Get cached hourly trends"""
         return await self.cache.get(
             'analytics',
-            f"hourly:{workspace_id}:{period}",
+            self._key("hourly", workspace_id, period),
             deserialize_type=list
         )
 
@@ -328,22 +333,22 @@ class AnalyticsCache:
         """Cache hourly trends"""
         return await self.cache.set(
             'analytics',
-            f"hourly:{workspace_id}:{period}",
+            self._key("hourly", workspace_id, period),
             data,
             ttl=self.ttl
         )
 
     def get_hourly_trends_sync(self, workspace_id: str, period: str):
-        return self.cache.get_sync('analytics', f"hourly:{workspace_id}:{period}", deserialize_type=list)
+        return self.cache.get_sync('analytics', self._key("hourly", workspace_id, period), deserialize_type=list)
 
     def set_hourly_trends_sync(self, workspace_id: str, period: str, data: List[Dict[str, Any]]):
-        return self.cache.set_sync('analytics', f"hourly:{workspace_id}:{period}", data, ttl=self.ttl)
+        return self.cache.set_sync('analytics', self._key("hourly", workspace_id, period), data, ttl=self.ttl)
 
     async def get_satisfaction(self, workspace_id: str, period: str) -> Optional[List[Dict[str, Any]]]:
         """Get cached satisfaction stats"""
         return await self.cache.get(
             'analytics',
-            f"satisfaction:{workspace_id}:{period}",
+            self._key("satisfaction", workspace_id, period),
             deserialize_type=list
         )
 
@@ -351,16 +356,16 @@ class AnalyticsCache:
         """Cache satisfaction stats"""
         return await self.cache.set(
             'analytics',
-            f"satisfaction:{workspace_id}:{period}",
+            self._key("satisfaction", workspace_id, period),
             data,
             ttl=self.ttl
         )
 
     def get_satisfaction_sync(self, workspace_id: str, period: str):
-        return self.cache.get_sync('analytics', f"satisfaction:{workspace_id}:{period}", deserialize_type=list)
+        return self.cache.get_sync('analytics', self._key("satisfaction", workspace_id, period), deserialize_type=list)
 
     def set_satisfaction_sync(self, workspace_id: str, period: str, data: List[Dict[str, Any]]):
-        return self.cache.set_sync('analytics', f"satisfaction:{workspace_id}:{period}", data, ttl=self.ttl)
+        return self.cache.set_sync('analytics', self._key("satisfaction", workspace_id, period), data, ttl=self.ttl)
 
 class EmbedCodeCache:
     """Specialized cache for embed codes"""
@@ -25,21 +25,47 @@ Text chunking utilities with token estimation and overlap
 """
 
 import re
-from typing import List, Dict, Any, Optional
+from array import array
+from bisect import bisect_left
+from itertools import chain, islice
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Sequence, Tuple
 import structlog
 from app.core.config import settings
 
 logger = structlog.get_logger()
 
+# Table row blocks the file parser already packed to the token budget
+PREPACKED_SOURCES = {"csv_rows", "xlsx_rows"}
 
-def chunk_text(text: str, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None) -> List[str]:
+# Returns the start offset of every token in the text
+Tokenizer = Callable[[str], Iterable[int]]
+
+_WORD_RE = re.compile(r"\S+")
+_SENTENCE_END_RE = re.compile(r"[.!?]+(?=\s)")
+
+
+def chunk_text(
+    text: str,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+    tokenizer: Optional[Tokenizer] = None
+) -> List[str]:
     """
     Split text into chunks with overlap
     
+    Sentences are packed into chunks of at most ``max_tokens`` tokens. Each
+    chunk after the first starts with the last ``overlap_tokens`` tokens of
+    the one before. A sentence longer than a chunk is split at token
+    boundaries. Chunks are slices of the cleaned text, so punctuation and
+    numbers such as ``3.14`` are kept intact.
+    
     Args:
         text: Text to chunk
         max_tokens: Maximum tokens per chunk (defaults to settings)
         overlap_tokens: Overlap tokens between chunks (defaults to settings)
+        tokenizer: Optional callable returning the start offset of each token
+            in the text it is given, for exact counts (e.g. from a Hugging Face
+            ``offset_mapping``). Without it, tokens are estimated from words.
         
     Returns:
         List of text chunks
@@ -55,55 +81,67 @@ def chunk_text(text: str, max_tokens: Optional[int] = None, overlap_tokens: Opti
     if not cleaned_text:
         return []
     
-    # Split into sentences
-    sentences = _split_into_sentences(cleaned_text)
-    if not sentences:
-        return []
+    # Tokenise once: budgets are counted in units of this array
+    if tokenizer is not None:
+        starts = array("q", tokenizer(cleaned_text))
+        budget, overlap = max(1, max_tokens), max(0, overlap_tokens)
+    else:
+        starts = array("q", (match.start() for match in _WORD_RE.finditer(cleaned_text)))
+        budget = max(1, _words_for_tokens(max_tokens))
+        overlap = max(1, int(overlap_tokens * 0.75)) if overlap_tokens > 0 else 0
+    if not starts:
+        return [cleaned_text]
     
-    # Create chunks
     chunks = []
-    current_chunk = ""
-    current_tokens = 0
-    
-    for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-        
-        # Estimate tokens for the sentence
-        sentence_tokens = _estimate_tokens(sentence)
-        
-        # Check if adding this sentence would exceed max tokens
-        if current_tokens + sentence_tokens > max_tokens and current_chunk:
-            # Save current chunk
-            chunks.append(current_chunk.strip())
+    chunk_first = 0  # First token of the open chunk
+    chunk_start = 0  # ...and its character offset
+    chunk_end = 0  # Character offset just past its last segment
+    for seg_start, seg_end, seg_first, seg_last in _iter_segments(cleaned_text, starts, budget):
+        # Token counts are index differences, prefix sums over the token array
+        if chunk_end and seg_last - chunk_first > budget:
+            chunks.append(cleaned_text[chunk_start:chunk_end].strip())
             
-            # Start new chunk with overlap
-            overlap_text = _get_overlap_text(current_chunk, overlap_tokens)
-            current_chunk = overlap_text + " " + sentence if overlap_text else sentence
-            current_tokens = _estimate_tokens(current_chunk)
-        else:
-            # Add sentence to current chunk
-            if current_chunk:
-                current_chunk += " " + sentence
-            else:
-                current_chunk = sentence
-            current_tokens += sentence_tokens
-    
-    # Add final chunk
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
-    
-    logger.info(
-        "Text chunked successfully",
-        total_chunks=len(chunks),
-        max_tokens=max_tokens,
-        overlap_tokens=overlap_tokens
-    )
+            # Start the next chunk with the overlap, trimmed so the segment still fits
+            chunk_first = min(seg_first, max(seg_first - overlap, seg_last - budget))
+            chunk_start = starts[chunk_first] if chunk_first < seg_first else seg_start
+        elif not chunk_end:
+            chunk_first, chunk_start = seg_first, seg_start
+        chunk_end = seg_end
+    
+    if chunk_end:
+        chunks.append(cleaned_text[chunk_start:chunk_end].strip())
     
     return chunks
 
 
+def _iter_segments(text: str, starts: Sequence[int], budget: int) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Yield ``(start, end, first_token, end_token)`` per sentence
+    
+    A sentence ends at ``.``, ``!`` or ``?`` followed by whitespace.
+    Sentences over ``budget`` tokens are cut into budget-sized pieces;
+    sentences without tokens are skipped.
+    """
+    seg_start = 0
+    seg_first = 0
+    token_count = len(starts)
+    boundaries = (match.end() for match in _SENTENCE_END_RE.finditer(text))
+    for seg_end in chain(boundaries, [len(text)]):
+        if seg_end <= seg_start:
+            continue
+        seg_last = bisect_left(starts, seg_end, seg_first)
+        piece_start = seg_start
+        while seg_last - seg_first > budget:
+            piece_end = starts[seg_first + budget]
+            yield piece_start, piece_end, seg_first, seg_first + budget
+            piece_start, seg_first = piece_end, seg_first + budget
+        if seg_last > seg_first:
+            yield piece_start, seg_end, seg_first, seg_last
+        seg_start, seg_first = seg_end, seg_last
+        if seg_first >= token_count:
+            break
+
+
 def _clean_text(text: str) -> str:
     """Clean and normalize text"""
     if not text:
@@ -141,33 +179,23 @@ def _estimate_tokens(text: str) -> int:
     if not text:
         return 0
     
-    # Count words
-    words = len(text.split())
-    
+    return _estimate_tokens_from_words(len(text.split()))
+
+
+def _words_for_tokens(tokens: int) -> int:
+    """Most words whose estimate (see _estimate_tokens) stays within ``tokens``"""
+    # int(words / 0.75) <= tokens  <=>  4 * words < 3 * (tokens + 1)
+    return (3 * (tokens + 1) - 1) // 4
+
+
+def _estimate_tokens_from_words(words: int) -> int:
+    """Token estimate for a known word count (see _estimate_tokens)"""
     # Rough token estimation (can be improved with actual tokenizer)
     estimated_tokens = int(words / 0.75)
     
     return max(1, estimated_tokens)  # At least 1 token
 
 
-def _get_overlap_text(text: str, overlap_tokens: int) -> str:
-    """Get overlap text from the end of current chunk"""
-    if not text or overlap_tokens <= 0:
-        return ""
-    
-    # Split into words
-    words = text.split()
-    if len(words) <= 1:
-        return text
-    
-    # Calculate how many words to take for overlap
-    overlap_words = max(1, int(overlap_tokens * 0.75))  # Convert tokens to words
-    overlap_words = min(overlap_words, len(words))
-    
-    # Return last portion of text for overlap
-    return " ".join(words[-overlap_words:])
-
-
 def create_chunk_metadata(chunk: str, chunk_index: int, source_metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Create metadata for a chunk"""
     metadata = {
@@ -182,3 +210,37 @@ def create_chunk_metadata(chunk: str, chunk_index: int, source_metadata: Optiona
         metadata.update(source_metadata)
     
     return metadata
+
+
+def iter_chunks(
+    text_blocks: Iterable[Tuple[str, Dict[str, Any]]], start_index: int = 0
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Chunk a stream of (text_block, metadata) tuples lazily
+    
+    Args:
+        text_blocks: Blocks as produced by the file parser, in document order
+        start_index: Index of the first chunk produced
+        
+    Yields:
+        (chunk_text, chunk_metadata) tuples with consecutive chunk indexes
+    """
+    chunk_index = start_index
+    for block_text, block_metadata in text_blocks:
+        if (
+            (block_metadata or {}).get("source") in PREPACKED_SOURCES
+            and _estimate_tokens(block_text) <= settings.MAX_CHUNK_TOKENS
+        ):
+            chunks = [block_text]
+        else:
+            chunks = chunk_text(block_text)
+        for chunk in chunks:
+            yield chunk, create_chunk_metadata(chunk, chunk_index, block_metadata)
+            chunk_index += 1
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most ``size`` items"""
+    iterator = iter(items)
+    while batch := list(islice(iterator, max(1, size))):
+        yield batch
@@ -0,0 +1,140 @@
+"""
+Append-only change log that lets several processes share one on-disk index
+"""
+
+import contextlib
+import json
+import os
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import structlog
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one process may use an index directory
+    fcntl = None
+
+logger = structlog.get_logger()
+
+# Fold the log into a new snapshot once it outgrows both this and the snapshot
+CHECKPOINT_MIN_LOG_BYTES = 4 * 1024 * 1024
+
+_UNREAD = object()
+
+
+def _stat(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class DeltaLog:
+    """One process's view of an index stored as a snapshot plus a change log.
+
+    Each change is one JSON line appended under an exclusive ``flock`` on
+    ``lock_path``; readers replay the lines they have not seen under a shared
+    one. The log starts with an epoch header. Writing a new snapshot restarts
+    the log under a new epoch, and a changed epoch or snapshot tells other
+    processes to reload the snapshot before replaying.
+
+    Typical use, with the owner's own thread lock held::
+
+        if not log.is_current():
+            with log.locked(exclusive=False):
+                reload, ops = log.read()
+                ...
+    """
+
+    def __init__(self, path: str, snapshot_path: str, lock_path: str):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.lock_path = lock_path
+        self.epoch: Optional[str] = None
+        self.offset = 0  # bytes of the log already replayed
+        self._log_stat: Any = _UNREAD
+        self._snapshot_stat: Optional[Tuple[int, int, int]] = None
+
+    @contextlib.contextmanager
+    def locked(self, exclusive: bool) -> Iterator[None]:
+        """Cross-process lock on the log and its snapshot"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        # Lock files are never deleted: a process holding the old inode would not exclude a new one
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def is_current(self) -> bool:
+        """True if nothing was written since the last :meth:`read` (no lock needed)"""
+        return self._log_stat == _stat(self.path) and self._snapshot_stat == _stat(self.snapshot_path)
+
+    def read(self) -> Tuple[bool, List[Dict[str, Any]]]:
+        """``(reload, ops)``: reload the snapshot first if ``reload``, then apply ``ops`` (lock held)"""
+        snapshot_stat = _stat(self.snapshot_path)
+        ops: List[Dict[str, Any]] = []
+        try:
+            log = open(self.path, "rb")
+        except FileNotFoundError:
+            log = None
+        with log or contextlib.nullcontext():
+            header = log.readline() if log is not None else b""
+            epoch = json.loads(header)["epoch"] if header.endswith(b"\n") else None
+            reload = self._log_stat is _UNREAD or epoch != self.epoch or snapshot_stat != self._snapshot_stat
+            if reload:
+                self.epoch, self.offset, self._snapshot_stat = epoch, len(header), snapshot_stat
+            if log is not None and epoch is not None:
+                log.seek(self.offset)
+                data = log.read()
+                # A torn last line (writer died mid-append) is cut off by the next writer
+                end = data.rfind(b"\n") + 1
+                for line in data[:end].splitlines():
+                    try:
+                        ops.append(json.loads(line))
+                    except ValueError as e:
+                        logger.warning("Skipping unreadable change log entry", log=self.path, error=str(e))
+                self.offset += end
+        self._log_stat = _stat(self.path)
+        return reload, ops
+
+    def append(self, op: Dict[str, Any]) -> None:
+        """Write one change after :meth:`read` (exclusive lock held)"""
+        if self.epoch is None:
+            self.restart()
+        line = (json.dumps(op, separators=(",", ":")) + "\n").encode("utf-8")
+        with open(self.path, "r+b") as f:
+            f.truncate(self.offset)
+            f.seek(self.offset)
+            f.write(line)
+        self.offset += len(line)
+        self._log_stat = _stat(self.path)
+
+    def needs_checkpoint(self) -> bool:
+        snapshot_size = self._snapshot_stat[1] if self._snapshot_stat else 0
+        return self.offset > max(CHECKPOINT_MIN_LOG_BYTES, snapshot_size)
+
+    def restart(self) -> None:
+        """Start an empty log under a new epoch, e.g. after writing a snapshot (exclusive lock held)"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.epoch = uuid.uuid4().hex
+        header = (json.dumps({"epoch": self.epoch}) + "\n").encode("utf-8")
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+        os.replace(tmp_path, self.path)
+        self.offset = len(header)
+        self._log_stat = _stat(self.path)
+        self._snapshot_stat = _stat(self.snapshot_path)
+
+    def forget(self) -> None:
+        """Record that the log and snapshot were deleted (exclusive lock held)"""
+        self.epoch, self.offset = None, 0
+        self._log_stat = _stat(self.path)
+        self._snapshot_stat = _stat(self.snapshot_path)
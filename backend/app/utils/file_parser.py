@@ -4,14 +4,20 @@ File parsing utilities for extracting text from various file formats
 
 import os
 import re
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Iterable, Iterator, Optional
 import pypdf
 import pandas as pd
 from docx import Document as DocxDocument
 import structlog
 
+from app.core.config import settings
+from app.utils.chunker import _estimate_tokens_from_words
+
 logger = structlog.get_logger()
 
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+TABULAR_CONTENT_TYPES = {"text/csv", XLSX_CONTENT_TYPE}
+
 
 def extract_text_from_file(file_path: str, content_type: str) -> List[Tuple[str, Dict[str, Any]]]:
     """
@@ -31,7 +37,7 @@ def extract_text_from_file(file_path: str, content_type: str) -> List[Tuple[str,
             return _extract_docx_text(file_path)
         elif content_type == "text/csv":
             return _extract_csv_text(file_path)
-        elif content_type == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":
+        elif content_type == XLSX_CONTENT_TYPE:
             return _extract_xlsx_text(file_path)
         else:
             raise ValueError(f"Unsupported content type: {content_type}")
@@ -47,25 +53,31 @@ def extract_text_from_file(file_path: str, content_type: str) -> List[Tuple[str,
 
 def _extract_pdf_text(file_path: str) -> List[Tuple[str, Dict[str, Any]]]:
     """Extract text from PDF file with page metadata"""
-    text_blocks = []
-    
+    return extract_pdf_pages(file_path)
+
+
+def pdf_page_count(file_path: str) -> int:
+    """Number of pages in a PDF (reads the page tree, not page content)"""
+    with open(file_path, 'rb') as file:
+        return len(pypdf.PdfReader(file).pages)
+
+
+def extract_pdf_pages(file_path: str, start: int = 0, end: Optional[int] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """Extract text from pages ``[start, end)`` of a PDF with page metadata"""
+    return list(iter_pdf_pages(file_path, start, end))
+
+
+def iter_pdf_pages(file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield the text of pages ``[start, end)`` one page at a time"""
     try:
         with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
+            pdf_reader = pypdf.PdfReader(file)
+            pages = pdf_reader.pages
+            end = len(pages) if end is None else min(end, len(pages))
             
-            for page_num, page in enumerate(pdf_reader.pages):
+            for page_num in range(start, end):
                 try:
-                    page_text = page.extract_text()
-                    if page_text and page_text.strip():
-                        # Clean the text
-                        cleaned_text = _clean_text(page_text)
-                        if cleaned_text:
-                            metadata = {
-                                "page": page_num + 1,
-                                "char_range": [0, len(cleaned_text)],
-                                "source": "pdf"
-                            }
-                            text_blocks.append((cleaned_text, metadata))
+                    page_text = pages[page_num].extract_text()
                 except Exception as e:
                     logger.warning(
                         "Failed to extract text from PDF page",
@@ -74,12 +86,21 @@ def _extract_pdf_text(file_path: str) -> List[Tuple[str, Dict[str, Any]]]:
                         file_path=file_path
                     )
                     continue
+                
+                if page_text and page_text.strip():
+                    # Clean the text
+                    cleaned_text = _clean_text(page_text)
+                    if cleaned_text:
+                        metadata = {
+                            "page": page_num + 1,
+                            "char_range": [0, len(cleaned_text)],
+                            "source": "pdf"
+                        }
+                        yield cleaned_text, metadata
                     
     except Exception as e:
         logger.error("PDF text extraction failed", error=str(e), file_path=file_path)
         raise
-    
-    return text_blocks
 
 
 def _extract_docx_text(file_path: str) -> List[Tuple[str, Dict[str, Any]]]:
@@ -109,96 +130,136 @@ def _extract_docx_text(file_path: str) -> List[Tuple[str, Dict[str, Any]]]:
     return text_blocks
 
 
-def _extract_csv_text(file_path: str) -> List[Tuple[str, Dict[str, Any]]]:
-    """Extract text from CSV file with row metadata"""
-    text_blocks = []
+def iter_table_pieces(file_path: str, content_type: str) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+    """
+    Yield the packed row blocks of a CSV or XLSX file piece by piece
     
+    Each list holds the blocks completed by one piece read (a CSV chunk
+    of TABULAR_CSV_CHUNK_ROWS rows, or one sheet), so only one piece of
+    the table is in memory at a time.
+    """
+    if content_type == "text/csv":
+        return _iter_csv_pieces(file_path)
+    if content_type == XLSX_CONTENT_TYPE:
+        return _iter_xlsx_pieces(file_path)
+    raise ValueError(f"Unsupported table content type: {content_type}")
+
+
+def _extract_csv_text(file_path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Extract text from CSV file as blocks of consecutive rows under the header"""
+    return [block for piece in _iter_csv_pieces(file_path) for block in piece]
+
+
+def _extract_xlsx_text(file_path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Extract text from XLSX file as blocks of consecutive rows per sheet"""
+    return [block for piece in _iter_xlsx_pieces(file_path) for block in piece]
+
+
+def _iter_csv_pieces(file_path: str) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
     try:
-        df = pd.read_csv(file_path)
-        
-        # Extract headers as context
-        headers = list(df.columns)
-        if headers:
-            header_text = " | ".join(str(h) for h in headers)
-            metadata = {
-                "row": 0,
-                "char_range": [0, len(header_text)],
-                "source": "csv_headers"
-            }
-            text_blocks.append((header_text, metadata))
-        
-        # Extract data rows
-        for index, row in df.iterrows():
-            row_text = " | ".join(str(cell) if pd.notna(cell) else "" for cell in row)
-            if row_text.strip():
-                cleaned_text = _clean_text(row_text)
-                if cleaned_text:
-                    metadata = {
-                        "row": index + 1,
-                        "char_range": [0, len(cleaned_text)],
-                        "source": "csv_data"
-                    }
-                    text_blocks.append((cleaned_text, metadata))
+        # Read in pieces so a large CSV never has to fit in one DataFrame
+        with pd.read_csv(file_path, chunksize=settings.TABULAR_CSV_CHUNK_ROWS) as frames:
+            yield from _iter_row_blocks(frames, "csv_rows")
                     
     except Exception as e:
         logger.error("CSV text extraction failed", error=str(e), file_path=file_path)
         raise
-    
-    return text_blocks
 
 
-def _extract_xlsx_text(file_path: str) -> List[Tuple[str, Dict[str, Any]]]:
-    """Extract text from XLSX file with sheet and cell metadata"""
-    text_blocks = []
-    
+def _iter_xlsx_pieces(file_path: str) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
     try:
-        # Read all sheets
-        excel_file = pd.ExcelFile(file_path)
-        
-        for sheet_name in excel_file.sheet_names:
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            
-            # Extract sheet name as context
-            sheet_text = f"Sheet: {sheet_name}"
-            metadata = {
-                "sheet": sheet_name,
-                "row": 0,
-                "char_range": [0, len(sheet_text)],
-                "source": "xlsx_sheet"
-            }
-            text_blocks.append((sheet_text, metadata))
-            
-            # Extract headers
-            headers = list(df.columns)
-            if headers:
-                header_text = " | ".join(str(h) for h in headers)
-                metadata = {
-                    "sheet": sheet_name,
-                    "row": 0,
-                    "char_range": [0, len(header_text)],
-                    "source": "xlsx_headers"
-                }
-                text_blocks.append((header_text, metadata))
-            
-            # Extract data rows
-            for index, row in df.iterrows():
-                row_text = " | ".join(str(cell) if pd.notna(cell) else "" for cell in row)
-                if row_text.strip():
-                    cleaned_text = _clean_text(row_text)
-                    if cleaned_text:
-                        metadata = {
-                            "sheet": sheet_name,
-                            "row": index + 1,
-                            "char_range": [0, len(cleaned_text)],
-                            "source": "xlsx_data"
-                        }
-                        text_blocks.append((cleaned_text, metadata))
+        # Open the workbook once and parse each sheet from it
+        with pd.ExcelFile(file_path) as excel_file:
+            for sheet_name in excel_file.sheet_names:
+                yield from _iter_row_blocks([excel_file.parse(sheet_name)], "xlsx_rows", sheet=sheet_name)
                         
     except Exception as e:
         logger.error("XLSX text extraction failed", error=str(e), file_path=file_path)
         raise
+
+
+def _iter_row_blocks(
+    frames: Iterable[pd.DataFrame], source: str, sheet: Optional[str] = None
+) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+    """
+    Pack consecutive table rows into blocks of up to MAX_CHUNK_TOKENS tokens
     
-    return text_blocks
+    Each block repeats the column header (and sheet name) so it stands on
+    its own once embedded; metadata records the rows it covers. Yields the
+    blocks each frame completes; the block still open at the end of a frame
+    carries on into the next one.
+    """
+    budget = settings.MAX_CHUNK_TOKENS
+    header = None
+    header_words = 0
+    open_texts: List[str] = []
+    open_numbers: List[int] = []
+    used = 0
+    emitted = False
+    
+    for df in frames:
+        if header is None:
+            header = _clean_text(" | ".join(str(h) for h in df.columns))
+            if sheet is not None:
+                header = f"Sheet: {sheet}\n{header}"
+            header_words = len(header.split())
+            used = header_words
+        
+        rows = _row_strings(df.dropna(how="all"))
+        rows = rows[rows != ""]
+        if rows.empty:
+            continue
+        
+        # Greedy packing over precomputed word counts (tokens are estimated from words)
+        blocks = []
+        for number, text, words in zip((rows.index + 1).tolist(), rows.tolist(), rows.str.count(r"\S+").tolist()):
+            if open_texts and _estimate_tokens_from_words(used + words) > budget:
+                blocks.append(_row_block(header, open_texts, open_numbers, source, sheet))
+                open_texts, open_numbers, used = [], [], header_words
+            open_texts.append(text)
+            open_numbers.append(number)
+            used += words
+        if blocks:
+            emitted = True
+            yield blocks
+    
+    if open_texts:
+        yield [_row_block(header, open_texts, open_numbers, source, sheet)]
+    elif header and not emitted:
+        # A table with headers but no data still says what it would hold
+        metadata = {"row": 0, "char_range": [0, len(header)], "source": source}
+        if sheet is not None:
+            metadata["sheet"] = sheet
+        yield [(header, metadata)]
+
+
+def _row_strings(df: pd.DataFrame) -> pd.Series:
+    """One cleaned ``a | b | c`` string per row, built a column at a time"""
+    if df.empty or not len(df.columns):
+        return pd.Series([], dtype=object)
+    cells = df.astype(object).where(df.notna(), "").astype(str)
+    columns = [cells[column] for column in cells.columns]
+    rows = columns[0].str.cat(columns[1:], sep=" | ") if len(columns) > 1 else columns[0]
+    # Same normalisation as _clean_text, applied to the whole column
+    return (
+        rows.str.replace(r"\s+", " ", regex=True)
+        .str.replace(r"[^\x20-\x7E\n\t]", "", regex=True)
+        .str.strip()
+    )
+
+
+def _row_block(header: str, row_texts: List[str], row_numbers: List[int],
+               source: str, sheet: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+    text = header + "\n" + "\n".join(row_texts)
+    metadata = {
+        "row": row_numbers[0],
+        "row_range": [row_numbers[0], row_numbers[-1]],
+        "char_range": [0, len(text)],
+        "source": source
+    }
+    if sheet is not None:
+        metadata["sheet"] = sheet
+    return text, metadata
 
 
 def _clean_text(text: str) -> str:
@@ -465,8 +465,8 @@ async def get_external_services_status() -> Dict[str, Any]:
                 genai.configure(api_key=settings.GEMINI_API_KEY)
                 
                 # Test API with a simple request
-                model = genai.GenerativeModel('gemini-pro')
-                response = model.generate_content("Hello")
+                model = genai.GenerativeModel(settings.GEMINI_MODEL_NAME)
+                response = await model.generate_content_async("Hello")
                 
                 if response and response.text:
                     results["gemini_api"] = {
@@ -179,6 +179,52 @@ ai_generation_tokens_total = Counter(
     registry=registry
 )
 
+llm_requests_total = Counter(
+    'llm_requests_total',
+    'Total LLM client requests',
+    ['model', 'mode', 'status'],
+    registry=registry
+)
+
+llm_queue_wait_seconds = Histogram(
+    'llm_queue_wait_seconds',
+    'Time LLM requests waited for a concurrency slot',
+    ['model'],
+    buckets=[0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0],
+    registry=registry
+)
+
+llm_model_duration_seconds = Histogram(
+    'llm_model_duration_seconds',
+    'Time spent waiting on the LLM provider once a slot was acquired',
+    ['model', 'mode'],
+    buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0],
+    registry=registry
+)
+
+llm_inflight_requests = Gauge(
+    'llm_inflight_requests',
+    'LLM requests currently holding a concurrency slot',
+    ['model'],
+    registry=registry
+)
+
+# Reranking metrics
+rerank_duration_seconds = Histogram(
+    'rerank_duration_seconds',
+    'End-to-end cross-encoder rerank latency, including cache lookups',
+    ['model'],
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0],
+    registry=registry
+)
+
+rerank_pairs_total = Counter(
+    'rerank_pairs_total',
+    'Query/chunk pairs reranked, by score source',
+    ['model', 'source'],
+    registry=registry
+)
+
 # Thread-safe metrics collector
 class MetricsCollector:
     """Thread-safe metrics collector using Prometheus client"""
@@ -276,6 +322,25 @@ class MetricsCollector:
         if output_tokens > 0:
             ai_generation_tokens_total.labels(model=model, workspace_id=workspace_id, token_type="output").inc(output_tokens)
     
+    def record_llm_request(self, model: str, mode: str, status: str, queue_wait: float, model_time: float):
+        """Record an LLM client call, split into queue wait and model time"""
+        llm_requests_total.labels(model=model, mode=mode, status=status).inc()
+        llm_queue_wait_seconds.labels(model=model).observe(queue_wait)
+        if status != "rejected":
+            llm_model_duration_seconds.labels(model=model, mode=mode).observe(model_time)
+    
+    def set_llm_inflight(self, model: str, count: int):
+        """Set the number of LLM requests holding a concurrency slot"""
+        llm_inflight_requests.labels(model=model).set(count)
+    
+    def record_rerank(self, model: str, duration: float, cached: int, inferred: int):
+        """Record a rerank call and how many pair scores came from cache"""
+        rerank_duration_seconds.labels(model=model).observe(duration)
+        if cached:
+            rerank_pairs_total.labels(model=model, source="cache").inc(cached)
+        if inferred:
+            rerank_pairs_total.labels(model=model, source="model").inc(inferred)
+    
     def _normalize_path(self, path: str) -> str:
         """Normalize path to avoid high cardinality"""
         # Replace UUIDs and IDs with placeholders
@@ -0,0 +1,322 @@
+"""
+Process pool for document text extraction.
+
+PDF, DOCX and spreadsheet parsing is CPU-bound Python that holds the GIL,
+so it runs in separate processes. Each parse task gets a deadline, each
+parser process a heap cap, and large PDFs are split into page ranges that
+are parsed in parallel and handed on in page order, never running more
+than a few ranges ahead of the consumer.
+"""
+
+import asyncio
+import concurrent.futures
+import contextlib
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+PDF_CONTENT_TYPE = "application/pdf"
+# file_parser.TABULAR_CONTENT_TYPES, repeated so the parent never imports pandas
+TABLE_CONTENT_TYPES = {"text/csv", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+
+# How often a blocked producer or consumer rechecks for cancellation or failure
+_POLL_SECONDS = 0.5
+
+# Extra time the parent allows past a deadline before killing the pool
+_KILL_GRACE_SECONDS = 5.0
+
+TextBlocks = List[Tuple[str, Dict[str, Any]]]
+
+
+class ParseTimeoutError(TimeoutError):
+    """A file took longer than its parse deadline"""
+
+
+class _Deadline(BaseException):
+    # BaseException so the parsers' ``except Exception`` blocks cannot swallow it
+    pass
+
+
+# --- Runs in the parser processes ---
+def _init_parser_process(memory_limit_mb: int) -> None:
+    # Import the parsers first so the cap only bounds parsing itself
+    import app.utils.file_parser  # noqa: F401
+    if memory_limit_mb > 0:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            logger.warning("Parser memory limit not applied", error=str(e))
+
+
+def _on_deadline(signum, frame):
+    raise _Deadline()
+
+
+def _run_with_deadline(timeout: float, func: Callable, *args: Any) -> Any:
+    """Call ``func``, interrupting it after ``timeout`` seconds where signals allow"""
+    if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        return func(*args)
+    previous = signal.signal(signal.SIGALRM, _on_deadline)
+    signal.setitimer(signal.ITIMER_REAL, max(timeout, 0.01))
+    try:
+        return func(*args)
+    except _Deadline:
+        raise ParseTimeoutError(f"Parsing exceeded {timeout:.0f}s") from None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_file(file_path: str, content_type: str, timeout: float) -> TextBlocks:
+    from app.utils.file_parser import extract_text_from_file
+    return _run_with_deadline(timeout, extract_text_from_file, file_path, content_type)
+
+
+def _open_pdf(file_path: str, fanout_pages: int, timeout: float) -> Tuple[int, Optional[TextBlocks]]:
+    """Page count, plus the text right away if the PDF is too small to split"""
+    from app.utils.file_parser import extract_pdf_pages, pdf_page_count
+
+    def open_pdf():
+        pages = pdf_page_count(file_path)
+        return pages, (extract_pdf_pages(file_path, 0, pages) if pages <= fanout_pages else None)
+    return _run_with_deadline(timeout, open_pdf)
+
+
+def _put(out: Any, cancelled: Any, item: Any) -> bool:
+    """Put ``item`` on the bounded queue, giving up if the consumer has gone"""
+    while not cancelled.is_set():
+        try:
+            out.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _stream_table(file_path: str, content_type: str, out: Any, cancelled: Any, timeout: float) -> None:
+    """Send a table's packed row blocks to the parent one piece at a time; ``None`` marks the end"""
+    from app.utils.file_parser import iter_table_pieces
+    pieces = iter_table_pieces(file_path, content_type)
+    while True:
+        # The deadline covers reading each piece, not waiting for the consumer
+        piece = _run_with_deadline(timeout, next, pieces, None)
+        if not _put(out, cancelled, piece) or piece is None:
+            return
+
+
+def _extract_pdf_range(file_path: str, start: int, end: int, timeout: float) -> TextBlocks:
+    from app.utils.file_parser import extract_pdf_pages
+    return _run_with_deadline(timeout, extract_pdf_pages, file_path, start, end)
+
+
+class ParsePool:
+    """Extracts ``(text, metadata)`` blocks from uploaded files in parser processes.
+
+    Results come back as a stream of batches in document order, one batch
+    per parse task. CSV and XLSX files stream their packed row blocks back
+    from a single task through a queue of ``queue_size`` pieces. A large
+    PDF is parsed as a series of page ranges, and only
+    ``max_workers + queue_size`` of them are parsing or waiting to be
+    consumed at once. Memory therefore depends on that window rather than
+    on the size of the document.
+
+    A parser stuck past its deadline (e.g. inside a C extension, where the
+    in-process alarm cannot interrupt it) gets the whole pool killed and
+    replaced; a parser killed for exceeding memory does the same.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, timeout: Optional[float] = None,
+                 memory_limit_mb: Optional[int] = None, fanout_pages: Optional[int] = None,
+                 pages_per_task: Optional[int] = None, queue_size: Optional[int] = None):
+        self.max_workers = max_workers or settings.PARSE_POOL_WORKERS or os.cpu_count() or 1
+        self.timeout = timeout if timeout is not None else settings.PARSE_TIMEOUT_SECONDS
+        self.memory_limit_mb = memory_limit_mb if memory_limit_mb is not None else settings.PARSE_MEMORY_LIMIT_MB
+        self.fanout_pages = fanout_pages if fanout_pages is not None else settings.PARSE_PDF_FANOUT_PAGES
+        self.pages_per_task = max(1, pages_per_task or settings.PARSE_PDF_PAGES_PER_TASK)
+        self.queue_size = max(1, queue_size or settings.PARSE_QUEUE_SIZE)
+        self._executor: Optional[concurrent.futures.Executor] = None
+        self._manager: Optional[Any] = None
+        self._lock = threading.Lock()
+        # Tasks are only submitted when a process is free, so a task's deadline covers its run, not its wait
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self.stats = {"files": 0, "pdf_fanouts": 0, "timeouts": 0, "failures": 0, "recycles": 0}
+
+    def _pool(self) -> concurrent.futures.Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    # Forking a process that runs an event loop and threads is unsafe
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_parser_process,
+                    initargs=(self.memory_limit_mb,),
+                )
+            return self._executor
+
+    def _queues(self) -> Any:
+        """Manager whose queues carry table pieces back from the parser processes"""
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+            return self._manager
+
+    def _recycle(self, executor: concurrent.futures.Executor) -> None:
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        self.stats["recycles"] += 1
+        # ProcessPoolExecutor has no public way to stop a running task
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning("Parser pool recycled")
+
+    def _submit(self, executor: concurrent.futures.Executor, func: Callable, *args: Any,
+                wait: bool = True) -> Optional[concurrent.futures.Future]:
+        """Start ``func(*args, timeout)`` once a process is free; ``None`` if none is and ``wait`` is False"""
+        if not self._slots.acquire(blocking=wait):
+            return None
+        try:
+            future = executor.submit(func, *args, self.timeout)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _result(self, future: concurrent.futures.Future) -> Any:
+        return future.result(timeout=self.timeout + _KILL_GRACE_SECONDS)
+
+    def iter_blocks(self, file_path: str, content_type: str) -> Iterator[TextBlocks]:
+        """Text blocks of a file in document order, one batch per parse task"""
+        executor = self._pool()
+        self.stats["files"] += 1
+        pending: Deque[concurrent.futures.Future] = deque()
+        try:
+            if content_type in TABLE_CONTENT_TYPES:
+                yield from self._iter_table(executor, file_path, content_type)
+                return
+
+            if content_type != PDF_CONTENT_TYPE:
+                yield self._result(self._submit(executor, _extract_file, file_path, content_type))
+                return
+
+            pages, blocks = self._result(self._submit(executor, _open_pdf, file_path, self.fanout_pages))
+            if blocks is not None:
+                yield blocks
+                return
+
+            # Large PDF: page ranges in parallel, handed on in page order
+            self.stats["pdf_fanouts"] += 1
+            window = self.max_workers + self.queue_size
+            starts = deque(range(0, pages, self.pages_per_task))
+            while starts or pending:
+                while starts and len(pending) < window:
+                    start = starts[0]
+                    # Wait for a free process only when there is nothing else to hand on
+                    future = self._submit(
+                        executor, _extract_pdf_range, file_path, start, min(start + self.pages_per_task, pages),
+                        wait=not pending
+                    )
+                    if future is None:
+                        break
+                    starts.popleft()
+                    pending.append(future)
+                yield self._result(pending.popleft())
+
+        except concurrent.futures.TimeoutError:
+            self.stats["timeouts"] += 1
+            self._recycle(executor)
+            raise ParseTimeoutError(f"Parsing exceeded {self.timeout:.0f}s") from None
+        except ParseTimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        except BrokenProcessPool:
+            self.stats["failures"] += 1
+            self._recycle(executor)
+            raise
+        except Exception:
+            self.stats["failures"] += 1
+            raise
+        finally:
+            # The consumer may stop early
+            for future in pending:
+                future.cancel()
+
+    def _iter_table(self, executor: concurrent.futures.Executor, file_path: str,
+                    content_type: str) -> Iterator[TextBlocks]:
+        """Row blocks of a CSV/XLSX, streamed from one parser process through a bounded queue"""
+        manager = self._queues()
+        out = manager.Queue(maxsize=self.queue_size)
+        cancelled = manager.Event()
+        future = self._submit(executor, _stream_table, file_path, content_type, out, cancelled)
+        try:
+            waiting_since = time.monotonic()
+            while True:
+                # Checked before reading: anything sent before the task ended is already queued
+                finished = future.done()
+                try:
+                    piece = out.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    if finished:
+                        # Raises the parser's error (a clean exit sends the end marker)
+                        future.result()
+                        return
+                    if time.monotonic() - waiting_since > self.timeout + _KILL_GRACE_SECONDS:
+                        raise concurrent.futures.TimeoutError()
+                    continue
+                if piece is None:
+                    return
+                yield piece
+                waiting_since = time.monotonic()
+        finally:
+            # Unblocks the producer if the consumer stopped early
+            cancelled.set()
+
+    def parse_sync(self, file_path: str, content_type: str) -> TextBlocks:
+        """All text blocks of a file at once; prefer :meth:`iter_blocks` for large files"""
+        return [block for blocks in self.iter_blocks(file_path, content_type) for block in blocks]
+
+    async def stream(self, file_path: str, content_type: str) -> AsyncIterator[TextBlocks]:
+        """:meth:`iter_blocks` without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        batches = self.iter_blocks(file_path, content_type)
+        try:
+            while True:
+                blocks = await loop.run_in_executor(None, next, batches, None)
+                if blocks is None:
+                    return
+                yield blocks
+        finally:
+            # Still running in its thread if we were cancelled mid-batch
+            with contextlib.suppress(ValueError):
+                batches.close()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            manager, self._manager = self._manager, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if manager is not None:
+            manager.shutdown()
+
+
+# Global instance
+parse_pool = ParsePool()
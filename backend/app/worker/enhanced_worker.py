@@ -7,34 +7,53 @@ import uuid
 import time
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, and_, or_
 import structlog
 from datetime import datetime, timedelta
 
 from app.core.config import settings
 from app.core.database import db_manager
 from app.models.document import Document, DocumentChunk
-from app.utils.file_parser import extract_text_from_file
-from app.utils.chunker import chunk_text, create_chunk_metadata
-from app.utils.storage import get_storage_adapter
+from app.utils.chunker import batched, iter_chunks
+from app.utils.parse_pool import parse_pool
 from app.utils.circuit_breaker import get_database_breaker, get_vector_db_breaker
+from app.services.embedding_outbox import EmbeddingOutbox, OutboxEntry
 from app.services.enhanced_vector_service import enhanced_vector_service
 from app.utils.metrics import MetricsCollector
 
 logger = structlog.get_logger()
 
+# Statuses each status may replace; any other status may replace anything but 'deleted'
+_STATUS_SOURCES = {
+    "done": ("processing",),
+    "embedded": ("processing", "done"),
+}
+
 
 class EnhancedWorker:
-    """Enhanced background worker with batching and optimization"""
+    """Enhanced background worker with batching and optimization.
+    
+    Chunking and embedding are decoupled by a durable Redis-stream outbox:
+    a document is ``done`` once its chunks are stored and queued, and
+    ``embedded`` only after every one of its vectors has landed.
+    """
     
-    def __init__(self):
+    def __init__(self, outbox: Optional[EmbeddingOutbox] = None):
         self.batch_size = 10
         self.batch_timeout = 5.0  # 5 seconds
         self.processing_batch = []
-        self.embedding_batch = []
+        self._documents_ready = asyncio.Event()
         self._lock = asyncio.Lock()
         self._running = False
         
+        # Embedding outbox consumer state
+        self.outbox = outbox or EmbeddingOutbox()
+        self.embedding_batch_chunks = settings.EMBEDDING_OUTBOX_BATCH_CHUNKS
+        self.embedding_flush_interval = settings.EMBEDDING_OUTBOX_FLUSH_INTERVAL
+        self.embedding_buffer: List[OutboxEntry] = []
+        self._embedding_buffered_at = 0.0
+        self._last_outbox_maintenance = 0.0
+        
         # Circuit breakers
         self.db_breaker = get_database_breaker()
         self.vector_breaker = get_vector_db_breaker()
@@ -60,35 +79,73 @@ class EnhancedWorker:
             self._running = False
     
     async def _process_document_batch_loop(self):
-        """Process document batches continuously"""
+        """Process document batches as they are queued"""
         while self._running:
             try:
-                if self.processing_batch:
-                    await self._process_document_batch()
-                else:
-                    await asyncio.sleep(0.1)  # Short sleep if no work
+                if not self.processing_batch:
+                    self._documents_ready.clear()
+                    try:
+                        await asyncio.wait_for(self._documents_ready.wait(), timeout=self.batch_timeout)
+                    except asyncio.TimeoutError:
+                        continue
+                await self._process_document_batch()
             except Exception as e:
                 logger.error("Document batch processing failed", error=str(e))
                 await asyncio.sleep(1)  # Wait before retry
     
     async def _process_embedding_batch_loop(self):
-        """Process embedding batches continuously"""
+        """Consume the embedding outbox; blocks on the stream instead of polling"""
+        if not self.outbox.available:
+            logger.warning("Embedding outbox unavailable; documents are embedded inline after chunking")
+            return
+        
+        await self.outbox.ensure_group()
         while self._running:
             try:
-                if self.embedding_batch:
-                    await self._process_embedding_batch()
-                else:
-                    await asyncio.sleep(0.1)  # Short sleep if no work
+                await self._consume_outbox_once()
             except Exception as e:
                 logger.error("Embedding batch processing failed", error=str(e))
                 await asyncio.sleep(1)  # Wait before retry
     
+    def _buffer_entries(self, entries: List[OutboxEntry]) -> None:
+        if entries and not self.embedding_buffer:
+            self._embedding_buffered_at = time.monotonic()
+        self.embedding_buffer.extend(entries)
+    
+    def _embedding_flush_due(self) -> bool:
+        """Flush on buffered size or on the age of the oldest buffered entry"""
+        if not self.embedding_buffer:
+            return False
+        if sum(entry.chunk_count for entry in self.embedding_buffer) >= self.embedding_batch_chunks:
+            return True
+        return time.monotonic() - self._embedding_buffered_at >= self.embedding_flush_interval
+    
+    async def _consume_outbox_once(self):
+        """One read from the outbox, then a flush if the buffer is due"""
+        now = time.monotonic()
+        if now - self._last_outbox_maintenance >= self.embedding_flush_interval:
+            self._last_outbox_maintenance = now
+            await self.outbox.promote_due()
+            self._buffer_entries(await self.outbox.claim_stale(self.batch_size))
+        
+        if not self._embedding_flush_due():
+            if self.embedding_buffer:
+                wait = self._embedding_buffered_at + self.embedding_flush_interval - time.monotonic()
+            else:
+                wait = self.embedding_flush_interval
+            self._buffer_entries(await self.outbox.read(count=self.batch_size, block_ms=int(max(wait, 0) * 1000)))
+        
+        if self._embedding_flush_due():
+            batch, self.embedding_buffer = self.embedding_buffer, []
+            await self._process_embedding_batch(batch)
+    
     async def _cleanup_loop(self):
         """Periodic cleanup tasks"""
         while self._running:
             try:
                 await self._cleanup_expired_sessions()
                 await self._cleanup_failed_jobs()
+                await self._requeue_stalled_documents()
                 await asyncio.sleep(300)  # 5 minutes
             except Exception as e:
                 logger.error("Cleanup failed", error=str(e))
@@ -101,6 +158,7 @@ class EnhancedWorker:
                 'document_id': document_id,
                 'timestamp': time.time()
             })
+            self._documents_ready.set()
             
             # Process batch if it's full
             if len(self.processing_batch) >= self.batch_size:
@@ -155,59 +213,52 @@ class EnhancedWorker:
     
     async def _process_workspace_documents(self, workspace_id: str, documents: List[Document]):
         """Process documents for a specific workspace"""
-        storage = get_storage_adapter()
+        # One document per parser process at a time; each streams through its own pipeline
+        slots = asyncio.Semaphore(parse_pool.max_workers)
         
-        for document in documents:
-            try:
-                # Update status to processing
-                await self._update_document_status(document.id, "processing")
-                
-                # Read file content
-                file_content = storage.get_file(document.path)
-                
-                # Extract text blocks with metadata
-                text_blocks = extract_text_from_file(document.path, document.content_type)
-                
-                if not text_blocks:
-                    raise ValueError("No text could be extracted from the document")
-                
-                # Process each text block
-                all_chunks = []
-                for block_text, block_metadata in text_blocks:
-                    # Chunk the text block
-                    chunks = chunk_text(block_text)
-                    
-                    # Create chunk metadata
-                    for i, chunk_text_content in enumerate(chunks):
-                        chunk_metadata = create_chunk_metadata(
-                            chunk_text_content, 
-                            len(all_chunks) + i, 
-                            block_metadata
-                        )
-                        all_chunks.append((chunk_text_content, chunk_metadata))
-                
-                # Save chunks to database
-                await self._save_chunks_batch(document, all_chunks)
-                
-                # Update document status to done
-                await self._update_document_status(document.id, "done")
-                
-                # Queue embeddings
-                await self._queue_embeddings(document.id, workspace_id, all_chunks)
-                
-                logger.info(
-                    f"Document {document.id} processed successfully",
-                    workspace_id=workspace_id,
-                    chunks_created=len(all_chunks)
-                )
-                
-            except Exception as e:
-                logger.error(
-                    f"Failed to process document {document.id}",
-                    error=str(e),
-                    workspace_id=workspace_id
-                )
-                await self._update_document_status(document.id, "failed", str(e))
+        async def process(document: Document):
+            async with slots:
+                await self._process_document(workspace_id, document)
+        
+        await asyncio.gather(*(process(document) for document in documents))
+    
+    async def _process_document(self, workspace_id: str, document: Document):
+        """Parse, chunk and store a document in bounded batches, then queue its embeddings"""
+        try:
+            # Update status to processing
+            if not await self._update_document_status(document.id, "processing"):
+                logger.info(f"Document {document.id} was deleted before processing")
+                return
+            
+            # Pages arrive from the parser processes a range at a time and are
+            # chunked and saved as they come, so memory does not grow with the file
+            chunk_count = 0
+            async for text_blocks in parse_pool.stream(document.path, document.content_type):
+                for batch in batched(iter_chunks(text_blocks, start_index=chunk_count), settings.INGEST_CHUNK_BATCH_SIZE):
+                    await self._save_chunks_batch(document, batch)
+                    chunk_count += len(batch)
+            
+            if not chunk_count:
+                raise ValueError("No text could be extracted from the document")
+            
+            # Queue embeddings durably before reporting the document as done
+            embedded = await self._queue_embeddings(document.id, workspace_id, chunk_count)
+            await self._update_document_status(document.id, "embedded" if embedded else "done")
+            
+            logger.info(
+                f"Document {document.id} processed successfully",
+                workspace_id=workspace_id,
+                chunks_created=chunk_count
+            )
+            
+        except Exception as e:
+            logger.error(
+                f"Failed to process document {document.id}",
+                error=str(e),
+                workspace_id=workspace_id
+            )
+            await self._discard_chunks(document.id)
+            await self._update_document_status(document.id, "failed", str(e))
     
     async def _save_chunks_batch(self, document: Document, chunks: List[tuple]):
         """Save chunks to database in batch"""
@@ -220,12 +271,16 @@ class EnhancedWorker:
                         workspace_id=document.workspace_id,
                         chunk_index=chunk_metadata["chunk_index"],
                         text=chunk_text_content,
-                        metadata=chunk_metadata
+                        chunk_metadata=chunk_metadata
                     )
                     chunk_objects.append(chunk)
                 
-                # Bulk insert chunks
+                # Bulk insert chunks; the heartbeat commits with them, so a document whose
+                # worker died after storing chunks is found by _requeue_stalled_documents
                 db.bulk_save_objects(chunk_objects)
+                db.query(Document).filter(Document.id == document.id).update(
+                    {Document.processing_heartbeat_at: datetime.utcnow()}, synchronize_session=False
+                )
                 db.commit()
                 
                 logger.info(f"Saved {len(chunk_objects)} chunks for document {document.id}")
@@ -234,47 +289,92 @@ class EnhancedWorker:
             logger.error(f"Failed to save chunks for document {document.id}", error=str(e))
             raise
     
-    async def _queue_embeddings(self, document_id: str, workspace_id: str, chunks: List[tuple]):
-        """Queue embeddings for processing"""
-        async with self._lock:
-            for chunk_text_content, chunk_metadata in chunks:
-                self.embedding_batch.append({
-                    'document_id': document_id,
-                    'workspace_id': workspace_id,
-                    'chunk_text': chunk_text_content,
-                    'chunk_metadata': chunk_metadata,
-                    'timestamp': time.time()
-                })
-            
-            # Process embedding batch if it's full
-            if len(self.embedding_batch) >= self.batch_size:
-                asyncio.create_task(self._process_embedding_batch())
+    async def _discard_chunks(self, document_id: str):
+        """Remove chunks already saved for a document that then failed"""
+        try:
+            with db_manager.get_write_session() as db:
+                db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete()
+                db.commit()
+        except Exception as e:
+            logger.error(f"Failed to discard chunks for document {document_id}", error=str(e))
     
-    async def _process_embedding_batch(self):
-        """Process batch of embeddings"""
-        if not self.embedding_batch:
-            return
+    async def _queue_embeddings(self, document_id: str, workspace_id: str, chunk_count: int) -> bool:
+        """Record the document's chunks in the embedding outbox.
         
-        async with self._lock:
-            batch = self.embedding_batch.copy()
-            self.embedding_batch.clear()
+        Returns True if they were embedded inline instead, which only
+        happens when Redis (and so the outbox) is unavailable.
+        """
+        if self.outbox.available:
+            await self.outbox.enqueue(document_id, workspace_id, chunk_count)
+            return False
         
-        logger.info(f"Processing embedding batch of {len(batch)} chunks")
+        step = settings.EMBEDDING_OUTBOX_BATCH_CHUNKS
+        for start in range(0, chunk_count, step):
+            await self._embed_entries(
+                str(workspace_id),
+                [OutboxEntry(str(document_id), str(workspace_id), start, min(start + step, chunk_count))]
+            )
+        return True
+    
+    async def _process_embedding_batch(self, entries: List[OutboxEntry]):
+        """Embed a batch of outbox entries, then acknowledge or schedule retries"""
+        if not entries:
+            return
+        
+        logger.info(f"Processing embedding batch of {sum(e.chunk_count for e in entries)} chunks")
         
         # Group by workspace for efficient processing
-        workspace_chunks = {}
-        for chunk_data in batch:
-            workspace_id = chunk_data['workspace_id']
-            if workspace_id not in workspace_chunks:
-                workspace_chunks[workspace_id] = []
-            workspace_chunks[workspace_id].append(chunk_data)
+        workspace_entries: Dict[str, List[OutboxEntry]] = {}
+        for entry in entries:
+            workspace_entries.setdefault(entry.workspace_id, []).append(entry)
         
-        # Process each workspace batch
-        for workspace_id, chunks in workspace_chunks.items():
+        for workspace_id, group in workspace_entries.items():
             try:
-                await self._process_workspace_embeddings(workspace_id, chunks)
+                await self._embed_entries(workspace_id, group)
             except Exception as e:
                 logger.error(f"Failed to process embeddings for workspace {workspace_id}", error=str(e))
+                dead = await self.outbox.retry_later(group)
+                for document_id in {entry.document_id for entry in dead}:
+                    await self._update_document_status(document_id, "failed", f"Embedding failed: {e}")
+                continue
+            
+            for document_id in await self.outbox.ack(group):
+                await self._update_document_status(document_id, "embedded")
+    
+    async def _embed_entries(self, workspace_id: str, entries: List[OutboxEntry]):
+        """Load the referenced chunks and store their vectors"""
+        # Primary, not a replica: the chunks may have been written moments ago
+        with db_manager.get_write_session() as db:
+            rows = db.query(
+                DocumentChunk.document_id,
+                DocumentChunk.chunk_index,
+                DocumentChunk.text,
+                DocumentChunk.chunk_metadata
+            ).filter(or_(*[
+                and_(
+                    DocumentChunk.document_id == entry.document_id,
+                    DocumentChunk.chunk_index >= entry.start,
+                    DocumentChunk.chunk_index < entry.end
+                )
+                for entry in entries
+            ])).order_by(DocumentChunk.document_id, DocumentChunk.chunk_index).all()
+        
+        # Chunks of a deleted document no longer need vectors
+        if not rows:
+            return
+        
+        chunks = [
+            {
+                'document_id': str(row.document_id),
+                'workspace_id': workspace_id,
+                'chunk_text': row.text,
+                'chunk_metadata': {
+                    **(row.chunk_metadata or {}), 'document_id': row.document_id, 'chunk_index': row.chunk_index
+                }
+            }
+            for row in rows
+        ]
+        await self._process_workspace_embeddings(workspace_id, chunks)
     
     async def _process_workspace_embeddings(self, workspace_id: str, chunks: List[Dict]):
         """Process embeddings for a specific workspace"""
@@ -285,13 +385,15 @@ class EnhancedWorker:
             ids = [f"{chunk['document_id']}_{chunk['chunk_metadata']['chunk_index']}" for chunk in chunks]
             
             # Add to vector database
-            await self.vector_breaker.call(
+            added = await self.vector_breaker.call(
                 enhanced_vector_service.add_documents,
                 workspace_id,
                 documents,
                 metadatas,
                 ids
             )
+            if added is False:
+                raise RuntimeError("Vector store rejected the batch")
             
             logger.info(f"Added {len(chunks)} embeddings for workspace {workspace_id}")
             
@@ -299,19 +401,32 @@ class EnhancedWorker:
             logger.error(f"Failed to process embeddings for workspace {workspace_id}", error=str(e))
             raise
     
-    async def _update_document_status(self, document_id: str, status: str, error: str = None):
-        """Update document status"""
+    async def _update_document_status(self, document_id: str, status: str, error: str = None) -> bool:
+        """Move a document to ``status`` if its current status allows it.
+        
+        A conditional update, since other processes change the status too: an
+        outbox consumer may mark the document embedded before its chunking
+        worker reports it done, and a user may delete it at any point.
+        Returns whether the status was changed.
+        """
+        sources = _STATUS_SOURCES.get(status)
+        allowed = Document.status.in_(sources) if sources else Document.status != "deleted"
+        values = {Document.status: status}
+        if status == "processing":
+            values[Document.processing_heartbeat_at] = datetime.utcnow()
+        if error:
+            values[Document.error] = error
         try:
             with db_manager.get_write_session() as db:
-                document = db.query(Document).filter(Document.id == document_id).first()
-                if document:
-                    document.status = status
-                    if error:
-                        document.error = error
-                    db.commit()
+                updated = db.query(Document).filter(Document.id == document_id, allowed).update(
+                    values, synchronize_session=False
+                )
+                db.commit()
+                return bool(updated)
         
         except Exception as e:
             logger.error(f"Failed to update document status for {document_id}", error=str(e))
+            return False
     
     async def _mark_documents_failed(self, documents: List[Document], error: str):
         """Mark documents as failed"""
@@ -344,9 +459,46 @@ class EnhancedWorker:
         except Exception as e:
             logger.error("Failed to cleanup failed jobs", error=str(e))
     
+    async def _requeue_stalled_documents(self):
+        """Re-process documents whose worker stopped mid-way.
+        
+        A document is left 'processing' if its worker died while parsing, or
+        after committing chunks but before queueing their embeddings. Once its
+        heartbeat is ``INGEST_STALLED_AFTER_SECONDS`` old its partial chunks are
+        dropped and it is processed again from the start.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.INGEST_STALLED_AFTER_SECONDS)
+        stalled = or_(Document.processing_heartbeat_at.is_(None), Document.processing_heartbeat_at < cutoff)
+        try:
+            with db_manager.get_write_session() as db:
+                candidates = [
+                    row.id for row in
+                    db.query(Document.id).filter(Document.status == "processing", stalled).limit(self.batch_size).all()
+                ]
+                requeued = []
+                for document_id in candidates:
+                    # Conditional update, so only one worker process claims each document
+                    claimed = db.query(Document).filter(
+                        Document.id == document_id, Document.status == "processing", stalled
+                    ).update({Document.status: "uploaded", Document.processing_heartbeat_at: None},
+                             synchronize_session=False)
+                    if claimed:
+                        db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete()
+                        requeued.append(document_id)
+                db.commit()
+        except Exception as e:
+            logger.error("Failed to requeue stalled documents", error=str(e))
+            return
+        
+        for document_id in requeued:
+            logger.warning(f"Re-processing stalled document {document_id}")
+            await self.process_document(str(document_id))
+    
     def stop(self):
         """Stop the worker"""
         self._running = False
+        self._documents_ready.set()
+        parse_pool.shutdown()
         logger.info("Enhanced worker stopped")
 
 
@@ -3,6 +3,7 @@ Background worker for document processing
 """
 
 import uuid
+from datetime import datetime
 from typing import List, Dict, Any
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
@@ -10,9 +11,8 @@ import structlog
 
 from app.core.config import settings
 from app.models.document import Document, DocumentChunk
-from app.utils.file_parser import extract_text_from_file
-from app.utils.chunker import chunk_text, create_chunk_metadata
-from app.utils.storage import get_storage_adapter
+from app.utils.parse_pool import parse_pool
+from app.utils.chunker import batched, iter_chunks
 from app.services.vector_service import VectorService
 
 logger = structlog.get_logger()
@@ -33,7 +33,6 @@ def process_document(document_id: str) -> Dict[str, Any]:
         Dict with processing results
     """
     db = SessionLocal()
-    storage = get_storage_adapter()
     vector = VectorService()
     
     try:
@@ -52,71 +51,38 @@ def process_document(document_id: str) -> Dict[str, Any]:
         # Update status to processing
         document.status = "processing"
         document.error = None
+        document.processing_heartbeat_at = datetime.utcnow()
         db.commit()
         
-        # Read file content
-        file_content = storage.get_file(document.path)
-        
-        # Extract text blocks with metadata
-        text_blocks = extract_text_from_file(document.path, document.content_type)
-        
-        if not text_blocks:
-            raise ValueError("No text could be extracted from the document")
-        
-        # Process each text block
-        all_chunks = []
-        processed = 0
-        total_blocks = len(text_blocks)
-        for block_text, block_metadata in text_blocks:
-            # Chunk the text block
-            chunks = chunk_text(block_text)
-            
-            # Create chunk metadata
-            for i, chunk_text_content in enumerate(chunks):
-                chunk_metadata = create_chunk_metadata(
-                    chunk_text_content, 
-                    len(all_chunks) + i, 
-                    block_metadata
+        # Parse (in the parser processes), chunk, store and index in bounded batches;
+        # only one batch of chunks is held in memory at a time
+        blocks = (
+            block
+            for text_blocks in parse_pool.iter_blocks(document.path, document.content_type)
+            for block in text_blocks
+        )
+        chunks_created = 0
+        for batch in batched(iter_chunks(blocks), settings.INGEST_CHUNK_BATCH_SIZE):
+            chunk_objects = [
+                DocumentChunk(
+                    id=uuid.uuid4(),
+                    document_id=document.id,
+                    workspace_id=document.workspace_id,
+                    chunk_index=chunk_metadata["chunk_index"],
+                    text=chunk_text_content,
+                    chunk_metadata=chunk_metadata
                 )
-                all_chunks.append((chunk_text_content, chunk_metadata))
-            processed += 1
-            # Optional: store progress in document.error as JSON or in a side-channel (skipping DB writes for perf)
-        
-        # Save chunks to database
-        chunk_objects = []
-        for chunk_text_content, chunk_metadata in all_chunks:
-            chunk = DocumentChunk(
-                document_id=document.id,
-                workspace_id=document.workspace_id,
-                chunk_index=chunk_metadata["chunk_index"],
-                text=chunk_text_content,
-                metadata=chunk_metadata
-            )
-            chunk_objects.append(chunk)
-        
-        # Bulk insert chunks
-        db.bulk_save_objects(chunk_objects)
-        db.commit()
+                for chunk_text_content, chunk_metadata in batch
+            ]
+            db.bulk_save_objects(chunk_objects)
+            document.processing_heartbeat_at = datetime.utcnow()
+            db.commit()
+            chunks_created += len(chunk_objects)
+            
+            _index_chunks(vector, document, chunk_objects)
         
-        # Index embeddings in vector database
-        try:
-            raw_chunks = []
-            for c in chunk_objects:
-                raw_chunks.append({
-                    "chunk_id": str(c.id),
-                    "text": c.text,
-                    "metadata": {
-                        "document_id": str(document.id),
-                        "workspace_id": str(document.workspace_id),
-                        "chunk_index": c.chunk_index,
-                        **(c.metadata or {})
-                    }
-                })
-            # Note: VectorService.add_document_chunks expects document_id and workspace_id as strings
-            import asyncio
-            asyncio.run(vector.add_document_chunks(document_id=str(document.id), chunks=raw_chunks, workspace_id=str(document.workspace_id)))
-        except Exception as e:
-            logger.error("Vector indexing failed", error=str(e), document_id=document_id)
+        if not chunks_created:
+            raise ValueError("No text could be extracted from the document")
         
         # Update document status to done
         document.status = "done"
@@ -126,13 +92,13 @@ def process_document(document_id: str) -> Dict[str, Any]:
             "Document processing completed successfully",
             document_id=document_id,
             workspace_id=document.workspace_id,
-            chunks_created=len(all_chunks)
+            chunks_created=chunks_created
         )
         
         return {
             "status": "success",
             "document_id": document_id,
-            "chunks_created": len(all_chunks),
+            "chunks_created": chunks_created,
             "message": "Document processed successfully",
             "progress": 100,
             "phase": "complete"
@@ -146,8 +112,15 @@ def process_document(document_id: str) -> Dict[str, Any]:
             workspace_id=getattr(document, 'workspace_id', None) if 'document' in locals() else None
         )
         
-        # Update document status to failed
+        # Update document status to failed, dropping any chunks already stored
         if 'document' in locals():
+            db.rollback()
+            db.query(DocumentChunk).filter(DocumentChunk.document_id == document.id).delete()
+            try:
+                # Batches indexed before the failure
+                vector.delete_document(str(document.id), str(document.workspace_id))
+            except Exception as index_error:
+                logger.error("Vector cleanup failed", error=str(index_error), document_id=document_id)
             document.status = "failed"
             document.error = str(e)
             db.commit()
@@ -163,6 +136,30 @@ def process_document(document_id: str) -> Dict[str, Any]:
         
     finally:
         db.close()
+        # Each RQ job runs in its own work horse process, which would otherwise leave its parser processes behind
+        parse_pool.shutdown()
+
+
+def _index_chunks(vector: VectorService, document: Document, chunk_objects: List[DocumentChunk]) -> None:
+    """Index one batch of stored chunks in the vector database"""
+    try:
+        raw_chunks = []
+        for c in chunk_objects:
+            raw_chunks.append({
+                "chunk_id": str(c.id),
+                "text": c.text,
+                "metadata": {
+                    "document_id": str(document.id),
+                    "workspace_id": str(document.workspace_id),
+                    "chunk_index": c.chunk_index,
+                    **(c.chunk_metadata or {})
+                }
+            })
+        # Note: VectorService.add_document_chunks expects document_id and workspace_id as strings
+        import asyncio
+        asyncio.run(vector.add_document_chunks(document_id=str(document.id), chunks=raw_chunks, workspace_id=str(document.workspace_id)))
+    except Exception as e:
+        logger.error("Vector indexing failed", error=str(e), document_id=str(document.id))
 
 
 def enqueue_embedding_jobs(document_id: str, chunk_ids: List[str]) -> None:
@@ -0,0 +1,65 @@
+"""
+Fake Gemini REST server for load-testing the LLM client without a real API.
+
+Implements ``generateContent`` and ``streamGenerateContent?alt=sse`` with a
+configurable first-token latency and token rate. Point the backend at it with:
+
+    python scripts/fake_llm_server.py --port 8089 --latency 0.5 --tokens-per-second 50
+    GEMINI_API_BASE_URL=http://127.0.0.1:8089 uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import json
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = (
+    "Thanks for reaching out! Based on the documentation, you can reset your "
+    "password from the account settings page. Let me know if you need anything else."
+)
+
+
+def create_app(latency: float, tokens_per_second: float) -> FastAPI:
+    app = FastAPI(title="Fake LLM")
+    tokens = ANSWER.split(" ")
+    token_delay = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+    def _payload(text: str) -> dict:
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+    @app.post("/v1beta/models/{model_method}")
+    async def generate(model_method: str, request: Request):
+        await request.body()
+        _, _, method = model_method.partition(":")
+        if method == "generateContent":
+            await asyncio.sleep(latency + token_delay * len(tokens))
+            return JSONResponse(_payload(ANSWER))
+        if method == "streamGenerateContent":
+            async def events():
+                await asyncio.sleep(latency)
+                for i, token in enumerate(tokens):
+                    text = token if i == 0 else f" {token}"
+                    yield f"data: {json.dumps(_payload(text))}\r\n\r\n"
+                    await asyncio.sleep(token_delay)
+            return StreamingResponse(events(), media_type="text/event-stream")
+        raise HTTPException(status_code=404, detail=f"Unknown method: {method}")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.latency, args.tokens_per_second), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -61,6 +61,7 @@ class TestEmbedOriginRateLimitIntegration:
             embed_code.expires_at = None
             svc = Mock()
             svc.get_embed_code_by_api_key.return_value = embed_code
+            svc.resolve_embed_auth.return_value = embed_code
             mock_embed_service.return_value = svc
 
             headers = {"X-Client-API-Key": "good", "X-Embed-Code-ID": "embed_1", "Origin": "https://customer.com", "Referer": "https://customer.com/page"}
@@ -77,6 +78,7 @@ class TestEmbedOriginRateLimitIntegration:
             embed_code.expires_at = None
             svc = Mock()
             svc.get_embed_code_by_api_key.return_value = embed_code
+            svc.resolve_embed_auth.return_value = embed_code
             mock_embed_service.return_value = svc
 
             headers = {"X-Client-API-Key": "good", "X-Embed-Code-ID": "embed_1"}
@@ -430,21 +430,30 @@ class TestEmbedWidgetComprehensive:
             assert "Embed code has expired" in response.json()["detail"]
 
     def test_widget_chat_message_rate_limit_exceeded(self, client, test_embed_code):
-        """Test widget chat message when rate limit is exceeded"""
-        with patch('app.services.embed_service.EmbedService') as mock_embed_service:
+        """Test widget chat message when the embed code's rate limit is exceeded"""
+        with patch('app.api.api_v1.endpoints.embed_enhanced.EmbedService') as mock_embed_service:
             mock_service = Mock()
-            mock_service.get_embed_code_by_api_key.return_value = test_embed_code
+            mock_service.resolve_embed_auth.return_value = test_embed_code
             mock_embed_service.return_value = mock_service
             
-            with patch('app.services.rate_limiting.rate_limiting_service.check_ip_rate_limit', new_callable=AsyncMock) as mock_rate_limit:
-                mock_rate_limit.return_value = (False, {"limit": 10, "remaining": 0, "reset_time": Mock(timestamp=lambda: 0)})
+            # The IP limit is checked on its own before the key is resolved
+            with patch('app.services.rate_limiting.rate_limiting_service.check_ip_rate_limit', new_callable=AsyncMock) as mock_ip_limit, \
+                 patch('app.services.rate_limiting.rate_limiting_service.check_widget_rate_limits', new_callable=AsyncMock) as mock_rate_limit:
+                mock_ip_limit.return_value = (True, {"limit": 10, "remaining": 9, "reset_time": Mock(timestamp=lambda: 0)})
+                # The combined check then covers only the embed and workspace scopes
+                mock_rate_limit.return_value = (False, {
+                    "embed": {"allowed": False, "limit": 60, "remaining": 0, "reset_time": Mock(timestamp=lambda: 0)},
+                    "workspace": {"allowed": True, "limit": 120, "remaining": 119, "reset_time": Mock(timestamp=lambda: 0)},
+                })
                 
                 payload = {"message": "Hello"}
                 headers = {"X-Client-API-Key": test_embed_code.client_api_key}
                 
                 response = client.post("/api/v1/embed/chat/message", json=payload, headers=headers)
                 assert response.status_code == 429
-                assert "Rate limit exceeded" in response.json()["detail"]
+                assert "Embed rate limit exceeded" in response.json()["detail"]
+                mock_ip_limit.assert_awaited_once()
+                assert mock_rate_limit.await_args.kwargs["ip_address"] is None
 
     def test_widget_chat_message_invalid_message_format(self, client, test_embed_code):
         """Test widget chat message with invalid message format"""
@@ -0,0 +1,42 @@
+"""
+Benchmark for chunk_text on inputs up to 10 MB
+"""
+
+import time
+
+import pytest
+
+from app.utils.chunker import chunk_text
+
+_PARAGRAPH = (
+    "The customer asked about the refund policy for annual plans. "
+    "Refunds are prorated within 30 days of renewal! "
+    "Is the discount applied before tax? Yes, it is applied to the subtotal of 1,299.00 dollars. "
+)
+
+
+def _text(size_bytes: int) -> str:
+    return (_PARAGRAPH * (size_bytes // len(_PARAGRAPH) + 1))[:size_bytes]
+
+
+def _best_time(text: str, repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        chunk_text(text, max_tokens=512, overlap_tokens=50)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.performance
+class TestChunkerBenchmark:
+    """Chunking cost grows linearly with input size"""
+
+    def test_chunking_scales_linearly(self):
+        timings = {size: _best_time(_text(size)) for size in (1_000_000, 10_000_000)}
+        for size, seconds in timings.items():
+            print(f"chunk_text {size / 1e6:>4.0f} MB: {seconds:.3f} s")
+
+        # 10x the input should cost ~10x, not the 100x of a quadratic packer
+        assert timings[10_000_000] < timings[1_000_000] * 20
+        assert timings[10_000_000] < 10
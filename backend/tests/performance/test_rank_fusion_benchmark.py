@@ -0,0 +1,46 @@
+"""
+Micro-benchmark for reciprocal rank fusion at increasing candidate counts
+"""
+
+import time
+from dataclasses import dataclass
+
+import pytest
+
+from app.services.rank_fusion import reciprocal_rank_fusion
+
+
+@dataclass
+class _Result:
+    chunk_id: str
+
+
+def _candidate_lists(count: int):
+    """Two half-overlapping ranked lists of ``count`` candidates each"""
+    vector = [_Result(f"chunk_{i}") for i in range(count)]
+    bm25 = [_Result(f"chunk_{i}") for i in range(count // 2, count + count // 2)]
+    return vector, bm25
+
+
+def _best_time(count: int, repeats: int = 20) -> float:
+    lists = _candidate_lists(count)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        reciprocal_rank_fusion(lists, weights=[0.7, 0.3])
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.performance
+class TestRankFusionBenchmark:
+    """Fusion cost grows linearly with the candidate count"""
+
+    def test_fusion_scales_linearly(self):
+        timings = {count: _best_time(count) for count in (10, 100, 1000)}
+        for count, seconds in timings.items():
+            print(f"rrf {count:>5} candidates: {seconds * 1000:.3f} ms")
+
+        # 10x more candidates should cost ~10x, far from the 100x of the old quadratic loop
+        assert timings[1000] < timings[100] * 30
+        assert timings[1000] < 0.05
@@ -96,7 +96,7 @@ class TestGeminiService:
     async def test_generate_response_success(self, mock_model):
         """Test successful response generation"""
         mock_instance = Mock()
-        mock_instance.generate_content.return_value.text = "Test response"
+        mock_instance.generate_content_async = AsyncMock(return_value=Mock(text="Test response"))
         mock_model.return_value = mock_instance
         
         service = GeminiService()
@@ -113,7 +113,7 @@ class TestGeminiService:
     async def test_generate_response_with_sources(self, mock_model):
         """Test response generation with sources"""
         mock_instance = Mock()
-        mock_instance.generate_content.return_value.text = "Test response with sources"
+        mock_instance.generate_content_async = AsyncMock(return_value=Mock(text="Test response with sources"))
         mock_model.return_value = mock_instance
         
         service = GeminiService()
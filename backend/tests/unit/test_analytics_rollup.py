@@ -0,0 +1,239 @@
+"""
+Unit tests for analytics rollup maintenance and the dashboard reads built on it
+"""
+
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from app.models.analytics import AnalyticsRollup, DAY, HOUR
+from app.models.chat import ChatMessage, ChatSession
+from app.services.analytics import AnalyticsService
+from app.services.analytics_rollup import AnalyticsRollupService, bucket_start
+from app.services.chat import ChatService
+from app.services.usage_buffer import UsageBuffer
+
+
+def _rollup(db, workspace_id, granularity, at):
+    return db.query(AnalyticsRollup).filter(
+        AnalyticsRollup.workspace_id == workspace_id,
+        AnalyticsRollup.granularity == granularity,
+        AnalyticsRollup.bucket_start == bucket_start(at, granularity)
+    ).first()
+
+
+def _chat_session(workspace_id, user_id, created_at=None, ended_at=None):
+    return ChatSession(
+        workspace_id=workspace_id,
+        user_id=user_id,
+        session_id=str(uuid.uuid4()),
+        created_at=created_at,
+        ended_at=ended_at
+    )
+
+
+def _interaction(session, created_at=None, confidence="high", response_time_ms=200):
+    return [
+        ChatMessage(session_id=session.id, role="user", content="How do refunds work?", created_at=created_at),
+        ChatMessage(
+            session_id=session.id,
+            role="assistant",
+            content="Refunds take 5 days.",
+            response_time_ms=response_time_ms,
+            confidence_score=confidence,
+            created_at=created_at
+        ),
+    ]
+
+
+@pytest.fixture(autouse=True)
+def no_analytics_cache():
+    with patch("app.services.analytics.analytics_cache.get_hourly_trends_sync", return_value=None), \
+         patch("app.services.analytics.analytics_cache.get_satisfaction_sync", return_value=None), \
+         patch("app.services.analytics.analytics_cache.set_hourly_trends_sync"), \
+         patch("app.services.analytics.analytics_cache.set_satisfaction_sync"):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def rollup_buffer(monkeypatch):
+    buffer = UsageBuffer(flush_interval=1)
+    monkeypatch.setattr(buffer, "_redis", lambda: None)
+    monkeypatch.setattr("app.services.analytics_rollup.usage_buffer", buffer)
+    return buffer
+
+
+class TestIncrementalMaintenance:
+    """record_* hooks buffer increments that a flush upserts into hourly and daily buckets"""
+
+    def test_increments_accumulate_in_hour_and_day_buckets(self, db_session, test_user, rollup_buffer):
+        rollups = AnalyticsRollupService(db_session)
+        session = _chat_session(test_user.workspace_id, test_user.id)
+        db_session.add(session)
+        rollups.record_session_started(session)
+        db_session.flush()
+
+        for confidence in ("high", "low"):
+            messages = _interaction(session, confidence=confidence)
+            db_session.add_all(messages)
+            rollups.record_messages(session.workspace_id, messages)
+        db_session.commit()
+        assert _rollup(db_session, test_user.workspace_id, HOUR, datetime.utcnow()) is None
+
+        assert rollup_buffer.flush(db_session) == 2
+
+        now = datetime.utcnow()
+        for granularity in (HOUR, DAY):
+            row = _rollup(db_session, test_user.workspace_id, granularity, now)
+            assert row.sessions_count == 1
+            assert row.messages_count == 4
+            assert row.user_messages_count == 2
+            assert row.response_time_ms_sum == 400
+            assert row.response_time_count == 2
+            assert (row.satisfied_count, row.unsatisfied_count) == (1, 1)
+
+    def test_session_duration_lands_in_start_bucket(self, db_session, test_user, rollup_buffer):
+        started = datetime.utcnow() - timedelta(days=2)
+        session = _chat_session(test_user.workspace_id, test_user.id, created_at=started)
+        db_session.add(session)
+        db_session.commit()
+
+        AnalyticsRollupService(db_session).record_session_ended(session, started + timedelta(minutes=3))
+        rollup_buffer.flush(db_session)
+
+        row = _rollup(db_session, test_user.workspace_id, DAY, started)
+        assert row.sessions_ended == 1
+        assert row.session_duration_seconds == pytest.approx(180)
+
+    def test_flagged_answer_counted_unsatisfied_once(self, db_session, test_user, rollup_buffer):
+        session = _chat_session(test_user.workspace_id, test_user.id)
+        db_session.add(session)
+        db_session.flush()
+        messages = _interaction(session, confidence="high")
+        db_session.add_all(messages)
+        db_session.commit()
+        rollups = AnalyticsRollupService(db_session)
+        rollups.record_messages(session.workspace_id, messages)
+        rollup_buffer.flush(db_session)
+
+        with patch("app.services.chat.VectorService"), patch("app.services.chat.GeminiService"):
+            chat = ChatService(db_session)
+        for message in messages:
+            assert chat.flag_message(session.session_id, message.id, test_user.id, "wrong")
+        assert chat.flag_message(session.session_id, messages[1].id, test_user.id, "still wrong")
+        rollup_buffer.flush(db_session)
+
+        row = _rollup(db_session, test_user.workspace_id, DAY, messages[1].created_at)
+        assert (row.satisfied_count, row.unsatisfied_count) == (1, 1)
+
+    def test_chat_service_messages_counted(self, db_session, test_user, rollup_buffer):
+        session = _chat_session(test_user.workspace_id, test_user.id)
+        db_session.add(session)
+        db_session.commit()
+        with patch("app.services.chat.VectorService"), patch("app.services.chat.GeminiService"):
+            chat = ChatService(db_session)
+
+        chat._save_message(session.id, session.workspace_id, "user", "Do you ship abroad?")
+        chat._save_message(session.id, session.workspace_id, "assistant", "Yes.", response_time_ms=90,
+                           confidence_score="medium")
+        rollup_buffer.flush(db_session)
+
+        row = _rollup(db_session, test_user.workspace_id, HOUR, datetime.utcnow())
+        assert (row.messages_count, row.user_messages_count, row.satisfied_count) == (2, 1, 1)
+        assert row.response_time_ms_sum == 90
+
+
+class TestBackfill:
+    """Rebuilding from source tables"""
+
+    def test_backfill_matches_source_rows_and_is_idempotent(self, db_session, test_user):
+        yesterday = datetime.utcnow().replace(minute=30) - timedelta(days=1)
+        session = _chat_session(
+            test_user.workspace_id, test_user.id, created_at=yesterday, ended_at=yesterday + timedelta(minutes=2)
+        )
+        db_session.add(session)
+        db_session.flush()
+        db_session.add_all(_interaction(session, created_at=yesterday, confidence="medium"))
+        db_session.commit()
+
+        rollups = AnalyticsRollupService(db_session)
+        assert rollups.backfill(workspace_id=test_user.workspace_id) == 2
+        assert rollups.backfill(workspace_id=test_user.workspace_id) == 2
+
+        row = _rollup(db_session, test_user.workspace_id, HOUR, yesterday)
+        assert (row.sessions_count, row.sessions_ended, row.messages_count) == (1, 1, 2)
+        assert row.session_duration_seconds == pytest.approx(120)
+        assert row.satisfied_count == 1
+
+    def test_activity_during_backfill_is_counted_once(self, db_session, test_user, rollup_buffer):
+        now = datetime.utcnow()
+        yesterday = now - timedelta(days=1)
+        old_session = _chat_session(test_user.workspace_id, test_user.id, created_at=yesterday)
+        live_session = _chat_session(test_user.workspace_id, test_user.id)
+        db_session.add_all([old_session, live_session])
+        db_session.commit()
+        rollups = AnalyticsRollupService(db_session)
+        flush = rollup_buffer.flush
+
+        def flush_then_record(db):
+            flushed = flush(db)
+            # Recorded after the backfill's flush, before its source scan
+            messages = _interaction(live_session)
+            db_session.add_all(messages)
+            old_session.ended_at = datetime.utcnow()
+            db_session.commit()
+            rollups.record_messages(live_session.workspace_id, messages)
+            rollups.record_session_ended(old_session, old_session.ended_at)
+            return flushed
+
+        with patch.object(rollup_buffer, "flush", side_effect=flush_then_record):
+            rollups.backfill(workspace_id=test_user.workspace_id)
+        rollup_buffer.flush(db_session)
+
+        assert _rollup(db_session, test_user.workspace_id, DAY, now).messages_count == 2
+        row = _rollup(db_session, test_user.workspace_id, DAY, yesterday)
+        assert (row.sessions_count, row.sessions_ended) == (1, 1)
+
+
+class TestDashboardReads:
+    """AnalyticsService reads rollups instead of scanning messages"""
+
+    def _seed(self, db_session, test_user, at, rollup_buffer):
+        session = _chat_session(test_user.workspace_id, test_user.id, created_at=at)
+        db_session.add(session)
+        db_session.flush()
+        messages = _interaction(session, created_at=at, confidence="low")
+        db_session.add_all(messages)
+        db_session.commit()
+        rollups = AnalyticsRollupService(db_session)
+        rollups.record_session_started(session)
+        rollups.record_messages(session.workspace_id, messages)
+        rollup_buffer.flush(db_session)
+
+    def test_usage_stats_fill_missing_days(self, db_session, test_user, rollup_buffer):
+        self._seed(db_session, test_user, datetime.utcnow(), rollup_buffer)
+
+        stats = AnalyticsService(db_session).get_usage_stats(test_user.id, days=3)
+
+        assert len(stats) == 4
+        assert [day["sessions_count"] for day in stats] == [0, 0, 0, 1]
+        assert stats[-1]["messages_count"] == 1
+
+    def test_hourly_trends_fold_by_hour_of_day(self, db_session, test_user, rollup_buffer):
+        at = datetime.utcnow() - timedelta(hours=1)
+        self._seed(db_session, test_user, at, rollup_buffer)
+
+        trends = AnalyticsService(db_session).get_hourly_trends(test_user.id, days=7)
+
+        assert len(trends) == 24
+        assert trends[at.hour] == {"hour": at.hour, "sessions_count": 1, "messages_count": 2}
+
+    def test_satisfaction_stats(self, db_session, test_user, rollup_buffer):
+        self._seed(db_session, test_user, datetime.utcnow(), rollup_buffer)
+
+        stats = AnalyticsService(db_session).get_satisfaction_stats(test_user.id, days=1)
+
+        assert stats[-1]["unsatisfied"] == 1
+        assert stats[-1]["satisfied"] == 0
@@ -0,0 +1,152 @@
+"""
+Unit tests for the auto-pipelining async Redis facade
+"""
+
+import asyncio
+
+from app.core.async_redis import AsyncRedis
+from app.services.cache_service import CacheService
+
+
+class FakeAsyncRedis:
+    """In-memory stand-in for redis.asyncio that records each pipeline round trip"""
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = []
+
+    def pipeline(self, transaction=True):
+        client = self
+        calls = []
+
+        class Pipeline:
+            def __getattr__(self, method):
+                def queue(*args, **kwargs):
+                    calls.append((method, args, kwargs))
+                return queue
+
+            async def execute(self, raise_on_error=True):
+                await asyncio.sleep(0)
+                client.round_trips.append([method for method, _, _ in calls])
+                return [client._run(method, args) for method, args, _ in calls]
+
+        return Pipeline()
+
+    def _run(self, method, args):
+        if method == "get":
+            return self.data.get(args[0])
+        if method == "mget":
+            return [self.data.get(key) for key in args[0]]
+        if method == "set":
+            self.data[args[0]] = args[1]
+            return True
+        if method == "incr":
+            self.data[args[0]] = int(self.data.get(args[0], 0)) + 1
+            return self.data[args[0]]
+        return ValueError(f"unsupported command {method}")
+
+
+def _facade(max_batch=256):
+    facade = AsyncRedis(max_batch=max_batch)
+    facade._client = FakeAsyncRedis()
+    return facade
+
+
+class TestAutoPipelining:
+    """Concurrent commands share one round trip"""
+
+    def test_concurrent_commands_are_batched(self):
+        facade = _facade()
+
+        async def run():
+            await facade.set("a", "1")
+            return await asyncio.gather(*(facade.incr("counter") for _ in range(10)))
+
+        results = asyncio.run(run())
+
+        assert sorted(results) == list(range(1, 11))
+        assert facade._client.round_trips == [["set"], ["incr"] * 10]
+
+    def test_concurrent_gets_fold_into_one_mget(self):
+        facade = _facade()
+        facade._client.data.update({"a": "1", "b": "2"})
+
+        async def run():
+            return await asyncio.gather(facade.get("a"), facade.get("b"), facade.get("missing"))
+
+        assert asyncio.run(run()) == ["1", "2", None]
+        assert facade._client.round_trips == [["mget"]]
+        assert facade.stats["merged_gets"] == 3
+
+    def test_batches_are_capped(self):
+        facade = _facade(max_batch=4)
+
+        async def run():
+            await asyncio.gather(*(facade.incr("counter") for _ in range(10)))
+
+        asyncio.run(run())
+
+        assert [len(batch) for batch in facade._client.round_trips] == [4, 4, 2]
+
+    def test_execute_many_keeps_order(self):
+        facade = _facade()
+
+        async def run():
+            return await facade.execute_many(("incr", "n"), ("incr", "n"), ("get", "n"))
+
+        assert asyncio.run(run()) == [1, 2, 2]
+        assert len(facade._client.round_trips) == 1
+
+    def test_execute_many_gets_are_not_reordered(self):
+        facade = _facade()
+
+        async def run():
+            return await facade.execute_many(("get", "k"), ("set", "k", "v"), ("get", "k"))
+
+        assert asyncio.run(run()) == [None, True, "v"]
+        assert facade._client.round_trips == [["get", "set", "get"]]
+
+    def test_errors_reach_only_their_caller(self):
+        facade = _facade()
+
+        async def run():
+            return await asyncio.gather(facade.incr("n"), facade.zcard("z"), return_exceptions=True)
+
+        ok, failed = asyncio.run(run())
+
+        assert ok == 1
+        assert isinstance(failed, ValueError)
+        assert facade.latency["zcard"].errors == 1
+
+
+class TestMetrics:
+    """Latency is tracked per command"""
+
+    def test_latency_by_command(self):
+        facade = _facade()
+
+        async def run():
+            await asyncio.gather(facade.get("a"), facade.get("b"), facade.incr("n"))
+
+        asyncio.run(run())
+        stats = facade.get_stats()
+
+        assert stats["commands_by_type"]["get"]["count"] == 2
+        assert stats["commands_by_type"]["incr"]["count"] == 1
+        assert stats["batches"] == 1
+
+
+class TestFallback:
+    """Without Redis the facade uses the in-memory fallback client"""
+
+    def test_cache_service_bulk_get(self):
+        service = CacheService()
+
+        async def run():
+            await service.set("bulk:a", {"v": 1}, ttl=60)
+            await service.set("bulk:b", [2], ttl=60)
+            service.local_cache.clear()
+            return await service.get_many(["bulk:a", "bulk:b", "bulk:c"])
+
+        assert asyncio.run(run()) == {"bulk:a": {"v": 1}, "bulk:b": [2]}
+        assert service.redis.available is False
@@ -0,0 +1,226 @@
+"""
+Unit tests for the local JWT claims cache, revocation replica and principal cache
+"""
+
+import json
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.models.user import User
+from app.services.auth_cache import (
+    INVALIDATION_CHANNEL,
+    AuthCache,
+    BloomFilter,
+    RevocationReplica,
+)
+
+
+class FakeRedis:
+    """Just enough of redis-py for the revocation snapshot"""
+
+    def __init__(self, ttls):
+        self.ttls = ttls
+
+    def scan_iter(self, match=None, count=None):
+        prefix = match.rstrip("*")
+        return iter([key.encode() for key in self.ttls if key.startswith(prefix)])
+
+    def pipeline(self, transaction=True):
+        redis = self
+        calls = []
+
+        class Pipeline:
+            def ttl(self, key):
+                calls.append(key.decode() if isinstance(key, bytes) else key)
+
+            def execute(self):
+                return [redis.ttls[key] for key in calls]
+
+        return Pipeline()
+
+
+class LoopbackRedis(FakeRedis):
+    """Publishes straight back to one subscriber, as a live subscription would"""
+
+    def __init__(self, ttls, subscriber=None):
+        super().__init__(ttls)
+        self.subscriber = subscriber
+
+    def publish(self, channel, data):
+        if self.subscriber is not None:
+            self.subscriber({"channel": channel, "data": data})
+
+
+class TestBloomFilter:
+    """No false negatives, few false positives"""
+
+    def test_membership(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"jti-{i}")
+
+        assert all(f"jti-{i}" in bloom for i in range(1000))
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        assert false_positives < 300
+
+
+class TestRevocationReplica:
+    """Exact answers behind the Bloom filter"""
+
+    def test_revoked_until_expiry(self):
+        replica = RevocationReplica(capacity=100, error_rate=0.01)
+        replica.add("a", time.time() + 60)
+        replica.add("b", time.time() - 1)
+
+        assert replica.is_revoked("a") is True
+        assert replica.is_revoked("b") is False
+        assert replica.is_revoked("c") is False
+
+    def test_prune_drops_expired_entries(self):
+        replica = RevocationReplica(capacity=2, error_rate=0.01)
+        replica.add("old", time.time() - 1)
+        replica.add("a", time.time() + 60)
+        replica.add("b", time.time() + 60)
+
+        assert len(replica) == 2
+        assert replica.is_revoked("a") and replica.is_revoked("b")
+
+    def test_load_snapshot_from_redis(self):
+        replica = RevocationReplica(capacity=100, error_rate=0.01)
+        replica.add("stale", time.time() + 60)
+
+        loaded = replica.load(FakeRedis({"revoked_tokens:a": 30, "revoked_tokens:gone": -2, "other:b": 30}))
+
+        assert loaded == 1
+        assert replica.is_revoked("a") is True
+        assert replica.is_revoked("stale") is False
+
+
+class TestClaimsCache:
+    """Verified claims live until the token expires"""
+
+    def test_hit_until_exp(self):
+        cache = AuthCache(token_cache_size=10)
+        payload = {"sub": "1", "exp": time.time() + 60}
+        cache.put_claims("token", "access", payload)
+
+        assert cache.get_claims("token", "access") is payload
+        assert cache.get_claims("token", "refresh") is None
+        with patch("app.services.auth_cache.time.time", return_value=time.time() + 120):
+            assert cache.get_claims("token", "access") is None
+
+    def test_evicts_least_recently_used(self):
+        cache = AuthCache(token_cache_size=2)
+        exp = time.time() + 60
+        for token in ("a", "b"):
+            cache.put_claims(token, "access", {"exp": exp})
+        cache.get_claims("a", "access")
+        cache.put_claims("c", "access", {"exp": exp})
+
+        assert cache.get_claims("b", "access") is None
+        assert cache.get_claims("a", "access") is not None
+
+    def test_revocation_unknown_until_replica_ready(self):
+        cache = AuthCache(revocations=RevocationReplica(capacity=10, error_rate=0.01))
+        with patch.object(cache, "_publish"):
+            cache.publish_revocation("a", time.time() + 60)
+
+        assert cache.is_revoked("a") is None
+        cache.revocations.ready = True
+        assert cache.is_revoked("a") is True
+        assert cache.is_revoked("b") is False
+
+
+class TestPrincipalCache:
+    """Snapshots are re-attached without a SELECT and invalidated on commit"""
+
+    def test_cached_user_is_attached_to_session(self, db_session, test_user):
+        cache = AuthCache(principal_ttl=30, principal_cache_size=10)
+        cache.put_principal(str(test_user.id), test_user)
+        db_session.expunge_all()
+
+        user = cache.get_principal(str(test_user.id), db_session)
+
+        assert user in db_session
+        assert (user.id, user.email, user.workspace_id) == (test_user.id, test_user.email, test_user.workspace_id)
+        user.full_name = "Renamed"
+        with patch("app.services.auth_cache.auth_cache") as global_cache:
+            db_session.commit()
+        assert db_session.get(User, test_user.id).full_name == "Renamed"
+        global_cache.publish_user_invalidation.assert_called_once_with({test_user.id})
+
+    def test_expired_entries_miss(self, db_session, test_user):
+        cache = AuthCache(principal_ttl=30, principal_cache_size=10)
+        cache.put_principal(str(test_user.id), test_user)
+
+        with patch("app.services.auth_cache.time.monotonic", return_value=time.monotonic() + 60):
+            assert cache.get_principal(str(test_user.id), db_session) is None
+
+    def test_invalidation_message_drops_user(self, db_session, test_user):
+        cache = AuthCache(principal_ttl=30, principal_cache_size=10)
+        cache.put_principal(str(test_user.id), test_user)
+
+        cache._on_message({"channel": INVALIDATION_CHANNEL, "data": json.dumps({"user_id": test_user.id})})
+
+        assert cache.get_principal(str(test_user.id), db_session) is None
+
+
+class TestReplication:
+    """Pub/sub messages carry revocations and user invalidations"""
+
+    def test_publish_and_apply_revocation(self):
+        client = MagicMock()
+        sender = AuthCache(revocations=RevocationReplica(capacity=10, error_rate=0.01))
+        receiver = AuthCache(revocations=RevocationReplica(capacity=10, error_rate=0.01))
+        receiver.revocations.ready = True
+
+        with patch("app.core.database.redis_manager.get_client", return_value=client):
+            sender.publish_revocation("a", time.time() + 60)
+        channel, data = client.publish.call_args[0]
+        receiver._on_message({"channel": channel, "data": data})
+
+        assert channel == INVALIDATION_CHANNEL
+        assert receiver.is_revoked("a") is True
+
+
+class TestListenerRecovery:
+    """A listener error makes the replica non-authoritative until a resync"""
+
+    def _cache(self):
+        return AuthCache(revocations=RevocationReplica(capacity=10, error_rate=0.01))
+
+    def test_error_clears_ready_until_resync(self):
+        cache = self._cache()
+        cache.revocations.ready = True
+
+        with patch("app.services.auth_cache._RETRY_SECONDS", 0):
+            cache._on_listener_error(ConnectionError("reset"), None, None)
+        assert cache.is_revoked("a") is None
+
+        # A revocation made while disconnected is picked up from the snapshot
+        loaded = cache._resync(LoopbackRedis({"revoked_tokens:a": 30}, cache._on_message))
+
+        assert loaded == 1
+        assert cache.is_revoked("a") is True
+
+    def test_resync_needs_a_delivering_subscription(self):
+        cache = self._cache()
+
+        with patch("app.services.auth_cache._PROBE_TIMEOUT", 0.01), pytest.raises(TimeoutError):
+            cache._resync(LoopbackRedis({"revoked_tokens:a": 30}))
+
+        assert cache.revocations.ready is False
+
+    def test_error_during_resync_keeps_replica_not_ready(self):
+        cache = self._cache()
+
+        def deliver_then_drop(message):
+            cache._on_message(message)
+            cache._on_listener_error(ConnectionError("reset"), None, None)
+
+        with patch("app.services.auth_cache._RETRY_SECONDS", 0), pytest.raises(ConnectionError):
+            cache._resync(LoopbackRedis({}, deliver_then_drop))
+
+        assert cache.revocations.ready is False
@@ -346,7 +346,7 @@ class TestWebSocketSecurity:
             mock_embed_code.workspace_id = "ws_1"
             mock_embed_code.id = "embed_123"
             mock_embed_code.is_active = True
-            mock_embed_instance.get_embed_code_by_api_key.return_value = mock_embed_code
+            mock_embed_instance.resolve_embed_auth.return_value = mock_embed_code
             mock_embed.return_value = mock_embed_instance
             
             # Mock database session
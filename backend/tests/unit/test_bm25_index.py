@@ -0,0 +1,163 @@
+"""
+Unit tests for the persistent per-workspace BM25 inverted index
+"""
+
+import os
+from unittest.mock import patch
+
+import pytest
+
+from app.utils import delta_log
+from app.services.bm25_index import BM25Index, BM25IndexManager, tokenize
+
+
+class TestBM25Index:
+    """Scoring and incremental maintenance of a single index"""
+
+    def test_tokenize_lowercases_words(self):
+        assert tokenize("Refund-Policy, 30 DAYS!") == ["refund", "policy", "30", "days"]
+
+    def test_search_ranks_keyword_matches(self):
+        index = BM25Index()
+        index.add_many([
+            ("c1", "How to request a refund for your order", 1),
+            ("c2", "Shipping times for international orders", 1),
+            ("c3", "Refund refund refund policy details", 2),
+        ])
+
+        results = index.search("refund", top_k=5)
+
+        assert [chunk_id for chunk_id, _ in results] == ["c3", "c1"]
+        assert all(score > 0 for _, score in results)
+
+    def test_unknown_terms_return_nothing(self):
+        index = BM25Index()
+        index.add("c1", "hello world", 1)
+
+        assert index.search("kubernetes") == []
+
+    def test_readding_chunk_replaces_previous_text(self):
+        index = BM25Index()
+        index.add("c1", "password reset instructions", 1)
+        index.add("c1", "invoice download instructions", 1)
+
+        assert index.search("password") == []
+        assert [chunk_id for chunk_id, _ in index.search("invoice")] == ["c1"]
+        assert len(index) == 1
+
+    def test_remove_document_drops_its_chunks(self):
+        index = BM25Index()
+        index.add_many([
+            ("c1", "billing cycle", 1),
+            ("c2", "billing address", 2),
+        ])
+
+        assert index.remove_document(1) == 1
+        assert [chunk_id for chunk_id, _ in index.search("billing")] == ["c2"]
+
+    def test_serialization_round_trip(self):
+        index = BM25Index()
+        index.add_many([
+            ("c1", "reset your password from settings", 1),
+            ("c2", "contact support by email", 2),
+        ])
+        index.remove("c2")
+
+        restored = BM25Index.from_bytes(index.to_bytes())
+
+        assert len(restored) == 1
+        assert restored.search("password") == index.search("password")
+
+
+class TestBM25IndexManager:
+    """Per-workspace isolation and persistence"""
+
+    @pytest.fixture
+    def manager(self, tmp_path):
+        return BM25IndexManager(index_dir=str(tmp_path / "bm25"))
+
+    def test_workspaces_are_isolated(self, manager):
+        manager.add_documents("ws_a", [("a1", "alpha pricing", 1)])
+        manager.add_documents("ws_b", [("b1", "beta pricing", 2)])
+
+        assert [c for c, _ in manager.search("ws_a", "pricing")] == ["a1"]
+        assert [c for c, _ in manager.search("ws_b", "pricing")] == ["b1"]
+
+    def test_index_is_persisted_and_reloaded(self, manager):
+        manager.add_documents("ws_a", [("a1", "webhook signature verification", 1)])
+
+        reloaded = BM25IndexManager(index_dir=manager.index_dir)
+
+        assert [c for c, _ in reloaded.search("ws_a", "webhook")] == ["a1"]
+
+    def test_delete_workspace_removes_index_file(self, manager):
+        manager.add_documents("ws_a", [("a1", "delete me", 1)])
+        manager.delete_workspace("ws_a")
+
+        reloaded = BM25IndexManager(index_dir=manager.index_dir)
+
+        assert reloaded.search("ws_a", "delete") == []
+
+    def test_checkpoint_snapshot_is_reloaded(self, manager):
+        manager.add_documents("ws_a", [("a1", "rotate api keys", 1)])
+        manager.save("ws_a")
+
+        reloaded = BM25IndexManager(index_dir=manager.index_dir)
+
+        assert [c for c, _ in reloaded.search("ws_a", "rotate")] == ["a1"]
+        assert os.path.getsize(os.path.join(manager.index_dir, "ws_a.log")) < 100
+
+    def test_other_workspaces_not_blocked(self, manager):
+        manager.add_documents("ws_b", [("b1", "beta pricing", 2)])
+
+        with manager._state("ws_a").lock:
+            assert [c for c, _ in manager.search("ws_b", "pricing")] == ["b1"]
+
+
+class TestSharedIndexDirectory:
+    """Managers in different worker processes share one index directory"""
+
+    @pytest.fixture
+    def workers(self, tmp_path):
+        index_dir = str(tmp_path / "bm25")
+        return BM25IndexManager(index_dir=index_dir), BM25IndexManager(index_dir=index_dir)
+
+    def test_no_lost_updates_and_other_writes_are_served(self, workers):
+        first, second = workers
+        first.search("ws_a", "warm")  # Loaded before the other worker writes
+        first.add_documents("ws_a", [("a1", "invoice export", 1)])
+        second.add_documents("ws_a", [("a2", "invoice email", 2)])
+        first.remove_document("ws_a", 1)
+
+        assert [c for c, _ in second.search("ws_a", "invoice")] == ["a2"]
+        restarted = BM25IndexManager(index_dir=first.index_dir)
+        assert [c for c, _ in restarted.search("ws_a", "invoice")] == ["a2"]
+
+    def test_checkpoint_by_another_worker_triggers_reload(self, workers):
+        first, second = workers
+        with patch.object(delta_log, "CHECKPOINT_MIN_LOG_BYTES", 0):
+            first.add_documents("ws_a", [("a1", "sso login", 1)])
+            assert [c for c, _ in second.search("ws_a", "login")] == ["a1"]
+            second.add_documents("ws_a", [("a2", "password login", 2)])
+            first.remove_document("ws_a", 2)
+
+        assert [c for c, _ in second.search("ws_a", "login")] == ["a1"]
+
+    def test_torn_log_line_is_dropped(self, workers):
+        first, second = workers
+        first.add_documents("ws_a", [("a1", "refund window", 1)])
+        with open(os.path.join(first.index_dir, "ws_a.log"), "ab") as log:
+            log.write(b'{"add":[["half')  # A writer died mid-append
+
+        second.add_documents("ws_a", [("a2", "refund status", 2)])
+
+        assert sorted(c for c, _ in first.search("ws_a", "refund")) == ["a1", "a2"]
+
+    def test_delete_by_another_worker_is_seen(self, workers):
+        first, second = workers
+        first.add_documents("ws_a", [("a1", "audit log", 1)])
+        assert second.search("ws_a", "audit")
+
+        first.delete_workspace("ws_a")
+
+        assert second.search("ws_a", "audit") == []
@@ -0,0 +1,148 @@
+"""
+Unit tests for generation-based cache tags and SCAN sweeping
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from app.core.database import redis_manager
+from app.services.cache_service import CacheService, QueryCache
+from app.services.cache_tags import CacheTags, sweep, sweep_sync, workspace_tag
+from app.services.token_revocation import TokenRevocationService
+
+
+class FakeScanClient:
+    """Returns keys a few at a time, as SCAN does on a large keyspace"""
+
+    def __init__(self, keys, step=2):
+        self.keys = keys
+        self.step = step
+        self.calls = 0
+
+    def _scan(self, cursor, match, count):
+        self.calls += 1
+        batch = [key for key in self.keys[cursor:cursor + self.step] if key.startswith(match.rstrip("*"))]
+        next_cursor = cursor + self.step
+        return (next_cursor if next_cursor < len(self.keys) else 0), batch
+
+    def scan(self, cursor=0, match=None, count=None):
+        return self._scan(cursor, match, count)
+
+
+class FakeAsyncScanClient(FakeScanClient):
+    async def scan(self, cursor=0, match=None, count=None):
+        return self._scan(cursor, match, count)
+
+
+class TestGenerations:
+    """Invalidating a tag is one INCR that moves every key built from it"""
+
+    def test_invalidate_changes_tagged_key(self):
+        tags = CacheTags(local_ttl=60)
+        tag = workspace_tag("search", "ws-gen-1")
+
+        async def run():
+            before = await tags.tagged("search:abc", tag)
+            await tags.invalidate(tag)
+            return before, await tags.tagged("search:abc", tag)
+
+        before, after = asyncio.run(run())
+
+        assert before.startswith("search:abc:g")
+        assert before != after
+
+    def test_other_processes_see_invalidation_after_local_ttl(self):
+        writer = CacheTags(local_ttl=60)
+        reader = CacheTags(local_ttl=0)
+        tag = workspace_tag("analytics", "ws-gen-2")
+
+        before = reader.tagged_sync("summary", tag)
+        writer.invalidate_sync(tag)
+
+        assert reader.tagged_sync("summary", tag) != before
+        assert reader.generations_sync(tag) == writer.generations_sync(tag)
+
+    def test_tags_are_independent(self):
+        tags = CacheTags(local_ttl=60)
+        search, analytics = workspace_tag("search", "ws-gen-3"), workspace_tag("analytics", "ws-gen-3")
+
+        async def run():
+            before = await tags.tagged("key", search, analytics)
+            await tags.invalidate(analytics)
+            return before, await tags.tagged("key", search), await tags.generations(search, analytics)
+
+        before, search_only, generations = asyncio.run(run())
+
+        assert before == "key:g0.0"
+        assert generations == [0, 1]
+        assert search_only == "key:g0"
+
+
+class TestSweep:
+    """Key enumeration walks the cursor instead of calling KEYS"""
+
+    def test_async_sweep_follows_cursor(self):
+        client = FakeAsyncScanClient(["a:1", "b:1", "a:2", "a:3", "b:2"])
+
+        async def run():
+            return [batch async for batch in sweep(client, "a:*")]
+
+        assert asyncio.run(run()) == [["a:1"], ["a:2", "a:3"]]
+        assert client.calls == 3
+
+    def test_sync_sweep_follows_cursor(self):
+        client = FakeScanClient(["a:1", "a:2", "a:3"], step=1)
+
+        assert list(sweep_sync(client, "a:*")) == [["a:1"], ["a:2"], ["a:3"]]
+
+
+class TestCallSites:
+    """Services invalidate by tag or sweep, never KEYS"""
+
+    def test_query_cache_workspace_invalidation(self):
+        calls = []
+
+        async def query():
+            calls.append(1)
+            return {"rows": len(calls)}
+
+        async def run():
+            first = await QueryCache.cache_query("recent", query, ttl=60, workspace_id="ws-q")
+            cached = await QueryCache.cache_query("recent", query, ttl=60, workspace_id="ws-q")
+            await QueryCache.invalidate_workspace("ws-q")
+            fresh = await QueryCache.cache_query("recent", query, ttl=60, workspace_id="ws-q")
+            return first, cached, fresh
+
+        assert asyncio.run(run()) == ({"rows": 1}, {"rows": 1}, {"rows": 2})
+
+    def test_delete_pattern_clears_both_tiers(self):
+        service = CacheService()
+
+        async def run():
+            await service.set("sweepns:a", 1, ttl=60)
+            await service.set("sweepns:b", 2, ttl=60)
+            await service.set("keepns:a", 3, ttl=60)
+            deleted = await service.delete_pattern("sweepns:*")
+            return deleted, await service.get("sweepns:a"), await service.get("keepns:a")
+
+        deleted, removed, kept = asyncio.run(run())
+
+        assert deleted == 4  # two L1 entries and two Redis keys
+        assert removed is None
+        assert kept == 3
+
+    def test_cleanup_expired_tokens(self):
+        client = redis_manager.get_client()
+        service = TokenRevocationService()
+        expired = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+        valid = (datetime.utcnow() + timedelta(hours=1)).isoformat()
+        client.set("revoked_tokens:old", json.dumps({"jti": "old", "expires_at": expired}))
+        client.set("revoked_tokens:new", json.dumps({"jti": "new", "expires_at": valid}))
+
+        try:
+            assert service.cleanup_expired_tokens() == 1
+            assert client.get("revoked_tokens:old") is None
+            assert client.get("revoked_tokens:new") is not None
+        finally:
+            client.delete("revoked_tokens:new")
@@ -0,0 +1,55 @@
+"""
+Unit tests for the sentence packer in app.utils.chunker
+"""
+
+import re
+from unittest.mock import patch
+
+from app.utils.chunker import _estimate_tokens, chunk_text
+
+
+def _char_tokenizer(text):
+    # One token per non-space character
+    return [match.start() for match in re.finditer(r"\S", text)]
+
+
+class TestChunkText:
+    """Chunks are budget-sized slices of the cleaned text"""
+
+    def test_chunks_respect_budget_and_overlap(self):
+        text = " ".join(f"Sentence number {i} is here." for i in range(200))
+
+        chunks = chunk_text(text, max_tokens=100, overlap_tokens=10)
+
+        assert len(chunks) > 1
+        assert all(_estimate_tokens(chunk) <= 100 for chunk in chunks)
+        for previous, current in zip(chunks, chunks[1:]):
+            overlap = " ".join(current.split()[:7])
+            assert previous.endswith(overlap)
+
+    def test_every_sentence_is_kept(self):
+        text = " ".join(f"Fact {i}." for i in range(500))
+
+        chunks = chunk_text(text, max_tokens=50, overlap_tokens=5)
+
+        kept = {word for chunk in chunks for word in chunk.split()}
+        assert {f"{i}." for i in range(500)} <= kept
+
+    def test_punctuation_and_numbers_survive(self):
+        assert chunk_text("Pi is 3.14 today! Really?  Yes.") == ["Pi is 3.14 today! Really? Yes."]
+
+    def test_long_sentence_is_split_at_token_boundaries(self):
+        chunks = chunk_text("word " * 1000, max_tokens=40, overlap_tokens=4)
+
+        assert [len(chunk.split()) for chunk in chunks] == [30] * 33 + [3 + 10]
+
+    def test_exact_tokenizer(self):
+        chunks = chunk_text("ab cd. ef gh. ij", max_tokens=6, overlap_tokens=1, tokenizer=_char_tokenizer)
+
+        assert chunks == ["ab cd.", ". ef gh.", ". ij"]
+
+    def test_no_logging_per_call(self):
+        with patch("app.utils.chunker.logger") as logger:
+            chunk_text("One. Two. Three.")
+
+        assert not logger.method_calls
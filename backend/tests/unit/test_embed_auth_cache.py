@@ -0,0 +1,153 @@
+"""
+Unit tests for the embed-code auth cache and its invalidation
+"""
+
+import json
+import uuid
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.embed_auth_cache import (
+    INVALIDATION_CHANNEL,
+    EmbedAuthCache,
+    EmbedAuthRecord,
+)
+from app.services.embed_service import EmbedService
+
+
+def _embed_code(api_key="key_1", allowed_origins=None):
+    return SimpleNamespace(
+        id=uuid.uuid4(),
+        workspace_id=uuid.uuid4(),
+        user_id=1,
+        client_api_key=api_key,
+        is_active=True,
+        allowed_origins=allowed_origins,
+    )
+
+
+class TestEmbedAuthRecord:
+    """Records are detached and origins pre-parsed"""
+
+    def test_parses_allowed_origins_once(self):
+        record = EmbedAuthRecord.from_embed_code(
+            _embed_code(allowed_origins="https://a.com, https://b.com,")
+        )
+
+        assert record.allowed_origins == frozenset({"https://a.com", "https://b.com"})
+        assert record.allows_origin("https://b.com") is True
+        assert record.allows_origin("https://evil.com") is False
+        assert record.allows_origin(None) is True
+
+    def test_unrestricted_without_origins(self):
+        record = EmbedAuthRecord.from_embed_code(_embed_code())
+
+        assert record.expires_at is None
+        assert record.allows_origin("https://anything.com") is True
+
+
+class TestEmbedAuthCache:
+    """TTL, LRU and invalidation"""
+
+    def test_expired_entries_miss(self):
+        cache = EmbedAuthCache(ttl=60, max_size=10)
+        record = EmbedAuthRecord.from_embed_code(_embed_code())
+        cache.put(record)
+
+        assert cache.get("key_1") is record
+        with patch("app.services.embed_auth_cache.time.monotonic", return_value=10 ** 9):
+            assert cache.get("key_1") is None
+
+    def test_evicts_least_recently_used(self):
+        cache = EmbedAuthCache(ttl=60, max_size=2)
+        for key in ("a", "b"):
+            cache.put(EmbedAuthRecord.from_embed_code(_embed_code(key)))
+        cache.get("a")
+        cache.put(EmbedAuthRecord.from_embed_code(_embed_code("c")))
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+
+    def test_invalidate_by_embed_code_id(self):
+        cache = EmbedAuthCache(ttl=60, max_size=10)
+        record = EmbedAuthRecord.from_embed_code(_embed_code())
+        cache.put(record)
+
+        cache.invalidate(embed_code_id=str(record.id))
+
+        assert cache.get("key_1") is None
+
+    def test_publish_invalidation_broadcasts(self):
+        cache = EmbedAuthCache(ttl=60, max_size=10)
+        cache.put(EmbedAuthRecord.from_embed_code(_embed_code()))
+        redis_client = MagicMock()
+
+        with patch("app.core.database.redis_manager.get_client", return_value=redis_client):
+            cache.publish_invalidation(client_api_key="key_1", embed_code_id="abc")
+
+        assert cache.get("key_1") is None
+        channel, payload = redis_client.publish.call_args.args
+        assert channel == INVALIDATION_CHANNEL
+        assert json.loads(payload) == {"client_api_key": "key_1", "embed_code_id": "abc"}
+
+    def test_pubsub_message_invalidates(self):
+        cache = EmbedAuthCache(ttl=60, max_size=10)
+        cache.put(EmbedAuthRecord.from_embed_code(_embed_code()))
+
+        cache._on_message({"data": json.dumps({"client_api_key": "key_1"})})
+
+        assert cache.get("key_1") is None
+
+
+class TestResolveEmbedAuth:
+    """EmbedService reads the DB only on a cache miss"""
+
+    @pytest.fixture
+    def cache(self):
+        cache = EmbedAuthCache(ttl=60, max_size=10)
+        with patch("app.services.embed_service.embed_auth_cache", cache):
+            yield cache
+
+    def test_second_resolve_skips_db(self, cache):
+        service = EmbedService(MagicMock())
+        embed_code = _embed_code()
+
+        with patch.object(service, "get_embed_code_by_api_key", return_value=embed_code) as lookup:
+            first = service.resolve_embed_auth("key_1")
+            second = service.resolve_embed_auth("key_1")
+
+        assert first is second
+        assert first.id == embed_code.id
+        lookup.assert_called_once_with("key_1")
+
+    def test_unknown_key_is_cached_briefly(self, cache):
+        service = EmbedService(MagicMock())
+
+        with patch.object(service, "get_embed_code_by_api_key", return_value=None) as lookup:
+            assert service.resolve_embed_auth("missing") is None
+            assert service.resolve_embed_auth("missing") is None
+            assert lookup.call_count == 1
+
+            with patch("app.services.embed_auth_cache.time.monotonic", return_value=10 ** 9):
+                assert service.resolve_embed_auth("missing") is None
+            assert lookup.call_count == 2
+
+    def test_invalidation_clears_unknown_key(self, cache):
+        cache.put_missing("key_1")
+
+        cache.invalidate(client_api_key="key_1")
+
+        assert cache.is_missing("key_1") is False
+
+    def test_delete_invalidates_cached_key(self, cache):
+        service = EmbedService(MagicMock())
+        embed_code = _embed_code()
+        cache.put(EmbedAuthRecord.from_embed_code(embed_code))
+
+        with patch.object(service, "get_embed_code_by_id", return_value=embed_code), \
+             patch("app.core.database.redis_manager.get_client", return_value=MagicMock()):
+            assert service.delete_embed_code(str(embed_code.id), 1) is True
+
+        assert cache.get("key_1") is None
@@ -157,6 +157,10 @@ class TestEmbedService:
         initial_usage = embed_code.usage_count
         embed_service.increment_usage(str(embed_code.id))
         
+        # Increments are buffered until the usage flush
+        from app.services.usage_buffer import usage_buffer
+        usage_buffer.flush(embed_service.db)
+        
         # Refresh from database
         embed_service.db.refresh(embed_code)
         assert embed_code.usage_count == initial_usage + 1
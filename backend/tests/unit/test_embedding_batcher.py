@@ -0,0 +1,105 @@
+"""
+Unit tests for micro-batched query embedding
+"""
+
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.services.embedding_batcher import EmbeddingBatcher, get_embedding_batcher
+
+
+class _CountingEncoder:
+    """Fake encoder that records each batch it receives"""
+
+    def __init__(self, dimension: int = 4, delay: float = 0.0, fail: bool = False):
+        self.dimension = dimension
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+        self.threads = []
+
+    def encode(self, texts, **kwargs):
+        self.batches.append(list(texts))
+        self.threads.append(threading.current_thread().name)
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("encoder down")
+        return np.array([[float(len(t))] * self.dimension for t in texts], dtype=np.float32)
+
+
+class TestEmbeddingBatcher:
+    """Concurrent requests share encode calls"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_one_batch(self):
+        encoder = _CountingEncoder()
+        batcher = EmbeddingBatcher(encoder.encode, max_batch_size=16, max_wait_ms=20)
+
+        results = await asyncio.gather(*[batcher.embed("q" * i) for i in range(1, 6)])
+
+        assert encoder.batches == [["q", "qq", "qqq", "qqqq", "qqqqq"]]
+        assert [r[0] for r in results] == [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert batcher.get_stats()["avg_batch_size"] == 5
+
+    @pytest.mark.asyncio
+    async def test_flushes_at_max_batch_size(self):
+        encoder = _CountingEncoder()
+        batcher = EmbeddingBatcher(encoder.encode, max_batch_size=2, max_wait_ms=50)
+
+        await asyncio.gather(*[batcher.embed(f"text {i}") for i in range(5)])
+
+        assert [len(b) for b in encoder.batches] == [2, 2, 1]
+
+    @pytest.mark.asyncio
+    async def test_single_request_waits_at_most_max_wait(self):
+        encoder = _CountingEncoder()
+        batcher = EmbeddingBatcher(encoder.encode, max_batch_size=16, max_wait_ms=10)
+
+        started = time.perf_counter()
+        await batcher.embed("lonely query")
+        elapsed = time.perf_counter() - started
+
+        assert elapsed < 0.5
+        assert encoder.batches == [["lonely query"]]
+
+    @pytest.mark.asyncio
+    async def test_duplicate_texts_encoded_once(self):
+        encoder = _CountingEncoder()
+        batcher = EmbeddingBatcher(encoder.encode, max_wait_ms=20)
+
+        first, second = await asyncio.gather(batcher.embed("refund"), batcher.embed("refund"))
+
+        assert encoder.batches == [["refund"]]
+        assert first == second
+
+    @pytest.mark.asyncio
+    async def test_encode_error_fails_every_request_in_batch(self):
+        batcher = EmbeddingBatcher(_CountingEncoder(fail=True).encode, max_wait_ms=20)
+
+        results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert batcher.get_stats()["errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_encode_runs_off_event_loop(self):
+        encoder = _CountingEncoder()
+        batcher = EmbeddingBatcher(encoder.encode, name="test-embed", max_wait_ms=1)
+
+        await batcher.embed("hello")
+
+        assert encoder.threads[0].startswith("test-embed-batcher")
+
+    def test_registry_shares_batcher_per_model_and_options(self):
+        encoder = _CountingEncoder()
+
+        first = get_embedding_batcher(encoder, normalize_embeddings=True)
+
+        assert get_embedding_batcher(encoder, normalize_embeddings=True) is first
+        assert get_embedding_batcher(encoder, normalize_embeddings=False) is not first
+        assert get_embedding_batcher(_CountingEncoder(), normalize_embeddings=True) is not first
@@ -0,0 +1,412 @@
+"""
+Unit tests for the Redis-stream embedding outbox and the worker that consumes it
+"""
+
+import asyncio
+import contextlib
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.services.embedding_outbox import _ACK_SCRIPT, EmbeddingOutbox, OutboxEntry
+
+
+class FakeStreamRedis:
+    """In-memory Redis with the stream, hash and sorted-set commands the outbox uses"""
+
+    def __init__(self):
+        self.streams = {}
+        self.groups = {}
+        self.hashes = {}
+        self.zsets = {}
+        self._sequence = 0
+
+    # Streams
+    async def xgroup_create(self, stream, group, id="0", mkstream=False):
+        if (stream, group) in self.groups:
+            raise Exception("BUSYGROUP Consumer Group name already exists")
+        self.streams.setdefault(stream, {})
+        self.groups[(stream, group)] = {"delivered": set(), "pending": {}}
+
+    async def xadd(self, stream, fields):
+        self._sequence += 1
+        message_id = f"{self._sequence}-0"
+        self.streams.setdefault(stream, {})[message_id] = dict(fields)
+        return message_id
+
+    async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        response = []
+        for stream in streams:
+            state = self.groups[(stream, group)]
+            fresh = [mid for mid in self.streams[stream] if mid not in state["delivered"]][:count]
+            for mid in fresh:
+                state["delivered"].add(mid)
+                state["pending"][mid] = (consumer, time.monotonic())
+            if fresh:
+                response.append([stream, [(mid, self.streams[stream][mid]) for mid in fresh]])
+        return response
+
+    async def xautoclaim(self, stream, group, consumer, min_idle_time, start_id="0-0", count=None):
+        state = self.groups[(stream, group)]
+        now = time.monotonic()
+        claimed = []
+        for mid, (_, delivered_at) in list(state["pending"].items()):
+            if (now - delivered_at) * 1000 >= min_idle_time and len(claimed) < count:
+                state["pending"][mid] = (consumer, now)
+                claimed.append((mid, self.streams[stream].get(mid)))
+        return ["0-0", claimed, []]
+
+    async def xack(self, stream, group, *ids):
+        pending = self.groups[(stream, group)]["pending"]
+        return sum(1 for mid in ids if pending.pop(mid, None) is not None)
+
+    async def xdel(self, stream, *ids):
+        return sum(1 for mid in ids if self.streams[stream].pop(mid, None) is not None)
+
+    async def xlen(self, stream):
+        return len(self.streams.get(stream, {}))
+
+    # Hashes and keys
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def hincrby(self, key, field, amount):
+        values = self.hashes.setdefault(key, {})
+        values[field] = int(values.get(field, 0)) + amount
+        return values[field]
+
+    async def delete(self, *keys):
+        return sum(1 for key in keys if self.hashes.pop(key, None) is not None)
+
+    # Sorted sets
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zrangebyscore(self, key, low, high, start=0, num=None):
+        members = sorted((score, member) for member, score in self.zsets.get(key, {}).items() if low <= score <= high)
+        return [member for _, member in members][start:start + num if num else None]
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        keys, args = keys_and_args[:numkeys], keys_and_args[numkeys:]
+        if script == _ACK_SCRIPT:
+            # XACK each entry; XDEL and HINCRBY only those this caller acknowledged
+            acked, completed = 0, []
+            for key, (message_id, count, document_id) in zip(keys[1:], zip(*[iter(args[1:])] * 3)):
+                if await self.xack(keys[0], args[0], message_id):
+                    acked += 1
+                    await self.xdel(keys[0], message_id)
+                    if await self.hincrby(key, "remaining", -count) <= 0:
+                        await self.delete(key)
+                        completed.append(document_id)
+            return [acked, *completed]
+        # The promote script: ZREM, and XADD only if this caller removed the member
+        (retry_key, stream), (member, *fields) = keys, args
+        if self.zsets.get(retry_key, {}).pop(member, None) is None:
+            return 0
+        await self.xadd(stream, dict(zip(fields[::2], fields[1::2])))
+        return 1
+
+    def pipeline(self, transaction=True):
+        client = self
+        queued = []
+
+        class Pipeline:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def __getattr__(self, method):
+                def queue(*args, **kwargs):
+                    queued.append((method, args, kwargs))
+                return queue
+
+            async def execute(self):
+                return [await getattr(client, method)(*args, **kwargs) for method, args, kwargs in queued]
+
+        return Pipeline()
+
+
+def _outbox(client=None, consumer="worker-1"):
+    outbox = EmbeddingOutbox(redis_client=client or FakeStreamRedis(), stream="test_outbox", group="g", consumer=consumer)
+    asyncio.run(outbox.ensure_group())
+    return outbox
+
+
+class TestEmbeddingOutbox:
+    """Entries survive until acknowledged; the last ack completes the document"""
+
+    def test_enqueue_splits_document_into_entries(self):
+        outbox = _outbox()
+
+        async def run():
+            with patch("app.services.embedding_outbox.settings.EMBEDDING_OUTBOX_ENTRY_CHUNKS", 4):
+                written = await outbox.enqueue("doc-1", "ws-1", 10)
+            return written, await outbox.read(count=10, block_ms=1)
+
+        written, entries = asyncio.run(run())
+
+        assert written == 3
+        assert [(e.start, e.end) for e in entries] == [(0, 4), (4, 8), (8, 10)]
+        assert outbox._redis_client.hashes["test_outbox:doc:doc-1"]["remaining"] == 10
+
+    def test_document_completes_on_last_ack(self):
+        outbox = _outbox()
+
+        async def run():
+            with patch("app.services.embedding_outbox.settings.EMBEDDING_OUTBOX_ENTRY_CHUNKS", 4):
+                await outbox.enqueue("doc-1", "ws-1", 6)
+            first, second = await outbox.read(count=10, block_ms=1)
+            return await outbox.ack([first]), await outbox.ack([second])
+
+        partial, complete = asyncio.run(run())
+
+        assert partial == []
+        assert complete == ["doc-1"]
+        assert outbox._redis_client.streams["test_outbox"] == {}
+
+    def test_reclaimed_entry_acked_twice_counts_once(self):
+        client = FakeStreamRedis()
+        slow, survivor = _outbox(client, "worker-1"), _outbox(client, "worker-2")
+
+        async def run():
+            with patch("app.services.embedding_outbox.settings.EMBEDDING_OUTBOX_ENTRY_CHUNKS", 4):
+                await slow.enqueue("doc-1", "ws-1", 8)
+            first, second = await slow.read(count=10, block_ms=1)
+            with patch("app.services.embedding_outbox.settings.EMBEDDING_OUTBOX_CLAIM_IDLE_MS", 0):
+                await survivor.claim_stale(1)
+            # Both consumers finish the first entry
+            return await survivor.ack([first]), await slow.ack([first]), await slow.ack([second])
+
+        survivor_done, duplicate_done, last_done = asyncio.run(run())
+
+        assert (survivor_done, duplicate_done, last_done) == ([], [], ["doc-1"])
+        assert (slow.stats["acked"], survivor.stats["acked"]) == (1, 1)
+
+    def test_unacknowledged_entries_are_reclaimed(self):
+        client = FakeStreamRedis()
+        crashed, survivor = _outbox(client, "worker-1"), _outbox(client, "worker-2")
+
+        async def run():
+            await crashed.enqueue("doc-1", "ws-1", 3)
+            await crashed.read(count=10, block_ms=1)
+            with patch("app.services.embedding_outbox.settings.EMBEDDING_OUTBOX_CLAIM_IDLE_MS", 0):
+                return await survivor.claim_stale(10)
+
+        reclaimed = asyncio.run(run())
+
+        assert [(e.document_id, e.start, e.end) for e in reclaimed] == [("doc-1", 0, 3)]
+        assert client.groups[("test_outbox", "g")]["pending"][reclaimed[0].message_id][0] == "worker-2"
+
+    def test_failed_entries_retry_with_backoff(self):
+        outbox = _outbox()
+
+        async def run():
+            await outbox.enqueue("doc-1", "ws-1", 3)
+            entries = await outbox.read(count=10, block_ms=1)
+            dead = await outbox.retry_later(entries, now=1000.0)
+            early = await outbox.promote_due(now=1000.0 + outbox.backoff(0) - 0.1)
+            due = await outbox.promote_due(now=1000.0 + outbox.backoff(0))
+            return dead, early, due, await outbox.read(count=10, block_ms=1)
+
+        dead, early, due, retried = asyncio.run(run())
+
+        assert dead == []
+        assert (early, due) == (0, 1)
+        assert retried[0].attempt == 1
+        assert outbox.backoff(1) == 2 * outbox.backoff(0)
+
+    def test_entries_out_of_attempts_are_dead(self):
+        outbox = _outbox()
+        entry = OutboxEntry("doc-1", "ws-1", 0, 3, attempt=4)
+
+        async def run():
+            message_id = await outbox._redis_client.xadd("test_outbox", entry.to_fields())
+            await outbox._redis_client.hset("test_outbox:doc:doc-1", {"remaining": 3})
+            (read,) = await outbox.read(count=1, block_ms=1)
+            with patch("app.services.embedding_outbox.settings.EMBEDDING_OUTBOX_MAX_ATTEMPTS", 5):
+                return await outbox.retry_later([read])
+
+        dead = asyncio.run(run())
+
+        assert [e.document_id for e in dead] == ["doc-1"]
+        assert outbox._redis_client.zsets.get("test_outbox:retry", {}) == {}
+        assert "test_outbox:doc:doc-1" not in outbox._redis_client.hashes
+
+    def test_fields_round_trip(self):
+        entry = OutboxEntry("doc-1", "ws-1", 4, 8, attempt=2)
+
+        restored = OutboxEntry.from_fields("1-0", json.loads(json.dumps(entry.to_fields())))
+
+        assert restored == OutboxEntry("doc-1", "ws-1", 4, 8, attempt=2, message_id="1-0")
+
+
+class TestWorkerConsumer:
+    """EnhancedWorker flushes by size or age and only then marks documents embedded"""
+
+    def _worker(self, outbox):
+        from app.worker.enhanced_worker import EnhancedWorker
+
+        worker = EnhancedWorker(outbox=outbox)
+        worker._embed_entries = AsyncMock()
+        worker._update_document_status = AsyncMock()
+        return worker
+
+    def test_size_based_flush_marks_document_embedded(self):
+        outbox = _outbox()
+        worker = self._worker(outbox)
+        worker.embedding_batch_chunks = 5
+        worker.embedding_flush_interval = 60
+
+        async def run():
+            await outbox.enqueue("doc-1", "ws-1", 5)
+            await worker._consume_outbox_once()
+
+        asyncio.run(run())
+
+        worker._embed_entries.assert_awaited_once()
+        worker._update_document_status.assert_awaited_once_with("doc-1", "embedded")
+        assert worker.embedding_buffer == []
+
+    def test_small_batches_wait_for_the_flush_interval(self):
+        outbox = _outbox()
+        worker = self._worker(outbox)
+        worker.embedding_batch_chunks = 100
+        worker.embedding_flush_interval = 60
+
+        async def run():
+            await outbox.enqueue("doc-1", "ws-1", 5)
+            worker._last_outbox_maintenance = time.monotonic()
+            await worker._consume_outbox_once()
+            buffered = len(worker.embedding_buffer)
+            worker._embedding_buffered_at -= 60
+            await worker._consume_outbox_once()
+            return buffered
+
+        assert asyncio.run(run()) == 1
+        worker._embed_entries.assert_awaited_once()
+
+    def test_failed_embedding_is_not_acknowledged(self):
+        outbox = _outbox()
+        worker = self._worker(outbox)
+        worker._embed_entries.side_effect = RuntimeError("vector store down")
+        worker.embedding_batch_chunks = 1
+
+        async def run():
+            await outbox.enqueue("doc-1", "ws-1", 3)
+            await worker._consume_outbox_once()
+
+        asyncio.run(run())
+
+        worker._update_document_status.assert_not_awaited()
+        assert len(outbox._redis_client.zsets["test_outbox:retry"]) == 1
+
+
+class TestDocumentStatus:
+    """Status changes are conditional, so a late or out-of-order writer cannot undo another's"""
+
+    def _setup(self, status):
+        from app.models.document import Document, DocumentChunk
+        from app.worker.enhanced_worker import EnhancedWorker
+
+        engine = create_engine("sqlite://")
+        Document.__table__.create(engine)
+        DocumentChunk.__table__.create(engine)
+        Session = sessionmaker(bind=engine)
+        document_id = uuid.uuid4()
+        with Session() as db:
+            db.add(Document(id=document_id, workspace_id=uuid.uuid4(), filename="f.pdf", content_type="application/pdf",
+                            size=1, uploaded_by=1, status=status))
+            db.commit()
+
+        worker = EnhancedWorker(outbox=_outbox())
+        worker.embedding_batch_chunks = 1
+        worker._process_workspace_embeddings = AsyncMock()
+        session = contextlib.contextmanager(lambda: (yield Session()))
+        return worker, Session, str(document_id), patch("app.worker.enhanced_worker.db_manager.get_write_session", session)
+
+    def _status(self, Session, document_id):
+        from app.models.document import Document
+
+        with Session() as db:
+            return db.get(Document, uuid.UUID(document_id)).status
+
+    def test_document_deleted_during_embedding_stays_deleted(self):
+        worker, Session, document_id, session = self._setup("deleted")
+
+        async def run():
+            # Enqueued before the delete removed the chunks
+            await worker.outbox.enqueue(document_id, "ws-1", 2)
+            await worker._consume_outbox_once()
+
+        with session:
+            asyncio.run(run())
+
+        worker._process_workspace_embeddings.assert_not_awaited()
+        assert worker.outbox.stats["acked"] == 1
+        assert self._status(Session, document_id) == "deleted"
+
+    def test_ack_before_done_leaves_document_embedded(self):
+        worker, Session, document_id, session = self._setup("processing")
+
+        async def run():
+            await worker.outbox.enqueue(document_id, "ws-1", 2)
+            # Another process's consumer embeds everything first
+            await worker._consume_outbox_once()
+            return await worker._update_document_status(document_id, "done")
+
+        with session:
+            assert asyncio.run(run()) is False
+
+        assert self._status(Session, document_id) == "embedded"
+
+    def test_failure_does_not_replace_deleted(self):
+        worker, Session, document_id, session = self._setup("deleted")
+
+        with session:
+            assert asyncio.run(worker._update_document_status(document_id, "failed", "Embedding failed")) is False
+            assert asyncio.run(worker._update_document_status(document_id, "processing")) is False
+
+        assert self._status(Session, document_id) == "deleted"
+
+
+class TestStalledDocuments:
+    """Documents whose worker died mid-way are found by their heartbeat and processed again"""
+
+    def test_stalled_document_is_requeued_once(self):
+        from app.models.document import Document, DocumentChunk
+        from app.worker.enhanced_worker import EnhancedWorker
+
+        engine = create_engine("sqlite://")
+        Document.__table__.create(engine)
+        DocumentChunk.__table__.create(engine)
+        Session = sessionmaker(bind=engine)
+        stalled, live = uuid.uuid4(), uuid.uuid4()
+        with Session() as db:
+            for document_id, heartbeat in ((stalled, datetime.utcnow() - timedelta(hours=1)), (live, datetime.utcnow())):
+                db.add(Document(id=document_id, workspace_id=uuid.uuid4(), filename="f.pdf", content_type="application/pdf",
+                                size=1, uploaded_by=1, status="processing", processing_heartbeat_at=heartbeat))
+                db.add(DocumentChunk(document_id=document_id, workspace_id=uuid.uuid4(), chunk_index=0, text="chunk"))
+            db.commit()
+
+        worker = EnhancedWorker(outbox=_outbox())
+        worker.process_document = AsyncMock()
+        session = contextlib.contextmanager(lambda: (yield Session()))
+        with patch("app.worker.enhanced_worker.db_manager.get_write_session", session):
+            asyncio.run(worker._requeue_stalled_documents())
+            asyncio.run(worker._requeue_stalled_documents())
+
+        worker.process_document.assert_awaited_once_with(str(stalled))
+        with Session() as db:
+            assert db.get(Document, stalled).status == "uploaded"
+            assert db.get(Document, live).status == "processing"
+            assert [row.document_id for row in db.query(DocumentChunk)] == [live]
@@ -0,0 +1,114 @@
+"""
+Unit tests for token streaming from Gemini through the RAG services
+"""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.gemini_service import GeminiService
+from app.services.rag_service import RAGService
+
+
+class _FakeStream:
+    """Async iterator standing in for AsyncGenerateContentResponse"""
+
+    def __init__(self, parts, fail_after=None):
+        self._parts = list(parts)
+        self._fail_after = fail_after
+
+    def __aiter__(self):
+        self._index = 0
+        return self
+
+    async def __anext__(self):
+        if self._fail_after is not None and self._index == self._fail_after:
+            raise RuntimeError("stream interrupted")
+        if self._index >= len(self._parts):
+            raise StopAsyncIteration
+        part = self._parts[self._index]
+        self._index += 1
+        return SimpleNamespace(text=part)
+
+
+def _streaming_model(parts, fail_after=None):
+    model = MagicMock()
+    model.generate_content_async = AsyncMock(return_value=_FakeStream(parts, fail_after))
+    return model
+
+
+async def _collect(agen):
+    return [event async for event in agen]
+
+
+@pytest.fixture
+def gemini_service():
+    with patch.object(GeminiService, "_initialize_model"):
+        service = GeminiService()
+    return service
+
+
+class TestGeminiStreaming:
+    """GeminiService.generate_response_stream yields partial text"""
+
+    @pytest.mark.asyncio
+    async def test_yields_deltas_then_final(self, gemini_service):
+        gemini_service.model = _streaming_model(["Refunds ", "take ", "5 days."])
+
+        events = await _collect(gemini_service.generate_response_stream("How long do refunds take?"))
+
+        assert [e["content"] for e in events if e["type"] == "delta"] == ["Refunds ", "take ", "5 days."]
+        assert events[-1]["type"] == "final"
+        assert events[-1]["content"] == "Refunds take 5 days."
+        assert events[-1]["model_used"] == "gemini-pro"
+        assert gemini_service.model.generate_content_async.await_args.kwargs["stream"] is True
+
+    @pytest.mark.asyncio
+    async def test_falls_back_when_stream_fails_before_first_token(self, gemini_service):
+        gemini_service.model = _streaming_model(["never"], fail_after=0)
+
+        events = await _collect(gemini_service.generate_response_stream("hello"))
+
+        assert events[-1]["type"] == "final"
+        assert events[-1]["model_used"] == "fallback"
+        assert events[0]["content"] == events[-1]["content"]
+
+    @pytest.mark.asyncio
+    async def test_keeps_partial_text_when_stream_breaks(self, gemini_service):
+        gemini_service.model = _streaming_model(["Partial ", "answer"], fail_after=1)
+
+        events = await _collect(gemini_service.generate_response_stream("question"))
+
+        assert [e["content"] for e in events if e["type"] == "delta"] == ["Partial "]
+        assert events[-1]["content"] == "Partial "
+
+    @pytest.mark.asyncio
+    async def test_without_model_emits_fallback_once(self, gemini_service):
+        gemini_service.model = None
+
+        events = await _collect(gemini_service.generate_response_stream("thanks"))
+
+        assert [e["type"] for e in events] == ["delta", "final"]
+        assert events[-1]["model_used"] == "fallback"
+
+
+class TestRAGServiceStreaming:
+    """RAGService.process_query_stream forwards Gemini deltas"""
+
+    @pytest.mark.asyncio
+    async def test_answer_chunks_arrive_incrementally(self, db_session):
+        with patch("app.services.rag_service.VectorService"), \
+             patch.object(GeminiService, "_initialize_model"):
+            rag_service = RAGService(db_session)
+        rag_service.vector_service.search_similar_chunks = AsyncMock(return_value=[])
+        rag_service.gemini_service.model = _streaming_model(["Hello", " there"])
+        rag_service._get_or_create_session = AsyncMock(return_value=SimpleNamespace(session_id="s-1"))
+
+        chunks = await _collect(rag_service.process_query_stream(workspace_id="ws_1", query="hi"))
+
+        answers = [c.content for c in chunks if c.type == "answer"]
+        assert answers == ["Hello", " there"]
+        assert chunks[-1].type == "end"
+        assert chunks[-1].metadata["session_id"] == "s-1"
+        assert chunks[-1].metadata["model_used"] == "gemini-pro"
@@ -0,0 +1,118 @@
+"""
+Unit tests for document-level TF-IDF keyword extraction
+"""
+
+import pytest
+
+from app.services.keyword_extractor import KeywordExtractor
+from app.services.production_rag_system import ProductionFileProcessor, TextBlock
+
+
+@pytest.fixture
+def extractor():
+    return KeywordExtractor(top_k=10)
+
+
+class TestKeywordExtractor:
+    """Blocks are scored together against shared IDF statistics"""
+
+    def test_returns_keywords_per_block_in_order(self, extractor):
+        texts = [
+            "Refunds are processed within five business days.",
+            "Reset your password from the account settings page.",
+            "",
+        ]
+
+        keywords = extractor.extract(texts)
+
+        assert len(keywords) == 3
+        assert "refunds" in keywords[0]
+        assert "password" in keywords[1]
+        assert keywords[2] == []
+
+    def test_common_terms_rank_below_distinctive_terms(self, extractor):
+        texts = [
+            "billing invoice overdue",
+            "billing invoice paid",
+            "billing invoice refund",
+        ]
+
+        keywords = extractor.extract(texts)
+
+        for block_keywords, distinctive in zip(keywords, ["overdue", "paid", "refund"]):
+            assert block_keywords.index(distinctive) < block_keywords.index("billing")
+
+    def test_includes_bigrams(self, extractor):
+        keywords = extractor.extract(["api key rotation", "webhook retries"])
+
+        assert "api key" in keywords[0]
+
+    def test_workspace_idf_updates_incrementally(self, extractor):
+        extractor.extract(["shipping policy details", "shipping times"], workspace_id="ws_1")
+        idf_before = extractor.idf("shipping", "ws_1")
+
+        extractor.extract(["return labels"], workspace_id="ws_1")
+
+        assert extractor.idf("shipping", "ws_1") > idf_before
+        assert extractor.idf("shipping", "ws_2") == 1.0
+
+    def test_workspace_history_demotes_previously_common_terms(self, extractor):
+        for _ in range(3):
+            extractor.extract(["warranty claim form", "warranty coverage"], workspace_id="ws_1")
+
+        keywords = extractor.extract(["warranty escalation"], workspace_id="ws_1")
+
+        assert keywords[0].index("escalation") < keywords[0].index("warranty")
+
+    def test_stop_words_only_returns_empty(self, extractor):
+        assert extractor.extract(["the and of", "is a"]) == [[], []]
+
+    def test_reset_drops_workspace_stats(self, extractor):
+        extractor.extract(["orders"], workspace_id="ws_1")
+
+        extractor.reset("ws_1")
+
+        assert extractor.idf("orders", "ws_1") == 1.0
+
+
+class TestFileProcessorKeywords:
+    """ProductionFileProcessor assigns keywords after extraction"""
+
+    @pytest.fixture
+    def file_processor(self):
+        processor = ProductionFileProcessor()
+        processor.keyword_extractor = KeywordExtractor()
+        return processor
+
+    def test_assign_keywords_scores_all_blocks_once(self, file_processor):
+        calls = []
+        original_extract = file_processor.keyword_extractor.extract
+
+        def recording_extract(texts, **kwargs):
+            calls.append(list(texts))
+            return original_extract(texts, **kwargs)
+
+        file_processor.keyword_extractor.extract = recording_extract
+        blocks = [
+            TextBlock(text="Invoices are emailed monthly."),
+            TextBlock(text="[Image 1]", block_type="image"),
+            TextBlock(text="Cancel a subscription from billing settings."),
+        ]
+
+        file_processor._assign_keywords(blocks, workspace_id="ws_1")
+
+        assert len(calls) == 1
+        assert len(calls[0]) == 2
+        assert "invoices" in blocks[0].keywords
+        assert blocks[1].keywords == []
+        assert "subscription" in blocks[2].keywords
+
+    @pytest.mark.asyncio
+    async def test_process_file_populates_keywords(self, file_processor, tmp_path):
+        path = tmp_path / "faq.txt"
+        path.write_text("Returns\n\nItems can be returned within thirty days of delivery.")
+
+        blocks = await file_processor.process_file(str(path), "text/plain", workspace_id="ws_1")
+
+        assert blocks
+        assert any(block.keywords for block in blocks)
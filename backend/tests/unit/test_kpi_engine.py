@@ -0,0 +1,109 @@
+"""
+Unit tests for grouped dashboard KPI computation
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+
+from app.models.chat import ChatMessage, ChatSession
+from app.services.kpi_engine import KPIEngine, percentile_cont
+
+
+NOW = datetime(2024, 3, 1, 12, 0, 0)
+
+
+def _session(db, workspace_id, user_id, created_at):
+    session = ChatSession(
+        workspace_id=workspace_id,
+        user_id=user_id,
+        session_id=str(uuid.uuid4()),
+        created_at=created_at,
+        last_activity_at=created_at
+    )
+    db.add(session)
+    db.flush()
+    return session
+
+
+def _exchange(db, session, created_at, response_time_ms):
+    db.add_all([
+        ChatMessage(session_id=session.id, role="user", content="q", created_at=created_at),
+        ChatMessage(
+            session_id=session.id,
+            role="assistant",
+            content="a",
+            response_time_ms=response_time_ms,
+            created_at=created_at
+        ),
+    ])
+
+
+@pytest.fixture
+def seeded(db_session, test_user):
+    current = _session(db_session, test_user.workspace_id, test_user.id, NOW - timedelta(days=1))
+    for response_time_ms in (100, 200, 300, 400):
+        _exchange(db_session, current, NOW - timedelta(days=1), response_time_ms)
+    previous = _session(db_session, test_user.workspace_id, test_user.id, NOW - timedelta(days=10))
+    _exchange(db_session, previous, NOW - timedelta(days=10), 1000)
+    # Outside both windows
+    old = _session(db_session, test_user.workspace_id, test_user.id, NOW - timedelta(days=30))
+    _exchange(db_session, old, NOW - timedelta(days=30), 50)
+    db_session.commit()
+    return test_user
+
+
+class TestPercentileCont:
+    """Python fallback matches SQL percentile_cont"""
+
+    def test_interpolates_between_ranks(self):
+        assert percentile_cont([100, 200, 300, 400], 50) == 250.0
+        assert percentile_cont([100, 200, 300, 400], 95) == pytest.approx(385.0)
+        assert percentile_cont([7], 95) == 7.0
+        assert percentile_cont([], 50) is None
+
+
+class TestKPIEngine:
+    """Both windows from grouped conditional aggregation"""
+
+    def test_computes_both_windows(self, db_session, seeded):
+        kpis = KPIEngine(db_session).compute(seeded.workspace_id, days=7, now=NOW)
+
+        assert kpis["queries"] == {"current": 4, "previous": 1, "delta_pct": 300.0}
+        assert kpis["sessions"] == {"current": 1, "previous": 1, "delta_pct": 0.0}
+        assert kpis["active_sessions"]["delta"] == 0
+        assert kpis["response_time_p50_ms"] == {"current": 250.0, "previous": 1000.0, "delta_ms": -750.0}
+        assert kpis["response_time_p95_ms"]["current"] == pytest.approx(385.0)
+
+    def test_counts_come_from_one_statement(self, db_session, seeded):
+        workspace_id = seeded.workspace_id
+        statements = []
+        engine = db_session.get_bind()
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            KPIEngine(db_session).compute(workspace_id, days=7, now=NOW)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        # Aggregates in one statement, plus the percentile fallback on SQLite
+        assert len(statements) == 2
+        assert "CASE WHEN" in statements[0]
+
+    def test_postgres_computes_percentiles_in_sql(self):
+        windows = {"current": (NOW - timedelta(days=7), NOW), "previous": (NOW - timedelta(days=14), NOW - timedelta(days=7))}
+        statement = KPIEngine._message_aggregates(uuid.uuid4(), windows, with_percentiles=True)
+
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+
+        assert sql.count("percentile_cont(") == 4
+        assert "WITHIN GROUP (ORDER BY CASE WHEN" in sql
+
+    def test_empty_workspace_reports_zeroes(self, db_session, test_user):
+        kpis = KPIEngine(db_session).compute(test_user.workspace_id, days=7, now=NOW)
+
+        assert kpis["queries"] == {"current": 0, "previous": 0, "delta_pct": 0.0}
+        assert kpis["response_time_p50_ms"] == {"current": 0.0, "previous": 0.0, "delta_ms": 0.0}
@@ -0,0 +1,190 @@
+"""
+Unit tests for the async LLM client (concurrency limits, timeouts, transports)
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+# conftest patches ``httpx.AsyncClient`` with a MagicMock for every test
+from httpx._client import AsyncClient as RealAsyncClient
+
+from app.exceptions import ExternalServiceError
+from app.services.gemini_service import GeminiService
+from app.services.llm_client import GeminiHTTPBackend, LLMBackend, LLMClient
+
+
+class _SlowBackend(LLMBackend):
+    """Backend that sleeps and records peak concurrency"""
+
+    model_name = "fake-model"
+
+    def __init__(self, delay: float = 0.05, parts=("Hello", " world")):
+        self.delay = delay
+        self.parts = parts
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            return "".join(self.parts)
+        finally:
+            self.active -= 1
+
+    async def stream(self, prompt: str):
+        for part in self.parts:
+            await asyncio.sleep(self.delay)
+            yield part
+
+
+class TestConcurrencyLimits:
+    """Calls are bounded globally and per workspace"""
+
+    @pytest.mark.asyncio
+    async def test_global_limit_caps_inflight_calls(self):
+        client = LLMClient(max_concurrency=2, workspace_max_concurrency=10)
+        backend = _SlowBackend()
+
+        results = await asyncio.gather(*[
+            client.generate(backend, "hi", workspace_id=f"ws_{i}") for i in range(6)
+        ])
+
+        assert results == ["Hello world"] * 6
+        assert backend.peak == 2
+        assert client.get_stats()["inflight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_workspace_limit_does_not_block_other_workspaces(self):
+        client = LLMClient(max_concurrency=10, workspace_max_concurrency=1)
+        busy = _SlowBackend(delay=0.05)
+
+        await asyncio.gather(
+            client.generate(busy, "a", workspace_id="ws_busy"),
+            client.generate(busy, "b", workspace_id="ws_busy"),
+            client.generate(busy, "c", workspace_id="ws_other"),
+        )
+
+        assert busy.peak == 2
+        stats = client.get_stats()
+        assert stats["requests"] == 3
+        assert stats["queue_wait_total"] >= 0.04
+        assert stats["active_workspaces"] == 0
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_no_slot_frees_up_in_time(self):
+        client = LLMClient(max_concurrency=1, workspace_max_concurrency=1, queue_timeout=0.01)
+        backend = _SlowBackend(delay=0.1)
+
+        results = await asyncio.gather(
+            client.generate(backend, "a"),
+            client.generate(backend, "b"),
+            return_exceptions=True,
+        )
+
+        assert results[0] == "Hello world"
+        assert isinstance(results[1], ExternalServiceError)
+        assert client.get_stats()["rejected"] == 1
+
+
+class TestTimeouts:
+    """Model time is bounded by the request timeout"""
+
+    @pytest.mark.asyncio
+    async def test_generate_times_out(self):
+        client = LLMClient(request_timeout=0.01)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await client.generate(_SlowBackend(delay=0.5), "hi", workspace_id="ws_1")
+
+        stats = client.get_stats()
+        assert stats["timeouts"] == 1
+        assert stats["inflight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_yields_parts_and_releases_slot(self):
+        client = LLMClient(max_concurrency=1)
+
+        parts = [part async for part in client.stream(_SlowBackend(delay=0), "hi", workspace_id="ws_1")]
+
+        assert parts == ["Hello", " world"]
+        assert client.get_stats()["inflight"] == 0
+        assert client._global_slots._value == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_idle_timeout(self):
+        client = LLMClient(request_timeout=0.01)
+
+        with pytest.raises(asyncio.TimeoutError):
+            async for _ in client.stream(_SlowBackend(delay=0.5), "hi"):
+                pass
+
+        assert client.get_stats()["timeouts"] == 1
+
+
+class TestGeminiHTTPBackend:
+    """REST transport parses generateContent and SSE stream payloads"""
+
+    @staticmethod
+    def _payload(text: str) -> dict:
+        return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+    def _backend(self, handler) -> GeminiHTTPBackend:
+        backend = GeminiHTTPBackend(base_url="http://fake-llm", api_key="k", model_name="gemini-pro")
+        backend._client = RealAsyncClient(base_url="http://fake-llm", transport=httpx.MockTransport(handler))
+        return backend
+
+    @pytest.mark.asyncio
+    async def test_generate(self):
+        seen = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen["path"] = request.url.path
+            seen["key"] = request.url.params.get("key")
+            seen["body"] = json.loads(request.content)
+            return httpx.Response(200, json=self._payload("pong"))
+
+        backend = self._backend(handler)
+
+        assert await backend.generate("ping") == "pong"
+        assert seen["path"] == "/v1beta/models/gemini-pro:generateContent"
+        assert seen["key"] == "k"
+        assert seen["body"]["contents"][0]["parts"][0]["text"] == "ping"
+        await backend.aclose()
+
+    @pytest.mark.asyncio
+    async def test_stream(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert request.url.params.get("alt") == "sse"
+            body = "".join(f"data: {json.dumps(self._payload(t))}\r\n\r\n" for t in ["Hi", " there"])
+            return httpx.Response(200, content=body.encode(), headers={"content-type": "text/event-stream"})
+
+        backend = self._backend(handler)
+
+        assert [part async for part in backend.stream("ping")] == ["Hi", " there"]
+        await backend.aclose()
+
+
+class TestGeminiServiceUsesClient:
+    """GeminiService no longer calls the blocking SDK method"""
+
+    @pytest.mark.asyncio
+    async def test_generate_response_awaits_async_sdk_call(self):
+        with patch.object(GeminiService, "_initialize_model"):
+            service = GeminiService()
+        service.http_backend = None
+        service.llm_client = LLMClient()
+        service.model = MagicMock()
+        service.model.generate_content_async = AsyncMock(return_value=SimpleNamespace(text="Async answer"))
+
+        result = await service.generate_response("Where is my order?", workspace_id="ws_1")
+
+        assert result["content"] == "Async answer"
+        service.model.generate_content.assert_not_called()
+        service.model.generate_content_async.assert_awaited_once()
+        assert service.llm_client.get_stats()["requests"] == 1
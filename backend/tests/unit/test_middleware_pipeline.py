@@ -0,0 +1,240 @@
+"""
+Unit tests for the pure-ASGI request hook pipeline
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.pipeline import ASGIPipeline, RequestHook
+from app.middleware.security import InputValidationHook, InputValidationMiddleware
+
+
+class RecordingHook(RequestHook):
+    """Records every callback; optionally short-circuits or handles errors"""
+
+    def __init__(self, name, calls, short_circuit=False, handle_errors=False):
+        self.name = name
+        self.calls = calls
+        self.short_circuit = short_circuit
+        self.handle_errors = handle_errors
+
+    async def on_request(self, ctx):
+        self.calls.append(("request", self.name))
+        if self.short_circuit:
+            return JSONResponse({"blocked_by": self.name}, status_code=429)
+        return None
+
+    def on_response_start(self, ctx, headers):
+        self.calls.append(("start", self.name))
+        headers.append("X-Hooks", self.name)
+
+    def on_error(self, ctx, exc):
+        self.calls.append(("error", self.name))
+        if self.handle_errors:
+            return JSONResponse({"detail": "handled"}, status_code=500)
+        return None
+
+    async def on_complete(self, ctx):
+        self.calls.append(("complete", self.name))
+
+
+def _app(*hooks):
+    app = FastAPI()
+
+    @app.get("/ok")
+    async def ok():
+        return {"ok": True}
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return await request.json()
+
+    app.add_middleware(ASGIPipeline, hooks=list(hooks))
+    return app
+
+
+async def _call(app, path="/", chunks=(b"",), method="GET"):
+    """Drive an ASGI app directly and collect what it sends"""
+    scope = {
+        "type": "http", "method": method, "path": path, "raw_path": path.encode(),
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 1234),
+        "server": ("test", 80), "scheme": "http", "http_version": "1.1", "root_path": "",
+    }
+    pending = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    sent = []
+
+    async def receive():
+        return pending.pop(0) if pending else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent
+
+
+class TestHookOrdering:
+    """Hooks nest like middleware inside one ASGI callable"""
+
+    def test_requests_in_order_responses_in_reverse(self):
+        calls = []
+        client = TestClient(_app(RecordingHook("outer", calls), RecordingHook("inner", calls)))
+
+        response = client.get("/ok")
+
+        assert response.status_code == 200
+        assert calls == [
+            ("request", "outer"), ("request", "inner"),
+            ("start", "inner"), ("start", "outer"),
+            ("complete", "inner"), ("complete", "outer"),
+        ]
+        assert response.headers.get_list("X-Hooks") == ["inner", "outer"]
+
+    def test_short_circuit_is_seen_by_outer_hooks_only(self):
+        calls = []
+        client = TestClient(_app(
+            RecordingHook("outer", calls),
+            RecordingHook("limiter", calls, short_circuit=True),
+            RecordingHook("inner", calls),
+        ))
+
+        response = client.get("/ok")
+
+        assert response.status_code == 429
+        assert response.json() == {"blocked_by": "limiter"}
+        assert ("request", "inner") not in calls
+        assert response.headers.get_list("X-Hooks") == ["outer"]
+
+    def test_skip_paths(self):
+        calls = []
+        hook = RecordingHook("probe", calls)
+        hook.skip_paths = frozenset({"/ok"})
+
+        TestClient(_app(hook)).get("/ok")
+
+        assert calls == []
+
+
+class TestErrorHandling:
+    """Errors go innermost-first to hooks until one answers"""
+
+    def test_handler_response_reaches_outer_hooks(self):
+        calls = []
+        client = TestClient(_app(
+            RecordingHook("outer", calls),
+            RecordingHook("handler", calls, handle_errors=True),
+            RecordingHook("metrics", calls),
+        ), raise_server_exceptions=False)
+
+        response = client.get("/boom")
+
+        assert response.status_code == 500
+        assert response.json() == {"detail": "handled"}
+        assert [c for c in calls if c[0] == "error"] == [("error", "metrics"), ("error", "handler")]
+        assert response.headers.get_list("X-Hooks") == ["outer"]
+        assert ("complete", "metrics") in calls
+
+    def test_unhandled_errors_propagate(self):
+        calls = []
+        client = TestClient(_app(RecordingHook("only", calls)))
+
+        with pytest.raises(RuntimeError):
+            client.get("/boom")
+        assert ("complete", "only") in calls
+
+
+class TestRequestBodies:
+    """Hooks can read the body without starving the endpoint"""
+
+    def test_body_is_replayed_to_the_app(self):
+        app = _app(InputValidationHook())
+
+        sent = asyncio.run(_call(app, "/echo", chunks=(b'{"a": ', b'"b"}'), method="POST"))
+
+        assert sent[0]["status"] == 200
+        assert json.loads(sent[1]["body"]) == {"a": "b"}
+
+    def test_standalone_middleware_still_validates(self):
+        app = FastAPI()
+        app.add_middleware(InputValidationMiddleware)
+
+        @app.post("/echo")
+        async def echo(request: Request):
+            return await request.json()
+
+        client = TestClient(app)
+
+        assert client.post("/echo", json={"q": "hello"}).json() == {"q": "hello"}
+        assert client.post("/echo", json={"q": "1 union select *"}).status_code == 400
+
+
+class TestStreaming:
+    """Responses are passed through, never buffered"""
+
+    def test_chunks_are_forwarded_as_they_are_produced(self):
+        sent = []
+        seen_before_next_chunk = []
+
+        async def stream():
+            for i in range(3):
+                # Everything yielded so far has already reached the server
+                seen_before_next_chunk.append(sum(1 for m in sent if m.get("body")))
+                yield f"chunk{i}".encode()
+
+        class Observer(RequestHook):
+            def on_body(self, ctx, body, more_body):
+                pass
+
+        app = FastAPI()
+
+        @app.get("/stream")
+        async def streamed():
+            return StreamingResponse(stream(), media_type="text/plain")
+
+        app.add_middleware(ASGIPipeline, hooks=[Observer()])
+
+        async def run():
+            scope = {
+                "type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream",
+                "query_string": b"", "headers": [], "client": ("127.0.0.1", 1),
+                "server": ("test", 80), "scheme": "http", "http_version": "1.1", "root_path": "",
+            }
+
+            async def receive():
+                await asyncio.sleep(3600)
+
+            async def send(message):
+                sent.append(message)
+
+            await app(scope, receive, send)
+
+        asyncio.run(run())
+
+        assert seen_before_next_chunk == [0, 1, 2]
+
+    def test_duration_is_measured_once(self):
+        durations = []
+
+        class Timing(RequestHook):
+            def on_response_start(self, ctx, headers):
+                durations.append(ctx.duration)
+
+            async def on_complete(self, ctx):
+                durations.append(ctx.duration)
+
+        TestClient(_app(Timing(), Timing())).get("/ok")
+
+        assert len(durations) == 4
+        assert len(set(durations)) == 1
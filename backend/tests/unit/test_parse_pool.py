@@ -0,0 +1,165 @@
+"""
+Unit tests for the document parsing process pool
+"""
+
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from app.utils import parse_pool as parse_pool_module
+from app.utils.chunker import batched, iter_chunks
+from app.utils.parse_pool import ParsePool, ParseTimeoutError, _run_with_deadline
+
+
+def _threaded_pool(**kwargs):
+    # Threads stand in for parser processes so the task functions can be patched
+    pool = ParsePool(**kwargs)
+    pool._executor = ThreadPoolExecutor(max_workers=pool.max_workers)
+    return pool
+
+
+class TestDeadline:
+    """The in-process alarm cannot be swallowed by parser error handling"""
+
+    def test_deadline_escapes_broad_except(self):
+        def stubborn_parser():
+            for _ in range(100):
+                try:
+                    time.sleep(0.05)
+                except Exception:
+                    pass
+
+        started = time.monotonic()
+        with pytest.raises(ParseTimeoutError):
+            _run_with_deadline(0.1, stubborn_parser)
+
+        assert time.monotonic() - started < 1
+
+    def test_fast_parser_unaffected(self):
+        assert _run_with_deadline(5, lambda: [("text", {})]) == [("text", {})]
+
+
+class TestPdfFanout:
+    """Large PDFs are parsed as page ranges and reassembled in page order"""
+
+    def test_page_ranges_are_reassembled_in_order(self):
+        pool = _threaded_pool(max_workers=4, fanout_pages=10, pages_per_task=8)
+        ranges = []
+
+        def extract_range(file_path, start, end, timeout):
+            ranges.append((start, end))
+            time.sleep(random.uniform(0, 0.02))
+            return [(f"page {page}", {"page": page + 1}) for page in range(start, end)]
+
+        with patch.object(parse_pool_module, "_open_pdf", return_value=(30, None)), \
+                patch.object(parse_pool_module, "_extract_pdf_range", side_effect=extract_range):
+            blocks = pool.parse_sync("big.pdf", "application/pdf")
+
+        assert [text for text, _ in blocks] == [f"page {page}" for page in range(30)]
+        assert sorted(ranges) == [(0, 8), (8, 16), (16, 24), (24, 30)]
+        assert pool.stats["pdf_fanouts"] == 1
+
+    def test_small_pdf_is_parsed_in_one_task(self):
+        pool = _threaded_pool(max_workers=2, fanout_pages=10)
+
+        with patch.object(parse_pool_module, "_open_pdf", return_value=(3, [("all", {"page": 1})])), \
+                patch.object(parse_pool_module, "_extract_pdf_range") as extract_range:
+            blocks = pool.parse_sync("small.pdf", "application/pdf")
+
+        assert blocks == [("all", {"page": 1})]
+        extract_range.assert_not_called()
+
+    def test_stuck_parser_recycles_pool(self):
+        pool = _threaded_pool(max_workers=1, timeout=0.05)
+        executor = pool._executor
+
+        with patch.object(parse_pool_module, "_KILL_GRACE_SECONDS", 0), \
+                patch.object(parse_pool_module, "_extract_file", side_effect=lambda *args: time.sleep(0.5)):
+            with pytest.raises(ParseTimeoutError):
+                pool.parse_sync("stuck.docx", "application/msword")
+
+        assert pool._executor is None
+        assert (pool.stats["timeouts"], pool.stats["recycles"]) == (1, 1)
+        executor.shutdown(wait=True)
+
+
+class TestStreaming:
+    """Pages reach chunking a range at a time, never far ahead of the consumer"""
+
+    def test_page_ranges_stay_within_window(self):
+        pool = _threaded_pool(max_workers=2, queue_size=1, fanout_pages=10, pages_per_task=10)
+        started = []
+
+        def extract_range(file_path, start, end, timeout):
+            started.append(start)
+            return [(f"page {page}", {"page": page + 1}) for page in range(start, end)]
+
+        consumed, most_ahead = 0, 0
+        with patch.object(parse_pool_module, "_open_pdf", return_value=(100, None)), \
+                patch.object(parse_pool_module, "_extract_pdf_range", side_effect=extract_range):
+            for blocks in pool.iter_blocks("big.pdf", "application/pdf"):
+                consumed += 1
+                time.sleep(0.005)  # slow chunking
+                most_ahead = max(most_ahead, len(started) - consumed)
+
+        assert consumed == 10
+        assert most_ahead <= pool.max_workers + pool.queue_size
+
+    def test_async_stream_and_chunk_indexes(self):
+        pool = _threaded_pool(max_workers=2, fanout_pages=2, pages_per_task=2)
+
+        def extract_range(file_path, start, end, timeout):
+            return [(f"Page {page} text. More text.", {"page": page + 1}) for page in range(start, end)]
+
+        async def run():
+            chunks = []
+            async for text_blocks in pool.stream("doc.pdf", "application/pdf"):
+                chunks.extend(iter_chunks(text_blocks, start_index=len(chunks)))
+            return chunks
+
+        with patch.object(parse_pool_module, "_open_pdf", return_value=(5, None)), \
+                patch.object(parse_pool_module, "_extract_pdf_range", side_effect=extract_range):
+            chunks = asyncio.run(run())
+
+        assert [metadata["page"] for _, metadata in chunks] == [1, 2, 3, 4, 5]
+        assert [metadata["chunk_index"] for _, metadata in chunks] == [0, 1, 2, 3, 4]
+
+    def test_batched(self):
+        assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+        assert list(batched([], 2)) == []
+
+
+class TestParserProcesses:
+    """Files are parsed in spawned processes"""
+
+    def test_parser_errors_come_back_from_child_process(self, tmp_path):
+        path = tmp_path / "notes.txt"
+        path.write_text("Plain text is not an accepted upload type.")
+        pool = ParsePool(max_workers=1, timeout=60)
+
+        try:
+            with pytest.raises(ValueError, match="Unsupported content type"):
+                pool.parse_sync(str(path), "text/plain")
+        finally:
+            pool.shutdown()
+
+        assert pool.stats["failures"] == 1
+
+    def test_table_streams_from_child_process(self, tmp_path):
+        path = tmp_path / "table.csv"
+        path.write_text("id,name\n" + "".join(f"{i},customer {i}\n" for i in range(3000)))
+        pool = ParsePool(max_workers=1, timeout=60, queue_size=1)
+
+        try:
+            # The closed blocks of a piece come back before the final open one
+            pieces = list(pool.iter_blocks(str(path), "text/csv"))
+        finally:
+            pool.shutdown()
+
+        rows = [row for piece in pieces for _, metadata in piece for row in metadata["row_range"]]
+        assert len(pieces) > 1
+        assert (rows[0], rows[-1]) == (1, 3000)
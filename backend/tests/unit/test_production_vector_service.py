@@ -0,0 +1,279 @@
+"""
+Unit tests for ProductionVectorService ingest and retrieval internals
+"""
+
+import asyncio
+import threading
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from app.services.bm25_index import BM25IndexManager
+from app.services.production_rag_system import Chunk
+from app.services.production_vector_service import (
+    IndexingStrategy,
+    ProductionVectorService,
+    SearchConfig,
+)
+
+
+class _RecordingModel:
+    """Fake SentenceTransformer that records batch sizes and calling threads"""
+
+    def __init__(self, dimension: int = 8):
+        self.dimension = dimension
+        self.batches = []
+        self.threads = []
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        self.batches.append(len(texts))
+        self.threads.append(threading.current_thread().name)
+        return np.ones((len(texts), self.dimension), dtype=np.float32)
+
+
+def _make_chunks(count: int, workspace_id: str = "ws_1"):
+    return [
+        Chunk(
+            text=f"chunk number {i} about refunds and billing",
+            chunk_id=f"chunk_{i}",
+            document_id=1,
+            workspace_id=workspace_id,
+            chunk_index=i,
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def vector_service(db_session):
+    with patch.object(ProductionVectorService, "_initialize_embedding_model"), \
+         patch.object(ProductionVectorService, "_initialize_vector_database"), \
+         patch.object(ProductionVectorService, "_initialize_redis_cache"), \
+         patch.object(ProductionVectorService, "_initialize_reranking_model"):
+        service = ProductionVectorService(db_session)
+    service.embedding_model = _RecordingModel()
+    service.embedding_dimension = 8
+    service.collection = MagicMock()
+    service.vector_store = MagicMock()
+    service.vector_store.get_shard.return_value = service.collection
+    service.redis_client = None
+    service.reranking_model = None
+    return service
+
+
+class TestBatchedIngest:
+    """add_chunks encodes in micro-batches off the event loop"""
+
+    @pytest.mark.asyncio
+    async def test_add_chunks_encodes_in_micro_batches(self, vector_service):
+        chunks = _make_chunks(10)
+
+        ok = await vector_service.add_chunks(
+            chunks, "ws_1", indexing_strategy=IndexingStrategy.DENSE, batch_size=4
+        )
+
+        assert ok is True
+        assert vector_service.embedding_model.batches == [4, 4, 2]
+        assert vector_service.collection.add.call_count == 3
+        added_ids = [
+            cid
+            for call in vector_service.collection.add.call_args_list
+            for cid in call.kwargs["ids"]
+        ]
+        assert added_ids == [c.chunk_id for c in chunks]
+
+    @pytest.mark.asyncio
+    async def test_add_chunks_runs_encode_off_event_loop(self, vector_service):
+        await vector_service.add_chunks(
+            _make_chunks(3), "ws_1", indexing_strategy=IndexingStrategy.DENSE, batch_size=2
+        )
+
+        assert vector_service.embedding_model.threads
+        assert all(name.startswith("vector-ingest") for name in vector_service.embedding_model.threads)
+
+    @pytest.mark.asyncio
+    async def test_add_chunks_sets_workspace_metadata(self, vector_service):
+        await vector_service.add_chunks(
+            _make_chunks(2), "ws_42", indexing_strategy=IndexingStrategy.DENSE
+        )
+
+        metadatas = vector_service.collection.add.call_args.kwargs["metadatas"]
+        assert {m["workspace_id"] for m in metadatas} == {"ws_42"}
+        assert vector_service.collection.add.call_args.kwargs["embeddings"][0] == [1.0] * 8
+        vector_service.vector_store.get_shard.assert_called_with("ws_42")
+        vector_service.vector_store.flush.assert_called_once_with("ws_42")
+
+    @pytest.mark.asyncio
+    async def test_add_chunks_skips_failed_batch(self, vector_service):
+        model = vector_service.embedding_model
+        original_encode = model.encode
+
+        def flaky_encode(texts, **kwargs):
+            if "chunk number 0" in texts[0]:
+                raise RuntimeError("encode failed")
+            return original_encode(texts, **kwargs)
+
+        model.encode = flaky_encode
+
+        ok = await vector_service.add_chunks(
+            _make_chunks(4), "ws_1", indexing_strategy=IndexingStrategy.DENSE, batch_size=2
+        )
+
+        assert ok is True
+        assert vector_service.collection.add.call_count == 1
+        assert vector_service.collection.add.call_args.kwargs["ids"] == ["chunk_2", "chunk_3"]
+
+    @pytest.mark.asyncio
+    async def test_add_chunks_without_collection_returns_false(self, vector_service):
+        vector_service.vector_store = None
+
+        assert await vector_service.add_chunks(_make_chunks(1), "ws_1") is False
+
+
+class TestHybridBM25:
+    """Hybrid search uses the persistent BM25 index, not vector candidates"""
+
+    @pytest.fixture
+    def bm25_service(self, vector_service, tmp_path):
+        vector_service.bm25_index = BM25IndexManager(index_dir=str(tmp_path / "bm25"))
+        return vector_service
+
+    @pytest.mark.asyncio
+    async def test_add_chunks_feeds_bm25_index(self, bm25_service):
+        await bm25_service.add_chunks(_make_chunks(3), "ws_1")
+
+        assert len(bm25_service.bm25_index.get_index("ws_1")) == 3
+
+    @pytest.mark.asyncio
+    async def test_bm25_search_surfaces_keyword_only_match(self, bm25_service):
+        bm25_service.bm25_index.add_documents("ws_1", [
+            ("kw_chunk", "error code E1234 means the API key expired", 7),
+            ("other", "general onboarding guide", 8),
+        ])
+        bm25_service.collection.get.return_value = {
+            "ids": ["kw_chunk"],
+            "documents": ["error code E1234 means the API key expired"],
+            "metadatas": [{"document_id": 7, "workspace_id": "ws_1"}],
+        }
+
+        results = await bm25_service._bm25_search("E1234", "ws_1", SearchConfig(top_k=5))
+
+        assert [r.chunk_id for r in results] == ["kw_chunk"]
+        assert results[0].search_method == "bm25"
+        assert results[0].document_id == 7
+
+    @pytest.mark.asyncio
+    async def test_delete_workspace_drops_bm25_index(self, bm25_service):
+        bm25_service.bm25_index.add_documents("ws_1", [("c1", "invoice", 1)])
+
+        assert await bm25_service.delete_workspace("ws_1") is True
+        assert bm25_service.bm25_index.search("ws_1", "invoice") == []
+
+
+class TestWorkspaceShards:
+    """Searches and deletes go to the workspace's own shard"""
+
+    @pytest.mark.asyncio
+    async def test_similarity_search_queries_workspace_shard_without_workspace_filter(self, vector_service):
+        vector_service.collection.query.return_value = {
+            "ids": [["c1"]],
+            "documents": [["refund policy"]],
+            "metadatas": [[{"document_id": 3}]],
+            "distances": [[0.25]],
+        }
+
+        results = await vector_service._similarity_search("refunds", "ws_9", SearchConfig(top_k=3))
+
+        vector_service.vector_store.get_shard.assert_called_with("ws_9")
+        assert vector_service.collection.query.call_args.kwargs["where"] is None
+        assert results[0].score == pytest.approx(0.75)
+
+    @pytest.mark.asyncio
+    async def test_delete_workspace_drops_shard(self, vector_service):
+        assert await vector_service.delete_workspace("ws_9") is True
+
+        vector_service.vector_store.delete_workspace.assert_called_once_with("ws_9")
+        vector_service.collection.delete.assert_not_called()
+
+
+class TestQueryEmbedding:
+    """Concurrent query embeddings are micro-batched"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_queries_share_encode_call(self, vector_service):
+        queries = [f"how do I reset password {i}" for i in range(4)]
+
+        embeddings = await asyncio.gather(*[vector_service._generate_embedding(q) for q in queries])
+
+        assert all(e == [1.0] * 8 for e in embeddings)
+        assert vector_service.embedding_model.batches == [4]
+        assert vector_service.embedding_model.threads[0].startswith("query-embedding-batcher")
+
+
+class TestReranking:
+    """Reranking runs on the rerank pool and reuses cached scores"""
+
+    @pytest.mark.asyncio
+    async def test_rerank_results_reuses_cached_scores(self, vector_service):
+        from app.services.production_vector_service import SearchResult
+        from app.services.reranker import RerankScoreCache
+
+        model = MagicMock()
+        model.predict.side_effect = lambda pairs, **kwargs: [float(len(text)) for _, text in pairs]
+        vector_service.reranking_model = model
+        vector_service._get_reranker().cache = RerankScoreCache(100)
+
+        def make_results():
+            return [
+                SearchResult(chunk_id=f"c{i}", document_id=1, text="t" * (i + 1), score=0.5)
+                for i in range(3)
+            ]
+
+        first = await vector_service._rerank_results("refunds", make_results(), top_k=2)
+        second = await vector_service._rerank_results("refunds", make_results(), top_k=2)
+
+        assert [r.chunk_id for r in first] == ["c2", "c1"]
+        assert [r.chunk_id for r in second] == ["c2", "c1"]
+        assert model.predict.call_count == 1
+
+
+class TestBatchedSearchModes:
+    """Query variations share one encode call and one shard lookup"""
+
+    @staticmethod
+    def _query_response(query_embeddings, n_results=10, where=None):
+        count = len(query_embeddings)
+        return {
+            "ids": [[f"c{q}", "shared"] for q in range(count)],
+            "documents": [[f"text {q}", "shared text"] for q in range(count)],
+            "metadatas": [[{"document_id": q}, {"document_id": 99}] for q in range(count)],
+            "distances": [[0.1, 0.2] for _ in range(count)],
+        }
+
+    @pytest.mark.asyncio
+    async def test_multi_query_search_batches_lookups(self, vector_service):
+        vector_service.collection.query.side_effect = self._query_response
+
+        results = await vector_service._multi_query_search("refunds", "ws_1", SearchConfig(top_k=10))
+
+        assert vector_service.embedding_model.batches == [4]
+        assert vector_service.collection.query.call_count == 1
+        assert len(vector_service.collection.query.call_args.kwargs["query_embeddings"]) == 4
+        assert [r.chunk_id for r in results] == ["c0", "shared", "c1", "c2", "c3"]
+
+    @pytest.mark.asyncio
+    async def test_fusion_search_runs_one_vector_lookup(self, vector_service, tmp_path):
+        vector_service.bm25_index = BM25IndexManager(index_dir=str(tmp_path / "bm25"))
+        vector_service.collection.query.side_effect = self._query_response
+        vector_service.collection.get.return_value = {"ids": [], "documents": [], "metadatas": []}
+
+        results = await vector_service._fusion_search("refund policy details", "ws_1", SearchConfig(top_k=3))
+
+        variations = await vector_service._generate_query_variations("refund policy details")
+        assert vector_service.collection.query.call_count == 1
+        assert vector_service.embedding_model.batches == [len(variations)]
+        assert len(results) == 3
+        assert len({r.chunk_id for r in results}) == 3
@@ -0,0 +1,60 @@
+"""
+Unit tests for weighted reciprocal rank fusion
+"""
+
+from dataclasses import dataclass
+
+import pytest
+
+from app.services.rank_fusion import DEFAULT_RRF_K, reciprocal_rank_fusion
+
+
+@dataclass
+class _Result:
+    chunk_id: str
+
+
+def _ranked(*ids):
+    return [_Result(chunk_id) for chunk_id in ids]
+
+
+class TestReciprocalRankFusion:
+    """Scores, weights and ordering of fused lists"""
+
+    def test_scores_match_rrf_formula(self):
+        fused = reciprocal_rank_fusion([_ranked("a", "b"), _ranked("b", "c")])
+
+        scores = {entry.item.chunk_id: entry.score for entry in fused}
+        assert scores["a"] == pytest.approx(1 / (DEFAULT_RRF_K + 1))
+        assert scores["b"] == pytest.approx(1 / (DEFAULT_RRF_K + 2) + 1 / (DEFAULT_RRF_K + 1))
+        assert scores["c"] == pytest.approx(1 / (DEFAULT_RRF_K + 2))
+        assert [entry.item.chunk_id for entry in fused] == ["b", "a", "c"]
+
+    def test_weights_favour_heavier_source(self):
+        fused = reciprocal_rank_fusion([_ranked("a"), _ranked("b")], weights=[0.3, 0.7])
+
+        assert [entry.item.chunk_id for entry in fused] == ["b", "a"]
+
+    def test_records_sources_and_keeps_first_item(self):
+        first = _ranked("a")
+        fused = reciprocal_rank_fusion([first, _ranked("x", "a"), _ranked("a")])
+
+        entry = next(e for e in fused if e.item.chunk_id == "a")
+        assert entry.item is first[0]
+        assert entry.sources == [0, 1, 2]
+
+    def test_duplicates_within_a_list_count_once(self):
+        fused = reciprocal_rank_fusion([_ranked("a", "a", "b")])
+
+        scores = {entry.item.chunk_id: entry.score for entry in fused}
+        assert scores["a"] == pytest.approx(1 / (DEFAULT_RRF_K + 1))
+        assert scores["b"] == pytest.approx(1 / (DEFAULT_RRF_K + 3))
+
+    def test_custom_key(self):
+        fused = reciprocal_rank_fusion([["x", "y"], ["y"]], key=lambda item: item)
+
+        assert [entry.item for entry in fused] == ["y", "x"]
+
+    def test_weight_count_must_match(self):
+        with pytest.raises(ValueError):
+            reciprocal_rank_fusion([_ranked("a"), _ranked("b")], weights=[1.0])
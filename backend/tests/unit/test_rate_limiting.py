@@ -0,0 +1,106 @@
+"""
+Unit tests for the multi-scope GCRA rate limiter
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.rate_limiting import RateLimitingService, RateLimitScope
+
+
+@pytest.fixture
+def limiter():
+    service = RateLimitingService()
+    service.redis_client = None
+    return service
+
+
+class TestInMemoryGCRA:
+    """Fallback limiter semantics"""
+
+    @pytest.mark.asyncio
+    async def test_allows_burst_up_to_limit(self, limiter):
+        results = [await limiter.check_rate_limit("ws:1", limit=5, window_seconds=60) for _ in range(6)]
+
+        assert [allowed for allowed, _ in results] == [True] * 5 + [False]
+        assert [info["remaining"] for _, info in results[:5]] == [4, 3, 2, 1, 0]
+        assert results[-1][1]["retry_after"] >= 1
+
+    @pytest.mark.asyncio
+    async def test_rejected_request_consumes_no_scope(self, limiter):
+        tight = RateLimitScope("ip:1.2.3.4", limit=1)
+        loose = RateLimitScope("workspace:1", limit=10)
+
+        assert (await limiter.check_rate_limits([tight, loose]))[0] is True
+        allowed, infos = await limiter.check_rate_limits([tight, loose])
+
+        assert allowed is False
+        assert [info["allowed"] for info in infos] == [False, True]
+        _, (loose_info,) = await limiter.check_rate_limits([loose])
+        assert loose_info["remaining"] == 8
+
+    @pytest.mark.asyncio
+    async def test_concurrent_burst_is_exact(self, limiter):
+        scope = RateLimitScope("embed:1", limit=20)
+
+        results = await asyncio.gather(*[limiter.check_rate_limits([scope]) for _ in range(50)])
+
+        assert sum(1 for allowed, _ in results if allowed) == 20
+
+    @pytest.mark.asyncio
+    async def test_reset_clears_scope(self, limiter):
+        await limiter.check_rate_limit("user:7", limit=1)
+        await limiter.reset_rate_limit("user:7")
+
+        allowed, _ = await limiter.check_rate_limit("user:7", limit=1)
+        assert allowed is True
+
+    @pytest.mark.asyncio
+    async def test_widget_limits_return_named_scopes(self, limiter):
+        allowed, infos = await limiter.check_widget_rate_limits("1.2.3.4", 5, 9, embed_limit=2)
+
+        assert allowed is True
+        assert infos["embed"]["remaining"] == 1
+        assert infos["workspace"]["limit"] == 120
+
+    @pytest.mark.asyncio
+    async def test_widget_limits_skip_ip_checked_before_auth(self, limiter):
+        with patch("app.services.rate_limiting._is_testing", return_value=False):
+            _, with_ip = await limiter.check_widget_rate_limits("1.2.3.4", 5, 9)
+            _, without_ip = await limiter.check_widget_rate_limits(None, 5, 9)
+
+        assert set(with_ip) == {"ip", "embed", "workspace"}
+        assert set(without_ip) == {"embed", "workspace"}
+
+
+class TestRedisGCRA:
+    """All scopes go to Redis in a single script call"""
+
+    @pytest.mark.asyncio
+    async def test_single_script_call_for_all_scopes(self, limiter):
+        limiter.redis_client = object()
+        limiter._gcra_script = AsyncMock(return_value=[1, 1, 9, 6000, 0, 1, 59, 1000, 0])
+
+        allowed, infos = await limiter.check_rate_limits([
+            RateLimitScope("ip:1.2.3.4", limit=10),
+            RateLimitScope("embed:1", limit=60),
+        ])
+
+        assert allowed is True
+        assert [info["remaining"] for info in infos] == [9, 59]
+        limiter._gcra_script.assert_awaited_once()
+        call = limiter._gcra_script.await_args
+        assert call.kwargs["keys"] == ["rate_limit:ip:1.2.3.4:60", "rate_limit:embed:1:60"]
+        assert call.kwargs["args"] == [10, 60000, 60, 60000]
+
+    @pytest.mark.asyncio
+    async def test_script_error_falls_back_to_memory(self, limiter):
+        limiter.redis_client = object()
+        limiter._gcra_script = AsyncMock(side_effect=ConnectionError("redis down"))
+
+        allowed, _ = await limiter.check_rate_limit("ws:1", limit=3)
+
+        assert allowed is True
+        assert limiter.redis_client is None
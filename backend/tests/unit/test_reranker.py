@@ -0,0 +1,137 @@
+"""
+Unit tests for cross-encoder reranking and its score cache
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from app.services.reranker import CrossEncoderReranker, RerankScoreCache
+
+
+class _CountingCrossEncoder:
+    """Fake CrossEncoder scoring a pair by the length of its text"""
+
+    def __init__(self):
+        self.batches = []
+        self.threads = []
+
+    def predict(self, pairs, batch_size=32, **kwargs):
+        self.batches.append(len(pairs))
+        self.threads.append(threading.current_thread().name)
+        return [float(len(text)) for _, text in pairs]
+
+
+class _FakeRedisPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def hset(self, key, mapping):
+        self.ops.append(("hset", key, mapping))
+        return self
+
+    def expire(self, key, ttl):
+        self.ops.append(("expire", key, ttl))
+        return self
+
+    async def execute(self):
+        for op in self.ops:
+            if op[0] == "hset":
+                self.redis.hashes.setdefault(op[1], {}).update(op[2])
+            else:
+                self.redis.ttls[op[1]] = op[2]
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.ttls = {}
+
+    async def hmget(self, key, fields):
+        stored = self.hashes.get(key, {})
+        return [stored.get(field) for field in fields]
+
+    def pipeline(self):
+        return _FakeRedisPipeline(self)
+
+
+def _items(count):
+    return [(f"chunk_{i}", "x" * (i + 1)) for i in range(count)]
+
+
+class TestCrossEncoderReranker:
+    """Pairs are batched on the rerank pool and scores are cached"""
+
+    @pytest.mark.asyncio
+    async def test_scores_in_batches_off_event_loop(self):
+        model = _CountingCrossEncoder()
+        reranker = CrossEncoderReranker(model, "ce", batch_size=4, cache=RerankScoreCache(100))
+
+        scores = await reranker.score("refunds", _items(10))
+
+        assert scores == [float(i + 1) for i in range(10)]
+        assert sorted(model.batches) == [2, 4, 4]
+        assert all(name.startswith("rerank") for name in model.threads)
+
+    @pytest.mark.asyncio
+    async def test_repeated_query_skips_inference(self):
+        model = _CountingCrossEncoder()
+        reranker = CrossEncoderReranker(model, "ce", cache=RerankScoreCache(100))
+
+        await reranker.score("refunds", _items(3))
+        scores = await reranker.score("refunds", _items(5))
+
+        assert scores == [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert model.batches == [3, 2]
+
+    @pytest.mark.asyncio
+    async def test_cache_is_keyed_by_query_and_model(self):
+        model = _CountingCrossEncoder()
+        cache = RerankScoreCache(100)
+
+        await CrossEncoderReranker(model, "ce", cache=cache).score("refunds", _items(2))
+        await CrossEncoderReranker(model, "ce", cache=cache).score("billing", _items(2))
+        await CrossEncoderReranker(model, "other", cache=cache).score("refunds", _items(2))
+
+        assert model.batches == [2, 2, 2]
+
+    @pytest.mark.asyncio
+    async def test_redis_scores_shared_across_processes(self):
+        redis = _FakeRedis()
+        first_model = _CountingCrossEncoder()
+        await CrossEncoderReranker(
+            first_model, "ce", redis_client=redis, cache=RerankScoreCache(100), cache_ttl=60
+        ).score("refunds", _items(3))
+
+        second_model = _CountingCrossEncoder()
+        scores = await CrossEncoderReranker(
+            second_model, "ce", redis_client=redis, cache=RerankScoreCache(100)
+        ).score("refunds", _items(3))
+
+        assert scores == [1.0, 2.0, 3.0]
+        assert second_model.batches == []
+        assert list(redis.ttls.values()) == [60]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_do_not_block_event_loop(self):
+        model = _CountingCrossEncoder()
+        reranker = CrossEncoderReranker(model, "ce", cache=RerankScoreCache(100))
+
+        results = await asyncio.gather(*[reranker.score(f"q{i}", _items(2)) for i in range(4)])
+
+        assert results == [[1.0, 2.0]] * 4
+
+
+class TestRerankScoreCache:
+    """Bounded LRU behaviour"""
+
+    def test_evicts_least_recently_used(self):
+        cache = RerankScoreCache(max_size=2)
+        cache.put_many("ce", "q", {"a": 1.0, "b": 2.0})
+        cache.get_many("ce", "q", ["a"])
+        cache.put_many("ce", "q", {"c": 3.0})
+
+        assert cache.get_many("ce", "q", ["a", "b", "c"]) == {"a": 1.0, "c": 3.0}
+        assert len(cache) == 2
@@ -0,0 +1,299 @@
+"""
+Unit tests for the route-declared response cache and its ETag/304 handling
+"""
+
+import asyncio
+import time
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.performance_middleware import CacheOptimizationHook
+from app.middleware.pipeline import ASGIPipeline
+from app.services.auth_cache import auth_cache
+from app.services.response_cache import (
+    CachedResponse,
+    CachePolicy,
+    ResponseCache,
+    cache_response,
+    etag_matches,
+    make_etag,
+)
+
+
+class FakeAsyncRedis:
+    """Shared bytes store standing in for another process's view of Redis"""
+
+    def __init__(self):
+        self.data = {}
+        self.calls = []
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def set(self, key, value, ex=None, nx=False):
+        self.calls.append(("set", key))
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token):
+        # The release script: delete only if the lock still holds this token
+        self.calls.append(("release", key))
+        if self.data.get(key) != token:
+            return 0
+        del self.data[key]
+        return 1
+
+
+def _app(cache, calls):
+    app = FastAPI()
+
+    @app.get("/stats")
+    @cache_response(ttl=60, stale_ttl=60, private=False)
+    async def stats(days: int = 30):
+        calls.append(days)
+        return {"days": days, "calls": len(calls)}
+
+    @app.get("/mine")
+    @cache_response(ttl=60)
+    async def mine():
+        calls.append("mine")
+        return {"calls": len(calls)}
+
+    @app.get("/plain")
+    async def plain():
+        calls.append("plain")
+        return {"calls": len(calls)}
+
+    @app.get("/stream")
+    @cache_response(ttl=60, private=False)
+    async def stream():
+        calls.append("stream")
+
+        async def events():
+            yield b"data: 1\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    app.add_middleware(ASGIPipeline, hooks=[CacheOptimizationHook(cache=cache)])
+    return app
+
+
+class TestEtags:
+    """Strong tags, weak comparison"""
+
+    def test_if_none_match_parsing(self):
+        assert etag_matches('"a", "b"', '"b"')
+        assert etag_matches('W/"b"', '"b"')
+        assert etag_matches("*", '"b"')
+        assert not etag_matches('"a"', '"b"')
+        assert not etag_matches(None, '"b"')
+
+    def test_serialized_entry_round_trips_compressed(self):
+        body = b'{"value": "' + b"x" * 5000 + b'"}'
+        entry = CachedResponse.build({"content-type": "application/json"}, body, CachePolicy(ttl=60))
+
+        data = entry.to_bytes(compress_min_bytes=1024)
+        restored = CachedResponse.from_bytes(data)
+
+        assert len(data) < len(body)
+        assert restored.body == body
+        assert (restored.etag, restored.headers) == (entry.etag, entry.headers)
+
+
+class TestResponseCaching:
+    """Declared routes are answered from cache; others always reach the app"""
+
+    def test_hit_after_miss(self):
+        calls = []
+        client = TestClient(_app(ResponseCache(max_entries=10), calls))
+
+        first = client.get("/stats?days=7")
+        second = client.get("/stats?days=7")
+
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.json() == first.json() == {"days": 7, "calls": 1}
+        assert second.headers["ETag"] == first.headers["ETag"]
+        assert client.get("/stats?days=14").headers["X-Cache"] == "MISS"
+        assert calls == [7, 14]
+
+    def test_undeclared_routes_are_not_cached(self):
+        calls = []
+        client = TestClient(_app(ResponseCache(max_entries=10), calls))
+
+        client.get("/plain")
+        response = client.get("/plain")
+
+        assert "X-Cache" not in response.headers
+        assert calls == ["plain", "plain"]
+
+    def test_streams_pass_through(self):
+        calls = []
+        client = TestClient(_app(ResponseCache(max_entries=10), calls))
+
+        client.get("/stream")
+        response = client.get("/stream")
+
+        assert response.text == "data: 1\n\n"
+        assert calls == ["stream", "stream"]
+
+    def test_private_routes_are_keyed_by_verified_principal(self):
+        calls = []
+        client = TestClient(_app(ResponseCache(max_entries=10), calls))
+        exp = time.time() + 60
+        auth_cache.put_claims("token-a", "access", {"sub": "1", "jti": "a", "exp": exp})
+        auth_cache.put_claims("token-b", "access", {"sub": "2", "jti": "b", "exp": exp})
+
+        try:
+            with patch.object(auth_cache, "is_revoked", return_value=False):
+                client.get("/mine", headers={"Authorization": "Bearer token-a"})
+                hit = client.get("/mine", headers={"Authorization": "Bearer token-a"})
+                other = client.get("/mine", headers={"Authorization": "Bearer token-b"})
+                anonymous = client.get("/mine")
+        finally:
+            auth_cache.clear()
+
+        assert hit.headers["X-Cache"] == "HIT"
+        assert other.headers["X-Cache"] == "MISS"
+        assert anonymous.headers["X-Cache"] == "MISS"
+        assert calls == ["mine", "mine", "mine"]
+
+
+class TestConditionalRequests:
+    """Matching If-None-Match gets a bodyless 304"""
+
+    def test_304_from_cache(self):
+        calls = []
+        client = TestClient(_app(ResponseCache(max_entries=10), calls))
+        etag = client.get("/stats").headers["ETag"]
+
+        response = client.get("/stats", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+        assert len(calls) == 1
+
+    def test_304_for_freshly_generated_response(self):
+        calls = []
+        cache = ResponseCache(max_entries=10)
+        client = TestClient(_app(cache, calls))
+        # Tag of the body the app is about to generate
+        etag = make_etag(b'{"days":30,"calls":1}')
+
+        response = client.get("/stats", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.headers["X-Cache"] == "MISS"
+        assert client.get("/stats", headers={"If-None-Match": etag}).headers["X-Cache"] == "HIT"
+        assert len(calls) == 1
+
+
+class TestStaleWhileRevalidate:
+    """One request refreshes a stale entry while the rest get the stale copy"""
+
+    def test_single_refresh(self):
+        calls = []
+        cache = ResponseCache(max_entries=10)
+        client = TestClient(_app(cache, calls))
+        client.get("/stats")
+
+        with patch("app.services.response_cache.time.time", return_value=time.time() + 90):
+            # Another request in this process is already refreshing the entry
+            assert cache.claim(next(iter(cache._entries))) is None
+            stale = client.get("/stats")
+            cache.clear()
+
+        assert stale.headers["X-Cache"] == "STALE"
+        assert stale.json() == {"days": 30, "calls": 1}
+        assert len(calls) == 1
+
+    def test_refresher_replaces_stale_entry(self):
+        calls = []
+        cache = ResponseCache(max_entries=10)
+        client = TestClient(_app(cache, calls))
+        client.get("/stats")
+
+        with patch("app.services.response_cache.time.time", return_value=time.time() + 90):
+            refreshed = client.get("/stats")
+        after = client.get("/stats")
+
+        assert refreshed.headers["X-Cache"] == "MISS"
+        assert after.headers["X-Cache"] == "HIT"
+        assert after.json() == {"days": 30, "calls": 2}
+
+    def test_refresh_lock_released_after_store(self):
+        calls = []
+        redis = FakeAsyncRedis()
+        client = TestClient(_app(ResponseCache(max_entries=0, redis_client=redis), calls))
+        client.get("/stats")
+        start = time.time()
+
+        refreshes = []
+        for offset in (90, 180):
+            with patch("app.services.response_cache.time.time", return_value=start + offset):
+                refreshes.append(client.get("/stats").headers["X-Cache"])
+
+        # Each stale refresh took the lock and gave it back once its entry was stored
+        assert refreshes == ["MISS", "MISS"]
+        assert [name for name, _ in redis.calls] == ["set", "release", "set", "release"]
+        assert not any(key.startswith("respcache-lock:") for key in redis.data)
+
+    def test_refresh_lock_held_elsewhere_serves_stale(self):
+        calls = []
+        redis = FakeAsyncRedis()
+        client = TestClient(_app(ResponseCache(max_entries=0, redis_client=redis), calls))
+        client.get("/stats")
+        (key,) = redis.data
+        redis.data[f"respcache-lock:{key}"] = "other-process"
+
+        with patch("app.services.response_cache.time.time", return_value=time.time() + 90):
+            stale = client.get("/stats")
+
+        assert stale.headers["X-Cache"] == "STALE"
+        assert redis.data[f"respcache-lock:{key}"] == "other-process"
+        assert len(calls) == 1
+
+    def test_concurrent_cold_misses_coalesce(self):
+        calls = []
+        app = FastAPI()
+
+        @app.get("/slow")
+        @cache_response(ttl=60, private=False)
+        async def slow():
+            calls.append("slow")
+            await asyncio.sleep(0.05)
+            return {"ok": True}
+
+        app.add_middleware(ASGIPipeline, hooks=[CacheOptimizationHook(cache=ResponseCache(max_entries=10))])
+
+        async def get():
+            scope = {
+                "type": "http", "method": "GET", "path": "/slow", "raw_path": b"/slow",
+                "query_string": b"", "headers": [], "client": ("127.0.0.1", 1),
+                "server": ("test", 80), "scheme": "http", "http_version": "1.1", "root_path": "",
+                "app": app,
+            }
+            sent = []
+
+            async def receive():
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                sent.append(message)
+
+            await app(scope, receive, send)
+            return sent[0]["status"]
+
+        async def run():
+            return await asyncio.gather(*(get() for _ in range(10)))
+
+        assert asyncio.run(run()) == [200] * 10
+        assert calls == ["slow"]
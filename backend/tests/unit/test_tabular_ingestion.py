@@ -0,0 +1,103 @@
+"""
+Unit tests for packing CSV/XLSX rows into header-prefixed blocks
+"""
+
+from unittest.mock import patch
+
+import pandas as pd
+
+from app.utils.chunker import _estimate_tokens, iter_chunks
+from app.utils.file_parser import extract_text_from_file, iter_table_pieces
+
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _write_csv(tmp_path, rows):
+    path = tmp_path / "table.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return str(path)
+
+
+def _covered_rows(blocks):
+    return [row for _, metadata in blocks for row in range(metadata["row_range"][0], metadata["row_range"][1] + 1)]
+
+
+class TestCsv:
+    """Rows are packed up to the token budget, each block under the header"""
+
+    def test_rows_packed_under_repeated_header(self, tmp_path):
+        rows = [{"id": i, "name": f"customer {i}", "note": "renewal due"} for i in range(2000)]
+        path = _write_csv(tmp_path, rows)
+
+        with patch("app.utils.file_parser.settings.MAX_CHUNK_TOKENS", 256):
+            blocks = extract_text_from_file(path, "text/csv")
+
+        assert 10 < len(blocks) < 100
+        assert all(text.startswith("id | name | note\n") for text, _ in blocks)
+        assert all(_estimate_tokens(text) <= 256 for text, _ in blocks)
+        assert _covered_rows(blocks) == list(range(1, 2001))
+        assert blocks[0][0].split("\n")[1] == "0 | customer 0 | renewal due"
+
+    def test_streamed_pieces_keep_row_numbers(self, tmp_path):
+        path = _write_csv(tmp_path, [{"a": i, "b": "x"} for i in range(250)])
+
+        with patch("app.utils.file_parser.settings.TABULAR_CSV_CHUNK_ROWS", 100):
+            blocks = extract_text_from_file(path, "text/csv")
+
+        assert _covered_rows(blocks) == list(range(1, 251))
+
+    def test_open_block_carries_across_pieces(self, tmp_path):
+        path = _write_csv(tmp_path, [{"id": i, "name": f"customer {i}"} for i in range(1000)])
+
+        with patch("app.utils.file_parser.settings.MAX_CHUNK_TOKENS", 256):
+            whole = extract_text_from_file(path, "text/csv")
+            with patch("app.utils.file_parser.settings.TABULAR_CSV_CHUNK_ROWS", 70):
+                pieces = list(iter_table_pieces(path, "text/csv"))
+
+        assert [block for piece in pieces for block in piece] == whole
+        assert len(pieces) > 5
+
+    def test_missing_cells_and_empty_rows(self, tmp_path):
+        path = tmp_path / "gaps.csv"
+        path.write_text("a,b\n1,\n,\n3,4\n")
+
+        (text, metadata), = extract_text_from_file(str(path), "text/csv")
+
+        assert text == "a | b\n1.0 |\n3.0 | 4.0"
+        assert metadata["row_range"] == [1, 3]
+
+    def test_header_only_table(self, tmp_path):
+        path = tmp_path / "empty.csv"
+        path.write_text("a,b\n")
+
+        assert extract_text_from_file(str(path), "text/csv") == [("a | b", {"row": 0, "char_range": [0, 5], "source": "csv_rows"})]
+
+
+class TestXlsx:
+    """Every sheet is parsed from the one opened workbook"""
+
+    def test_sheets_read_once_with_sheet_in_header(self, tmp_path):
+        path = tmp_path / "book.xlsx"
+        with pd.ExcelWriter(path) as writer:
+            pd.DataFrame({"sku": ["A1", "B2"], "qty": [3, 4]}).to_excel(writer, sheet_name="Stock", index=False)
+            pd.DataFrame({"region": ["EU"]}).to_excel(writer, sheet_name="Regions", index=False)
+
+        with patch("app.utils.file_parser.pd.read_excel", side_effect=AssertionError("workbook re-opened")):
+            blocks = extract_text_from_file(str(path), XLSX)
+
+        assert [text for text, _ in blocks] == ["Sheet: Stock\nsku | qty\nA1 | 3\nB2 | 4", "Sheet: Regions\nregion\nEU"]
+        assert [(m["sheet"], m["row_range"]) for _, m in blocks] == [("Stock", [1, 2]), ("Regions", [1, 1])]
+
+
+class TestChunking:
+    """Packed blocks become chunks as they are"""
+
+    def test_packed_blocks_pass_through(self):
+        block = ("price | qty\n3.50 | 2\n4.25 | 1", {"row": 1, "row_range": [1, 2], "source": "csv_rows"})
+        prose = ("First sentence. Second sentence.", {"page": 1, "source": "pdf"})
+
+        chunks = list(iter_chunks([block, prose]))
+
+        assert chunks[0][0] == block[0]
+        assert chunks[0][1]["row_range"] == [1, 2]
+        assert [metadata["chunk_index"] for _, metadata in chunks] == [0, 1]
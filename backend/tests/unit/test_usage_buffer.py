@@ -0,0 +1,308 @@
+"""
+Unit tests for write-behind usage counters
+"""
+
+import asyncio
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from uuid import UUID
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.middleware.quota_middleware import QuotaExceededException, check_quota, increment_usage
+from app.models.subscriptions import Subscription
+from app.models.usage import UsageFlushBatch
+from app.services.usage_buffer import EMBED_CODE, ROLLUP, SUBSCRIPTION, UsageBuffer
+
+
+class _FakeRedisPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def hincrby(self, key, field, amount):
+        self.ops.append(lambda: self.redis.hincrby(key, field, amount))
+
+    def hincrbyfloat(self, key, field, amount):
+        self.ops.append(lambda: self.redis.hincrbyfloat(key, field, amount))
+
+    def hset(self, key, field, value):
+        self.ops.append(lambda: self.redis.hashes.setdefault(key, {}).__setitem__(field, value))
+
+    def hget(self, key, field):
+        self.ops.append(lambda: self.redis.hget(key, field))
+
+    def execute(self):
+        return [op() for op in self.ops]
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.strings = {}
+
+    def pipeline(self, transaction=True):
+        return _FakeRedisPipeline(self)
+
+    def hincrby(self, key, field, amount):
+        stored = self.hashes.setdefault(key, {})
+        stored[field] = str(int(stored.get(field, 0)) + amount)
+        return int(stored[field])
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def hincrbyfloat(self, key, field, amount):
+        stored = self.hashes.setdefault(key, {})
+        stored[field] = repr(float(stored.get(field, 0)) + amount)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def exists(self, key):
+        return int(key in self.hashes)
+
+    def rename(self, source, target):
+        if source not in self.hashes:
+            raise Exception("ERR no such key")
+        self.hashes[target] = self.hashes.pop(source)
+
+    def get(self, key):
+        return self.strings.get(key)
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.strings.pop(key, None)
+
+    def eval(self, script, numkeys, key, token):
+        # The lock release script: compare-and-delete
+        if self.strings.get(key) != token:
+            return 0
+        del self.strings[key]
+        return 1
+
+
+def _db():
+    """Session mock in which no batch has been applied yet"""
+    db = MagicMock()
+    db.get.return_value = None
+    return db
+
+
+def _executed_rows(db):
+    """Parameter lists passed to each batched UPDATE"""
+    return [call.args[1] for call in db.execute.call_args_list]
+
+
+@pytest.fixture
+def memory_buffer(monkeypatch):
+    buffer = UsageBuffer(flush_interval=1)
+    monkeypatch.setattr(buffer, "_redis", lambda: None)
+    return buffer
+
+
+class TestMemoryBuffer:
+    """Fallback buffering without Redis"""
+
+    def test_increments_coalesce_into_one_update(self, memory_buffer):
+        for _ in range(5):
+            memory_buffer.record_embed_usage("11111111-1111-1111-1111-111111111111")
+        memory_buffer.record_query_usage("22222222-2222-2222-2222-222222222222", amount=3)
+        db = MagicMock()
+
+        assert memory_buffer.flush(db) == 2
+
+        embed_rows, subscription_rows = _executed_rows(db)
+        assert [row["b_amount"] for row in embed_rows] == [5]
+        assert [row["b_amount"] for row in subscription_rows] == [3]
+        db.commit.assert_called_once()
+        assert memory_buffer.pending() == {EMBED_CODE: {}, SUBSCRIPTION: {}, ROLLUP: {}}
+
+    def test_failed_flush_keeps_counters(self, memory_buffer):
+        memory_buffer.record_embed_usage("a")
+        db = MagicMock()
+        db.commit.side_effect = RuntimeError("db down")
+
+        assert memory_buffer.flush(db) == 0
+
+        db.rollback.assert_called_once()
+        memory_buffer.record_embed_usage("a")
+        assert memory_buffer.pending()[EMBED_CODE] == {"a": 2}
+
+    def test_empty_flush_skips_database(self, memory_buffer):
+        db = MagicMock()
+
+        assert memory_buffer.flush(db) == 0
+        db.execute.assert_not_called()
+
+
+class TestRedisBuffer:
+    """Redis batches are claimed by rename and deleted only after commit"""
+
+    def test_flush_applies_and_clears_claimed_batch(self):
+        redis = _FakeRedis()
+        buffer = UsageBuffer(redis_client=redis, flush_interval=1)
+        buffer.record_embed_usage("a")
+        buffer.record_embed_usage("a")
+        db = _db()
+
+        assert buffer.flush(db) == 1
+
+        (embed_rows,) = _executed_rows(db)
+        assert embed_rows[0]["b_amount"] == 2
+        assert redis.hashes == {}
+        assert "usage:flush_lock" not in redis.strings
+
+    def test_failed_commit_leaves_batch_for_retry(self):
+        redis = _FakeRedis()
+        buffer = UsageBuffer(redis_client=redis, flush_interval=1)
+        buffer.record_query_usage("s1")
+        failing_db = _db()
+        failing_db.commit.side_effect = RuntimeError("db down")
+
+        assert buffer.flush(failing_db) == 0
+        assert redis.hashes["usage:flushing:subscription"] == {"s1": "1"}
+
+        # New increments wait in the pending hash while the old batch is retried
+        buffer.record_query_usage("s1")
+        db = _db()
+        assert buffer.flush(db) == 1
+        assert _executed_rows(db)[0][0]["b_amount"] == 1
+        assert redis.hashes == {"usage:pending:subscription": {"s1": "1"}}
+
+    def test_flush_skipped_while_another_process_holds_lock(self):
+        redis = _FakeRedis()
+        redis.strings["usage:flush_lock"] = "1"
+        buffer = UsageBuffer(redis_client=redis, flush_interval=1)
+        buffer.record_embed_usage("a")
+        db = _db()
+
+        assert buffer.flush(db) == 0
+        db.execute.assert_not_called()
+        assert redis.hashes["usage:pending:embed_code"] == {"a": "1"}
+
+    def test_expired_lock_taken_over_is_not_released(self):
+        redis = _FakeRedis()
+        buffer = UsageBuffer(redis_client=redis, flush_interval=1)
+        buffer.record_embed_usage("a")
+        db = _db()
+        # Our lock expires mid-flush and another process takes it
+        db.commit.side_effect = lambda: redis.strings.__setitem__("usage:flush_lock", "other-flusher")
+
+        assert buffer.flush(db) == 1
+        assert redis.strings["usage:flush_lock"] == "other-flusher"
+
+    def test_rollup_increments_grouped_by_bucket(self):
+        redis = _FakeRedis()
+        buffer = UsageBuffer(redis_client=redis, flush_interval=1)
+        workspace_id = UUID("33333333-3333-3333-3333-333333333333")
+        hour = datetime(2024, 1, 5, 14)
+        buffer.record_rollup(workspace_id, "hour", hour, {"messages_count": 1, "satisfied_count": 0})
+        buffer.record_rollup(workspace_id, "hour", hour, {"messages_count": 1, "session_duration_seconds": 1.5})
+        db = _db()
+
+        with patch("app.services.analytics_rollup.AnalyticsRollupService.apply_increments", return_value=1) as apply:
+            assert buffer.flush(db) == 1
+
+        (increments,), _ = apply.call_args
+        assert increments == {(workspace_id, "hour", hour): {"messages_count": 2.0, "session_duration_seconds": 1.5}}
+        assert redis.hashes == {}
+
+    def test_batch_committed_by_stalled_flusher_is_applied_once(self):
+        Session = _sqlite_session()
+        with Session() as db:
+            subscription = Subscription(workspace_id=uuid.uuid4(), tier="pro", status="active", queries_this_period=0)
+            db.add(subscription)
+            db.commit()
+            subscription_id = str(subscription.id)
+        redis = _FakeRedis()
+        buffer = UsageBuffer(redis_client=redis, flush_interval=1)
+        buffer.record_query_usage(subscription_id, amount=3)
+
+        # The flusher commits, then stalls past its lock TTL before clearing the batch
+        with patch.object(redis, "delete"), Session() as db:
+            assert buffer.flush(db) == 1
+        buffer.record_query_usage(subscription_id)
+
+        with Session() as db:
+            assert buffer.flush(db) == 0  # The leftover batch is dropped, not re-applied
+            assert buffer.flush(db) == 1  # Then the new increment
+            assert db.get(Subscription, UUID(subscription_id)).queries_this_period == 4
+            assert db.query(UsageFlushBatch).count() == 2
+        assert redis.hashes == {}
+
+
+def _sqlite_session():
+    engine = create_engine("sqlite://")
+    Subscription.__table__.create(engine)
+    UsageFlushBatch.__table__.create(engine)
+    return sessionmaker(bind=engine)
+
+
+class TestQuotaEnforcement:
+    """Quota checks count queries that are still buffered"""
+
+    @pytest.fixture
+    def quota_setup(self, monkeypatch):
+        Session = _sqlite_session()
+        buffer = UsageBuffer(redis_client=_FakeRedis(), flush_interval=60)
+        monkeypatch.setattr("app.middleware.quota_middleware.usage_buffer", buffer)
+        workspace_id = uuid.uuid4()
+        with Session() as db:
+            db.add(Subscription(workspace_id=workspace_id, tier="starter", status="active",
+                                monthly_query_quota=5, queries_this_period=2))
+            db.commit()
+        return Session, buffer, SimpleNamespace(id=1, workspace_id=workspace_id)
+
+    def test_burst_within_one_flush_interval_stops_at_quota(self, quota_setup):
+        Session, buffer, user = quota_setup
+
+        async def request(db):
+            subscription = await check_quota(current_user=user, db=db)
+            return await increment_usage(subscription, db)
+
+        async def burst(db):
+            # All pass check_quota before any is counted, as concurrent requests would
+            subscriptions = [await check_quota(current_user=user, db=db) for _ in range(10)]
+            results = []
+            for subscription in subscriptions:
+                try:
+                    results.append(await increment_usage(subscription, db))
+                except QuotaExceededException:
+                    results.append(False)
+            return results
+
+        with Session() as db:
+            results = asyncio.run(burst(db))
+            assert results.count(True) == 3
+            with pytest.raises(QuotaExceededException):
+                asyncio.run(request(db))
+
+            buffer.flush(db)
+            db.expire_all()
+            assert db.query(Subscription).one().queries_this_period == 5
+            with pytest.raises(QuotaExceededException):
+                asyncio.run(request(db))
+
+    def test_buffered_queries_count_without_redis(self, quota_setup, monkeypatch):
+        Session, buffer, user = quota_setup
+        monkeypatch.setattr(buffer, "_redis", lambda: None)
+
+        with Session() as db:
+            subscription = db.query(Subscription).one()
+            buffer.record_query_usage(str(subscription.id), amount=3)
+
+            with pytest.raises(QuotaExceededException) as exc_info:
+                asyncio.run(check_quota(current_user=user, db=db))
+        assert exc_info.value.detail["quota_info"]["quota_used"] == 5
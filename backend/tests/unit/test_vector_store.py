@@ -0,0 +1,252 @@
+"""
+Unit tests for the workspace-sharded vector store
+"""
+
+import os
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from app.services import vector_store as vector_store_module
+from app.services.vector_store import (
+    ChromaVectorStore,
+    LocalShard,
+    LocalVectorStore,
+    workspace_shard_name,
+)
+
+
+def _random_vectors(count: int, dimension: int = 16, seed: int = 0):
+    return np.random.default_rng(seed).normal(size=(count, dimension)).astype(np.float32)
+
+
+def _add(shard, vectors, offset: int = 0, metadata=None):
+    ids = [f"c{offset + i}" for i in range(len(vectors))]
+    shard.add(
+        ids=ids,
+        embeddings=vectors.tolist(),
+        metadatas=[dict(metadata or {}, n=offset + i) for i in range(len(vectors))],
+        documents=[f"doc {offset + i}" for i in range(len(vectors))],
+    )
+    return ids
+
+
+class TestLocalShard:
+    """Exact search for small shards, HNSW above the threshold"""
+
+    def test_exact_search_returns_nearest_with_cosine_distance(self):
+        shard = LocalShard("ws", ann_threshold=1000)
+        vectors = _random_vectors(50)
+        _add(shard, vectors)
+
+        result = shard.query(query_embeddings=[vectors[7].tolist()], n_results=3)
+
+        assert result["ids"][0][0] == "c7"
+        assert result["documents"][0][0] == "doc 7"
+        assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
+        assert result["distances"][0] == sorted(result["distances"][0])
+        assert shard._ann is None
+
+    def test_large_shard_uses_ann_and_matches_exact_top_hit(self):
+        pytest.importorskip("hnswlib")
+        shard = LocalShard("ws", ann_threshold=100)
+        vectors = _random_vectors(300)
+        _add(shard, vectors)
+
+        assert shard._ann is not None
+        for row in (0, 150, 299):
+            result = shard.query(query_embeddings=[vectors[row].tolist()], n_results=5)
+            assert result["ids"][0][0] == f"c{row}"
+
+    def test_large_shard_without_hnswlib_uses_exact_search(self):
+        shard = LocalShard("ws", ann_threshold=100)
+        vectors = _random_vectors(300)
+        with patch.object(vector_store_module, "HNSWLIB_AVAILABLE", False):
+            _add(shard, vectors)
+
+        assert shard._ann is None
+        result = shard.query(query_embeddings=[vectors[150].tolist()], n_results=5)
+        assert result["ids"][0][0] == "c150"
+
+    def test_where_filter_applies_to_both_search_paths(self):
+        for threshold in ((1000, 10) if vector_store_module.HNSWLIB_AVAILABLE else (1000,)):
+            shard = LocalShard("ws", ann_threshold=threshold)
+            vectors = _random_vectors(40)
+            _add(shard, vectors[:20], metadata={"lang": "en"})
+            _add(shard, vectors[20:], offset=20, metadata={"lang": "de"})
+
+            result = shard.query(query_embeddings=[vectors[3].tolist()], n_results=5, where={"lang": "de"})
+
+            assert len(result["ids"][0]) == 5
+            assert all(m["lang"] == "de" for m in result["metadatas"][0])
+
+    def test_add_existing_id_replaces_vector(self):
+        shard = LocalShard("ws", ann_threshold=1000)
+        vectors = _random_vectors(3)
+        _add(shard, vectors)
+
+        shard.add(ids=["c0"], embeddings=[vectors[2].tolist()], documents=["updated"])
+
+        assert shard.count() == 3
+        assert shard.get(ids=["c0"])["documents"] == ["updated"]
+
+    def test_delete_by_id_and_where_compacts_tombstones(self):
+        shard = LocalShard("ws", ann_threshold=1000)
+        _add(shard, _random_vectors(8))
+
+        shard.delete(ids=["c0", "c1"])
+        assert shard.size == 6
+
+        shard.delete(where={"n": 2})
+
+        assert shard.count() == 5
+        assert shard.size == 6
+        assert "c0" not in shard.get()["ids"]
+        result = shard.query(query_embeddings=[[1.0] * 16], n_results=10)
+        assert len(result["ids"][0]) == 5
+
+    def test_empty_shard_query_returns_empty_lists(self):
+        result = LocalShard("ws").query(query_embeddings=[[1.0, 0.0]], n_results=3)
+
+        assert result["ids"] == [[]]
+
+
+class TestLocalVectorStore:
+    """Shards persist per workspace and delete in one step"""
+
+    def test_flush_and_reload(self, tmp_path):
+        store = LocalVectorStore("documents", root_dir=str(tmp_path))
+        vectors = _random_vectors(10)
+        _add(store.get_shard("ws_1"), vectors)
+        store.flush("ws_1")
+
+        reloaded = LocalVectorStore("documents", root_dir=str(tmp_path)).get_shard("ws_1")
+
+        assert reloaded.count() == 10
+        assert reloaded.query(query_embeddings=[vectors[4].tolist()], n_results=1)["ids"] == [["c4"]]
+
+    def test_workspaces_are_isolated(self, tmp_path):
+        store = LocalVectorStore("documents", root_dir=str(tmp_path))
+        _add(store.get_shard("ws_1"), _random_vectors(5))
+        _add(store.get_shard("ws_2"), _random_vectors(3, seed=1), offset=100)
+
+        result = store.get_shard("ws_2").query(query_embeddings=[[1.0] * 16], n_results=10)
+
+        assert sorted(result["ids"][0]) == ["c100", "c101", "c102"]
+        assert store.count() == 8
+
+    def test_delete_workspace_removes_shard_directory(self, tmp_path):
+        store = LocalVectorStore("documents", root_dir=str(tmp_path))
+        _add(store.get_shard("ws_1"), _random_vectors(5))
+        store.flush("ws_1")
+        shard_dir = store._shard_path("ws_1")
+        assert os.path.isdir(shard_dir)
+
+        store.delete_workspace("ws_1")
+
+        assert not os.path.exists(shard_dir)
+        assert [name for name in os.listdir(store.root_dir) if not name.endswith(".lock")] == []
+        assert store.get_shard("ws_1").count() == 0
+
+    def test_changes_are_durable_without_flush(self, tmp_path):
+        store = LocalVectorStore("documents", root_dir=str(tmp_path))
+        _add(store.get_shard("ws_1"), _random_vectors(4))
+        store.get_shard("ws_1").delete(ids=["c1"])
+
+        reloaded = LocalVectorStore("documents", root_dir=str(tmp_path)).get_shard("ws_1")
+
+        assert sorted(reloaded.get()["ids"]) == ["c0", "c2", "c3"]
+
+
+class TestSharedLocalShards:
+    """Stores in different worker processes share one shard directory"""
+
+    def test_no_lost_updates_and_other_writes_are_served(self, tmp_path):
+        first = LocalVectorStore("documents", root_dir=str(tmp_path))
+        second = LocalVectorStore("documents", root_dir=str(tmp_path))
+        vectors = _random_vectors(6)
+        first.get_shard("ws_1").count()  # Loaded before the other worker writes
+        _add(first.get_shard("ws_1"), vectors[:3])
+        _add(second.get_shard("ws_1"), vectors[3:], offset=3)
+        first.get_shard("ws_1").delete(ids=["c4"])
+
+        result = second.get_shard("ws_1").query(query_embeddings=[vectors[5].tolist()], n_results=10)
+
+        assert result["ids"][0][0] == "c5"
+        assert sorted(result["ids"][0]) == ["c0", "c1", "c2", "c3", "c5"]
+
+    def test_checkpoint_and_delete_by_another_worker_trigger_reload(self, tmp_path):
+        first = LocalVectorStore("documents", root_dir=str(tmp_path))
+        second = LocalVectorStore("documents", root_dir=str(tmp_path))
+        with patch("app.utils.delta_log.CHECKPOINT_MIN_LOG_BYTES", 0):
+            _add(first.get_shard("ws_1"), _random_vectors(3))
+            assert second.get_shard("ws_1").count() == 3
+            _add(second.get_shard("ws_1"), _random_vectors(2, seed=1), offset=3)
+
+        assert first.get_shard("ws_1").count() == 5
+        first.delete_workspace("ws_1")
+        assert second.get_shard("ws_1").count() == 0
+
+
+class TestChromaVectorStore:
+    """One Chroma collection per workspace"""
+
+    def test_get_shard_creates_workspace_collection_once(self):
+        client = MagicMock()
+        store = ChromaVectorStore("documents", client)
+
+        first = store.get_shard("ws/1")
+        second = store.get_shard("ws/1")
+
+        assert first is second
+        client.get_or_create_collection.assert_called_once()
+        assert client.get_or_create_collection.call_args.kwargs["name"] == "documents_ws_1"
+        assert workspace_shard_name("documents", "ws/1") == "documents_ws_1"
+
+    def test_delete_workspace_drops_collection(self):
+        client = MagicMock()
+        store = ChromaVectorStore("documents", client)
+        store.get_shard("ws_1")
+
+        store.delete_workspace("ws_1")
+
+        client.delete_collection.assert_called_once_with(name="documents_ws_1")
+        store.get_shard("ws_1")
+        assert client.get_or_create_collection.call_count == 2
+
+    def test_legacy_collections_are_imported_into_shards_once(self):
+        def legacy(name, rows):
+            collection = MagicMock()
+            collection.name = name
+            collection.get.side_effect = lambda limit, offset, include: {
+                "ids": [row[0] for row in rows[offset:offset + limit]],
+                "embeddings": [[0.0, 1.0] for _ in rows[offset:offset + limit]],
+                "documents": [row[1] for row in rows[offset:offset + limit]],
+                "metadatas": [row[2] for row in rows[offset:offset + limit]],
+            }
+            return collection
+
+        collections = {
+            "documents": legacy("documents", [("a", "shared a", {"workspace_id": "1"})]),
+            "workspace_2": legacy("workspace_2", [("b", "old b", {}), ("c", "old c", {})]),
+            "unrelated": legacy("unrelated", [("d", "other", {})]),
+        }
+        shards = {}
+        client = MagicMock()
+        client.list_collections.return_value = list(collections.values())
+        client.get_collection.side_effect = lambda name: collections[name]
+        client.get_or_create_collection.side_effect = lambda name, metadata: shards.setdefault(name, MagicMock())
+        store = ChromaVectorStore("documents", client)
+
+        copied = store.import_legacy_collections(lambda texts: [[1.0, 0.0] for _ in texts])
+
+        assert copied == 3
+        assert shards["documents_1"].upsert.call_args.kwargs["embeddings"] == [[0.0, 1.0]]
+        reembedded = shards["documents_2"].upsert.call_args.kwargs
+        assert reembedded["ids"] == ["b", "c"]
+        assert reembedded["embeddings"] == [[1.0, 0.0], [1.0, 0.0]]
+        assert reembedded["metadatas"][0]["workspace_id"] == "2"
+        collections["documents"].modify.assert_called_once_with(name="imported_documents")
+        collections["workspace_2"].modify.assert_called_once_with(name="imported_workspace_2")
+        collections["unrelated"].modify.assert_not_called()
@@ -57,7 +57,7 @@ test.describe('Dashboard', () => {
         body: JSON.stringify({
           queries: { delta_pct: 15.5 },
           sessions: { delta_pct: 8.2 },
-          avg_response_time_ms: { delta_ms: -200 },
+          response_time_p50_ms: { delta_ms: -200 },
           active_sessions: { delta: 2 }
         })
       });
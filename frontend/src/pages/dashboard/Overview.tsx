@@ -77,7 +77,7 @@ export function Overview() {
         deltas: {
           queriesPct: k?.queries?.delta_pct ?? 0,
           sessionsPct: k?.sessions?.delta_pct ?? 0,
-          responseMs: (k?.avg_response_time_ms?.delta_ms ?? 0),
+          responseMs: (k?.response_time_p50_ms?.delta_ms ?? 0),
           activeDelta: k?.active_sessions?.delta ?? 0,
         },
       });
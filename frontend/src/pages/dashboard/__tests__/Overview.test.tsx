@@ -81,7 +81,7 @@ const mockUsageData = [
 const mockKpisData = {
   queries: { delta_pct: 12.5 },
   sessions: { delta_pct: 8.3 },
-  avg_response_time_ms: { delta_ms: -300 },
+  response_time_p50_ms: { delta_ms: -300 },
   active_sessions: { delta: 5 },
 };
 
@@ -75,7 +75,10 @@ export interface ApiKpis {
   sessions?: {
     delta_pct: number;
   };
-  avg_response_time_ms?: {
+  response_time_p50_ms?: {
+    delta_ms: number;
+  };
+  response_time_p95_ms?: {
     delta_ms: number;
   };
   active_sessions?: {